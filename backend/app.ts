@@ -0,0 +1,98 @@
+import { Application } from "https://deno.land/x/oak@v12.6.1/mod.ts";
+import { oakCors } from "https://deno.land/x/cors@v1.2.2/mod.ts";
+import openRouterRoutes from "./routes/openRouter.ts";
+import speedTestRoutes from "./routes/speedTest.ts";
+import exercismRoutes from "./routes/exercism.ts";
+import repoTestRoutes from "./routes/repoTest.ts";
+import runHistoryRoutes from "./routes/runHistory.ts";
+import runRoutes from "./routes/runs.ts";
+import jobRoutes from "./routes/jobs.ts";
+import promptSuiteRoutes from "./routes/promptSuites.ts";
+import llmRoutes from "./routes/llmManagement.ts";
+import systemRoutes from "./routes/system.ts";
+import { RepoTestService } from "./services/repoTestService.ts";
+import { JobService } from "./services/jobService.ts";
+import { RouteTable } from "./utils/routeTable.ts";
+import { compressResponses } from "./utils/responseCompression.ts";
+import { httpMetrics } from "./utils/httpMetrics.ts";
+import { monitorEventLoop } from "./utils/metrics.ts";
+import { traceRequests, tracer } from "./utils/tracing.ts";
+import { logger } from "./utils/logger.ts";
+import { envLimit } from "./utils/concurrency.ts";
+import { workerId } from "./utils/cluster.ts";
+
+// The HTTP application: middleware and every route. main.ts serves it from one process or from
+// each cluster worker (worker.ts).
+export function createApp(): Application {
+  const app = new Application();
+
+  // Enable CORS for all routes
+  app.use(oakCors());
+
+  // Request tracing, only when TRACE_DIR or TRACE_OTLP_ENDPOINT is set
+  if (tracer.enabled) app.use(traceRequests());
+
+  // Request log: failures and slow requests by default, every request with LOG_LEVEL=debug.
+  // Paths only, since query strings can carry API keys.
+  const slowRequestMs = envLimit("LOG_SLOW_REQUEST_MS", 1000);
+  app.use(async (ctx, next) => {
+    const start = performance.now();
+    await next();
+    const ms = Math.round(performance.now() - start);
+    const status = ctx.response.status;
+    const level = status >= 500 ? "error" : status >= 400 ? "warn" : ms >= slowRequestMs ? "info" : "debug";
+    if (!logger.enabled(level)) return;
+    logger.log(level, "request", {
+      method: ctx.request.method,
+      path: ctx.request.url.pathname,
+      route: (ctx.state as { route?: string }).route,
+      status,
+      ms,
+      worker: workerId() || undefined,
+    });
+  });
+
+  // Timing middleware
+  app.use(async (ctx, next) => {
+    const start = Date.now();
+    await next();
+    const ms = Date.now() - start;
+    ctx.response.headers.set("X-Response-Time", `${ms}ms`);
+  });
+
+  // Request durations by route and open SSE streams, served at /metrics
+  app.use(httpMetrics());
+
+  // gzip/brotli for buffered responses above COMPRESSION_MIN_BYTES; streams pass through
+  app.use(compressResponses());
+
+  // Every route lives in one table, compiled into a trie before the server starts
+  const routes = RouteTable.merge(
+    systemRoutes,
+    runHistoryRoutes,
+    runRoutes,
+    jobRoutes,
+    llmRoutes,
+    openRouterRoutes,
+    speedTestRoutes,
+    exercismRoutes,
+    repoTestRoutes,
+    promptSuiteRoutes,
+  ).compile();
+  app.use(routes.routes());
+  app.use(routes.allowedMethods());
+
+  return app;
+}
+
+// Per-thread work that runs alongside serving
+export function startBackgroundTasks() {
+  // Probe coding tools in the background so the Repo Test tab does not wait on it
+  RepoTestService.listTools().catch((error) => logger.warn("Failed to probe coding tools", { error }));
+
+  // Event-loop lag, sampled on an unref'd timer
+  monitorEventLoop();
+
+  // Claim background jobs (repo tests, batches, exercism runs) alongside the other threads
+  JobService.start();
+}
@@ -626,4 +626,17 @@ class InMemoryDB {
 import sqliteDb from "./sqliteDb.ts";
 
 export default sqliteDb;
-export type { RunHistory, RunStats, LLMProvider, LLMModel };
\ No newline at end of file
+export type { RunHistory, RunStats, LLMProvider, LLMModel };
+export type {
+  EnqueueJob,
+  Job,
+  JobStatus,
+  PromptSuite,
+  SuiteBatch,
+  SuiteBatchCell,
+  SuiteBatchStatus,
+  SuiteModelAggregate,
+  SuitePrompt,
+  SuitePromptInput,
+  VersionedTable,
+} from "./sqliteDb.ts";
\ No newline at end of file
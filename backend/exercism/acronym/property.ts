@@ -0,0 +1,35 @@
+import { pick, type PropertySuite, randomInt, shrinkString } from "../property.ts";
+
+const SEPARATORS = [" ", " ", " ", "-", ", ", ": ", " - ", "_"];
+
+// Words are split on non-letters and at lowercase-to-capital changes ("HyperText" is two
+// words), and an all-caps run counts as one word ("GNU"). Generated phrases always separate
+// their words, but shrinking deletes single characters, separators included, so camelCase
+// inputs do reach the reference ("Abc Def" shrinks to "AbcDef")
+export function acronymReference(phrase: string): string {
+  return phrase
+    .replace(/([a-z])(?=[A-Z])/g, "$1 ")
+    .split(/[^A-Za-z]+/)
+    .filter((word) => word.length > 0)
+    .map((word) => word[0].toUpperCase())
+    .join("");
+}
+
+function randomWord(rng: () => number): string {
+  const word = Array.from({ length: randomInt(rng, 1, 9) }, () => String.fromCharCode(97 + randomInt(rng, 0, 25))).join("");
+  const style = rng();
+  if (style < 0.2) return word.toUpperCase();
+  if (style < 0.6) return word[0].toUpperCase() + word.slice(1);
+  return word;
+}
+
+export const ACRONYM_PROPERTY: PropertySuite<string, string> = {
+  reference: acronymReference,
+  generate: (rng) => {
+    const words = Array.from({ length: randomInt(rng, 1, 7) }, () => randomWord(rng));
+    let phrase = words[0];
+    for (const word of words.slice(1)) phrase += pick(rng, SEPARATORS) + word;
+    return phrase;
+  },
+  shrink: shrinkString,
+};
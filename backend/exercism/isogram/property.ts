@@ -0,0 +1,29 @@
+import { pick, type PropertySuite, randomInt, shrinkString, shuffle } from "../property.ts";
+
+const LETTERS = "abcdefghijklmnopqrstuvwxyzéöü";
+
+export function isIsogramReference(s: string): boolean {
+  const seen = new Set<string>();
+  for (const ch of s.toLowerCase()) {
+    if (ch === " " || ch === "-") continue;
+    if (seen.has(ch)) return false;
+    seen.add(ch);
+  }
+  return true;
+}
+
+export const ISOGRAM_PROPERTY: PropertySuite<string, boolean> = {
+  reference: isIsogramReference,
+  generate: (rng) => {
+    const length = randomInt(rng, 0, 16);
+    // Half the inputs are built from distinct letters so both outcomes are well represented
+    const letters = rng() < 0.5
+      ? shuffle(rng, Array.from(LETTERS)).slice(0, length)
+      : Array.from({ length }, () => pick(rng, Array.from(LETTERS)));
+    return letters
+      .map((ch) => (rng() < 0.3 ? ch.toUpperCase() : ch))
+      .map((ch) => (rng() < 0.1 ? pick(rng, [" ", "-"]) + ch : ch))
+      .join("");
+  },
+  shrink: shrinkString,
+};
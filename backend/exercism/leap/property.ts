@@ -0,0 +1,18 @@
+import { pick, type PropertySuite, randomInt, shrinkInteger } from "../property.ts";
+
+export function isLeapReference(year: number): boolean {
+  return (year % 4 === 0 && year % 100 !== 0) || year % 400 === 0;
+}
+
+export const LEAP_PROPERTY: PropertySuite<number, boolean> = {
+  reference: isLeapReference,
+  generate: (rng) => {
+    // Century and quad-century years are the interesting boundaries
+    if (rng() < 0.5) {
+      const step = pick(rng, [4, 100, 400]);
+      return step * randomInt(rng, 1, Math.floor(9999 / step));
+    }
+    return randomInt(rng, 1, 9999);
+  },
+  shrink: (year) => shrinkInteger(year, 1),
+};
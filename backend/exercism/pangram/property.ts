@@ -0,0 +1,29 @@
+import { pick, type PropertySuite, randomInt, shrinkString, shuffle } from "../property.ts";
+
+const ALPHABET = "abcdefghijklmnopqrstuvwxyz";
+const NOISE = " .,;!?0123456789_\"'";
+
+export function isPangramReference(s: string): boolean {
+  const seen = new Set<string>();
+  for (const ch of s.toLowerCase()) {
+    if (ch >= "a" && ch <= "z") seen.add(ch);
+  }
+  return seen.size === 26;
+}
+
+export const PANGRAM_PROPERTY: PropertySuite<string, boolean> = {
+  reference: isPangramReference,
+  generate: (rng) => {
+    // Near-pangrams (full alphabet minus 0-2 letters) are where implementations differ
+    const base = rng() < 0.6
+      ? shuffle(rng, Array.from(ALPHABET)).slice(randomInt(rng, 0, 2))
+      : Array.from({ length: randomInt(rng, 0, 40) }, () => pick(rng, Array.from(ALPHABET)));
+    const out: string[] = [];
+    for (const ch of base) {
+      out.push(rng() < 0.3 ? ch.toUpperCase() : ch);
+      if (rng() < 0.25) out.push(pick(rng, Array.from(NOISE)));
+    }
+    return out.join("");
+  },
+  shrink: shrinkString,
+};
@@ -0,0 +1,64 @@
+// Shared types for generated (property-based) exercise suites.
+// Each exercise folder exports a PropertySuite next to its hand-written cases.
+
+export type Rng = () => number; // uniform in [0, 1)
+
+export interface PropertySuite<I, O> {
+  // Trusted implementation used as the oracle for expected outputs
+  reference: (input: I) => O;
+  // Draw one random input
+  generate: (rng: Rng) => I;
+  // Smaller candidates derived from a failing input, most aggressive first
+  shrink: (input: I) => I[];
+}
+
+// mulberry32: tiny, fast and good enough for test input generation
+export function createRng(seed: number): Rng {
+  let state = seed >>> 0;
+  return () => {
+    state = (state + 0x6d2b79f5) >>> 0;
+    let t = state;
+    t = Math.imul(t ^ (t >>> 15), t | 1);
+    t ^= t + Math.imul(t ^ (t >>> 7), t | 61);
+    return ((t ^ (t >>> 14)) >>> 0) / 4294967296;
+  };
+}
+
+export function randomInt(rng: Rng, min: number, max: number): number {
+  return min + Math.floor(rng() * (max - min + 1));
+}
+
+export function pick<T>(rng: Rng, items: readonly T[]): T {
+  return items[Math.floor(rng() * items.length)];
+}
+
+export function shuffle<T>(rng: Rng, items: T[]): T[] {
+  for (let i = items.length - 1; i > 0; i--) {
+    const j = Math.floor(rng() * (i + 1));
+    [items[i], items[j]] = [items[j], items[i]];
+  }
+  return items;
+}
+
+// Candidates for a failing string: drop halves first, then single characters
+export function shrinkString(s: string): string[] {
+  const chars = Array.from(s);
+  const out: string[] = [];
+  if (chars.length > 1) {
+    const half = Math.floor(chars.length / 2);
+    out.push(chars.slice(half).join(""), chars.slice(0, half).join(""));
+  }
+  for (let i = 0; i < chars.length; i++) {
+    out.push(chars.slice(0, i).concat(chars.slice(i + 1)).join(""));
+  }
+  return out;
+}
+
+// Candidates for a failing integer, staying >= min
+export function shrinkInteger(n: number, min: number): number[] {
+  const out = new Set<number>();
+  for (const candidate of [min, Math.floor(n / 10), Math.floor(n / 2), n - 1]) {
+    if (candidate >= min && candidate < n) out.add(candidate);
+  }
+  return [...out];
+}
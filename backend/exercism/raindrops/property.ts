@@ -0,0 +1,22 @@
+import { pick, type PropertySuite, randomInt, shrinkInteger } from "../property.ts";
+
+export function raindropsReference(n: number): string {
+  let out = "";
+  if (n % 3 === 0) out += "Pling";
+  if (n % 5 === 0) out += "Plang";
+  if (n % 7 === 0) out += "Plong";
+  return out || String(n);
+}
+
+export const RAINDROPS_PROPERTY: PropertySuite<number, string> = {
+  reference: raindropsReference,
+  generate: (rng) => {
+    // Bias towards products of 3, 5 and 7 so every sound combination shows up
+    if (rng() < 0.6) {
+      const factor = pick(rng, [3, 5, 7, 15, 21, 35, 105]);
+      return factor * randomInt(rng, 1, 10000);
+    }
+    return randomInt(rng, 1, 1_000_000);
+  },
+  shrink: (n) => shrinkInteger(n, 1),
+};
@@ -1,7 +1,25 @@
-import { Router } from "https://deno.land/x/oak@v12.6.1/mod.ts";
-import { ExercismService } from "../services/exercismService.ts";
+import { RouteTable } from "../utils/routeTable.ts";
+import { ExercismService, type RunRequest } from "../services/exercismService.ts";
+import { JobService } from "../services/jobService.ts";
+import { respondWithJobEvents, submitOptions } from "./jobs.ts";
 
-const router = new Router({ prefix: "/api/exercism" });
+const router = new RouteTable({ prefix: "/api/exercism" });
+
+// The request fields of a run, without submission options
+function runRequest(body: any): RunRequest {
+  const { exerciseId, models, testCount, samples, temperature, concurrency, refresh, generatedCases, seed } = body || {};
+  return { exerciseId, models, testCount, samples, temperature, concurrency, refresh, generatedCases, seed };
+}
+
+function invalidRun(request: RunRequest): string | null {
+  if (!request?.exerciseId || !Array.isArray(request.models) || request.models.length === 0) {
+    return "exerciseId and at least one model are required";
+  }
+  return null;
+}
+
+JobService.register("exercism", (request: RunRequest, { run, signal }) =>
+  ExercismService.runStreaming(request, (event) => run.append(event), signal), { concurrency: 2, validate: invalidRun });
 
 router.get("/exercises", (ctx) => {
   try {
@@ -13,23 +31,76 @@ router.get("/exercises", (ctx) => {
   }
 });
 
+// Runs as a job and waits for it; the job (Location) outlives this request
 router.post("/run", async (ctx) => {
   try {
     const body = await ctx.request.body({ type: "json" }).value;
-    const { exerciseId, models, testCount } = body || {};
-    if (!exerciseId || !Array.isArray(models) || models.length === 0) {
+    const request = runRequest(body);
+    const error = invalidRun(request);
+    const options = submitOptions(ctx, body);
+    if (error || typeof options === "string") {
       ctx.response.status = 400;
-      ctx.response.body = { success: false, error: "exerciseId and at least one model are required" };
+      ctx.response.body = { success: false, error: error ?? options };
       return;
     }
-    const result = await ExercismService.run({ exerciseId, models, testCount });
-    ctx.response.body = { success: true, data: result };
+    const { job } = JobService.submit("exercism", request, options);
+    const finished = await JobService.wait(job.id);
+    if (finished.status !== "succeeded") throw new Error(finished.error || `Job ${job.id} ${finished.status}`);
+    ctx.response.headers.set("Location", `/api/jobs/${job.id}`);
+    ctx.response.body = { success: true, data: finished.result };
   } catch (error) {
     ctx.response.status = 500;
     ctx.response.body = { success: false, error: error instanceof Error ? error.message : "Unknown error" };
   }
 });
 
+// Same as /run, but streams per-model phase events over SSE while the run progresses
+router.post("/run-stream", async (ctx) => {
+  try {
+    const body = await ctx.request.body({ type: "json" }).value;
+    const request = runRequest(body);
+    const error = invalidRun(request);
+    const options = submitOptions(ctx, body);
+    if (error || typeof options === "string") {
+      ctx.response.status = 400;
+      ctx.response.body = { success: false, error: error ?? options };
+      return;
+    }
+    const { job, created } = JobService.submit("exercism", request, options);
+    ctx.response.headers.set("X-Run-Coalesced", String(!created));
+    respondWithJobEvents(ctx, job);
+  } catch (error) {
+    ctx.response.status = 500;
+    ctx.response.body = { success: false, error: error instanceof Error ? error.message : "Unknown error" };
+  }
+});
+
+// Re-score stored solutions from earlier runs without calling any model
+router.post("/reevaluate", async (ctx) => {
+  try {
+    const body = await ctx.request.body({ type: "json" }).value;
+    const { runId, exerciseId, model, startDate, endDate, limit, testCount, generatedCases, seed } = body || {};
+    if (runId !== undefined && typeof runId !== "number") {
+      ctx.response.status = 400;
+      ctx.response.body = { success: false, error: "runId must be a number" };
+      return;
+    }
+    for (const [field, value] of [["startDate", startDate], ["endDate", endDate]]) {
+      if (value !== undefined && (typeof value !== "string" || Number.isNaN(Date.parse(value)))) {
+        ctx.response.status = 400;
+        ctx.response.body = { success: false, error: `${field} must be a date, e.g. 2026-01-31 or an ISO timestamp` };
+        return;
+      }
+    }
+    const result = await ExercismService.reevaluate({ runId, exerciseId, model, startDate, endDate, limit, testCount, generatedCases, seed });
+    ctx.response.body = { success: true, data: result };
+  } catch (error) {
+    const message = error instanceof Error ? error.message : "Unknown error";
+    ctx.response.status = message === "Run not found" ? 404 : 500;
+    ctx.response.body = { success: false, error: message };
+  }
+});
+
 router.get("/history", (ctx) => {
   try {
     const limit = parseInt(ctx.request.url.searchParams.get("limit") || "50");
@@ -0,0 +1,146 @@
+import type { Context } from "https://deno.land/x/oak@v12.6.1/mod.ts";
+import { RouteTable } from "../utils/routeTable.ts";
+import { type JobResume, JobService, type SubmitOptions } from "../services/jobService.ts";
+import type { Job, JobStatus } from "../db.ts";
+import { respondWithRunEvents } from "../utils/sse.ts";
+
+const router = new RouteTable({ prefix: "/api/jobs" });
+
+const JOB_STATUSES: JobStatus[] = ["queued", "running", "succeeded", "failed", "cancelled"];
+
+// Priority (higher runs first), idempotency key (Idempotency-Key header or `idempotency_key`)
+// and `coalesce` of a submission, or an error message when one is malformed
+export function submitOptions(ctx: Context, body: any): SubmitOptions | string {
+  const idempotencyKey = ctx.request.headers.get("Idempotency-Key") ?? body?.idempotency_key ?? null;
+  if (idempotencyKey !== null && (typeof idempotencyKey !== "string" || idempotencyKey.length === 0 || idempotencyKey.length > 255)) {
+    return "idempotency_key must be a string of 1 to 255 characters";
+  }
+  const priority = body?.priority ?? 0;
+  if (!Number.isInteger(priority)) return "priority must be an integer";
+  return { priority, idempotencyKey, coalesce: Boolean(body?.coalesce) };
+}
+
+// Last-Event-ID (or ?after=) of a job stream: "<attempt>-<seq>" as sent, or a bare seq for
+// the first attempt. null when malformed.
+export function jobResumeFrom(ctx: Context): JobResume | null {
+  const value = ctx.request.headers.get("Last-Event-ID") ?? ctx.request.url.searchParams.get("after") ?? "0";
+  const match = value.trim().match(/^(?:(\d+)-)?(\d+)$/);
+  if (!match) return null;
+  const resume = { attempt: match[1] === undefined ? 1 : parseInt(match[1]), after: parseInt(match[2]) };
+  return Number.isSafeInteger(resume.attempt) && Number.isSafeInteger(resume.after) ? resume : null;
+}
+
+// Stream a job's events over SSE, from its queued notice to its last event; the client
+// reattaches at /api/jobs/:id/events. No X-Run-Id: the stream spans one run log per attempt.
+export function respondWithJobEvents(ctx: Context, job: Job, resume?: JobResume) {
+  const abort = new AbortController();
+  respondWithRunEvents(ctx, null, JobService.follow(job.id, resume, abort.signal), abort, `/api/jobs/${job.id}/events`);
+}
+
+function jobId(param: string): number | null {
+  const id = parseInt(param);
+  return Number.isInteger(id) && id > 0 ? id : null;
+}
+
+// Queue a job: { type, payload, priority?, idempotency_key?, coalesce? }. 202 with the new job,
+// or 200 with the existing one when the idempotency key (or `coalesce`) matched.
+router.post("/", async (ctx) => {
+  try {
+    const body = await ctx.request.body({ type: "json" }).value;
+    const invalid = JobService.invalid(body?.type, body?.payload);
+    const options = submitOptions(ctx, body);
+    if (invalid || typeof options === "string") {
+      ctx.response.status = 400;
+      ctx.response.body = { success: false, error: invalid ?? options };
+      return;
+    }
+    const { job, created } = JobService.submit(body.type, body.payload, options);
+    ctx.response.status = created ? 202 : 200;
+    ctx.response.headers.set("Location", `/api/jobs/${job.id}`);
+    ctx.response.body = { success: true, data: job };
+  } catch (error) {
+    ctx.response.status = 500;
+    ctx.response.body = { success: false, error: error instanceof Error ? error.message : "Unknown error" };
+  }
+});
+
+// Newest first, without results; ?status= and ?limit= (default 50)
+router.get("/", (ctx) => {
+  try {
+    const status = ctx.request.url.searchParams.get("status") ?? undefined;
+    if (status !== undefined && !JOB_STATUSES.includes(status as JobStatus)) {
+      ctx.response.status = 400;
+      ctx.response.body = { success: false, error: `status must be one of: ${JOB_STATUSES.join(", ")}` };
+      return;
+    }
+    const limit = Math.min(parseInt(ctx.request.url.searchParams.get("limit") || "50") || 50, 500);
+    ctx.response.body = { success: true, data: JobService.list(limit, status as JobStatus | undefined) };
+  } catch (error) {
+    ctx.response.status = 500;
+    ctx.response.body = { success: false, error: error instanceof Error ? error.message : "Unknown error" };
+  }
+});
+
+router.get("/:id", (ctx) => {
+  try {
+    const id = jobId(ctx.params.id);
+    const job = id === null ? undefined : JobService.get(id);
+    if (!job) {
+      ctx.response.status = 404;
+      ctx.response.body = { success: false, error: "Job not found" };
+      return;
+    }
+    ctx.response.body = { success: true, data: job };
+  } catch (error) {
+    ctx.response.status = 500;
+    ctx.response.body = { success: false, error: error instanceof Error ? error.message : "Unknown error" };
+  }
+});
+
+// Follow a job over SSE; Last-Event-ID (or ?after=) resumes where the client left off, or
+// replays the current attempt from its start if the client was on an earlier one
+router.get("/:id/events", (ctx) => {
+  try {
+    const id = jobId(ctx.params.id);
+    const job = id === null ? undefined : JobService.get(id);
+    if (!job) {
+      ctx.response.status = 404;
+      ctx.response.body = { success: false, error: "Job not found" };
+      return;
+    }
+    const resume = jobResumeFrom(ctx);
+    if (resume === null) {
+      ctx.response.status = 400;
+      ctx.response.body = { success: false, error: "Last-Event-ID must be an event id of this stream, e.g. 2-15" };
+      return;
+    }
+    respondWithJobEvents(ctx, job, resume);
+  } catch (error) {
+    ctx.response.status = 500;
+    ctx.response.body = { success: false, error: error instanceof Error ? error.message : "Unknown error" };
+  }
+});
+
+// Cancel a queued job; one that already started runs to completion
+router.delete("/:id", (ctx) => {
+  try {
+    const id = jobId(ctx.params.id);
+    const job = id === null ? undefined : JobService.get(id);
+    if (!job) {
+      ctx.response.status = 404;
+      ctx.response.body = { success: false, error: "Job not found" };
+      return;
+    }
+    if (!JobService.cancel(job.id)) {
+      ctx.response.status = 409;
+      ctx.response.body = { success: false, error: `Job is ${JobService.get(job.id)?.status ?? job.status} and can no longer be cancelled` };
+      return;
+    }
+    ctx.response.body = { success: true, data: JobService.get(job.id) };
+  } catch (error) {
+    ctx.response.status = 500;
+    ctx.response.body = { success: false, error: error instanceof Error ? error.message : "Unknown error" };
+  }
+});
+
+export default router;
@@ -1,4 +1,7 @@
 import { DbService } from "../services/dbService.ts";
+import { ModelCatalogService } from "../services/modelCatalogService.ts";
+import { notModified } from "../utils/httpCache.ts";
+import { type RouteContext, RouteTable } from "../utils/routeTable.ts";
 import type { LLMProvider, LLMModel } from "../db.ts";
 
 export interface LLMManagementRoutes {
@@ -119,6 +122,25 @@ export class LLMManagementHandler {
     }
   }
 
+  private static topModels: { models: any[]; version: string } | null = null;
+
+  // Top 10 OpenRouter models by context length, from the shared catalog; recomputed only when it changes
+  static async getTopOpenRouterModels(): Promise<{ models: any[]; version: string }> {
+    const { models, version } = await ModelCatalogService.get();
+    if (this.topModels?.version === version) return this.topModels;
+    const top = models
+      .filter((model: any) => model.id && !model.id.includes('free') && !model.id.includes('nitro'))
+      .sort((a: any, b: any) => {
+        // Sort by context length (higher is better) and then by name
+        const aContext = a.context_length || 0;
+        const bContext = b.context_length || 0;
+        if (bContext !== aContext) return bContext - aContext;
+        return a.id.localeCompare(b.id);
+      })
+      .slice(0, 10);
+    return this.topModels = { models: top, version };
+  }
+
   // Get stored models
   static async getModels(providerId?: number): Promise<{ models: LLMModel[] }> {
     const models = DbService.getLLMModels(providerId);
@@ -156,148 +178,101 @@ export class LLMManagementHandler {
   }
 }
 
-// Route handlers for Deno server
-export const llmRoutes = {
-  "/api/llm/providers": {
-    GET: async () => {
-      try {
-        return new Response(JSON.stringify(await LLMManagementHandler.getProviders()), {
-          headers: { "Content-Type": "application/json" }
-        });
-      } catch (error) {
-        return new Response(JSON.stringify({ error: error.message }), {
-          status: 500,
-          headers: { "Content-Type": "application/json" }
-        });
-      }
-    }
-  },
+const router = new RouteTable({ prefix: "/api/llm" });
 
-  "/api/llm/providers/:name": {
-    GET: async (request: Request, params: { name: string }) => {
-      try {
-        return new Response(JSON.stringify(await LLMManagementHandler.getProvider(params.name)), {
-          headers: { "Content-Type": "application/json" }
-        });
-      } catch (error) {
-        return new Response(JSON.stringify({ error: error.message }), {
-          status: 500,
-          headers: { "Content-Type": "application/json" }
-        });
-      }
-    }
-  },
+const isId = (value: string) => /^\d+$/.test(value);
 
-  "/api/llm/providers/:name/models": {
-    GET: async (request: Request, params: { name: string }) => {
-      try {
-        const url = new URL(request.url);
-        const apiKey = url.searchParams.get("apiKey") || undefined;
-        
-        return new Response(JSON.stringify(await LLMManagementHandler.fetchProviderModels(params.name, apiKey)), {
-          headers: { "Content-Type": "application/json" }
-        });
-      } catch (error) {
-        return new Response(JSON.stringify({ error: error.message }), {
-          status: 500,
-          headers: { "Content-Type": "application/json" }
-        });
-      }
-    },
+function fail(ctx: RouteContext<unknown, unknown>, error: unknown, fallback = "Unknown error") {
+  ctx.response.status = 500;
+  ctx.response.body = { error: error instanceof Error ? error.message : fallback };
+}
 
-    POST: async (request: Request, params: { name: string }) => {
-      try {
-        const body = await request.json();
-        const apiKey = body.apiKey;
-        
-        return new Response(JSON.stringify(await LLMManagementHandler.fetchProviderModels(params.name, apiKey)), {
-          headers: { "Content-Type": "application/json" }
-        });
-      } catch (error) {
-        return new Response(JSON.stringify({ error: error.message }), {
-          status: 500,
-          headers: { "Content-Type": "application/json" }
-        });
-      }
-    }
-  },
+router.get("/providers", async (ctx) => {
+  try {
+    ctx.response.body = await LLMManagementHandler.getProviders();
+  } catch (error) {
+    fail(ctx, error);
+  }
+});
 
-  "/api/llm/models": {
-    GET: async (request: Request) => {
-      try {
-        const url = new URL(request.url);
-        const providerId = url.searchParams.get("providerId");
-        
-        return new Response(JSON.stringify(await LLMManagementHandler.getModels(
-          providerId ? parseInt(providerId) : undefined
-        )), {
-          headers: { "Content-Type": "application/json" }
-        });
-      } catch (error) {
-        return new Response(JSON.stringify({ error: error.message }), {
-          status: 500,
-          headers: { "Content-Type": "application/json" }
-        });
-      }
-    },
+router.get("/providers/:name", async (ctx) => {
+  try {
+    ctx.response.body = await LLMManagementHandler.getProvider(ctx.params.name);
+  } catch (error) {
+    fail(ctx, error);
+  }
+});
 
-    POST: async (request: Request) => {
-      try {
-        const body = await request.json();
-        return new Response(JSON.stringify(await LLMManagementHandler.createModel(body)), {
-          headers: { "Content-Type": "application/json" }
-        });
-      } catch (error) {
-        return new Response(JSON.stringify({ error: error.message }), {
-          status: 500,
-          headers: { "Content-Type": "application/json" }
-        });
-      }
-    }
-  },
+// Public endpoint for OpenRouter, no API key needed; takes precedence over /providers/:name/models
+router.get("/providers/openrouter/models", async (ctx) => {
+  try {
+    const { models, version } = await LLMManagementHandler.getTopOpenRouterModels();
+    if (notModified(ctx, "openrouter-top", version)) return;
+    ctx.response.body = { success: true, models };
+  } catch (error) {
+    fail(ctx, error, "Failed to fetch models");
+  }
+});
 
-  "/api/llm/models/:id": {
-    GET: async (request: Request, params: { id: string }) => {
-      try {
-        const id = parseInt(params.id);
-        return new Response(JSON.stringify(await LLMManagementHandler.getModel(id)), {
-          headers: { "Content-Type": "application/json" }
-        });
-      } catch (error) {
-        return new Response(JSON.stringify({ error: error.message }), {
-          status: 500,
-          headers: { "Content-Type": "application/json" }
-        });
-      }
-    },
+router.get("/providers/:name/models", async (ctx) => {
+  try {
+    const apiKey = ctx.request.url.searchParams.get("apiKey") || undefined;
+    ctx.response.body = await LLMManagementHandler.fetchProviderModels(ctx.params.name, apiKey);
+  } catch (error) {
+    fail(ctx, error);
+  }
+});
 
-    PUT: async (request: Request, params: { id: string }) => {
-      try {
-        const id = parseInt(params.id);
-        const body = await request.json();
-        return new Response(JSON.stringify(await LLMManagementHandler.updateModel(id, body)), {
-          headers: { "Content-Type": "application/json" }
-        });
-      } catch (error) {
-        return new Response(JSON.stringify({ error: error.message }), {
-          status: 500,
-          headers: { "Content-Type": "application/json" }
-        });
-      }
-    },
+router.post("/providers/:name/models", { body: { apiKey: "string?" } }, async (ctx) => {
+  try {
+    ctx.response.body = await LLMManagementHandler.fetchProviderModels(ctx.params.name, ctx.body.apiKey);
+  } catch (error) {
+    fail(ctx, error);
+  }
+});
 
-    DELETE: async (request: Request, params: { id: string }) => {
-      try {
-        const id = parseInt(params.id);
-        return new Response(JSON.stringify(await LLMManagementHandler.deleteModel(id)), {
-          headers: { "Content-Type": "application/json" }
-        });
-      } catch (error) {
-        return new Response(JSON.stringify({ error: error.message }), {
-          status: 500,
-          headers: { "Content-Type": "application/json" }
-        });
-      }
-    }
+router.get("/models", async (ctx) => {
+  try {
+    const providerId = ctx.request.url.searchParams.get("providerId");
+    ctx.response.body = await LLMManagementHandler.getModels(providerId ? parseInt(providerId) : undefined);
+  } catch (error) {
+    fail(ctx, error);
   }
-};
+});
+
+router.post("/models", { body: { provider_id: "integer", model_id: "string", display_name: "string" } }, async (ctx) => {
+  try {
+    ctx.response.body = await LLMManagementHandler.createModel(ctx.body as unknown as Omit<LLMModel, "id" | "created_at">);
+  } catch (error) {
+    fail(ctx, error);
+  }
+});
+
+router.get("/models/:id", async (ctx) => {
+  if (!isId(ctx.params.id)) return;
+  try {
+    ctx.response.body = await LLMManagementHandler.getModel(parseInt(ctx.params.id));
+  } catch (error) {
+    fail(ctx, error);
+  }
+});
+
+router.put("/models/:id", { body: {} }, async (ctx) => {
+  if (!isId(ctx.params.id)) return;
+  try {
+    ctx.response.body = await LLMManagementHandler.updateModel(parseInt(ctx.params.id), ctx.body as Partial<LLMModel>);
+  } catch (error) {
+    fail(ctx, error);
+  }
+});
+
+router.delete("/models/:id", async (ctx) => {
+  if (!isId(ctx.params.id)) return;
+  try {
+    ctx.response.body = await LLMManagementHandler.deleteModel(parseInt(ctx.params.id));
+  } catch (error) {
+    fail(ctx, error);
+  }
+});
+
+export default router;
@@ -1,8 +1,8 @@
-import { Router } from "https://deno.land/x/oak@v12.6.1/mod.ts";
+import { RouteTable } from "../utils/routeTable.ts";
 import { OpenRouterService } from "../services/openRouterService.ts";
 import { DbService } from "../services/dbService.ts";
 
-const router = new Router({
+const router = new RouteTable({
   prefix: "/api/openrouter"
 });
 
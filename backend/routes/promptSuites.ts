@@ -0,0 +1,278 @@
+import type { Context } from "https://deno.land/x/oak@v12.6.1/mod.ts";
+import { RouteTable } from "../utils/routeTable.ts";
+import { MAX_SUITE_NAME_LENGTH, PromptSuiteService } from "../services/promptSuiteService.ts";
+import { JobService } from "../services/jobService.ts";
+import { DbService } from "../services/dbService.ts";
+import type { SuiteBatch, SuitePromptInput } from "../db.ts";
+import { jobResumeFrom, respondWithJobEvents, submitOptions } from "./jobs.ts";
+
+const router = new RouteTable({ prefix: "/api/prompt-suites" });
+
+// Every cell of a batch is saved as it finishes, so a retried attempt (after a crash) picks up
+// where the last one stopped. Batches are long and share one cell budget, so one runs at a time.
+JobService.register("prompt-suite-batch", async (payload: { batch_id: number }, { run, signal }) => {
+  try {
+    return await PromptSuiteService.runBatch(payload.batch_id, (event) => run.append(event), signal);
+  } catch (error) {
+    DbService.updateSuiteBatch(payload.batch_id, { status: "failed", finished: true });
+    throw error;
+  }
+}, {
+  concurrency: 1,
+  spill: true,
+  validate: (payload) => Number.isInteger(payload?.batch_id) ? null : "batch_id must be an integer",
+});
+
+function positiveId(param: string): number | null {
+  const id = parseInt(param);
+  return Number.isInteger(id) && id > 0 ? id : null;
+}
+
+// Queue a job for the batch and record it on the batch
+function submitBatchJob(batch: SuiteBatch, priority?: number): SuiteBatch {
+  const { job } = JobService.submit("prompt-suite-batch", { batch_id: batch.id }, { priority });
+  DbService.updateSuiteBatch(batch.id, { status: "queued", job_id: job.id, finished: false });
+  return DbService.getSuiteBatch(batch.id)!;
+}
+
+function respondWithBatch(ctx: Context, batch: SuiteBatch, status: number) {
+  ctx.response.status = status;
+  ctx.response.headers.set("Location", `/api/prompt-suites/batches/${batch.id}`);
+  ctx.response.body = {
+    success: true,
+    data: { ...PromptSuiteService.describeBatch(batch), events_url: `/api/prompt-suites/batches/${batch.id}/events` },
+  };
+}
+
+router.get("/", (ctx) => {
+  try {
+    ctx.response.body = { success: true, data: DbService.getPromptSuites() };
+  } catch (error) {
+    ctx.response.status = 500;
+    ctx.response.body = { success: false, error: error instanceof Error ? error.message : "Unknown error" };
+  }
+});
+
+// Create a suite, either from JSON ({ name, description?, prompts } with prompts as strings or
+// { prompt, id?, temperature?, max_tokens? } objects, or { name, description?, jsonl }) or from
+// a raw JSONL body (application/x-ndjson or text/plain) with ?name= and ?description=
+router.post("/", async (ctx) => {
+  try {
+    const contentType = ctx.request.headers.get("content-type") ?? "";
+    const raw = /ndjson|jsonl|text\/plain/.test(contentType);
+    const params = ctx.request.url.searchParams;
+    const body = raw
+      ? { name: params.get("name"), description: params.get("description"), jsonl: await ctx.request.body({ type: "text" }).value }
+      : await ctx.request.body({ type: "json" }).value;
+    const { name, description, prompts, jsonl } = body || {};
+
+    if (typeof name !== "string" || name.trim() === "" || name.length > MAX_SUITE_NAME_LENGTH) {
+      ctx.response.status = 400;
+      ctx.response.body = { success: false, error: `name must be a non-empty string of at most ${MAX_SUITE_NAME_LENGTH} characters` };
+      return;
+    }
+
+    let parsed: { prompts: SuitePromptInput[]; errors: string[] };
+    if (typeof jsonl === "string") {
+      parsed = PromptSuiteService.parseJsonl(jsonl);
+    } else if (Array.isArray(prompts)) {
+      parsed = { prompts: [], errors: [] };
+      prompts.forEach((value: unknown, index: number) => {
+        const prompt = PromptSuiteService.promptFrom(value);
+        if (typeof prompt === "string") parsed.errors.push(`prompts[${index}]: ${prompt}`);
+        else parsed.prompts.push(prompt);
+      });
+    } else {
+      ctx.response.status = 400;
+      ctx.response.body = { success: false, error: "prompts (an array) or jsonl (a string) is required" };
+      return;
+    }
+    if (parsed.errors.length > 0 || parsed.prompts.length === 0) {
+      ctx.response.status = 400;
+      ctx.response.body = {
+        success: false,
+        error: parsed.errors.length > 0 ? `Invalid prompts: ${parsed.errors.slice(0, 10).join("; ")}` : "The suite has no prompts",
+      };
+      return;
+    }
+    if (parsed.prompts.length > PromptSuiteService.maxPrompts()) {
+      ctx.response.status = 400;
+      ctx.response.body = { success: false, error: `A suite holds at most ${PromptSuiteService.maxPrompts()} prompts` };
+      return;
+    }
+    if (DbService.getPromptSuite(name)) {
+      ctx.response.status = 409;
+      ctx.response.body = { success: false, error: `A prompt suite named "${name}" already exists` };
+      return;
+    }
+
+    const id = DbService.createPromptSuite({ name, description: typeof description === "string" ? description : null, prompts: parsed.prompts });
+    ctx.response.status = 201;
+    ctx.response.headers.set("Location", `/api/prompt-suites/${id}`);
+    ctx.response.body = { success: true, data: DbService.getPromptSuite(id) };
+  } catch (error) {
+    ctx.response.status = 500;
+    ctx.response.body = { success: false, error: error instanceof Error ? error.message : "Unknown error" };
+  }
+});
+
+router.get("/:id", (ctx) => {
+  try {
+    const id = positiveId(ctx.params.id);
+    const suite = id === null ? undefined : DbService.getPromptSuite(id);
+    if (!suite) {
+      ctx.response.status = 404;
+      ctx.response.body = { success: false, error: "Prompt suite not found" };
+      return;
+    }
+    ctx.response.body = { success: true, data: { ...suite, prompts: DbService.getSuitePrompts(suite.id) } };
+  } catch (error) {
+    ctx.response.status = 500;
+    ctx.response.body = { success: false, error: error instanceof Error ? error.message : "Unknown error" };
+  }
+});
+
+router.get("/:id/batches", (ctx) => {
+  try {
+    const id = positiveId(ctx.params.id);
+    const suite = id === null ? undefined : DbService.getPromptSuite(id);
+    if (!suite) {
+      ctx.response.status = 404;
+      ctx.response.body = { success: false, error: "Prompt suite not found" };
+      return;
+    }
+    const limit = Math.min(parseInt(ctx.request.url.searchParams.get("limit") || "50") || 50, 500);
+    ctx.response.body = { success: true, data: DbService.getSuiteBatches(suite.id, limit).map((b) => PromptSuiteService.describeBatch(b)) };
+  } catch (error) {
+    ctx.response.status = 500;
+    ctx.response.body = { success: false, error: error instanceof Error ? error.message : "Unknown error" };
+  }
+});
+
+// Start a batch: { models, temperature?, max_tokens?, priority?, idempotency_key? }. Prompts'
+// own temperature and max_tokens win over the batch's. 202 with the batch; follow it at
+// events_url, or poll GET /api/prompt-suites/batches/:id.
+router.post("/:id/batches", async (ctx) => {
+  try {
+    const id = positiveId(ctx.params.id);
+    const suite = id === null ? undefined : DbService.getPromptSuite(id);
+    if (!suite) {
+      ctx.response.status = 404;
+      ctx.response.body = { success: false, error: "Prompt suite not found" };
+      return;
+    }
+    const body = await ctx.request.body({ type: "json" }).value;
+    const invalid = PromptSuiteService.invalidBatch(body || {});
+    const options = submitOptions(ctx, body);
+    if (invalid || typeof options === "string") {
+      ctx.response.status = 400;
+      ctx.response.body = { success: false, error: invalid ?? options };
+      return;
+    }
+
+    const { batch, created } = DbService.createSuiteBatch({
+      suiteId: suite.id,
+      models: body.models,
+      temperature: body.temperature,
+      maxTokens: body.max_tokens,
+      idempotencyKey: options.idempotencyKey,
+    });
+    respondWithBatch(ctx, created ? submitBatchJob(batch, options.priority) : batch, created ? 202 : 200);
+  } catch (error) {
+    ctx.response.status = 500;
+    ctx.response.body = { success: false, error: error instanceof Error ? error.message : "Unknown error" };
+  }
+});
+
+// Status, progress and per-model aggregates of a batch
+router.get("/batches/:batchId", (ctx) => {
+  try {
+    const id = positiveId(ctx.params.batchId);
+    const batch = id === null ? undefined : DbService.getSuiteBatch(id);
+    if (!batch) {
+      ctx.response.status = 404;
+      ctx.response.body = { success: false, error: "Batch not found" };
+      return;
+    }
+    ctx.response.body = { success: true, data: PromptSuiteService.describeBatch(batch) };
+  } catch (error) {
+    ctx.response.status = 500;
+    ctx.response.body = { success: false, error: error instanceof Error ? error.message : "Unknown error" };
+  }
+});
+
+// Finished cells in prompt order; ?limit= (default 500) and ?offset=
+router.get("/batches/:batchId/cells", (ctx) => {
+  try {
+    const id = positiveId(ctx.params.batchId);
+    const batch = id === null ? undefined : DbService.getSuiteBatch(id);
+    if (!batch) {
+      ctx.response.status = 404;
+      ctx.response.body = { success: false, error: "Batch not found" };
+      return;
+    }
+    const params = ctx.request.url.searchParams;
+    const limit = Math.min(parseInt(params.get("limit") || "500") || 500, 5000);
+    const offset = Math.max(parseInt(params.get("offset") || "0") || 0, 0);
+    ctx.response.body = { success: true, data: DbService.getSuiteBatchCells(batch.id, limit, offset) };
+  } catch (error) {
+    ctx.response.status = 500;
+    ctx.response.body = { success: false, error: error instanceof Error ? error.message : "Unknown error" };
+  }
+});
+
+// Progress of the batch's current job over SSE: cell_complete events with the cell's metrics,
+// its model's aggregate so far and overall progress, then batch_complete. Last-Event-ID (or
+// ?after=) resumes within the current job.
+router.get("/batches/:batchId/events", (ctx) => {
+  try {
+    const id = positiveId(ctx.params.batchId);
+    const batch = id === null ? undefined : DbService.getSuiteBatch(id);
+    const job = batch?.job_id ? JobService.get(batch.job_id) : undefined;
+    if (!batch || !job) {
+      ctx.response.status = 404;
+      ctx.response.body = { success: false, error: batch ? "Batch has not been started" : "Batch not found" };
+      return;
+    }
+    const resume = jobResumeFrom(ctx);
+    if (resume === null) {
+      ctx.response.status = 400;
+      ctx.response.body = { success: false, error: "Last-Event-ID must be an event id of this stream, e.g. 2-15" };
+      return;
+    }
+    respondWithJobEvents(ctx, job, resume);
+  } catch (error) {
+    ctx.response.status = 500;
+    ctx.response.body = { success: false, error: error instanceof Error ? error.message : "Unknown error" };
+  }
+});
+
+// Run the cells of a batch that have not succeeded: after it failed, or to retry failed cells
+router.post("/batches/:batchId/resume", (ctx) => {
+  try {
+    const id = positiveId(ctx.params.batchId);
+    const batch = id === null ? undefined : DbService.getSuiteBatch(id);
+    if (!batch) {
+      ctx.response.status = 404;
+      ctx.response.body = { success: false, error: "Batch not found" };
+      return;
+    }
+    const job = batch.job_id === null ? undefined : JobService.get(batch.job_id);
+    if (job && (job.status === "queued" || job.status === "running")) {
+      respondWithBatch(ctx, batch, 200);
+      return;
+    }
+    const { progress } = PromptSuiteService.describeBatch(batch);
+    if (progress.done >= progress.total) {
+      ctx.response.status = 409;
+      ctx.response.body = { success: false, error: "Every cell of the batch has already succeeded" };
+      return;
+    }
+    respondWithBatch(ctx, submitBatchJob(batch), 202);
+  } catch (error) {
+    ctx.response.status = 500;
+    ctx.response.body = { success: false, error: error instanceof Error ? error.message : "Unknown error" };
+  }
+});
+
+export default router;
@@ -1,9 +1,211 @@
-import { Router } from "https://deno.land/x/oak@v12.6.1/mod.ts";
-import { RepoTestService } from "../services/repoTestService.ts";
+import type { Context } from "https://deno.land/x/oak@v12.6.1/mod.ts";
+import { RouteTable } from "../utils/routeTable.ts";
+import {
+  CODING_TOOLS,
+  INCREMENTAL_TEST_MODES,
+  ITERATION_STRATEGIES,
+  MAX_ITERATIONS,
+  type MatrixRequest,
+  type RepoTestRequest,
+  RepoTestService,
+} from "../services/repoTestService.ts";
+import { JobService } from "../services/jobService.ts";
 import { OpenRouterService } from "../services/openRouterService.ts";
 import { DbService } from "../services/dbService.ts";
+import { respondWithJobEvents, submitOptions } from "./jobs.ts";
+
+const router = new RouteTable({ prefix: "/api/repo-test" });
+
+interface LeaderboardInput {
+  model: string;
+  tool?: string;
+  result: Awaited<ReturnType<typeof RepoTestService.run>> | null;
+  error: string | null;
+  duration_ms: number;
+}
+
+function buildLeaderboard(results: LeaderboardInput[]) {
+  return results.map(r => ({
+    model: r.model,
+    ...(r.tool ? { tool: r.tool } : {}),
+    status: r.result?.status || 'error',
+    tests_passed: r.result?.final_tests_passed || 0,
+    tests_total: r.result?.final_tests_total || 0,
+    tests_failed: r.result?.final_tests_failed || 0,
+    // "failed": the counts cover only the re-run failures, not the whole suite
+    test_scope: r.result?.final_test_scope ?? 'full',
+    duration_ms: r.duration_ms,
+    iterations: r.result?.iterations.length || 0,
+    error: r.error,
+  })).sort((a, b) => {
+    // Sort by: pass rate descending, then tests passed descending
+    if (a.status === 'success' && b.status !== 'success') return -1;
+    if (b.status === 'success' && a.status !== 'success') return 1;
+    const aRate = a.tests_total > 0 ? a.tests_passed / a.tests_total : 0;
+    const bRate = b.tests_total > 0 ? b.tests_passed / b.tests_total : 0;
+    if (bRate !== aRate) return bRate - aRate;
+    return b.tests_passed - a.tests_passed;
+  });
+}
+
+// `limits` is optional; when given it must be an object of non-negative numbers
+function invalidLimits(limits: unknown): boolean {
+  if (limits === undefined || limits === null) return false;
+  if (typeof limits !== "object" || Array.isArray(limits)) return true;
+  return Object.values(limits).some((v) => typeof v !== "number" || !Number.isFinite(v) || v < 0);
+}
+
+// Error message for bad `iterations` / `strategy` / `incremental_tests` values, or null when they are fine
+function invalidIterationOptions(iterations: unknown, strategy: unknown, incremental: unknown): string | null {
+  if (iterations !== undefined && iterations !== null &&
+      !(Number.isInteger(iterations) && (iterations as number) >= 1 && (iterations as number) <= MAX_ITERATIONS)) {
+    return `iterations must be an integer between 1 and ${MAX_ITERATIONS}`;
+  }
+  if (strategy !== undefined && strategy !== null && !ITERATION_STRATEGIES.includes(strategy as any)) {
+    return `strategy must be one of: ${ITERATION_STRATEGIES.join(", ")}`;
+  }
+  if (incremental !== undefined && incremental !== null && !INCREMENTAL_TEST_MODES.includes(incremental as any)) {
+    return `incremental_tests must be one of: ${INCREMENTAL_TEST_MODES.join(", ")}`;
+  }
+  return null;
+}
+
+interface BatchRequest extends Omit<RepoTestRequest, "model"> {
+  models: string[];
+}
+
+// Job payloads: the request fields each kind of run takes, so other body fields (priority,
+// idempotency_key, coalesce) do not end up in the payload
+function runRequest(body: any): RepoTestRequest {
+  const { repo_url, ref, prompt, test_command, tool, model, limits, iterations, strategy, incremental_tests } = body || {};
+  return { repo_url, ref, prompt, test_command, tool, model, limits, iterations, strategy, incremental_tests };
+}
+
+function batchRequest(body: any): BatchRequest {
+  const { repo_url, ref, prompt, test_command, tool, models, limits, iterations, strategy, incremental_tests } = body || {};
+  return { repo_url, ref, prompt, test_command, tool, models, limits, iterations, strategy, incremental_tests };
+}
+
+function matrixRequest(body: any): MatrixRequest {
+  const { repo_url, ref, prompt, test_command, pairs, concurrency, limits, iterations, strategy, incremental_tests } = body || {};
+  return { repo_url, ref, prompt, test_command, pairs, concurrency, limits, iterations, strategy, incremental_tests };
+}
+
+// Error message for a request that cannot run, or null
+function invalidRun(request: RepoTestRequest): string | null {
+  const { repo_url, ref, prompt, test_command, tool, model, limits, iterations, strategy, incremental_tests } = request || {} as RepoTestRequest;
+  if (!repo_url || !ref || !prompt || !test_command || !tool || !model) {
+    return "repo_url, ref, prompt, test_command, tool, and model are all required";
+  }
+  if (invalidLimits(limits)) return "limits must be an object of non-negative numbers";
+  return invalidIterationOptions(iterations, strategy, incremental_tests);
+}
+
+function invalidBatch(request: BatchRequest): string | null {
+  const { repo_url, ref, prompt, test_command, tool, models, limits, iterations, strategy, incremental_tests } = request || {} as BatchRequest;
+  if (!repo_url || !ref || !prompt || !test_command || !tool || !models || !Array.isArray(models) || models.length === 0) {
+    return "repo_url, ref, prompt, test_command, tool, and models array are all required";
+  }
+  if (invalidLimits(limits)) return "limits must be an object of non-negative numbers";
+  return invalidIterationOptions(iterations, strategy, incremental_tests);
+}
+
+function invalidMatrix(request: MatrixRequest): string | null {
+  const { repo_url, ref, prompt, test_command, pairs, limits, iterations, strategy, incremental_tests } = request || {} as MatrixRequest;
+  const validPairs = Array.isArray(pairs) && pairs.length > 0 &&
+    pairs.every((p: any) => p && typeof p.tool === "string" && typeof p.model === "string");
+  if (!repo_url || !ref || !prompt || !test_command || !validPairs) {
+    return "repo_url, ref, prompt, test_command, and a pairs array of { tool, model } are all required";
+  }
+  const unknownTool = pairs.find((p) => !CODING_TOOLS.some((t) => t.id === p.tool));
+  if (unknownTool) return `Unknown tool: ${unknownTool.tool}`;
+  if (invalidLimits(limits)) return "limits must be an object of non-negative numbers";
+  return invalidIterationOptions(iterations, strategy, incremental_tests);
+}
+
+// Repo runs are long, so their event logs spill to disk instead of dropping old events.
+// Batches and matrices run many models each, so by default one of them runs at a time.
+// Every handler passes on the job's signal, so an executor that lost its lease kills its
+// processes instead of racing the retry.
+JobService.register("repo-test", async (request: RepoTestRequest, { run, signal }) => {
+  const result = await RepoTestService.run(request, (progress) => run.append(progress), signal);
+  run.append({ type: "complete", message: "Run complete", data: result });
+  return result;
+}, { concurrency: 2, spill: true, validate: invalidRun });
 
-const router = new Router({ prefix: "/api/repo-test" });
+// Batch run: test multiple models simultaneously
+JobService.register("repo-test-batch", async (request: BatchRequest, { job, run, signal }) => {
+  const { models, ...shared } = request;
+  const batchId = `batch_${job.id}`;
+  run.append({ type: "batch_start", message: `Starting batch run for ${models.length} models`, data: { batchId, models } });
+
+  // Run all models in parallel
+  const results = await Promise.all(models.map(async (model) => {
+    const startTime = Date.now();
+    try {
+      run.append({ type: "model_start", message: `Starting ${model}`, data: { model } });
+      const result = await RepoTestService.run({ ...shared, model }, (progress) => {
+        run.append({ type: "model_progress", message: progress.message, data: { model, ...progress } });
+      }, signal);
+      run.append({
+        type: "model_complete",
+        message: `${model}: ${result.status} (${result.final_tests_passed}/${result.final_tests_total})`,
+        data: { model, result, duration_ms: Date.now() - startTime },
+      });
+      return { model, result, error: null, duration_ms: Date.now() - startTime };
+    } catch (error) {
+      const errorMsg = error instanceof Error ? error.message : String(error);
+      run.append({ type: "model_error", message: `${model} failed: ${errorMsg}`, data: { model, error: errorMsg } });
+      return { model, result: null, error: errorMsg, duration_ms: Date.now() - startTime };
+    }
+  }));
+
+  const leaderboard = buildLeaderboard(results);
+  run.append({
+    type: "batch_complete",
+    message: `Batch complete: ${results.filter(r => r.result?.status === 'success').length}/${models.length} models passed`,
+    data: { batchId, leaderboard, results },
+  });
+  return { batchId, leaderboard, results };
+}, { concurrency: 1, spill: true, validate: invalidBatch });
+
+// Matrix run: several (tool, model) pairs on one repo/ref/prompt. The repo is cloned and
+// installed once, pairs run concurrently in isolated copies, and every event is tagged
+// with its pair (`pair: null` for the shared clone/install phase).
+JobService.register("repo-test-matrix", async (request: MatrixRequest, { job, run, signal }) => {
+  const matrixId = `matrix_${job.id}`;
+  run.append({
+    type: "matrix_start",
+    message: `Starting matrix run for ${request.pairs.length} pairs`,
+    data: { matrixId, pairs: request.pairs, concurrency: RepoTestService.matrixConcurrency(request.concurrency) },
+  });
+
+  const results = await RepoTestService.runMatrix(request, (pair, event) => run.append({ ...event, pair }), signal);
+  const leaderboard = buildLeaderboard(results);
+  run.append({
+    type: "matrix_complete",
+    message: `Matrix complete: ${results.filter(r => r.result?.status === 'success').length}/${request.pairs.length} pairs passed`,
+    data: { matrixId, leaderboard, results },
+  });
+  return { matrixId, leaderboard, results };
+}, { concurrency: 1, spill: true, validate: invalidMatrix });
+
+// Queue a job of `type` for the request and stream its events; a resubmitted idempotency key
+// (or `coalesce` with an identical run in progress) follows the existing job instead
+async function submitAndStream(ctx: Context, type: string, toRequest: (body: any) => unknown) {
+  const body = await ctx.request.body({ type: "json" }).value;
+  const request = toRequest(body);
+  const error = JobService.invalid(type, request);
+  const options = submitOptions(ctx, body);
+  if (error || typeof options === "string") {
+    ctx.response.status = 400;
+    ctx.response.body = { success: false, error: error ?? options };
+    return;
+  }
+  const { job, created } = JobService.submit(type, request, options);
+  ctx.response.headers.set("X-Run-Coalesced", String(!created));
+  respondWithJobEvents(ctx, job);
+}
 
 // List available coding tools
 router.get("/tools", async (ctx) => {
@@ -16,77 +218,47 @@ router.get("/tools", async (ctx) => {
   }
 });
 
-// Run a repo test (SSE streaming)
-router.post("/run", async (ctx) => {
+// Re-probe every coding tool, ignoring cached results (e.g. after installing one)
+router.post("/tools/refresh", async (ctx) => {
   try {
-    const body = await ctx.request.body({ type: "json" }).value;
-    const { repo_url, ref, prompt, test_command, tool, model } = body || {};
-
-    if (!repo_url || !ref || !prompt || !test_command || !tool || !model) {
-      ctx.response.status = 400;
-      ctx.response.body = {
-        success: false,
-        error: "repo_url, ref, prompt, test_command, tool, and model are all required",
-      };
-      return;
-    }
+    const tools = await RepoTestService.listTools(true);
+    ctx.response.body = { success: true, data: tools };
+  } catch (error) {
+    ctx.response.status = 500;
+    ctx.response.body = { success: false, error: error instanceof Error ? error.message : "Unknown error" };
+  }
+});
 
-    // Set up SSE
-    ctx.response.headers.set("Content-Type", "text/event-stream");
-    ctx.response.headers.set("Cache-Control", "no-cache");
-    ctx.response.headers.set("Connection", "keep-alive");
-    ctx.response.headers.set("X-Accel-Buffering", "no");
-
-    const encoder = new TextEncoder();
-    const stream = new ReadableStream({
-      async start(controller) {
-        const sendEvent = (event: any) => {
-          try {
-            controller.enqueue(encoder.encode(`data: ${JSON.stringify(event)}\n\n`));
-          } catch { /* stream closed */ }
-        };
-
-        try {
-          const result = await RepoTestService.run(
-            { repo_url, ref, prompt, test_command, tool, model },
-            (progress) => sendEvent(progress),
-          );
-          sendEvent({ type: "complete", message: "Run complete", data: result });
-        } catch (e) {
-          sendEvent({ type: "error", message: e instanceof Error ? e.message : String(e) });
-        } finally {
-          try {
-            controller.enqueue(encoder.encode("data: [DONE]\n\n"));
-            controller.close();
-          } catch { /* ignore */ }
-        }
-      },
-    });
-
-    ctx.response.body = stream;
+// Run a repo test (SSE streaming). The run is a job: it carries on if the client goes away, and
+// the client reattaches at X-Resume-Url.
+router.post("/run", async (ctx) => {
+  try {
+    await submitAndStream(ctx, "repo-test", runRequest);
   } catch (error) {
     ctx.response.status = 500;
     ctx.response.body = { success: false, error: error instanceof Error ? error.message : "Unknown error" };
   }
 });
 
-// Run a repo test (non-streaming, returns full result)
+// Run a repo test (non-streaming, returns full result). Prefer POST /api/jobs and polling
+// GET /api/jobs/:id for anything long; this waits on the job for compatibility.
 router.post("/run-sync", async (ctx) => {
   try {
     const body = await ctx.request.body({ type: "json" }).value;
-    const { repo_url, ref, prompt, test_command, tool, model } = body || {};
-
-    if (!repo_url || !ref || !prompt || !test_command || !tool || !model) {
+    const request = runRequest(body);
+    const error = JobService.invalid("repo-test", request);
+    const options = submitOptions(ctx, body);
+    if (error || typeof options === "string") {
       ctx.response.status = 400;
-      ctx.response.body = {
-        success: false,
-        error: "repo_url, ref, prompt, test_command, tool, and model are all required",
-      };
+      ctx.response.body = { success: false, error: error ?? options };
       return;
     }
 
-    const result = await RepoTestService.run({ repo_url, ref, prompt, test_command, tool, model });
-    ctx.response.body = { success: true, data: result };
+    const { job } = JobService.submit("repo-test", request, options);
+    const finished = await JobService.wait(job.id);
+    if (finished.status !== "succeeded") throw new Error(finished.error || `Job ${job.id} ${finished.status}`);
+    ctx.response.headers.set("Location", `/api/jobs/${job.id}`);
+    ctx.response.body = { success: true, data: finished.result };
   } catch (error) {
     ctx.response.status = 500;
     ctx.response.body = { success: false, error: error instanceof Error ? error.message : "Unknown error" };
@@ -122,6 +294,30 @@ router.get("/runs/:id", (ctx) => {
   }
 });
 
+// Diff of one iteration against the post-install baseline
+router.get("/runs/:id/iterations/:iteration/diff", async (ctx) => {
+  try {
+    const id = parseInt(ctx.params.id || "0");
+    const iteration = parseInt(ctx.params.iteration || "0");
+    const diff = await RepoTestService.getIterationDiff(id, iteration);
+    if (diff === undefined) {
+      ctx.response.status = 404;
+      ctx.response.body = { success: false, error: "Iteration not found" };
+      return;
+    }
+    if (diff === null) {
+      ctx.response.status = 404;
+      ctx.response.body = { success: false, error: "No diff recorded for this iteration" };
+      return;
+    }
+    ctx.response.headers.set("Content-Type", "text/x-diff; charset=utf-8");
+    ctx.response.body = diff;
+  } catch (error) {
+    ctx.response.status = 500;
+    ctx.response.body = { success: false, error: error instanceof Error ? error.message : "Unknown error" };
+  }
+});
+
 // Get available free models from OpenRouter
 router.get("/models", async (ctx) => {
   try {
@@ -154,112 +350,20 @@ router.get("/models", async (ctx) => {
   }
 });
 
-// Batch run: test multiple models simultaneously
+// Batch run: test multiple models simultaneously (SSE streaming)
 router.post("/batch", async (ctx) => {
   try {
-    const body = await ctx.request.body({ type: "json" }).value;
-    const { repo_url, ref, prompt, test_command, tool, models } = body || {};
-
-    if (!repo_url || !ref || !prompt || !test_command || !tool || !models || !Array.isArray(models) || models.length === 0) {
-      ctx.response.status = 400;
-      ctx.response.body = {
-        success: false,
-        error: "repo_url, ref, prompt, test_command, tool, and models array are all required",
-      };
-      return;
-    }
+    await submitAndStream(ctx, "repo-test-batch", batchRequest);
+  } catch (error) {
+    ctx.response.status = 500;
+    ctx.response.body = { success: false, error: error instanceof Error ? error.message : "Unknown error" };
+  }
+});
 
-    // Return batch ID immediately, then run in background
-    const batchId = `batch_${Date.now()}_${Math.random().toString(36).slice(2, 8)}`;
-
-    // Set up SSE for streaming progress
-    ctx.response.headers.set("Content-Type", "text/event-stream");
-    ctx.response.headers.set("Cache-Control", "no-cache");
-    ctx.response.headers.set("Connection", "keep-alive");
-    ctx.response.headers.set("X-Accel-Buffering", "no");
-
-    const encoder = new TextEncoder();
-    const stream = new ReadableStream({
-      async start(controller) {
-        const sendEvent = (event: any) => {
-          try {
-            controller.enqueue(encoder.encode(`data: ${JSON.stringify(event)}\n\n`));
-          } catch { /* stream closed */ }
-        };
-
-        sendEvent({ type: "batch_start", message: `Starting batch run for ${models.length} models`, data: { batchId, models } });
-
-        // Run all models in parallel
-        const runPromises = models.map(async (model: string) => {
-          const startTime = Date.now();
-          try {
-            sendEvent({ type: "model_start", message: `Starting ${model}`, data: { model } });
-
-            const result = await RepoTestService.run(
-              { repo_url, ref, prompt, test_command, tool, model },
-              (progress) => {
-                sendEvent({
-                  type: "model_progress",
-                  message: progress.message,
-                  data: { model, ...progress }
-                });
-              }
-            );
-
-            sendEvent({
-              type: "model_complete",
-              message: `${model}: ${result.status} (${result.final_tests_passed}/${result.final_tests_total})`,
-              data: { model, result, duration_ms: Date.now() - startTime }
-            });
-
-            return { model, result, error: null, duration_ms: Date.now() - startTime };
-          } catch (error) {
-            const errorMsg = error instanceof Error ? error.message : String(error);
-            sendEvent({
-              type: "model_error",
-              message: `${model} failed: ${errorMsg}`,
-              data: { model, error: errorMsg }
-            });
-            return { model, result: null, error: errorMsg, duration_ms: Date.now() - startTime };
-          }
-        });
-
-        const results = await Promise.all(runPromises);
-
-        // Build leaderboard
-        const leaderboard = results.map(r => ({
-          model: r.model,
-          status: r.result?.status || 'error',
-          tests_passed: r.result?.final_tests_passed || 0,
-          tests_total: r.result?.final_tests_total || 0,
-          tests_failed: r.result?.final_tests_failed || 0,
-          duration_ms: r.duration_ms,
-          iterations: r.result?.iterations.length || 0,
-          error: r.error,
-        })).sort((a, b) => {
-          // Sort by: pass rate descending, then tests passed descending
-          if (a.status === 'success' && b.status !== 'success') return -1;
-          if (b.status === 'success' && a.status !== 'success') return 1;
-          const aRate = a.tests_total > 0 ? a.tests_passed / a.tests_total : 0;
-          const bRate = b.tests_total > 0 ? b.tests_passed / b.tests_total : 0;
-          if (bRate !== aRate) return bRate - aRate;
-          return b.tests_passed - a.tests_passed;
-        });
-
-        sendEvent({
-          type: "batch_complete",
-          message: `Batch complete: ${results.filter(r => r.result?.status === 'success').length}/${models.length} models passed`,
-          data: { batchId, leaderboard, results }
-        });
-
-        try {
-          controller.enqueue(encoder.encode("data: [DONE]\n\n"));
-          controller.close();
-        } catch { /* ignore */ }
-      },
-    });
-
-    ctx.response.body = stream;
+// Matrix run: several (tool, model) pairs on one repo/ref/prompt (SSE streaming)
+router.post("/matrix", async (ctx) => {
+  try {
+    await submitAndStream(ctx, "repo-test-matrix", matrixRequest);
   } catch (error) {
     ctx.response.status = 500;
     ctx.response.body = { success: false, error: error instanceof Error ? error.message : "Unknown error" };
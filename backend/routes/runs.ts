@@ -0,0 +1,107 @@
+import { RouteTable } from "../utils/routeTable.ts";
+import { type RunEventFrame, runEvents, type RunSummary } from "../utils/runEvents.ts";
+import { respondWithRunEvents, resumeFrom } from "../utils/sse.ts";
+import { gather } from "../utils/cluster.ts";
+import { logger } from "../utils/logger.ts";
+
+const router = new RouteTable({ prefix: "/api/runs" });
+
+// A WebSocket subscriber waits while this much is queued on its socket, so it only ever falls
+// behind in the run's log, never holds up the run or other subscribers
+const SOCKET_HIGH_WATER_BYTES = 1024 * 1024;
+
+async function sendToSocket(socket: WebSocket, feed: AsyncGenerator<RunEventFrame>, abort: AbortController) {
+  socket.addEventListener("close", () => abort.abort());
+  if (socket.readyState === WebSocket.CONNECTING) {
+    await new Promise((resolve) => socket.addEventListener("open", resolve, { once: true }));
+  }
+  try {
+    for await (const { seq, json } of feed) {
+      while (socket.readyState === WebSocket.OPEN && socket.bufferedAmount > SOCKET_HIGH_WATER_BYTES) {
+        await new Promise((resolve) => setTimeout(resolve, 25));
+      }
+      if (socket.readyState !== WebSocket.OPEN) break;
+      socket.send(seq > 0 ? `{"id":${seq},"event":${json}}` : `{"event":${json}}`);
+    }
+    if (socket.readyState === WebSocket.OPEN) {
+      socket.send(`{"done":true}`);
+      socket.close(1000, "Run finished");
+    }
+  } catch (error) {
+    logger.warn("Run event socket failed", { error });
+    try {
+      socket.close(1011, "Event stream failed");
+    } catch { /* already closed */ }
+  }
+}
+
+// Runs this server knows about, newest first, with how many subscribers follow each
+router.get("/", async (ctx) => {
+  try {
+    const runs = (await gather("runs")).filter(Boolean).flat() as RunSummary[];
+    runs.sort((a, b) => b.startedAt.localeCompare(a.startedAt));
+    ctx.response.body = { success: true, data: runs };
+  } catch (error) {
+    ctx.response.status = 500;
+    ctx.response.body = { success: false, error: error instanceof Error ? error.message : "Unknown error" };
+  }
+});
+
+// Reattach to a streamed run, or watch someone else's: replays the events after Last-Event-ID
+// (or ?after=), then follows the run live until it finishes. Works for finished runs until they
+// pass retention.
+router.get("/:id/events", async (ctx) => {
+  try {
+    const id = ctx.params.id!;
+    const after = resumeFrom(ctx);
+    if (after === null) {
+      ctx.response.status = 400;
+      ctx.response.body = { success: false, error: "Last-Event-ID must be a non-negative integer" };
+      return;
+    }
+
+    const abort = new AbortController();
+    const feed = await runEvents.open(id, after, abort.signal);
+    if (!feed) {
+      ctx.response.status = 404;
+      ctx.response.body = { success: false, error: "Run not found" };
+      return;
+    }
+    respondWithRunEvents(ctx, id, feed, abort);
+  } catch (error) {
+    ctx.response.status = 500;
+    ctx.response.body = { success: false, error: error instanceof Error ? error.message : "Unknown error" };
+  }
+});
+
+// The same feed over a WebSocket: one {"id", "event"} message per event, then {"done": true}
+router.get("/:id/ws", async (ctx) => {
+  try {
+    if (!ctx.isUpgradable) {
+      ctx.response.status = 426;
+      ctx.response.body = { success: false, error: "Expected a WebSocket upgrade" };
+      return;
+    }
+    const id = ctx.params.id!;
+    const after = resumeFrom(ctx);
+    if (after === null) {
+      ctx.response.status = 400;
+      ctx.response.body = { success: false, error: "after must be a non-negative integer" };
+      return;
+    }
+
+    const abort = new AbortController();
+    const feed = await runEvents.open(id, after, abort.signal);
+    if (!feed) {
+      ctx.response.status = 404;
+      ctx.response.body = { success: false, error: "Run not found" };
+      return;
+    }
+    sendToSocket(ctx.upgrade(), feed, abort);
+  } catch (error) {
+    ctx.response.status = 500;
+    ctx.response.body = { success: false, error: error instanceof Error ? error.message : "Unknown error" };
+  }
+});
+
+export default router;
@@ -1,14 +1,18 @@
-import { Router } from "https://deno.land/x/oak@v12.6.1/mod.ts";
-import { SpeedTestService, type StreamingEvent } from "../services/speedTestService.ts";
-
-const router = new Router({
+import { RouteTable } from "../utils/routeTable.ts";
+import { SpeedTestService } from "../services/speedTestService.ts";
+import { notModified } from "../utils/httpCache.ts";
+import { logger } from "../utils/logger.ts";
+import { runEvents } from "../utils/runEvents.ts";
+import { respondWithRunEvents } from "../utils/sse.ts";
+
+const router = new RouteTable({
   prefix: "/api/speed-test"
 });
 
 // Run speed test with streaming
 router.post("/run-stream", async (ctx) => {
   try {
-    const { prompt, models, temperature = 0.7, max_tokens = 1000 } = await ctx.request.body().value;
+    const { prompt, models, temperature = 0.7, max_tokens = 1000, coalesce = false } = await ctx.request.body().value;
     
     if (!prompt || !models || !Array.isArray(models) || models.length === 0) {
       ctx.response.status = 400;
@@ -19,87 +23,28 @@ router.post("/run-stream", async (ctx) => {
       return;
     }
 
-    // Set up Server-Sent Events
-    ctx.response.headers.set("Content-Type", "text/event-stream");
-    ctx.response.headers.set("Cache-Control", "no-cache");
-    ctx.response.headers.set("Connection", "keep-alive");
-    ctx.response.headers.set("Access-Control-Allow-Origin", "*");
-    ctx.response.headers.set("Access-Control-Allow-Headers", "Cache-Control");
-
-    let closeStream: (() => void) | undefined;
-    const body = new ReadableStream({
-      start(controller) {
-        const encoder = new TextEncoder();
-        let streamClosed = false;
-        const cleanupCallbacks: Array<() => void> = [];
-
-        const closeIfNeeded = () => {
-          if (streamClosed) {
-            return;
-          }
-          streamClosed = true;
-          try {
-            controller.close();
-          } catch (closeError) {
-            console.error("Failed to close SSE stream:", closeError);
-          }
-          cleanupCallbacks.forEach((cleanup) => cleanup());
-        };
-
-        closeStream = closeIfNeeded;
-
-        const sendEvent = (event: StreamingEvent | { type: string; [key: string]: unknown }) => {
-          if (streamClosed) {
-            return;
-          }
-          try {
-            const data = `data: ${JSON.stringify(event)}\n\n`;
-            controller.enqueue(encoder.encode(data));
-          } catch (enqueueError) {
-            console.error("Failed to enqueue SSE event:", enqueueError);
-            closeIfNeeded();
-          }
-        };
-
-        const requestSignal = (ctx.request as { signal?: AbortSignal; originalRequest?: Request }).signal ??
-          (ctx.request as { originalRequest?: Request }).originalRequest?.signal;
-
-        if (requestSignal) {
-          const abortHandler = () => {
-            closeIfNeeded();
-          };
-
-          requestSignal.addEventListener("abort", abortHandler);
-          cleanupCallbacks.push(() => requestSignal.removeEventListener("abort", abortHandler));
-        }
-
-        SpeedTestService.runStreamingSpeedTest({
-          prompt,
-          models,
-          temperature,
-          max_tokens,
-        }, (event) => {
-          sendEvent(event);
-        }).then(() => {
-          closeIfNeeded();
-        }).catch((error) => {
-          sendEvent({
-            type: "error",
-            error: error instanceof Error ? error.message : "Unknown error",
-          });
-          closeIfNeeded();
+    // The run executes on its own and writes to its event log; this response, any reattach and
+    // any other viewer read from it. With `coalesce`, an identical recent request shares the run.
+    const params = { prompt, models, temperature, max_tokens };
+    const { id, coalesced } = await runEvents.start("speed-test", (run) =>
+      SpeedTestService.runStreamingSpeedTest(params, (event) => {
+        run.append(event);
+      }).catch((error) => {
+        run.append({
+          type: "error",
+          error: error instanceof Error ? error.message : "Unknown error",
         });
-      },
-      cancel() {
-        if (closeStream) {
-          closeStream();
-        }
-      },
-    });
+      }), { coalesce: coalesce ? params : undefined });
 
-    ctx.response.body = body;
+    const abort = new AbortController();
+    const feed = await runEvents.open(id, 0, abort.signal);
+    if (!feed) throw new Error("Run ended before it could be followed");
+    ctx.response.headers.set("Access-Control-Allow-Origin", "*");
+    ctx.response.headers.set("Access-Control-Allow-Headers", "Cache-Control");
+    ctx.response.headers.set("X-Run-Coalesced", String(coalesced));
+    respondWithRunEvents(ctx, id, feed, abort);
   } catch (error) {
-    console.error("Error running streaming speed test:", error);
+    logger.error("Error running streaming speed test", { error });
     ctx.response.status = 500;
     ctx.response.body = {
       success: false,
@@ -134,7 +79,7 @@ router.post("/run", async (ctx) => {
       data: result,
     };
   } catch (error) {
-    console.error("Error running speed test:", error);
+    logger.error("Error running speed test", { error });
     ctx.response.status = 500;
     ctx.response.body = {
       success: false,
@@ -154,7 +99,7 @@ router.get("/history", async (ctx) => {
       data: history,
     };
   } catch (error) {
-    console.error("Error fetching test history:", error);
+    logger.error("Error fetching test history", { error });
     ctx.response.status = 500;
     ctx.response.body = {
       success: false,
@@ -166,14 +111,15 @@ router.get("/history", async (ctx) => {
 // Get available models
 router.get("/models", async (ctx) => {
   try {
-    const models = await SpeedTestService.getAvailableModels();
-    
+    const { models, version } = await SpeedTestService.getModelCatalog();
+    if (notModified(ctx, "models", version)) return;
+
     ctx.response.body = {
       success: true,
       data: models,
     };
   } catch (error) {
-    console.error("Error fetching models:", error);
+    logger.error("Error fetching models", { error });
     ctx.response.status = 500;
     ctx.response.body = {
       success: false,
@@ -192,7 +138,7 @@ router.get("/popular-models", async (ctx) => {
       data: models,
     };
   } catch (error) {
-    console.error("Error fetching popular models:", error);
+    logger.error("Error fetching popular models", { error });
     ctx.response.status = 500;
     ctx.response.body = {
       success: false,
@@ -0,0 +1,73 @@
+import { RouteTable } from "../utils/routeTable.ts";
+import { DbService } from "../services/dbService.ts";
+import { notModified } from "../utils/httpCache.ts";
+import { type MetricSnapshot, metrics, PROMETHEUS_CONTENT_TYPE, Registry } from "../utils/metrics.ts";
+import { openStreams } from "../utils/httpMetrics.ts";
+import { clusterRole, gather, onCollect, workerId } from "../utils/cluster.ts";
+
+const router = new RouteTable();
+
+router.get("/", (ctx) => {
+  ctx.response.body = {
+    message: "Welcome to LLM Speed Test API",
+    version: "1.0.0",
+  };
+});
+
+router.get("/health", (ctx) => {
+  ctx.response.body = {
+    status: "healthy",
+    worker: workerId(),
+    timestamp: new Date().toISOString(),
+  };
+});
+
+// Prometheus scrape target; in cluster mode, the sum over every worker and the primary
+router.get("/metrics", async (ctx) => {
+  const body = clusterRole() === "single"
+    ? metrics.render()
+    : Registry.renderMerged((await gather("metrics")).filter(Boolean) as MetricSnapshot[][]);
+  ctx.response.headers.set("Content-Type", PROMETHEUS_CONTENT_TYPE);
+  ctx.response.body = body;
+});
+
+// What each HTTP worker is serving, from whichever worker takes the request
+const startedAt = Date.now();
+onCollect("status", () => ({
+  worker: workerId(),
+  uptimeSeconds: Math.round((Date.now() - startedAt) / 1000),
+  openStreams: openStreams(),
+}));
+
+router.get("/api/cluster", async (ctx) => {
+  const workers = (await gather("status")).filter(Boolean) as Array<{ worker: number }>;
+  ctx.response.body = {
+    success: true,
+    data: {
+      mode: clusterRole(),
+      servedBy: workerId(),
+      workers: workers.sort((a, b) => a.worker - b.worker),
+    },
+  };
+});
+
+router.get("/api/test-results", (ctx) => {
+  try {
+    const limit = parseInt(ctx.request.url.searchParams.get("limit") || "50");
+    if (notModified(ctx, "test-results", DbService.getTableVersion("test_results"))) return;
+    const results = DbService.getTestResults(limit);
+    ctx.response.body = {
+      success: true,
+      data: results,
+    };
+  } catch (error) {
+    console.error("Error fetching test results:", error);
+    ctx.response.status = 500;
+    ctx.response.body = {
+      success: false,
+      error: error instanceof Error ? error.message : "Unknown error",
+    };
+  }
+});
+
+export default router;
@@ -1,5 +1,19 @@
 import db from "../db.ts";
-import type { LLMProvider, LLMModel } from "../db.ts";
+import type {
+  EnqueueJob,
+  Job,
+  JobStatus,
+  LLMModel,
+  LLMProvider,
+  PromptSuite,
+  SuiteBatch,
+  SuiteBatchCell,
+  SuiteBatchStatus,
+  SuiteModelAggregate,
+  SuitePrompt,
+  SuitePromptInput,
+  VersionedTable,
+} from "../db.ts";
 
 export interface ApiKey {
   id?: number;
@@ -18,6 +32,9 @@ export interface TestResult {
   response_time: number;
   response_text?: string;
   status: string;
+  latency_ms?: number | null;
+  tokens_per_second?: number | null;
+  total_tokens?: number | null;
   created_at?: string;
 }
 
@@ -41,6 +58,10 @@ export interface Provider {
     testsTotal: number;
     score: number;
     error?: string;
+    samples?: { sampleIndex: number; testsPassed: number; testsTotal: number; score: number; compileError?: string; error?: string }[];
+    k?: number;
+    passAt1?: number;
+    passAtK?: number;
   }
 
   export interface CodeEvalRun {
@@ -50,6 +71,7 @@ export interface Provider {
     testCount: number;
     models: string[];
     results: CodeEvalResult[];
+    sourceRunId?: number | null; // set on runs produced by re-evaluating an earlier run
     created_at: string;
   }
 
@@ -118,6 +140,11 @@ export class DbService {
     db.execute("DELETE FROM api_keys WHERE id = ?", [id]);
   }
 
+  // Change counter bumped on every write to `table`; see VERSIONED_TABLES
+  static getTableVersion(table: VersionedTable): number {
+    return db.getTableVersion(table);
+  }
+
   // Test result operations
   static getTestResults(limit = 50): TestResult[] {
     const results = db.query("SELECT * FROM test_results ORDER BY created_at DESC LIMIT ?", [limit]);
@@ -129,16 +156,15 @@ export class DbService {
       response_time: row.response_time,
       response_text: row.response_text,
       status: row.status,
+      latency_ms: row.latency_ms,
+      tokens_per_second: row.tokens_per_second,
+      total_tokens: row.total_tokens,
       created_at: row.created_at
     }));
   }
 
   static createTestResult(testResult: Omit<TestResult, "id" | "created_at">): number {
-    const result = db.execute(
-      "INSERT INTO test_results (prompt, provider, model, response_time, response_text, status) VALUES (?, ?, ?, ?, ?, ?)",
-      [testResult.prompt, testResult.provider, testResult.model, testResult.response_time, testResult.response_text, testResult.status]
-    );
-    return result.lastInsertRowId;
+    return db.createTestResult(testResult);
   }
 
   // Provider operations
@@ -218,6 +244,23 @@ export class DbService {
     return db.getCodeEvalRuns(limit) as any;
   }
 
+  static getCodeEvalRun(id: number): CodeEvalRun | undefined {
+    return db.getCodeEvalRun(id) as any;
+  }
+
+  static findCodeEvalRuns(filter: { exerciseId?: string; model?: string; startDate?: string; endDate?: string; limit: number }): CodeEvalRun[] {
+    return db.findCodeEvalRuns(filter) as any;
+  }
+
+  // Code completion cache
+  static getCodeCompletion(model: string, promptHash: string, temperature: number, sampleIndex: number): { code: string; generation: any } | undefined {
+    return db.getCodeCompletion(model, promptHash, temperature, sampleIndex);
+  }
+
+  static saveCodeCompletion(entry: { model: string; promptHash: string; temperature: number; sampleIndex: number; code: string; generation?: any }): void {
+    db.saveCodeCompletion(entry);
+  }
+
   // Repo test runs
   static saveRepoTestRun(run: {
     repo_url: string; ref: string; prompt: string; test_command: string;
@@ -233,6 +276,44 @@ export class DbService {
     return db.updateRepoTestRun(id, updates);
   }
 
+  static saveRepoTestCases(runId: number, iteration: number, cases: Array<{
+    suite: string | null; name: string; status: string; duration_ms: number | null; message?: string;
+  }>): void {
+    db.saveRepoTestCases(runId, iteration, cases);
+  }
+
+  static getRepoTestCases(runId: number): any[] {
+    return db.getRepoTestCases(runId);
+  }
+
+  static saveRepoTestSpans(runId: number, spans: Array<{
+    name: string; parent: string | null; iteration: number | null; start_ms: number; duration_ms: number;
+  }>): void {
+    db.saveRepoTestSpans(runId, spans);
+  }
+
+  static getRepoTestSpans(runId: number): any[] {
+    return db.getRepoTestSpans(runId);
+  }
+
+  static saveRepoTestIteration(runId: number, iteration: {
+    iteration: number; test_exit_code: number; tests_passed: number; tests_failed: number; tests_total: number;
+    duration_ms: number; files_changed: number | null; diff_bytes: number | null; diff_gz: Uint8Array | null;
+    test_scope: string; failed_first_passed: number | null; failed_first_failed: number | null;
+    failed_first_total: number | null; failed_first_duration_ms: number | null;
+  }): void {
+    db.saveRepoTestIteration(runId, iteration);
+  }
+
+  static getRepoTestIterations(runId: number): any[] {
+    return db.getRepoTestIterations(runId);
+  }
+
+  // undefined when the iteration does not exist, null when it has no recorded diff
+  static getRepoTestIterationDiff(runId: number, iteration: number): Uint8Array | null | undefined {
+    return db.getRepoTestIterationDiff(runId, iteration);
+  }
+
   static getRepoTestRuns(limit = 50): any[] {
     return db.getRepoTestRuns(limit);
   }
@@ -240,4 +321,90 @@ export class DbService {
   static getRepoTestRun(id: number): any | undefined {
     return db.getRepoTestRun(id);
   }
+
+  // Job queue
+  static enqueueJob(job: EnqueueJob): { job: Job; created: boolean } {
+    return db.enqueueJob(job);
+  }
+
+  static getJob(id: number): Job | undefined {
+    return db.getJob(id);
+  }
+
+  static listJobs(limit = 50, status?: JobStatus): Job[] {
+    return db.listJobs(limit, status);
+  }
+
+  static claimJob(owner: string, limits: Record<string, number>, leaseMs: number): Job | undefined {
+    return db.claimJob(owner, limits, leaseMs);
+  }
+
+  static setJobRun(id: number, owner: string, runId: string): boolean {
+    return db.setJobRun(id, owner, runId);
+  }
+
+  static heartbeatJob(id: number, owner: string, leaseMs: number): boolean {
+    return db.heartbeatJob(id, owner, leaseMs);
+  }
+
+  static completeJob(id: number, owner: string, result: any): boolean {
+    return db.completeJob(id, owner, result);
+  }
+
+  static failJob(id: number, owner: string, error: string): boolean {
+    return db.failJob(id, owner, error);
+  }
+
+  static cancelJob(id: number): boolean {
+    return db.cancelJob(id);
+  }
+
+  // Prompt suites and their batches
+  static createPromptSuite(suite: { name: string; description?: string | null; prompts: SuitePromptInput[] }): number {
+    return db.createPromptSuite(suite);
+  }
+
+  static getPromptSuites(): PromptSuite[] {
+    return db.getPromptSuites();
+  }
+
+  static getPromptSuite(idOrName: number | string): PromptSuite | undefined {
+    return db.getPromptSuite(idOrName);
+  }
+
+  static getSuitePrompts(suiteId: number): SuitePrompt[] {
+    return db.getSuitePrompts(suiteId);
+  }
+
+  static createSuiteBatch(batch: { suiteId: number; models: string[]; temperature?: number | null; maxTokens?: number | null; idempotencyKey?: string | null }): { batch: SuiteBatch; created: boolean } {
+    return db.createSuiteBatch(batch);
+  }
+
+  static getSuiteBatch(id: number): SuiteBatch | undefined {
+    return db.getSuiteBatch(id);
+  }
+
+  static getSuiteBatches(suiteId: number, limit = 50): SuiteBatch[] {
+    return db.getSuiteBatches(suiteId, limit);
+  }
+
+  static updateSuiteBatch(id: number, updates: { status?: SuiteBatchStatus; job_id?: number; finished?: boolean }): boolean {
+    return db.updateSuiteBatch(id, updates);
+  }
+
+  static saveSuiteBatchCell(batchId: number, prompt: string, cell: SuiteBatchCell & { response_text: string }): void {
+    db.saveSuiteBatchCell(batchId, prompt, cell);
+  }
+
+  static getSuiteBatchCells(batchId: number, limit = 500, offset = 0): any[] {
+    return db.getSuiteBatchCells(batchId, limit, offset);
+  }
+
+  static getSucceededSuiteCells(batchId: number): string[] {
+    return db.getSucceededSuiteCells(batchId);
+  }
+
+  static getSuiteBatchAggregates(batchId: number, model?: string): SuiteModelAggregate[] {
+    return db.getSuiteBatchAggregates(batchId, model);
+  }
 }
\ No newline at end of file
@@ -0,0 +1,236 @@
+import { sha256Hex } from "../utils/hash.ts";
+import { copyTree, type LinkMode } from "../utils/fsCopy.ts";
+import { runStreaming } from "../utils/subprocess.ts";
+
+// Content-addressed cache of installed dependencies for repo tests. Entries are keyed
+// by the hash of the manifest, lockfile and related config, so a repo/ref that was
+// installed once never pays for `npm install` / `pip install` again.
+
+// Files whose contents decide what gets installed into node_modules
+const NODE_KEY_FILES = [
+  "package.json",
+  "package-lock.json",
+  "npm-shrinkwrap.json",
+  "yarn.lock",
+  "pnpm-lock.yaml",
+  "babel.config.js",
+  "babel.config.json",
+];
+// Installers may rewrite these (e.g. `npm install --save-dev`), so the cache restores them too
+const NODE_RESTORED_FILES = ["package.json", "package-lock.json", "yarn.lock", "pnpm-lock.yaml"];
+const COMPLETE_MARKER = ".arena-complete";
+
+export interface PreparedDependencies {
+  ecosystems: string[];
+  cached: boolean; // nothing had to be installed
+  env: Record<string, string>; // extra env for tool and test commands (Python venv)
+}
+
+export class DepCacheService {
+  private static inflight = new Map<string, Promise<void>>();
+
+  static cacheDir(): string {
+    return Deno.env.get("DEP_CACHE_DIR") || `${Deno.cwd()}/backend/tmp/dep-cache`;
+  }
+
+  // Defaults to reflink; hardlink is fastest but a tool that edits files under
+  // node_modules then edits the cache too
+  static linkMode(): LinkMode {
+    const mode = Deno.env.get("DEP_CACHE_LINK_MODE");
+    return mode === "hardlink" || mode === "copy" ? mode : "reflink";
+  }
+
+  private static async exists(path: string): Promise<boolean> {
+    try {
+      await Deno.stat(path);
+      return true;
+    } catch {
+      return false;
+    }
+  }
+
+  private static coalesce(key: string, fn: () => Promise<void>): Promise<void> {
+    const existing = this.inflight.get(key);
+    if (existing) return existing;
+    const op = fn().finally(() => this.inflight.delete(key));
+    this.inflight.set(key, op);
+    return op;
+  }
+
+  private static async hashFiles(workdir: string, files: string[], salt: string): Promise<string> {
+    const parts = [salt];
+    for (const file of files) {
+      const content = await Deno.readTextFile(`${workdir}/${file}`).catch(() => null);
+      if (content !== null) parts.push(`${file}\n${content}`);
+    }
+    return (await sha256Hex(parts.join("\0"))).slice(0, 32);
+  }
+
+  private static async prepareNode(workdir: string, install: (workdir: string) => Promise<void>): Promise<boolean> {
+    const key = await this.hashFiles(workdir, NODE_KEY_FILES, `node:${Deno.build.os}:${Deno.build.arch}`);
+    const entry = `${this.cacheDir()}/node-${key}`;
+
+    if (!(await this.exists(`${entry}/${COMPLETE_MARKER}`))) {
+      let installedHere = false as boolean;
+      let leader = false as boolean;
+      try {
+        await this.coalesce(entry, async () => {
+          leader = true;
+          if (await this.exists(`${entry}/${COMPLETE_MARKER}`)) return;
+          await install(workdir);
+          installedHere = true;
+          await this.populateNode(entry, workdir).catch((error) => console.warn("Failed to cache node_modules:", error));
+        });
+      } catch (error) {
+        // Only the run that did the install fails with it (e.g. its time budget ran out)
+        if (leader) throw error;
+      }
+      if (installedHere) return false;
+      // Another run installed while we waited; if it could not populate the cache, install ourselves
+      if (!(await this.exists(`${entry}/${COMPLETE_MARKER}`))) {
+        await install(workdir);
+        return false;
+      }
+    }
+
+    await Deno.remove(`${workdir}/node_modules`, { recursive: true }).catch(() => {});
+    await copyTree(`${entry}/node_modules`, `${workdir}/node_modules`, this.linkMode());
+    for (const file of NODE_RESTORED_FILES) {
+      if (await this.exists(`${entry}/files/${file}`)) await Deno.copyFile(`${entry}/files/${file}`, `${workdir}/${file}`);
+    }
+    return true;
+  }
+
+  private static async populateNode(entry: string, workdir: string): Promise<void> {
+    if (!(await this.exists(`${workdir}/node_modules`))) return;
+    const tmp = `${entry}.tmp-${crypto.randomUUID().slice(0, 8)}`;
+    try {
+      await Deno.mkdir(`${tmp}/files`, { recursive: true });
+      // Never hardlink into the cache: the workdir keeps being edited after this point
+      await copyTree(`${workdir}/node_modules`, `${tmp}/node_modules`, "reflink");
+      for (const file of NODE_RESTORED_FILES) {
+        if (await this.exists(`${workdir}/${file}`)) await Deno.copyFile(`${workdir}/${file}`, `${tmp}/files/${file}`);
+      }
+      await Deno.writeTextFile(`${tmp}/${COMPLETE_MARKER}`, new Date().toISOString());
+      await Deno.remove(entry, { recursive: true }).catch(() => {});
+      await Deno.rename(tmp, entry);
+    } catch (error) {
+      await Deno.remove(tmp, { recursive: true }).catch(() => {});
+      throw error;
+    }
+  }
+
+  // `env` pointed at a private copy, at `dir`, of the venv it uses. Matrix pairs run side by side
+  // and a tool may pip install into its venv, so each pair gets its own. A venv hardcodes its path
+  // in its scripts' shebangs and activate files, so those are rewritten for the copy.
+  static async isolateVenv(env: Record<string, string>, dir: string): Promise<Record<string, string>> {
+    const venv = env.VIRTUAL_ENV;
+    if (!venv) return env;
+    await copyTree(venv, dir, "reflink");
+    const binDir = `${dir}/${Deno.build.os === "windows" ? "Scripts" : "bin"}`;
+    for await (const entry of Deno.readDir(binDir)) {
+      if (!entry.isFile) continue;
+      const path = `${binDir}/${entry.name}`;
+      const bytes = await Deno.readFile(path);
+      // Scripts only; executables such as a copied python stay as they are
+      if (!(bytes[0] === 0x23 && bytes[1] === 0x21) && !entry.name.startsWith("activate")) continue;
+      const text = new TextDecoder().decode(bytes);
+      if (text.includes(venv)) await Deno.writeTextFile(path, text.replaceAll(venv, dir));
+    }
+    return { ...env, VIRTUAL_ENV: dir, PATH: (env.PATH ?? "").replace(venv, dir) };
+  }
+
+  private static pythonCommand(): string {
+    return Deno.build.os === "windows" ? "python" : "python3";
+  }
+
+  private static async pythonVersion(): Promise<string> {
+    try {
+      const res = await new Deno.Command(this.pythonCommand(), { args: ["--version"], stdout: "piped", stderr: "piped" }).output();
+      const decoder = new TextDecoder();
+      return (decoder.decode(res.stdout) + decoder.decode(res.stderr)).trim();
+    } catch {
+      return "unknown";
+    }
+  }
+
+  // pip and the venv module go through runStreaming so a timeout also kills the build
+  // backends and compilers they spawn
+  private static async pipInstall(pip: string, workdir: string, signal?: AbortSignal): Promise<boolean> {
+    try {
+      const res = await runStreaming(pip, { args: ["install", "-r", "requirements.txt"], cwd: workdir, signal });
+      return res.success;
+    } catch {
+      return false;
+    }
+  }
+
+  // Venvs are not relocatable, so the cached venv is used in place through VIRTUAL_ENV/PATH
+  // (runs that must not share it take a copy with isolateVenv). It inherits system
+  // site-packages so globally installed test runners keep working.
+  private static async preparePython(workdir: string, signal?: AbortSignal): Promise<{ cached: boolean; env: Record<string, string> }> {
+    const requirements = await Deno.readTextFile(`${workdir}/requirements.txt`);
+    // Requirements pointing into the workdir (e.g. `-e .`) cannot live in a shared venv
+    if (/^\s*(-e|--editable|\.|file:)/m.test(requirements)) {
+      await this.pipInstall("pip", workdir, signal);
+      return { cached: false, env: {} };
+    }
+
+    const key = await this.hashFiles(workdir, ["requirements.txt"], `python:${Deno.build.os}:${await this.pythonVersion()}`);
+    const venv = `${this.cacheDir()}/py-${key}/venv`;
+    const binDir = `${venv}/${Deno.build.os === "windows" ? "Scripts" : "bin"}`;
+    const env = {
+      VIRTUAL_ENV: venv,
+      PATH: `${binDir}${Deno.build.os === "windows" ? ";" : ":"}${Deno.env.get("PATH") ?? ""}`,
+    };
+
+    let cached = true;
+    if (!(await this.exists(`${venv}/${COMPLETE_MARKER}`))) {
+      cached = false;
+      await this.coalesce(venv, async () => {
+        if (await this.exists(`${venv}/${COMPLETE_MARKER}`)) return;
+        await Deno.remove(venv, { recursive: true }).catch(() => {});
+        await Deno.mkdir(venv, { recursive: true });
+        const created = await runStreaming(this.pythonCommand(), { args: ["-m", "venv", "--system-site-packages", venv], signal });
+        if (!created.success || !(await this.pipInstall(`${binDir}/pip`, workdir, signal))) {
+          await Deno.remove(venv, { recursive: true }).catch(() => {});
+          throw new Error("venv install failed");
+        }
+        await Deno.writeTextFile(`${venv}/${COMPLETE_MARKER}`, new Date().toISOString());
+      }).catch((error) => {
+        console.warn("Falling back to a plain pip install:", error instanceof Error ? error.message : error);
+      });
+      signal?.throwIfAborted();
+      if (!(await this.exists(`${venv}/${COMPLETE_MARKER}`))) {
+        await this.pipInstall("pip", workdir, signal);
+        return { cached: false, env: {} };
+      }
+    }
+    return { cached, env };
+  }
+
+  // Restore or install every ecosystem found in the workdir. `installNode` performs the
+  // repo's own node install and is only called on a cache miss. `signal` aborts pip/venv installs.
+  static async prepare(
+    workdir: string,
+    installNode: (workdir: string) => Promise<void>,
+    signal?: AbortSignal,
+  ): Promise<PreparedDependencies> {
+    const ecosystems: string[] = [];
+    let cached = true;
+    let env: Record<string, string> = {};
+
+    if (await this.exists(`${workdir}/package.json`)) {
+      ecosystems.push("node");
+      cached = (await this.prepareNode(workdir, installNode)) && cached;
+    }
+    if (await this.exists(`${workdir}/requirements.txt`)) {
+      ecosystems.push("python");
+      const python = await this.preparePython(workdir, signal);
+      cached = python.cached && cached;
+      env = { ...env, ...python.env };
+    }
+
+    return { ecosystems, cached: ecosystems.length > 0 && cached, env };
+  }
+}
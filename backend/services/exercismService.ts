@@ -1,5 +1,8 @@
-import { OpenRouterService } from "./openRouterService.ts";
-import { DbService } from "./dbService.ts";
+import { OpenRouterService, type StreamChunk } from "./openRouterService.ts";
+import { type CodeEvalRun, DbService } from "./dbService.ts";
+import { envLimit, Semaphore } from "../utils/concurrency.ts";
+import { sha256Hex } from "../utils/hash.ts";
+import { type GeneratedResult, MAX_GENERATED_CASES, PropertySuiteService } from "./propertySuiteService.ts";
 
 type CodeGeneratorOverride = (model: string, prompt: string) => Promise<string>;
 
@@ -14,6 +17,47 @@ export interface RunRequest {
   exerciseId: string;
   models: string[];
   testCount?: number; // default 10
+  samples?: number; // completions per model for pass@k, default 1
+  temperature?: number; // default 0.2
+  concurrency?: number; // max in-flight generations, default EXERCISM_GENERATION_CONCURRENCY or 4
+  refresh?: boolean; // bypass the completion cache and regenerate
+  generatedCases?: number; // additional property-based cases checked against a reference oracle, default 0
+  seed?: number; // seed for generated cases, default 42
+}
+
+// Re-score stored solutions: either one run by id, or every run matching the filter
+export interface ReevaluateRequest {
+  runId?: number;
+  exerciseId?: string;
+  model?: string;
+  startDate?: string;
+  endDate?: string;
+  limit?: number; // max source runs when filtering, default 50
+  testCount?: number; // defaults to each source run's testCount
+  generatedCases?: number;
+  seed?: number;
+}
+
+export interface ReevaluatedRun {
+  sourceRunId: number;
+  runId: number;
+  exerciseId: string;
+  testCount: number;
+  results: PerModelResult[];
+}
+
+export interface ReevaluateResponse {
+  runs: ReevaluatedRun[];
+  solutions: number;
+  uniqueSolutions: number; // identical code is only evaluated once
+  durationMs: number;
+}
+
+export interface GenerationMetrics {
+  durationMs: number;
+  ttftMs: number | null;
+  tokensPerSecond: number | null;
+  completionTokens: number;
 }
 
 export interface PerModelResult {
@@ -26,16 +70,134 @@ export interface PerModelResult {
   testsTotal: number;
   score: number;
   error?: string;
+  generation?: GenerationMetrics; // only set by the streaming path, and not for cached code
+  cached?: boolean; // set when the code came from the completion cache
+  generated?: GeneratedResult; // only set when generatedCases was requested
+  // Only set when more than one sample was requested; the top-level fields then describe the best sample
+  samples?: SampleResult[];
+  k?: number;
+  passAt1?: number;
+  passAtK?: number;
+}
+
+export interface SampleResult {
+  sampleIndex: number;
+  testsPassed: number;
+  testsTotal: number;
+  score: number;
+  compileError?: string;
+  error?: string;
+  cached?: boolean;
+  generation?: GenerationMetrics;
+  generated?: GeneratedResult;
 }
 
 export interface RunResponse {
   exerciseId: string;
   exerciseName: string;
   testCount: number;
+  samples: number;
   results: PerModelResult[];
   runId: number;
 }
 
+export interface ExercismStreamEvent {
+  type:
+    | "run_start"
+    | "generation_start"
+    | "first_token"
+    | "generation_done"
+    | "lint"
+    | "compile"
+    | "test_case"
+    | "generated"
+    | "score"
+    | "model_complete"
+    | "run_complete"
+    | "error";
+  model?: string;
+  exerciseId?: string;
+  exerciseName?: string;
+  testCount?: number;
+  models?: string[];
+  ttftMs?: number | null;
+  tokensPerSecond?: number | null;
+  completionTokens?: number;
+  durationMs?: number;
+  lintWarnings?: number;
+  lintErrors?: number;
+  compileError?: string;
+  caseIndex?: number;
+  passed?: boolean;
+  testsPassed?: number;
+  testsTotal?: number;
+  score?: number;
+  result?: PerModelResult;
+  results?: PerModelResult[];
+  runId?: number;
+  sampleIndex?: number;
+  samples?: number;
+  cached?: boolean;
+  generated?: GeneratedResult;
+  error?: string;
+}
+
+type EmitEvent = (event: ExercismStreamEvent) => void;
+
+type Solution = (input: unknown) => unknown;
+
+interface LintCounts {
+  warnings: number;
+  errors: number;
+}
+
+type SampleOutcome = PerModelResult & { sampleIndex: number };
+
+interface Sampling {
+  samples: number;
+  temperature: number;
+  refresh: boolean;
+}
+
+interface GeneratedOptions {
+  count: number;
+  seed: number;
+}
+
+interface RunContext {
+  exercise: Exercise;
+  testCount: number;
+  generated?: GeneratedOptions;
+  prompt: string;
+  runDir: string;
+  sampling: Sampling;
+  generationLimit: Semaphore;
+  evaluationLimit: Semaphore;
+  // Stops samples from starting generation or evaluation once aborted
+  signal?: AbortSignal;
+}
+
+const MAX_SAMPLES = 100;
+const MAX_REEVALUATE_RUNS = 500;
+const LINT_BATCH_SIZE = 200;
+
+// Unbiased pass@k estimator (Chen et al., 2021): 1 - C(n-c, k) / C(n, k),
+// computed as a running product to stay numerically stable for large n.
+export function estimatePassAtK(n: number, c: number, k: number): number {
+  if (n <= 0 || k <= 0) return 0;
+  if (n - c < k) return 1;
+  let prod = 1;
+  for (let i = n - c + 1; i <= n; i++) {
+    prod *= 1 - k / i;
+  }
+  return 1 - prod;
+}
+
+interface ExerciseCase {
+  input: unknown;
+  expected: unknown;
+}
+
 // Import test cases for isogram
 import { ISOGRAM_CASES } from "../exercism/isogram/cases.ts";
 // Additional exercises
@@ -44,6 +206,14 @@ import { RAINDROPS_CASES } from "../exercism/raindrops/cases.ts";
 import { LEAP_CASES } from "../exercism/leap/cases.ts";
 import { ACRONYM_CASES } from "../exercism/acronym/cases.ts";
 
+const EXERCISE_CASES: Record<string, ExerciseCase[]> = {
+  isogram: ISOGRAM_CASES,
+  pangram: PANGRAM_CASES,
+  raindrops: RAINDROPS_CASES,
+  leap: LEAP_CASES,
+  acronym: ACRONYM_CASES,
+};
+
 
 export class ExercismService {
   private static codeGeneratorOverride?: CodeGeneratorOverride;
@@ -106,32 +276,115 @@ export class ExercismService {
     }
   }
 
-  private static async generateSolutionCode(model: string, prompt: string): Promise<string> {
-    if (this.codeGeneratorOverride) {
-      return await this.codeGeneratorOverride(model, prompt);
-    }
-    // Use OpenRouter with stored API key
+  private static extractCode(content: string): string {
+    const codeBlockMatch = content.match(/```[a-zA-Z]*\n([\s\S]*?)```/);
+    return codeBlockMatch ? codeBlockMatch[1].trim() : content.trim();
+  }
+
+  private static getOpenRouterService(): OpenRouterService {
     const apiKeyRecord = DbService.getApiKey("OPENROUTER_API_KEY", "OpenRouter");
     if (!apiKeyRecord?.key_value) throw new Error("OpenRouter API key not configured");
-    const service = new OpenRouterService(apiKeyRecord.key_value);
+    return new OpenRouterService(apiKeyRecord.key_value);
+  }
 
-    const request = {
+  private static buildCompletionRequest(model: string, prompt: string, temperature: number) {
+    return {
       model,
       messages: [
         { role: "user" as const, content: prompt },
       ],
-      temperature: 0.2,
+      temperature,
       max_tokens: 700,
     };
+  }
 
-    const result = await service.generateCompletion(request, model);
+  private static async generateSolutionCode(model: string, prompt: string, temperature: number): Promise<string> {
+    // Use OpenRouter with stored API key
+    const service = this.getOpenRouterService();
+    const result = await service.generateCompletion(this.buildCompletionRequest(model, prompt, temperature), model);
     if (result.error) throw new Error(result.error);
 
     const content: string = result.response?.choices?.[0]?.message?.content || "";
-    // Extract code block
-    const codeBlockMatch = content.match(/```[a-zA-Z]*\n([\s\S]*?)```/);
-    const code = codeBlockMatch ? codeBlockMatch[1].trim() : content.trim();
-    return code;
+    return this.extractCode(content);
+  }
+
+  // Streaming variant used by runStreaming: captures TTFT and tokens/s while generating.
+  private static async generateSolutionCodeStreaming(
+    model: string,
+    prompt: string,
+    temperature: number,
+    onFirstToken: (ttftMs: number) => void,
+  ): Promise<{ code: string; metrics: GenerationMetrics }> {
+    const start = Date.now();
+    const service = this.getOpenRouterService();
+    let firstTokenAt = null as number | null;
+    let chunkCount = 0;
+
+    const result = await service.generateStreamingCompletion(
+      this.buildCompletionRequest(model, prompt, temperature),
+      model,
+      (chunk: StreamChunk) => {
+        if (!chunk.choices?.[0]?.delta?.content) return;
+        chunkCount++;
+        if (firstTokenAt === null) {
+          firstTokenAt = Date.now();
+          onFirstToken(firstTokenAt - start);
+        }
+      },
+    );
+    if (result.error) throw new Error(result.error);
+
+    const end = Date.now();
+    const completionTokens = result.response?.usage?.completion_tokens || chunkCount;
+    const generationSeconds = firstTokenAt !== null ? (end - firstTokenAt) / 1000 : 0;
+    const content: string = result.response?.choices?.[0]?.message?.content || "";
+    return {
+      code: this.extractCode(content),
+      metrics: {
+        durationMs: end - start,
+        ttftMs: firstTokenAt !== null ? firstTokenAt - start : null,
+        tokensPerSecond: generationSeconds > 0 ? completionTokens / generationSeconds : null,
+        completionTokens,
+      },
+    };
+  }
+
+  // Produce one sample, served from the completion cache when possible so that
+  // re-scoring never pays for generation twice.
+  private static async generateSample(
+    model: string,
+    prompt: string,
+    sampling: Sampling,
+    sampleIndex: number,
+    streaming: boolean,
+    onFirstToken: (ttftMs: number) => void,
+  ): Promise<{ code: string; generation?: GenerationMetrics; cached: boolean }> {
+    // Stubbed generators bypass the cache so every call stays observable to tests
+    if (this.codeGeneratorOverride) {
+      const start = Date.now();
+      const code = await this.codeGeneratorOverride(model, prompt);
+      const generation = streaming
+        ? { durationMs: Date.now() - start, ttftMs: null, tokensPerSecond: null, completionTokens: 0 }
+        : undefined;
+      return { code, generation, cached: false };
+    }
+
+    const promptHash = await sha256Hex(prompt);
+    if (!sampling.refresh) {
+      const hit = DbService.getCodeCompletion(model, promptHash, sampling.temperature, sampleIndex);
+      // The stored metrics describe the original generation, not this run
+      if (hit) return { code: hit.code, generation: undefined, cached: true };
+    }
+
+    let code: string;
+    let generation: GenerationMetrics | undefined;
+    if (streaming) {
+      ({ code, metrics: generation } = await this.generateSolutionCodeStreaming(model, prompt, sampling.temperature, onFirstToken));
+    } else {
+      code = await this.generateSolutionCode(model, prompt, sampling.temperature);
+    }
+    DbService.saveCodeCompletion({ model, promptHash, temperature: sampling.temperature, sampleIndex, code, generation });
+    return { code, generation, cached: false };
   }
 
   private static async writeTempSolution(runDir: string, modelSafe: string, code: string): Promise<string> {
@@ -141,7 +394,7 @@ export class ExercismService {
     return filePath;
   }
 
-  private static async runDenoLint(filePath: string): Promise<{ warnings: number; errors: number }> {
+  private static async runDenoLint(filePath: string): Promise<LintCounts> {
     const p = new Deno.Command("deno", { args: ["lint", "--json", filePath] });
     const { code, stdout } = await p.output();
     // deno lint exits with 0 if success, 1 if found problems
@@ -160,6 +413,28 @@ export class ExercismService {
     }
   }
 
+  // One deno process per LINT_BATCH_SIZE files instead of one per file
+  private static async runDenoLintBatch(filePaths: string[]): Promise<Map<string, LintCounts>> {
+    const counts = new Map<string, LintCounts>(filePaths.map((path) => [path, { warnings: 0, errors: 0 }]));
+    for (let i = 0; i < filePaths.length; i += LINT_BATCH_SIZE) {
+      const chunk = filePaths.slice(i, i + LINT_BATCH_SIZE);
+      const { stdout } = await new Deno.Command("deno", { args: ["lint", "--json", ...chunk] }).output();
+      try {
+        const json = JSON.parse(new TextDecoder().decode(stdout));
+        for (const d of json.diagnostics || []) {
+          const entry = counts.get(String(d.filename || "").replace(/^file:\/\//, ""));
+          if (!entry) continue;
+          if (d.category === "error") entry.errors++;
+          else entry.warnings++;
+        }
+      } catch {
+        // Unparseable batch output: fall back to linting the chunk file by file
+        await Promise.all(chunk.map(async (path) => counts.set(path, await this.runDenoLint(path))));
+      }
+    }
+    return counts;
+  }
+
   private static async tryCompile(filePath: string): Promise<string | undefined> {
     try {
       // Attempt a dynamic import to check for syntax/type errors
@@ -171,127 +446,224 @@ export class ExercismService {
     }
   }
 
-  private static async runIsogramTests(modulePath: string, testCount: number): Promise<{ passed: number; total: number }> {
-    // Import the solution module and obtain default export
-    const { default: isIsogram } = await import(`file://${modulePath}?t=${Date.now()}`) as { default: (s: string) => boolean };
-    const total = Math.min(testCount, ISOGRAM_CASES.length);
-    let passed = 0;
-    for (let i = 0; i < total; i++) {
-      const c = ISOGRAM_CASES[i];
-      let ok = false;
-      try {
-        ok = isIsogram(c.input) === c.expected;
-      } catch {
-        ok = false;
-      }
-      if (ok) passed++;
-    }
-    return { passed, total };
-  }
-  private static async runPangramTests(modulePath: string, testCount: number): Promise<{ passed: number; total: number }> {
-    const { default: isPangram } = await import(`file://${modulePath}?t=${Date.now()}`) as { default: (s: string) => boolean };
-    const total = Math.min(testCount, PANGRAM_CASES.length);
-    let passed = 0;
-    for (let i = 0; i < total; i++) {
-      const c = PANGRAM_CASES[i];
-      let ok = false;
-      try { ok = isPangram(c.input) === c.expected; } catch { ok = false; }
-      if (ok) passed++;
-    }
-    return { passed, total };
+  private static async loadSolution(modulePath: string): Promise<Solution> {
+    const { default: solution } = await import(`file://${modulePath}?t=${Date.now()}`) as { default: Solution };
+    return solution;
   }
 
-  private static async runRaindropsTests(modulePath: string, testCount: number): Promise<{ passed: number; total: number }> {
-    const { default: raindrops } = await import(`file://${modulePath}?t=${Date.now()}`) as { default: (n: number) => string };
-    const total = Math.min(testCount, RAINDROPS_CASES.length);
+  // Runs the first `testCount` hand-written cases of an exercise against the solution's default export.
+  private static runCases(
+    exerciseId: string,
+    solution: Solution,
+    testCount: number,
+    onCase?: (caseIndex: number, passed: boolean) => void,
+  ): { passed: number; total: number } {
+    const cases = EXERCISE_CASES[exerciseId];
+    if (!cases) throw new Error("Unsupported exercise");
+    const total = Math.min(testCount, cases.length);
     let passed = 0;
     for (let i = 0; i < total; i++) {
-      const c = RAINDROPS_CASES[i];
+      const c = cases[i];
       let ok = false;
-      try { ok = raindrops(c.input) === c.expected; } catch { ok = false; }
+      try { ok = solution(c.input) === c.expected; } catch { ok = false; }
       if (ok) passed++;
+      onCase?.(i, ok);
     }
     return { passed, total };
   }
 
-  private static async runLeapTests(modulePath: string, testCount: number): Promise<{ passed: number; total: number }> {
-    const { default: isLeap } = await import(`file://${modulePath}?t=${Date.now()}`) as { default: (y: number) => boolean };
-    const total = Math.min(testCount, LEAP_CASES.length);
-    let passed = 0;
-    for (let i = 0; i < total; i++) {
-      const c = LEAP_CASES[i];
-      let ok = false;
-      try { ok = isLeap(c.input) === c.expected; } catch { ok = false; }
-      if (ok) passed++;
-    }
-    return { passed, total };
-  }
-
-  private static async runAcronymTests(modulePath: string, testCount: number): Promise<{ passed: number; total: number }> {
-    const { default: acronym } = await import(`file://${modulePath}?t=${Date.now()}`) as { default: (s: string) => string };
-    const total = Math.min(testCount, ACRONYM_CASES.length);
-    let passed = 0;
-    for (let i = 0; i < total; i++) {
-      const c = ACRONYM_CASES[i];
-      let ok = false;
-      try { ok = acronym(c.input) === c.expected; } catch { ok = false; }
-      if (ok) passed++;
-    }
-    return { passed, total };
-  }
 
-
-  private static scoreFromMetrics(testsPassed: number, testsTotal: number, lintWarnings: number, lintErrors: number, compileError?: string): number {
+  private static scoreFromMetrics(
+    testsPassed: number,
+    testsTotal: number,
+    lintWarnings: number,
+    lintErrors: number,
+    compileError?: string,
+    generated?: GeneratedResult,
+  ): number {
     if (compileError) return 0;
-    const testScore = testsTotal > 0 ? (testsPassed / testsTotal) * 100 : 0;
+    let testScore = testsTotal > 0 ? (testsPassed / testsTotal) * 100 : 0;
+    // Generated cases weigh as much as the hand-written ones
+    if (generated && generated.total > 0) {
+      testScore = (testScore + (generated.passed / generated.total) * 100) / 2;
+    }
     const penalty = lintErrors * 5 + lintWarnings * 1;
     const raw = Math.max(0, Math.round(testScore - penalty));
     return raw;
   }
 
-  static async run(request: RunRequest): Promise<RunResponse> {
+  // Lint, compile and test one solution. Shared by run, runStreaming and evaluateSolution.
+  private static async evaluateCode(
+    exercise: Exercise,
+    model: string,
+    code: string,
+    runDir: string,
+    testCount: number,
+    emit?: EmitEvent,
+    fileTag?: string,
+    generatedOptions?: GeneratedOptions,
+  ): Promise<PerModelResult> {
+    const modelSafe = model.replace(/[^a-zA-Z0-9_-]+/g, "_") + (fileTag ? `_${fileTag}` : "");
+    const modulePath = await this.writeTempSolution(runDir, modelSafe, code);
+    const lint = await this.runDenoLint(modulePath);
+    return await this.scoreWrittenCode(exercise, model, code, modulePath, lint, testCount, emit, generatedOptions);
+  }
+
+  // Compile, test and score a solution that is already on disk and linted
+  private static async scoreWrittenCode(
+    exercise: Exercise,
+    model: string,
+    code: string,
+    modulePath: string,
+    lint: LintCounts,
+    testCount: number,
+    emit?: EmitEvent,
+    generatedOptions?: GeneratedOptions,
+  ): Promise<PerModelResult> {
+    const { warnings: lintWarnings, errors: lintErrors } = lint;
+    emit?.({ type: "lint", model, lintWarnings, lintErrors });
+    const compileError = await this.tryCompile(modulePath);
+    emit?.({ type: "compile", model, passed: !compileError, compileError });
+    let testsPassed = 0, testsTotal = Math.min(testCount, exercise.totalTests);
+    let generated: GeneratedResult | undefined = generatedOptions
+      ? { seed: generatedOptions.seed, passed: 0, total: generatedOptions.count }
+      : undefined;
+    if (!compileError) {
+      const solution = await this.loadSolution(modulePath);
+      const res = this.runCases(exercise.id, solution, testCount, emit
+        ? (caseIndex, passed) => emit({ type: "test_case", model, caseIndex, passed })
+        : undefined);
+      testsPassed = res.passed;
+      testsTotal = res.total;
+      if (generatedOptions) {
+        const fixture = await PropertySuiteService.getFixture(exercise.id, generatedOptions.seed, generatedOptions.count);
+        generated = PropertySuiteService.run(exercise.id, solution, fixture);
+      }
+    }
+    if (generated) emit?.({ type: "generated", model, generated });
+    const score = this.scoreFromMetrics(testsPassed, testsTotal, lintWarnings, lintErrors, compileError, generated);
+    emit?.({ type: "score", model, testsPassed, testsTotal, score });
+    const result: PerModelResult = { model, code, lintWarnings, lintErrors, compileError, testsPassed, testsTotal, score };
+    return generated ? { ...result, generated } : result;
+  }
+
+  private static resolveRun(request: RunRequest): RunContext {
     const exercise = this.listExercises().find(e => e.id === request.exerciseId);
     if (!exercise) throw new Error("Exercise not found");
     const testCount = request.testCount && request.testCount > 0 ? request.testCount : 10;
-
     const prompt = this.buildPrompt(exercise.id);
     const runDir = `${Deno.cwd()}/backend/tmp/exercism/${Date.now()}`;
+    const generated = this.resolveGenerated(exercise.id, request);
+    const sampling: Sampling = {
+      samples: Math.min(MAX_SAMPLES, request.samples && request.samples > 0 ? Math.floor(request.samples) : 1),
+      temperature: typeof request.temperature === "number" ? request.temperature : 0.2,
+      refresh: !!request.refresh,
+    };
+    return {
+      exercise,
+      testCount,
+      generated,
+      prompt,
+      runDir,
+      sampling,
+      generationLimit: new Semaphore(request.concurrency && request.concurrency > 0
+        ? request.concurrency
+        : envLimit("EXERCISM_GENERATION_CONCURRENCY", 4)),
+      evaluationLimit: new Semaphore(envLimit("EXERCISM_EVAL_CONCURRENCY", navigator.hardwareConcurrency || 4)),
+    };
+  }
 
-    const results: PerModelResult[] = [];
+  private static resolveGenerated(exerciseId: string, request: { generatedCases?: number; seed?: number }): GeneratedOptions | undefined {
+    const count = request.generatedCases && request.generatedCases > 0
+      ? Math.min(MAX_GENERATED_CASES, Math.floor(request.generatedCases))
+      : 0;
+    if (count === 0 || !PropertySuiteService.hasSuite(exerciseId)) return undefined;
+    return { count, seed: typeof request.seed === "number" ? request.seed : 42 };
+  }
 
-    await Promise.all(request.models.map(async (model) => {
-      const modelSafe = model.replace(/[^a-zA-Z0-9_-]+/g, "_");
+  private static errorResult(model: string, testCount: number, e: unknown): PerModelResult {
+    return { model, code: "", lintWarnings: 0, lintErrors: 0, compileError: undefined, testsPassed: 0, testsTotal: testCount, score: 0, error: e instanceof Error ? e.message : String(e) };
+  }
+
+  // Generate and evaluate every sample of one model; generation and evaluation are
+  // each bounded by the run's semaphores so all models share one budget.
+  private static async runModel(run: RunContext, model: string, emit?: EmitEvent): Promise<PerModelResult> {
+    const { exercise, testCount, prompt, runDir, sampling, generated } = run;
+    const outcomes = await Promise.all(Array.from({ length: sampling.samples }, async (_, sampleIndex): Promise<SampleOutcome> => {
+      const sampleEmit: EmitEvent | undefined = emit ? (event) => emit({ ...event, sampleIndex }) : undefined;
       try {
-        const code = await this.generateSolutionCode(model, prompt);
-        const modulePath = await this.writeTempSolution(runDir, modelSafe, code);
-        const { warnings: lintWarnings, errors: lintErrors } = await this.runDenoLint(modulePath);
-        const compileError = await this.tryCompile(modulePath);
-        let testsPassed = 0, testsTotal = testCount;
-        if (!compileError) {
-          let res: { passed: number; total: number };
-          switch (exercise.id) {
-            case "isogram":
-              res = await this.runIsogramTests(modulePath, testCount); break;
-            case "pangram":
-              res = await this.runPangramTests(modulePath, testCount); break;
-            case "raindrops":
-              res = await this.runRaindropsTests(modulePath, testCount); break;
-            case "leap":
-              res = await this.runLeapTests(modulePath, testCount); break;
-            case "acronym":
-              res = await this.runAcronymTests(modulePath, testCount); break;
-            default:
-              throw new Error("Unsupported exercise");
-          }
-          testsPassed = res.passed;
-          testsTotal = res.total;
-        }
-        const score = this.scoreFromMetrics(testsPassed, testsTotal, lintWarnings, lintErrors, compileError);
-        results.push({ model, code, lintWarnings, lintErrors, compileError, testsPassed, testsTotal, score });
+        const { code, generation, cached } = await run.generationLimit.run(() => {
+          run.signal?.throwIfAborted();
+          sampleEmit?.({ type: "generation_start", model });
+          return this.generateSample(
+            model,
+            prompt,
+            sampling,
+            sampleIndex,
+            !!emit,
+            (ttftMs) => sampleEmit?.({ type: "first_token", model, ttftMs }),
+          );
+        });
+        sampleEmit?.({ type: "generation_done", model, cached, ...generation });
+        const fileTag = sampling.samples > 1 ? `s${sampleIndex}` : undefined;
+        const evaluated = await run.evaluationLimit.run(() => {
+          run.signal?.throwIfAborted();
+          return this.evaluateCode(exercise, model, code, runDir, testCount, sampleEmit, fileTag, generated);
+        });
+        return { ...evaluated, generation, cached, sampleIndex };
       } catch (e) {
-        results.push({ model, code: "", lintWarnings: 0, lintErrors: 0, compileError: undefined, testsPassed: 0, testsTotal: testCount, score: 0, error: e instanceof Error ? e.message : String(e) });
+        const failed = { ...this.errorResult(model, testCount, e), sampleIndex };
+        sampleEmit?.({ type: "error", model, error: failed.error });
+        return failed;
       }
     }));
+    return this.aggregateSamples(outcomes, !!emit);
+  }
+
+  private static isCorrect(outcome: SampleOutcome): boolean {
+    if (outcome.generated && outcome.generated.passed !== outcome.generated.total) return false;
+    return !outcome.error && !outcome.compileError && outcome.testsTotal > 0 && outcome.testsPassed === outcome.testsTotal;
+  }
+
+  private static aggregateSamples(outcomes: SampleOutcome[], withGeneration: boolean): PerModelResult {
+    if (outcomes.length === 1) {
+      const { sampleIndex: _sampleIndex, cached, generation, ...result } = outcomes[0];
+      const single: PerModelResult = cached ? { ...result, cached } : result;
+      return withGeneration ? { ...single, generation } : single;
+    }
+
+    const n = outcomes.length;
+    const c = outcomes.filter((o) => this.isCorrect(o)).length;
+    const best = outcomes.reduce((a, b) => (b.score > a.score ? b : a));
+    const { sampleIndex: _sampleIndex, cached: _cached, generation: _generation, ...representative } = best;
+    return {
+      ...representative,
+      samples: outcomes.map((o) => ({
+        sampleIndex: o.sampleIndex,
+        testsPassed: o.testsPassed,
+        testsTotal: o.testsTotal,
+        score: o.score,
+        compileError: o.compileError,
+        error: o.error,
+        cached: o.cached,
+        generation: o.generation,
+        generated: o.generated,
+      })),
+      k: n,
+      passAt1: estimatePassAtK(n, c, 1),
+      passAtK: estimatePassAtK(n, c, n),
+    };
+  }
+
+  static async run(request: RunRequest): Promise<RunResponse> {
+    const run = this.resolveRun(request);
+    const { exercise, testCount } = run;
+
+    const results: PerModelResult[] = [];
+
+    await Promise.all(request.models.map(async (model) => {
+      results.push(await this.runModel(run, model));
+    }));
 
     const runId = DbService.saveCodeEvalRun({
       exerciseId: exercise.id,
@@ -301,40 +673,146 @@ export class ExercismService {
       results,
     });
 
-    return { exerciseId: exercise.id, exerciseName: exercise.name, testCount, results, runId };
+    return { exerciseId: exercise.id, exerciseName: exercise.name, testCount, samples: run.sampling.samples, results, runId };
+  }
+
+  // Same pipeline as run, but reports every phase through onEvent as it happens and
+  // generates through a streaming completion so TTFT and tokens/s are captured. Once
+  // `signal` aborts no sample starts generating or evaluating and the run is not saved;
+  // completions already in flight run to the end.
+  static async runStreaming(request: RunRequest, onEvent: EmitEvent, signal?: AbortSignal): Promise<RunResponse> {
+    const run = { ...this.resolveRun(request), signal };
+    const { exercise, testCount } = run;
+    onEvent({ type: "run_start", exerciseId: exercise.id, exerciseName: exercise.name, testCount, samples: run.sampling.samples, models: request.models });
+
+    const results: PerModelResult[] = [];
+
+    await Promise.all(request.models.map(async (model) => {
+      const result = await this.runModel(run, model, onEvent);
+      results.push(result);
+      onEvent({ type: "model_complete", model, result });
+    }));
+    signal?.throwIfAborted();
+
+    const runId = DbService.saveCodeEvalRun({
+      exerciseId: exercise.id,
+      exerciseName: exercise.name,
+      testCount,
+      models: request.models,
+      results,
+    });
+
+    onEvent({ type: "run_complete", runId, exerciseId: exercise.id, results });
+    return { exerciseId: exercise.id, exerciseName: exercise.name, testCount, samples: run.sampling.samples, results, runId };
+  }
+
+
+  private static findSourceRuns(request: ReevaluateRequest): CodeEvalRun[] {
+    if (request.runId !== undefined) {
+      const run = DbService.getCodeEvalRun(request.runId);
+      if (!run) throw new Error("Run not found");
+      return [run];
+    }
+    const limit = Math.min(MAX_REEVALUATE_RUNS, request.limit && request.limit > 0 ? Math.floor(request.limit) : 50);
+    return DbService.findCodeEvalRuns({
+      exerciseId: request.exerciseId,
+      model: request.model,
+      startDate: request.startDate,
+      endDate: request.endDate,
+      limit,
+    });
   }
 
+  // Re-score stored solutions against the current cases and scoring rules without calling
+  // any model. Identical solutions are evaluated once, linting runs in batches and
+  // compile/test runs in parallel; each source run gets a new run linking back to it.
+  static async reevaluate(request: ReevaluateRequest): Promise<ReevaluateResponse> {
+    const start = Date.now();
+    const sources = this.findSourceRuns(request);
+    const runDir = `${Deno.cwd()}/backend/tmp/exercism/${Date.now()}_reeval`;
+
+    interface Job {
+      exercise: Exercise;
+      testCount: number;
+      code: string;
+      generated?: GeneratedOptions;
+      modulePath: string;
+      result?: PerModelResult;
+    }
+    const jobs = new Map<string, Job>();
+    const plan: Array<{ source: CodeEvalRun; exercise: Exercise; testCount: number; entries: Array<{ model: string; key: string }> }> = [];
+
+    for (const source of sources) {
+      const exercise = this.listExercises().find((e) => e.id === source.exerciseId);
+      if (!exercise) continue;
+      const testCount = request.testCount && request.testCount > 0 ? request.testCount : source.testCount;
+      const generated = this.resolveGenerated(exercise.id, request);
+      const entries: Array<{ model: string; key: string }> = [];
+      for (const result of source.results) {
+        if (!result.code) continue;
+        if (request.model && result.model !== request.model) continue;
+        const key = await sha256Hex(`${exercise.id}\0${testCount}\0${result.code}`);
+        if (!jobs.has(key)) {
+          jobs.set(key, { exercise, testCount, code: result.code, generated, modulePath: `${runDir}/${key.slice(0, 24)}.ts` });
+        }
+        entries.push({ model: result.model, key });
+      }
+      if (entries.length > 0) plan.push({ source, exercise, testCount, entries });
+    }
+
+    if (jobs.size > 0) {
+      await Deno.mkdir(runDir, { recursive: true });
+      await Promise.all([...jobs.values()].map((job) => Deno.writeTextFile(job.modulePath, job.code)));
+      const lint = await this.runDenoLintBatch([...jobs.values()].map((job) => job.modulePath));
+      const evaluationLimit = new Semaphore(envLimit("EXERCISM_EVAL_CONCURRENCY", navigator.hardwareConcurrency || 4));
+      await Promise.all([...jobs.values()].map((job) =>
+        evaluationLimit.run(async () => {
+          try {
+            job.result = await this.scoreWrittenCode(
+              job.exercise,
+              "solution",
+              job.code,
+              job.modulePath,
+              lint.get(job.modulePath)!,
+              job.testCount,
+              undefined,
+              job.generated,
+            );
+          } catch (e) {
+            job.result = { ...this.errorResult("solution", job.testCount, e), code: job.code };
+          }
+        })
+      ));
+    }
+
+    const runs = plan.map(({ source, exercise, testCount, entries }): ReevaluatedRun => {
+      const results = entries.map(({ model, key }) => ({ ...jobs.get(key)!.result!, model }));
+      const runId = DbService.saveCodeEvalRun({
+        exerciseId: exercise.id,
+        exerciseName: exercise.name,
+        testCount,
+        models: results.map((r) => r.model),
+        results,
+        sourceRunId: source.id,
+      });
+      return { sourceRunId: source.id, runId, exerciseId: exercise.id, testCount, results };
+    });
+
+    return {
+      runs,
+      solutions: plan.reduce((sum, p) => sum + p.entries.length, 0),
+      uniqueSolutions: jobs.size,
+      durationMs: Date.now() - start,
+    };
+  }
 
   // Test helper: evaluate a provided solution code without calling an LLM
   static async evaluateSolution(exerciseId: string, code: string, testCount = 10): Promise<PerModelResult> {
     const exercise = this.listExercises().find(e => e.id === exerciseId);
     if (!exercise) throw new Error("Exercise not found");
     const runDir = `${Deno.cwd()}/backend/tmp/exercism/${Date.now()}_test`;
-    const modulePath = await this.writeTempSolution(runDir, "solution", code);
-    const { warnings: lintWarnings, errors: lintErrors } = await this.runDenoLint(modulePath);
-    const compileError = await this.tryCompile(modulePath);
-    let testsPassed = 0, testsTotal = Math.min(testCount, exercise.totalTests);
-    if (!compileError) {
-      let res: { passed: number; total: number };
-      switch (exerciseId) {
-        case "isogram":
-          res = await this.runIsogramTests(modulePath, testsTotal); break;
-        case "pangram":
-          res = await this.runPangramTests(modulePath, testsTotal); break;
-        case "raindrops":
-          res = await this.runRaindropsTests(modulePath, testsTotal); break;
-        case "leap":
-          res = await this.runLeapTests(modulePath, testsTotal); break;
-        case "acronym":
-          res = await this.runAcronymTests(modulePath, testsTotal); break;
-        default:
-          throw new Error("Unsupported exercise");
-      }
-      testsPassed = res.passed;
-      testsTotal = res.total;
-    }
-    const score = this.scoreFromMetrics(testsPassed, testsTotal, lintWarnings, lintErrors, compileError);
-    return { model: "local-test", code, lintWarnings, lintErrors, compileError, testsPassed, testsTotal, score };
+    const result = await this.evaluateCode(exercise, "solution", code, runDir, testCount);
+    return { ...result, model: "local-test" };
   }
 
   static getHistory(limit = 50) {
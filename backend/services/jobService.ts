@@ -0,0 +1,258 @@
+import { DbService } from "./dbService.ts";
+import type { Job, JobStatus } from "../db.ts";
+import { envLimit } from "../utils/concurrency.ts";
+import { type RunEventFrame, type RunEventLog, runEvents, stableStringify } from "../utils/runEvents.ts";
+import { workerId } from "../utils/cluster.ts";
+import { logger } from "../utils/logger.ts";
+
+// Background jobs for work that outlives a request: repo tests, batches, matrices, exercism runs.
+//
+// Jobs live in the `jobs` table. Every thread that serves HTTP also polls for work
+// (JOB_POLL_MS, and right after a submit) and claims the highest-priority job whose type is
+// under its concurrency limit. Limits count running jobs across all workers, since claims run
+// on the one database connection. A claimed job holds a lease of JOB_LEASE_MS that its executor
+// renews every third of that; when the process dies the lease lapses, and another poll (or the
+// next start, which expires every lease up front) claims the job again, up to max_attempts.
+// A handler that throws fails its job outright; only lost leases are retried.
+//
+// Each attempt writes its events to a run event log, so job progress streams and resumes like
+// any other run (`follow`). Event ids are "<attempt>-<seq>": a seq only means something
+// within the attempt that wrote it.
+
+export interface JobContext {
+  job: Job;
+  // This attempt's event log; what the handler appends is what followers of the job see
+  run: RunEventLog;
+  // Aborted when this executor loses the lease and the job may run elsewhere
+  signal: AbortSignal;
+}
+
+export type JobHandler<P = any> = (payload: P, context: JobContext) => Promise<unknown>;
+
+// Where a follower picks up: after event `after` of attempt `attempt`
+export interface JobResume {
+  attempt: number;
+  after: number;
+}
+
+export interface JobTypeOptions<P = any> {
+  // Running jobs of this type across the server; JOB_CONCURRENCY_<TYPE> overrides it
+  concurrency?: number;
+  // Keep events the run log's ring evicts on disk; for long, chatty jobs
+  spill?: boolean;
+  // Error message for a payload this handler cannot run, or null
+  validate?: (payload: P) => string | null;
+}
+
+export interface SubmitOptions {
+  priority?: number;
+  idempotencyKey?: string | null;
+  // Join a queued or running job of the same type with an equal payload
+  coalesce?: boolean;
+}
+
+interface Registration {
+  handler: JobHandler;
+  concurrency: number;
+  spill: boolean;
+  validate?: (payload: any) => string | null;
+}
+
+const WAIT_POLL_MS = 250;
+const ACTIVE: JobStatus[] = ["queued", "running"];
+
+function sleep(ms: number, signal?: AbortSignal): Promise<void> {
+  return new Promise((resolve) => {
+    const timer = setTimeout(done, ms);
+    function done() {
+      clearTimeout(timer);
+      signal?.removeEventListener("abort", done);
+      resolve();
+    }
+    signal?.addEventListener("abort", done, { once: true });
+  });
+}
+
+function notice(event: unknown): RunEventFrame {
+  return { seq: 0, json: JSON.stringify(event) };
+}
+
+// `message` is what repo test clients read, `error` what the others read
+function errorEvent(message: string) {
+  return { type: "error", message, error: message };
+}
+
+export class JobService {
+  private static handlers = new Map<string, Registration>();
+  private static owner = `${Deno.pid}:${workerId()}:${crypto.randomUUID().slice(0, 8)}`;
+  private static timer: number | null = null;
+  private static claiming = false;
+
+  private static leaseMs(): number {
+    return envLimit("JOB_LEASE_MS", 30_000);
+  }
+
+  static register<P>(type: string, handler: JobHandler<P>, options: JobTypeOptions<P> = {}) {
+    const env = `JOB_CONCURRENCY_${type.toUpperCase().replace(/[^A-Z0-9]/g, "_")}`;
+    this.handlers.set(type, {
+      handler,
+      concurrency: envLimit(env, options.concurrency ?? 1),
+      spill: options.spill ?? false,
+      validate: options.validate,
+    });
+  }
+
+  static types(): string[] {
+    return [...this.handlers.keys()];
+  }
+
+  // Error message for a submission that would be rejected, or null
+  static invalid(type: unknown, payload: unknown): string | null {
+    const registration = typeof type === "string" ? this.handlers.get(type) : undefined;
+    if (!registration) return `type must be one of: ${this.types().join(", ")}`;
+    return registration.validate?.(payload) ?? null;
+  }
+
+  // Queue a job; `created` is false when an idempotency key or `coalesce` matched an existing one
+  static submit(type: string, payload: unknown, options: SubmitOptions = {}): { job: Job; created: boolean } {
+    const error = this.invalid(type, payload);
+    if (error) throw new Error(error);
+    const submitted = DbService.enqueueJob({
+      type,
+      // Key order fixed, so equal payloads are stored as equal text and can be coalesced
+      payload: JSON.parse(stableStringify(payload ?? null)),
+      priority: options.priority,
+      idempotencyKey: options.idempotencyKey,
+      joinActive: options.coalesce,
+    });
+    if (submitted.created) queueMicrotask(() => this.claim());
+    return submitted;
+  }
+
+  static get(id: number): Job | undefined {
+    return DbService.getJob(id);
+  }
+
+  static list(limit = 50, status?: JobStatus): Job[] {
+    return DbService.listJobs(limit, status);
+  }
+
+  static cancel(id: number): boolean {
+    return DbService.cancelJob(id);
+  }
+
+  // Start claiming jobs on this thread, on an unref'd timer
+  static start() {
+    if (this.timer !== null) return;
+    this.timer = setInterval(() => this.claim(), envLimit("JOB_POLL_MS", 1000));
+    Deno.unrefTimer(this.timer);
+    this.claim();
+  }
+
+  static stop() {
+    if (this.timer !== null) clearInterval(this.timer);
+    this.timer = null;
+  }
+
+  // Take jobs until none is eligible
+  private static claim() {
+    if (this.timer === null || this.claiming || this.handlers.size === 0) return;
+    this.claiming = true;
+    try {
+      const limits = Object.fromEntries([...this.handlers].map(([type, r]) => [type, r.concurrency]));
+      for (let job = DbService.claimJob(this.owner, limits, this.leaseMs()); job; job = DbService.claimJob(this.owner, limits, this.leaseMs())) {
+        this.execute(job);
+      }
+    } catch (error) {
+      logger.error("Failed to claim jobs", { error });
+    } finally {
+      this.claiming = false;
+    }
+  }
+
+  private static async execute(job: Job) {
+    const registration = this.handlers.get(job.type)!;
+    const leaseMs = this.leaseMs();
+    const run = runEvents.create(`job:${job.type}`, { spill: registration.spill });
+    const lease = new AbortController();
+    const heartbeat = setInterval(() => {
+      try {
+        if (!DbService.heartbeatJob(job.id, this.owner, leaseMs)) {
+          lease.abort(new Error("Lost the job's lease; it may be running on another worker"));
+        }
+      } catch (error) {
+        logger.warn("Job heartbeat failed", { job: job.id, error });
+      }
+    }, Math.max(1000, Math.floor(leaseMs / 3)));
+
+    try {
+      DbService.setJobRun(job.id, this.owner, run.id);
+      if (job.attempts > 1) {
+        run.append({ type: "status", message: `Resuming after an interrupted attempt (attempt ${job.attempts} of ${job.max_attempts})` });
+      }
+      const result = await registration.handler(job.payload, { job, run, signal: lease.signal });
+      if (!DbService.completeJob(job.id, this.owner, result)) {
+        logger.warn("Job finished after losing its lease", { job: job.id, type: job.type });
+      }
+    } catch (error) {
+      const message = error instanceof Error ? error.message : "Unknown error";
+      logger.error("Job failed", { job: job.id, type: job.type, error });
+      run.append(errorEvent(message));
+      DbService.failJob(job.id, this.owner, message);
+    } finally {
+      clearInterval(heartbeat);
+      run.finish();
+      this.claim();
+    }
+  }
+
+  // Resolves once the job is no longer queued or running
+  static async wait(id: number, signal?: AbortSignal): Promise<Job> {
+    while (true) {
+      const job = DbService.getJob(id);
+      if (!job) throw new Error(`Job ${id} not found`);
+      if (!ACTIVE.includes(job.status) || signal?.aborted) return job;
+      await sleep(WAIT_POLL_MS, signal);
+    }
+  }
+
+  // The job's events: a notice while it is queued, then its current attempt's run log (from
+  // `resume.after` when that is the attempt the follower was on, else from the start), moving
+  // on to the next attempt's log if the lease is lost. Ends when the job does.
+  static async *follow(id: number, resume: JobResume = { attempt: 1, after: 0 }, signal?: AbortSignal): AsyncGenerator<RunEventFrame> {
+    let runId: string | null = null;
+    let streamed = false;
+    let announced = false;
+    for (let polls = 0; !signal?.aborted; polls++) {
+      const job = DbService.getJob(id);
+      if (!job) return;
+      if (job.run_id && job.run_id !== runId) {
+        // run_id is cleared on each claim, so a set one belongs to job.attempts
+        const attempt = job.attempts;
+        const after = runId === null && attempt === resume.attempt ? resume.after : 0;
+        const feed = await runEvents.open(job.run_id, after, signal);
+        runId = job.run_id;
+        if (feed) {
+          streamed = true;
+          for await (const frame of feed) yield frame.seq > 0 ? { ...frame, id: `${attempt}-${frame.seq}` } : frame;
+          continue;
+        }
+      }
+      if (!ACTIVE.includes(job.status)) {
+        // Nothing to replay, e.g. the run log passed retention: report the outcome instead
+        if (!streamed) {
+          yield notice(job.status === "succeeded"
+            ? { type: "status", message: `Job ${id} succeeded`, data: { job: id } }
+            : errorEvent(job.error || `Job ${id} ${job.status}`));
+        }
+        return;
+      }
+      // Only once it has waited, so a job that starts right away streams nothing extra
+      if (job.status === "queued" && !announced && polls > 0) {
+        announced = true;
+        yield notice({ type: "status", message: "Queued, waiting for a free worker", data: { job: id } });
+      }
+      await sleep(WAIT_POLL_MS, signal);
+    }
+  }
+}
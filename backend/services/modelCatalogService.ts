@@ -0,0 +1,56 @@
+import { envLimit } from "../utils/concurrency.ts";
+import { sha256Hex } from "../utils/hash.ts";
+
+// The OpenRouter model catalog, fetched at most once per TTL (MODEL_CATALOG_TTL_MS, default
+// 5 minutes) however many tabs poll it. Each snapshot carries a version hashed from the
+// payload, which the model endpoints use as their ETag: a refetch that returns the same
+// catalog keeps the same version, so clients still get 304s.
+
+const CATALOG_URL = "https://openrouter.ai/api/v1/models";
+
+export interface ModelCatalog {
+  models: any[];
+  version: string;
+  fetched_at: number;
+}
+
+export class ModelCatalogService {
+  private static cache: ModelCatalog | null = null;
+  private static inflight: Promise<ModelCatalog> | null = null;
+
+  static clearCache() {
+    this.cache = null;
+  }
+
+  private static ttlMs(): number {
+    return envLimit("MODEL_CATALOG_TTL_MS", 5 * 60_000);
+  }
+
+  static get(apiKey?: string, force = false): Promise<ModelCatalog> {
+    const cached = this.cache;
+    if (!force && cached && Date.now() - cached.fetched_at < this.ttlMs()) return Promise.resolve(cached);
+    return this.inflight ??= this.fetchCatalog(apiKey).finally(() => {
+      this.inflight = null;
+    });
+  }
+
+  private static async fetchCatalog(apiKey?: string): Promise<ModelCatalog> {
+    try {
+      const response = await fetch(CATALOG_URL, {
+        headers: apiKey ? { "Authorization": `Bearer ${apiKey}` } : {},
+      });
+      if (!response.ok) throw new Error(`HTTP error! status: ${response.status}`);
+      const text = await response.text();
+      const models = JSON.parse(text).data || [];
+      this.cache = { models, version: (await sha256Hex(text)).slice(0, 16), fetched_at: Date.now() };
+      return this.cache;
+    } catch (error) {
+      // A stale catalog beats none; it is retried on the next request
+      if (this.cache) {
+        console.warn("Failed to refresh the model catalog, serving the cached one:", error);
+        return this.cache;
+      }
+      throw error;
+    }
+  }
+}
@@ -1,4 +1,32 @@
 import { DbService } from "./dbService.ts";
+import { metrics } from "../utils/metrics.ts";
+import { type Span, tracer } from "../utils/tracing.ts";
+import { logger } from "../utils/logger.ts";
+
+const upstreamDuration = metrics.histogram(
+  "upstream_request_duration_seconds",
+  "Total time of OpenRouter chat completions, by model",
+  ["model", "mode"],
+);
+const upstreamTtft = metrics.histogram("upstream_ttft_seconds", "Time to the first streamed token from OpenRouter, by model", ["model"]);
+const upstreamTps = metrics.histogram(
+  "upstream_tokens_per_second",
+  "Completion tokens per second after the first token, by model",
+  ["model"],
+  [1, 5, 10, 25, 50, 100, 200, 400, 800],
+);
+const upstreamErrors = metrics.counter("upstream_http_errors_total", "OpenRouter responses with status 429 or 5xx, by model", ["model", "status"]);
+
+function countUpstreamError(model: string, status: number) {
+  if (status === 429 || status >= 500) upstreamErrors.labels(model, String(status)).inc();
+}
+
+function startUpstreamSpan(model: string, stream: boolean): Span | null {
+  return tracer.startSpan("openrouter.chat", {
+    kind: "client",
+    attributes: { "gen_ai.system": "openrouter", "gen_ai.request.model": model, "openrouter.stream": stream },
+  });
+}
 
 export interface OpenRouterMessage {
   role: "system" | "user" | "assistant";
@@ -78,6 +106,8 @@ export class OpenRouterService {
       request.stream_options = { include_usage: true };
     }
     const startTime = Date.now();
+    const started = performance.now();
+    const span = tracer.enabled ? startUpstreamSpan(request.model, false) : null;
     
     try {
       const response = await fetch(`${this.baseUrl}/chat/completions`, {
@@ -92,9 +122,12 @@ export class OpenRouterService {
       });
 
       const responseTime = Date.now() - startTime;
+      span?.setAttribute("http.response.status_code", response.status);
 
       if (!response.ok) {
+        countUpstreamError(request.model, response.status);
         const errorText = await response.text();
+        span?.recordError(`HTTP ${response.status}`).end();
         return {
           responseTime,
           response: null,
@@ -103,6 +136,7 @@ export class OpenRouterService {
       }
 
       const data: OpenRouterResponse = await response.json();
+      upstreamDuration.labels(request.model, "single").observeSince(started);
       
       // Store the result in the database
       const prompt = request.messages
@@ -114,6 +148,8 @@ export class OpenRouterService {
       const reasoningText = data.choices[0]?.message?.reasoning_content || "";
       const fullResponse = reasoningText ? `[REASONING]\n${reasoningText}\n\n[ANSWER]\n${responseText}` : responseText;
       
+      span?.setAttribute("gen_ai.usage.output_tokens", data.usage?.completion_tokens).end();
+      
       DbService.createTestResult({
         prompt,
         provider: "OpenRouter",
@@ -131,6 +167,7 @@ export class OpenRouterService {
     } catch (error) {
       const responseTime = Date.now() - startTime;
       const errorMessage = error instanceof Error ? error.message : "Unknown error";
+      span?.recordError(error).end();
       
       // Store the error in the database
       const prompt = request.messages
@@ -171,7 +208,7 @@ export class OpenRouterService {
       const data = await response.json();
       return data.data || [];
     } catch (error) {
-      console.error("Error fetching models:", error);
+      logger.error("Error fetching models", { error });
       return [];
     }
   }
@@ -182,7 +219,7 @@ export class OpenRouterService {
       const models = await service.getModels();
       return models.length > 0;
     } catch (error) {
-      console.error("Connection test failed:", error);
+      logger.error("Connection test failed", { error });
       return false;
     }
   }
@@ -193,6 +230,8 @@ export class OpenRouterService {
     onChunk?: (chunk: StreamChunk) => void
   ): Promise<{ responseTime: number; response: OpenRouterResponse | null; error: string | null }> {
     const startTime = Date.now();
+    const started = performance.now();
+    const span = tracer.enabled ? startUpstreamSpan(request.model, true) : null;
     
     // Ensure streaming is enabled with usage tracking
     const streamingRequest = {
@@ -213,8 +252,11 @@ export class OpenRouterService {
         body: JSON.stringify(streamingRequest),
       });
 
+      span?.addEvent("response_headers", { "http.response.status_code": response.status });
       if (!response.ok) {
+        countUpstreamError(request.model, response.status);
         const errorText = await response.text();
+        span?.recordError(`HTTP ${response.status}`).end();
         return {
           responseTime: Date.now() - startTime,
           response: null,
@@ -224,6 +266,7 @@ export class OpenRouterService {
 
       const reader = response.body?.getReader();
       if (!reader) {
+        span?.recordError("No response body").end();
         return {
           responseTime: Date.now() - startTime,
           response: null,
@@ -235,6 +278,7 @@ export class OpenRouterService {
       let fullReasoningContent = "";
       let finalUsage: any = null;
       let lastChunk: StreamChunk | null = null;
+      let firstTokenAt = 0;
 
       const decoder = new TextDecoder();
       let buffer = "";
@@ -255,6 +299,10 @@ export class OpenRouterService {
             try {
               const chunk: StreamChunk = JSON.parse(data);
               lastChunk = chunk;
+              if (firstTokenAt === 0 && (chunk.choices?.[0]?.delta?.content || chunk.choices?.[0]?.delta?.reasoning_content)) {
+                firstTokenAt = performance.now();
+                span?.addEvent("first_token");
+              }
               
               // Accumulate content
               if (chunk.choices?.[0]?.delta?.content) {
@@ -277,13 +325,22 @@ export class OpenRouterService {
               }
             } catch (e) {
               // Skip malformed chunks
-              console.warn('Skipping malformed chunk:', data);
+              logger.warn('Skipping malformed chunk', { model: request.model, chunk: data });
             }
           }
         }
       }
 
       const responseTime = Date.now() - startTime;
+      const finished = performance.now();
+      upstreamDuration.labels(request.model, "stream").observe((finished - started) / 1000);
+      if (firstTokenAt > 0) {
+        upstreamTtft.labels(request.model).observe((firstTokenAt - started) / 1000);
+        const completionTokens = finalUsage?.completion_tokens;
+        if (completionTokens > 0 && finished > firstTokenAt) {
+          upstreamTps.labels(request.model).observe(completionTokens / ((finished - firstTokenAt) / 1000));
+        }
+      }
       
       // Construct final response
       const finalResponse: OpenRouterResponse = {
@@ -317,6 +374,11 @@ export class OpenRouterService {
         `[REASONING]\n${fullReasoningContent}\n\n[ANSWER]\n${fullContent}` : 
         fullContent;
       
+      span?.setAttributes({
+        "gen_ai.usage.output_tokens": finalUsage?.completion_tokens,
+        "openrouter.ttft_ms": firstTokenAt > 0 ? Math.round(firstTokenAt - started) : undefined,
+      }).end();
+      
       DbService.createTestResult({
         prompt,
         provider: "OpenRouter",
@@ -334,6 +396,7 @@ export class OpenRouterService {
     } catch (error) {
       const responseTime = Date.now() - startTime;
       const errorMessage = error instanceof Error ? error.message : "Unknown error";
+      span?.recordError(error).end();
       
       // Store the error in the database
       const prompt = request.messages
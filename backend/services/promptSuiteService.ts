@@ -0,0 +1,211 @@
+import { DbService } from "./dbService.ts";
+import { OpenRouterService } from "./openRouterService.ts";
+import { SpeedTestService, type SpeedTestRequest, type StreamedCompletion } from "./speedTestService.ts";
+import type { SuiteBatch, SuiteModelAggregate, SuitePrompt, SuitePromptInput } from "../db.ts";
+import { envLimit, Semaphore } from "../utils/concurrency.ts";
+
+// Prompt suites: named prompt lists, imported from JSONL, run as batches against a model list.
+//
+// A batch runs every (prompt, model) cell through the same streaming path as the speed test,
+// at most PROMPT_SUITE_CONCURRENCY cells at a time across all batches on this thread (batches
+// run as "prompt-suite-batch" jobs, one at a time by default). Each finished cell is saved right
+// away, so a batch that is interrupted, or resumed to retry its failed cells, only runs the cells
+// that have not succeeded yet.
+
+type CompletionOverride = (model: string, request: Omit<SpeedTestRequest, "models">) => Promise<StreamedCompletion>;
+
+export interface SuiteBatchProgress {
+  done: number;
+  total: number;
+}
+
+export interface SuiteBatchEvent {
+  type: "batch_start" | "cell_complete" | "batch_complete";
+  message: string;
+  data: Record<string, unknown>;
+}
+
+export const MAX_SUITE_NAME_LENGTH = 200;
+
+// One budget for every batch on this thread, not one per batch
+const cellLimit = new Semaphore(envLimit("PROMPT_SUITE_CONCURRENCY", 8));
+
+function optionalNumber(value: unknown): boolean {
+  return value === undefined || value === null || (typeof value === "number" && Number.isFinite(value) && value >= 0);
+}
+
+// max_tokens of 0 would ask for an empty completion
+function positiveNumber(value: unknown): boolean {
+  return value === undefined || value === null || (typeof value === "number" && Number.isFinite(value) && value > 0);
+}
+
+export class PromptSuiteService {
+  private static completionOverride?: CompletionOverride;
+
+  // Allows tests to stub the LLM call.
+  static setCompletionOverride(override?: CompletionOverride) {
+    this.completionOverride = override;
+  }
+
+  static maxPrompts(): number {
+    return envLimit("PROMPT_SUITE_MAX_PROMPTS", 5000);
+  }
+
+  // Prompts from JSONL: one JSON string, or one { prompt, id?, temperature?, max_tokens? }
+  // object, per line. Blank lines are skipped; errors name their line.
+  static parseJsonl(text: string): { prompts: SuitePromptInput[]; errors: string[] } {
+    const prompts: SuitePromptInput[] = [];
+    const errors: string[] = [];
+    text.split(/\r?\n/).forEach((line, index) => {
+      if (line.trim() === "") return;
+      let value: any;
+      try {
+        value = JSON.parse(line);
+      } catch {
+        errors.push(`line ${index + 1}: not valid JSON`);
+        return;
+      }
+      const prompt = this.promptFrom(value);
+      if (typeof prompt === "string") errors.push(`line ${index + 1}: ${prompt}`);
+      else prompts.push(prompt);
+    });
+    return { prompts, errors };
+  }
+
+  // A prompt from a JSON value, or an error message
+  static promptFrom(value: any): SuitePromptInput | string {
+    if (typeof value === "string") value = { prompt: value };
+    if (!value || typeof value !== "object" || Array.isArray(value)) return "expected a string or an object with a prompt";
+    if (typeof value.prompt !== "string" || value.prompt.trim() === "") return "prompt must be a non-empty string";
+    if (value.id !== undefined && value.id !== null && typeof value.id !== "string" && typeof value.id !== "number") {
+      return "id must be a string or a number";
+    }
+    if (!optionalNumber(value.temperature)) return "temperature must be a non-negative number";
+    if (!positiveNumber(value.max_tokens)) return "max_tokens must be a positive number";
+    return {
+      prompt: value.prompt,
+      external_id: value.id === undefined || value.id === null ? null : String(value.id),
+      temperature: value.temperature ?? null,
+      max_tokens: value.max_tokens ?? null,
+    };
+  }
+
+  // Error message for batch settings that cannot run, or null
+  static invalidBatch(settings: { models?: unknown; temperature?: unknown; max_tokens?: unknown }): string | null {
+    const { models, temperature, max_tokens } = settings;
+    if (!Array.isArray(models) || models.length === 0 || models.some((m) => typeof m !== "string" || m.trim() === "")) {
+      return "models must be a non-empty array of model ids";
+    }
+    if (new Set(models).size !== models.length) return "models must not repeat";
+    if (!optionalNumber(temperature)) return "temperature must be a non-negative number";
+    if (!positiveNumber(max_tokens)) return "max_tokens must be a positive number";
+    return null;
+  }
+
+  // A batch with its progress and per-model aggregates so far
+  static describeBatch(batch: SuiteBatch) {
+    const total = (DbService.getPromptSuite(batch.suite_id)?.prompt_count ?? 0) * batch.models.length;
+    const aggregates = DbService.getSuiteBatchAggregates(batch.id);
+    const done = aggregates.reduce((sum, a) => sum + a.succeeded, 0);
+    const failed = aggregates.reduce((sum, a) => sum + a.failed, 0);
+    const job = batch.job_id === null ? undefined : DbService.getJob(batch.job_id);
+    return {
+      ...batch,
+      progress: { done, failed, total },
+      aggregates,
+      job: job ? { id: job.id, status: job.status, attempts: job.attempts, error: job.error } : null,
+    };
+  }
+
+  // Run the batch's cells that have not succeeded yet; stops starting cells once `signal`
+  // aborts (the job lost its lease and may be running elsewhere)
+  static async runBatch(batchId: number, emit: (event: SuiteBatchEvent) => void, signal?: AbortSignal) {
+    const batch = DbService.getSuiteBatch(batchId);
+    if (!batch) throw new Error(`Batch ${batchId} not found`);
+    const suite = DbService.getPromptSuite(batch.suite_id);
+    if (!suite) throw new Error(`Prompt suite ${batch.suite_id} not found`);
+
+    let service: OpenRouterService | null = null;
+    if (!this.completionOverride) {
+      const apiKey = SpeedTestService.openRouterKey();
+      if (!apiKey) throw new Error("Invalid OpenRouter API key. Please update your API key.");
+      service = new OpenRouterService(apiKey);
+    }
+
+    const prompts = DbService.getSuitePrompts(suite.id);
+    const succeeded = new Set(DbService.getSucceededSuiteCells(batch.id));
+    const progress: SuiteBatchProgress = { done: succeeded.size, total: prompts.length * batch.models.length };
+    DbService.updateSuiteBatch(batch.id, { status: "running", finished: false });
+    emit({
+      type: "batch_start",
+      message: succeeded.size > 0
+        ? `Resuming batch ${batch.id}: ${progress.total - succeeded.size} of ${progress.total} cells left`
+        : `Starting batch ${batch.id}: ${prompts.length} prompts x ${batch.models.length} models`,
+      data: { batchId: batch.id, suite: { id: suite.id, name: suite.name }, models: batch.models, progress: { ...progress } },
+    });
+
+    const running: Promise<void>[] = [];
+    for (const prompt of prompts) {
+      for (const model of batch.models) {
+        if (succeeded.has(`${prompt.id}:${model}`)) continue;
+        const release = await cellLimit.acquire();
+        if (signal?.aborted) {
+          release();
+          break;
+        }
+        running.push(this.runCell(service, batch, prompt, model)
+          .then((aggregate) => {
+            if (aggregate.status === "succeeded") progress.done++;
+            emit({
+              type: "cell_complete",
+              message: `${model} on prompt ${prompt.position + 1}: ${aggregate.status}${aggregate.error ? ` (${aggregate.error})` : ""}`,
+              data: { batchId: batch.id, promptId: prompt.id, position: prompt.position, ...aggregate, progress: { ...progress } },
+            });
+          })
+          .finally(release));
+      }
+      if (signal?.aborted) break;
+    }
+    await Promise.all(running);
+    if (signal?.aborted) return null;
+
+    const aggregates = DbService.getSuiteBatchAggregates(batch.id);
+    const failed = aggregates.reduce((sum, a) => sum + a.failed, 0);
+    DbService.updateSuiteBatch(batch.id, { status: "completed", finished: true });
+    emit({
+      type: "batch_complete",
+      message: `Batch ${batch.id} complete: ${progress.done}/${progress.total} cells succeeded${failed > 0 ? `, ${failed} failed (resume to retry them)` : ""}`,
+      data: { batchId: batch.id, progress: { ...progress }, aggregates },
+    });
+    return { batchId: batch.id, progress, aggregates };
+  }
+
+  // Complete one cell, save it, and return its outcome with its model's aggregate so far
+  private static async runCell(service: OpenRouterService | null, batch: SuiteBatch, prompt: SuitePrompt, model: string) {
+    const request = {
+      prompt: prompt.prompt,
+      temperature: prompt.temperature ?? batch.temperature ?? undefined,
+      max_tokens: prompt.max_tokens ?? batch.max_tokens ?? undefined,
+    };
+    const completion = this.completionOverride
+      ? await this.completionOverride(model, request).catch((error): StreamedCompletion => ({
+        model, content: "", reasoningContent: "", responseTime: 0, latency: null, tokensPerSecond: null, totalTokens: 0,
+        error: error instanceof Error ? error.message : "Unknown error",
+      }))
+      : await SpeedTestService.streamModel(service!, model, request, () => {});
+
+    const cell = {
+      prompt_id: prompt.id,
+      model,
+      status: completion.error ? "failed" as const : "succeeded" as const,
+      response_time_ms: completion.responseTime,
+      latency_ms: completion.latency,
+      tokens_per_second: completion.tokensPerSecond,
+      total_tokens: completion.totalTokens,
+      error: completion.error,
+    };
+    DbService.saveSuiteBatchCell(batch.id, prompt.prompt, { ...cell, response_text: completion.content });
+    const [aggregate] = DbService.getSuiteBatchAggregates(batch.id, model);
+    return { ...cell, aggregate: aggregate as SuiteModelAggregate };
+  }
+}
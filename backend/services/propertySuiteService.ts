@@ -0,0 +1,177 @@
+import { createRng, type PropertySuite } from "../exercism/property.ts";
+import { ISOGRAM_PROPERTY } from "../exercism/isogram/property.ts";
+import { PANGRAM_PROPERTY } from "../exercism/pangram/property.ts";
+import { RAINDROPS_PROPERTY } from "../exercism/raindrops/property.ts";
+import { LEAP_PROPERTY } from "../exercism/leap/property.ts";
+import { ACRONYM_PROPERTY } from "../exercism/acronym/property.ts";
+
+// deno-lint-ignore no-explicit-any
+type AnySuite = PropertySuite<any, any>;
+
+const PROPERTY_SUITES: Record<string, AnySuite> = {
+  isogram: ISOGRAM_PROPERTY,
+  pangram: PANGRAM_PROPERTY,
+  raindrops: RAINDROPS_PROPERTY,
+  leap: LEAP_PROPERTY,
+  acronym: ACRONYM_PROPERTY,
+};
+
+export const MAX_GENERATED_CASES = 100_000;
+const MAX_SHRINK_STEPS = 500;
+const MAX_CACHED_FIXTURES = 32;
+const FIXTURE_VERSION = 1;
+
+// Columnar fixture: inputs[i] maps to expected[i]. Boolean oracles are stored
+// as a "0101..." string, which keeps large fixtures small on disk.
+export interface Fixture {
+  version: number;
+  exerciseId: string;
+  seed: number;
+  count: number;
+  inputs: unknown[];
+  expected: unknown[] | string;
+}
+
+export interface Counterexample {
+  input: unknown;
+  expected: unknown;
+  actual: unknown;
+  shrinkSteps: number;
+}
+
+export interface GeneratedResult {
+  seed: number;
+  passed: number;
+  total: number;
+  counterexample?: Counterexample;
+}
+
+type Solution = (input: unknown) => unknown;
+
+export class PropertySuiteService {
+  private static fixtures = new Map<string, Fixture>();
+
+  static hasSuite(exerciseId: string): boolean {
+    return exerciseId in PROPERTY_SUITES;
+  }
+
+  private static getSuite(exerciseId: string): AnySuite {
+    const suite = PROPERTY_SUITES[exerciseId];
+    if (!suite) throw new Error("Unsupported exercise");
+    return suite;
+  }
+
+  private static fixtureDir(): string {
+    return `${Deno.cwd()}/backend/tmp/exercism/fixtures`;
+  }
+
+  static buildFixture(exerciseId: string, seed: number, count: number): Fixture {
+    const suite = this.getSuite(exerciseId);
+    const rng = createRng(seed);
+    const inputs: unknown[] = new Array(count);
+    const expected: unknown[] = new Array(count);
+    for (let i = 0; i < count; i++) {
+      inputs[i] = suite.generate(rng);
+      expected[i] = suite.reference(inputs[i]);
+    }
+    const allBooleans = expected.every((value) => typeof value === "boolean");
+    return {
+      version: FIXTURE_VERSION,
+      exerciseId,
+      seed,
+      count,
+      inputs,
+      expected: allBooleans ? expected.map((value) => (value ? "1" : "0")).join("") : expected,
+    };
+  }
+
+  // Fixtures are deterministic in (exercise, seed, count): computed once, then served
+  // from memory or from the on-disk cache.
+  static async getFixture(exerciseId: string, seed: number, count: number): Promise<Fixture> {
+    const key = `${exerciseId}-${seed}-${count}`;
+    const cached = this.fixtures.get(key);
+    if (cached) {
+      // Refresh recency
+      this.fixtures.delete(key);
+      this.fixtures.set(key, cached);
+      return cached;
+    }
+
+    const path = `${this.fixtureDir()}/${key}.json`;
+    let fixture: Fixture | undefined;
+    try {
+      const stored = JSON.parse(await Deno.readTextFile(path)) as Fixture;
+      if (stored.version === FIXTURE_VERSION && stored.inputs.length === count) fixture = stored;
+    } catch {
+      // Missing or unreadable, rebuild below
+    }
+    if (!fixture) {
+      fixture = this.buildFixture(exerciseId, seed, count);
+      try {
+        await Deno.mkdir(this.fixtureDir(), { recursive: true });
+        await Deno.writeTextFile(path, JSON.stringify(fixture));
+      } catch (error) {
+        console.warn("Failed to persist property fixture:", error);
+      }
+    }
+
+    this.fixtures.set(key, fixture);
+    if (this.fixtures.size > MAX_CACHED_FIXTURES) {
+      this.fixtures.delete(this.fixtures.keys().next().value!);
+    }
+    return fixture;
+  }
+
+  private static expectedAt(fixture: Fixture, index: number): unknown {
+    return typeof fixture.expected === "string" ? fixture.expected[index] === "1" : fixture.expected[index];
+  }
+
+  private static check(solution: Solution, input: unknown, expected: unknown): { ok: boolean; actual: unknown } {
+    try {
+      const actual = solution(input);
+      return { ok: actual === expected, actual };
+    } catch (e) {
+      return { ok: false, actual: `threw: ${e instanceof Error ? e.message : String(e)}` };
+    }
+  }
+
+  // Greedily walk towards a smaller input that still fails
+  static shrink(exerciseId: string, solution: Solution, input: unknown): Counterexample {
+    const suite = this.getSuite(exerciseId);
+    let current = input;
+    let expected = suite.reference(current);
+    let actual = this.check(solution, current, expected).actual;
+    let steps = 0;
+    outer: while (steps < MAX_SHRINK_STEPS) {
+      for (const candidate of suite.shrink(current)) {
+        const candidateExpected = suite.reference(candidate);
+        const result = this.check(solution, candidate, candidateExpected);
+        if (!result.ok) {
+          current = candidate;
+          expected = candidateExpected;
+          actual = result.actual;
+          steps++;
+          continue outer;
+        }
+      }
+      break;
+    }
+    return { input: current, expected, actual, shrinkSteps: steps };
+  }
+
+  // Run every fixture case against an already imported solution and shrink the first failure
+  static run(exerciseId: string, solution: Solution, fixture: Fixture): GeneratedResult {
+    let passed = 0;
+    let firstFailure = -1;
+    for (let i = 0; i < fixture.count; i++) {
+      if (this.check(solution, fixture.inputs[i], this.expectedAt(fixture, i)).ok) passed++;
+      else if (firstFailure < 0) firstFailure = i;
+    }
+    return {
+      seed: fixture.seed,
+      passed,
+      total: fixture.count,
+      counterexample: firstFailure >= 0 ? this.shrink(exerciseId, solution, fixture.inputs[firstFailure]) : undefined,
+    };
+  }
+}
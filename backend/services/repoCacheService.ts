@@ -0,0 +1,224 @@
+import { sha256Hex } from "../utils/hash.ts";
+import { git } from "../utils/git.ts";
+
+// Local bare mirrors of the repos used by repo tests. Each run materializes its
+// workdir from the mirror (`clone --shared`), so running one repo across many
+// models costs one network fetch instead of one clone per model.
+
+const DEFAULT_MAX_BYTES = 5 * 1024 * 1024 * 1024;
+const DEFAULT_MAX_AGE_DAYS = 14;
+// A mirror fetched this recently is considered fresh for branch/tag refs
+const FETCH_FRESH_MS = 60_000;
+const EVICT_INTERVAL_MS = 10 * 60_000;
+const LAST_USED_FILE = "arena-last-used";
+
+function envNumber(name: string, fallback: number): number {
+  const parsed = Number(Deno.env.get(name));
+  return Number.isFinite(parsed) && parsed > 0 ? parsed : fallback;
+}
+
+export interface MaterializePhase {
+  name: "mirror" | "checkout";
+  start: number; // performance.now()
+  duration_ms: number;
+}
+
+export interface MaterializedRepo {
+  sha: string;
+  cacheHit: boolean; // mirror already existed
+  release: () => void; // call once the workdir has been removed
+  phases: MaterializePhase[]; // mirror clone/fetch, then workdir checkout
+}
+
+export class RepoCacheService {
+  // In-flight clone/fetch per mirror path, so concurrent runs share one network round trip
+  private static inflight = new Map<string, Promise<void>>();
+  private static lastFetched = new Map<string, number>();
+  private static leases = new Map<string, number>();
+  private static lastEviction = 0;
+
+  static cacheDir(): string {
+    return Deno.env.get("REPO_CACHE_DIR") || `${Deno.cwd()}/backend/tmp/repo-cache`;
+  }
+
+  static async mirrorPath(repoUrl: string): Promise<string> {
+    const slug = repoUrl.replace(/\.git$/, "").split(/[/:]/).filter(Boolean).slice(-2).join("-").replace(/[^a-zA-Z0-9_.-]+/g, "_");
+    return `${this.cacheDir()}/${slug}-${(await sha256Hex(repoUrl)).slice(0, 12)}.git`;
+  }
+
+  private static async exists(path: string): Promise<boolean> {
+    try {
+      await Deno.stat(path);
+      return true;
+    } catch {
+      return false;
+    }
+  }
+
+  // Run `fn` unless the same mirror already has an operation in flight, in which case wait for that one
+  private static coalesce(mirror: string, fn: () => Promise<void>): Promise<void> {
+    const existing = this.inflight.get(mirror);
+    if (existing) return existing;
+    const op = fn().finally(() => this.inflight.delete(mirror));
+    this.inflight.set(mirror, op);
+    return op;
+  }
+
+  private static async ensureMirror(repoUrl: string, mirror: string): Promise<boolean> {
+    // Wait out any clone/fetch another run already started
+    await this.inflight.get(mirror)?.catch(() => {});
+    if (await this.exists(`${mirror}/HEAD`)) return true;
+    await this.coalesce(mirror, async () => {
+      if (await this.exists(`${mirror}/HEAD`)) return;
+      await Deno.mkdir(this.cacheDir(), { recursive: true });
+      const tmp = `${mirror}.tmp-${crypto.randomUUID().slice(0, 8)}`;
+      const res = await git(["clone", "--mirror", repoUrl, tmp]);
+      if (!res.success) {
+        await Deno.remove(tmp, { recursive: true }).catch(() => {});
+        throw new Error(`Git clone failed: ${res.stderr.trim()}`);
+      }
+      // Rename into place so a half-written mirror is never picked up
+      await Deno.rename(tmp, mirror);
+      this.lastFetched.set(mirror, Date.now());
+    });
+    return false;
+  }
+
+  private static fetch(mirror: string, ref?: string, signal?: AbortSignal): Promise<void> {
+    // Specific refs (e.g. SHAs outside advertised refs) are not coalesced with a plain fetch
+    if (ref) {
+      return git(["fetch", "origin", ref], { cwd: mirror, signal }).then((res) => {
+        if (!res.success) throw new Error(`Git fetch failed for ref '${ref}': ${res.stderr.trim()}`);
+      });
+    }
+    return this.coalesce(mirror, async () => {
+      const res = await git(["fetch", "--prune", "origin"], { cwd: mirror });
+      if (!res.success) throw new Error(`Git fetch failed: ${res.stderr.trim()}`);
+      this.lastFetched.set(mirror, Date.now());
+    });
+  }
+
+  private static async resolve(mirror: string, ref: string): Promise<string | undefined> {
+    const res = await git(["rev-parse", "--verify", "--quiet", `${ref}^{commit}`], { cwd: mirror });
+    return res.success && res.stdout.trim() ? res.stdout.trim() : undefined;
+  }
+
+  private static isSha(ref: string): boolean {
+    return /^[0-9a-f]{7,40}$/i.test(ref);
+  }
+
+  // Check out `ref` of `repoUrl` into `workdir` (which must not exist yet) from the local mirror.
+  // `signal` kills this run's own git commands; the shared mirror clone/fetch is left running
+  // for the other runs waiting on it.
+  static async materialize(repoUrl: string, ref: string, workdir: string, signal?: AbortSignal): Promise<MaterializedRepo> {
+    const mirror = await this.mirrorPath(repoUrl);
+    this.leases.set(mirror, (this.leases.get(mirror) ?? 0) + 1);
+    let released = false;
+    const release = () => {
+      if (released) return;
+      released = true;
+      const count = (this.leases.get(mirror) ?? 1) - 1;
+      if (count > 0) this.leases.set(mirror, count);
+      else this.leases.delete(mirror);
+    };
+
+    try {
+      const mirrorStart = performance.now();
+      const cacheHit = await this.ensureMirror(repoUrl, mirror);
+
+      // Commits never move, so a SHA already in the mirror needs no network at all.
+      // Branches and tags are refreshed unless a fetch just happened.
+      let sha = this.isSha(ref) ? await this.resolve(mirror, ref) : undefined;
+      if (!sha) {
+        if (cacheHit && Date.now() - (this.lastFetched.get(mirror) ?? 0) > FETCH_FRESH_MS) {
+          await this.fetch(mirror);
+        }
+        sha = await this.resolve(mirror, ref);
+      }
+      if (!sha) {
+        await this.fetch(mirror, ref, signal);
+        sha = await this.resolve(mirror, "FETCH_HEAD");
+      }
+      if (!sha) throw new Error(`Git checkout failed for ref '${ref}': unknown ref`);
+      // The shared clone/fetch ignores `signal`, so check it before doing per-run work
+      signal?.throwIfAborted();
+      const checkoutStart = performance.now();
+      const phases: MaterializePhase[] = [{ name: "mirror", start: mirrorStart, duration_ms: checkoutStart - mirrorStart }];
+
+      const clone = await git(["clone", "--shared", "--no-checkout", "--quiet", mirror, workdir], { signal });
+      if (!clone.success) throw new Error(`Git clone failed: ${clone.stderr.trim()}`);
+      const checkout = await git(["checkout", "--quiet", "--detach", sha], { cwd: workdir, signal });
+      if (!checkout.success) throw new Error(`Git checkout failed for ref '${ref}': ${checkout.stderr.trim()}`);
+      // Tools that look at the remote should see the real upstream, not the cache
+      await git(["remote", "set-url", "origin", repoUrl], { cwd: workdir });
+      phases.push({ name: "checkout", start: checkoutStart, duration_ms: performance.now() - checkoutStart });
+
+      await Deno.writeTextFile(`${mirror}/${LAST_USED_FILE}`, String(Date.now())).catch(() => {});
+      // A caller that already gave up would never release the lease
+      signal?.throwIfAborted();
+      return { sha, cacheHit, release, phases };
+    } catch (e) {
+      release();
+      throw e;
+    }
+  }
+
+  private static async directorySize(path: string): Promise<number> {
+    let total = 0;
+    for await (const entry of Deno.readDir(path)) {
+      const child = `${path}/${entry.name}`;
+      if (entry.isDirectory) total += await this.directorySize(child);
+      else if (entry.isFile) total += (await Deno.stat(child)).size;
+    }
+    return total;
+  }
+
+  private static async lastUsed(mirror: string): Promise<number> {
+    try {
+      return Number(await Deno.readTextFile(`${mirror}/${LAST_USED_FILE}`)) || 0;
+    } catch {
+      return (await Deno.stat(mirror)).mtime?.getTime() ?? 0;
+    }
+  }
+
+  // Drop mirrors unused for longer than REPO_CACHE_MAX_AGE_DAYS, then the least recently
+  // used ones until the cache fits in REPO_CACHE_MAX_BYTES. Mirrors in use are never touched.
+  static async evict(): Promise<{ removed: string[]; totalBytes: number }> {
+    const maxBytes = envNumber("REPO_CACHE_MAX_BYTES", DEFAULT_MAX_BYTES);
+    const maxAgeMs = envNumber("REPO_CACHE_MAX_AGE_DAYS", DEFAULT_MAX_AGE_DAYS) * 24 * 60 * 60_000;
+    const dir = this.cacheDir();
+    if (!(await this.exists(dir))) return { removed: [], totalBytes: 0 };
+
+    const mirrors: Array<{ path: string; bytes: number; lastUsed: number }> = [];
+    for await (const entry of Deno.readDir(dir)) {
+      if (!entry.isDirectory || !entry.name.endsWith(".git")) continue;
+      const path = `${dir}/${entry.name}`;
+      mirrors.push({ path, bytes: await this.directorySize(path), lastUsed: await this.lastUsed(path) });
+    }
+
+    let totalBytes = mirrors.reduce((sum, m) => sum + m.bytes, 0);
+    const removed: string[] = [];
+    const now = Date.now();
+    mirrors.sort((a, b) => a.lastUsed - b.lastUsed);
+    for (const mirror of mirrors) {
+      if (this.leases.has(mirror.path) || this.inflight.has(mirror.path)) continue;
+      if (now - mirror.lastUsed <= maxAgeMs && totalBytes <= maxBytes) continue;
+      try {
+        await Deno.remove(mirror.path, { recursive: true });
+        this.lastFetched.delete(mirror.path);
+        totalBytes -= mirror.bytes;
+        removed.push(mirror.path);
+      } catch (error) {
+        console.warn(`Failed to evict repo mirror ${mirror.path}:`, error);
+      }
+    }
+    return { removed, totalBytes };
+  }
+
+  // Eviction walks the whole cache, so only do it every EVICT_INTERVAL_MS
+  static evictInBackground(): void {
+    if (Date.now() - this.lastEviction < EVICT_INTERVAL_MS) return;
+    this.lastEviction = Date.now();
+    this.evict().catch((error) => console.warn("Repo cache eviction failed:", error));
+  }
+}
@@ -0,0 +1,319 @@
+import { envLimit, mapWithConcurrency } from "../utils/concurrency.ts";
+import { gitOutput } from "../utils/git.ts";
+
+// Repository context for tools that get the code in their prompt (OpenRouter Direct).
+// Files come from `git ls-files`, so .gitignore is respected. They are read with a
+// bounded pool and ranked against the prompt by path and identifier overlap, with a
+// boost for files that ranked files import. The best ones are packed into a token
+// budget. File contents are cached per HEAD commit, so a second iteration or another
+// model on the same ref only re-reads the files that changed since.
+
+const SOURCE_EXTENSIONS = new Set([
+  ".ts", ".tsx", ".js", ".jsx", ".mjs", ".cjs", ".py", ".rs", ".go", ".java", ".kt", ".swift",
+  ".c", ".h", ".cpp", ".hpp", ".cc", ".cs", ".rb", ".php", ".scala", ".ex", ".exs",
+]);
+const JS_EXTENSIONS = [".ts", ".tsx", ".js", ".jsx", ".mjs", ".cjs"];
+const SKIP_DIRS = new Set(["node_modules", "__pycache__", "venv", ".venv", ".git", "vendor", "dist", "build", "target"]);
+const TEST_DIRS = new Set(["test", "tests", "__tests__", "spec", "specs", "testdata", "__mocks__"]);
+const MAX_FILE_BYTES = 256 * 1024;
+const MAX_TREE_LINES = 400;
+const MAX_CACHED_COMMITS = 8;
+const MAX_IDENTIFIERS = 2000;
+const STOPWORDS = new Set([
+  "the", "and", "for", "with", "that", "this", "from", "are", "was", "not", "but", "all", "any", "can", "should",
+  "must", "when", "then", "than", "into", "have", "has", "use", "using", "make", "made", "each", "which", "will",
+  "function", "return", "const", "let", "var", "class", "import", "export", "def", "self", "true", "false", "null",
+  "test", "tests", "file", "files", "code", "please", "implement", "add", "fix", "new",
+]);
+
+export interface IndexedFile {
+  path: string;
+  content: string;
+  identifiers: Set<string>;
+  imports: string[]; // raw specifiers; resolved against the file list when ranking
+}
+
+export interface RepoContext {
+  tree: string;
+  context: string; // packed file contents
+  files: string[]; // paths included in `context`, best first
+  tokens: number; // estimated tokens of tree + context
+  indexedFiles: number;
+  reusedFiles: number; // served from the per-commit cache
+}
+
+export function estimateTokens(text: string): number {
+  return Math.ceil(text.length / 4);
+}
+
+function extname(path: string): string {
+  const base = path.slice(path.lastIndexOf("/") + 1);
+  const dot = base.lastIndexOf(".");
+  return dot > 0 ? base.slice(dot) : "";
+}
+
+function dirname(path: string): string {
+  const slash = path.lastIndexOf("/");
+  return slash === -1 ? "" : path.slice(0, slash);
+}
+
+function normalize(path: string): string {
+  const out: string[] = [];
+  for (const part of path.split("/")) {
+    if (!part || part === ".") continue;
+    if (part === "..") out.pop();
+    else out.push(part);
+  }
+  return out.join("/");
+}
+
+// Tests are never shown to the model; the benchmark depends on it
+export function isTestPath(path: string): boolean {
+  const parts = path.toLowerCase().split("/");
+  const name = parts.pop() ?? "";
+  return parts.some((p) => TEST_DIRS.has(p)) || name.includes("test") || name.includes("spec");
+}
+
+// Lowercased words of an identifier-ish text, with camelCase and snake_case split apart
+export function terms(text: string): string[] {
+  const words: string[] = [];
+  for (const token of text.match(/[A-Za-z_][A-Za-z0-9_]*/g) ?? []) {
+    const lower = token.toLowerCase();
+    if (lower.length >= 3) words.push(lower);
+    for (const part of token.split(/_|(?<=[a-z0-9])(?=[A-Z])/)) {
+      const p = part.toLowerCase();
+      if (p.length >= 3 && p !== lower) words.push(p);
+    }
+  }
+  return words;
+}
+
+function extractImports(path: string, content: string): string[] {
+  const imports: string[] = [];
+  const ext = extname(path);
+  if (JS_EXTENSIONS.includes(ext)) {
+    for (const m of content.matchAll(/(?:import|export)\s[^'"]*?from\s*['"]([^'"]+)['"]|(?:require|import)\(\s*['"]([^'"]+)['"]\s*\)/g)) {
+      imports.push(m[1] ?? m[2]);
+    }
+  } else if (ext === ".py") {
+    for (const m of content.matchAll(/^\s*(?:from\s+(\.*[\w.]*)\s+import|import\s+([\w.]+))/gm)) {
+      imports.push(m[1] ?? m[2]);
+    }
+  }
+  return imports;
+}
+
+// Map an import specifier to a file in the repo, if it points to one
+function resolveImport(from: string, spec: string, files: Set<string>): string | undefined {
+  if (extname(from) === ".py") {
+    const dots = spec.match(/^\.*/)![0].length;
+    let base = "";
+    if (dots > 0) {
+      base = dirname(from);
+      for (let i = 1; i < dots; i++) base = dirname(base);
+    }
+    const module = spec.slice(dots).replace(/\./g, "/");
+    const stem = normalize(`${base}/${module}`);
+    return [`${stem}.py`, `${stem}/__init__.py`].find((c) => files.has(c));
+  }
+  if (!spec.startsWith(".")) return undefined;
+  const stem = normalize(`${dirname(from)}/${spec}`);
+  const candidates = [stem, ...JS_EXTENSIONS.map((e) => stem + e), ...JS_EXTENSIONS.map((e) => `${stem}/index${e}`)];
+  // TS sources often import "./x.js" that exists as x.ts
+  if (JS_EXTENSIONS.includes(extname(stem))) {
+    const bare = stem.slice(0, -extname(stem).length);
+    candidates.push(...JS_EXTENSIONS.map((e) => bare + e));
+  }
+  return candidates.find((c) => files.has(c));
+}
+
+export class RepoIndexService {
+  // HEAD commit -> path -> file as committed. LRU by insertion order.
+  private static cache = new Map<string, Map<string, IndexedFile>>();
+
+  static clearCache() {
+    this.cache.clear();
+  }
+
+  private static commitCache(sha: string): Map<string, IndexedFile> {
+    let files = this.cache.get(sha);
+    if (files) {
+      this.cache.delete(sha);
+    } else {
+      files = new Map();
+      if (this.cache.size >= MAX_CACHED_COMMITS) this.cache.delete(this.cache.keys().next().value!);
+    }
+    this.cache.set(sha, files);
+    return files;
+  }
+
+  // Tracked plus untracked-but-not-ignored files; falls back to a directory walk outside git
+  private static async listFiles(workdir: string): Promise<string[]> {
+    const listed = await gitOutput(["ls-files", "-z", "--cached", "--others", "--exclude-standard"], workdir);
+    // node_modules is installed into the workdir and is not always ignored
+    if (listed !== null) {
+      return [...new Set(listed.split("\0"))].filter((p) => p && !p.split("/").some((d) => SKIP_DIRS.has(d)));
+    }
+
+    const files: string[] = [];
+    const walk = async (rel: string) => {
+      for await (const entry of Deno.readDir(rel ? `${workdir}/${rel}` : workdir)) {
+        if (entry.name.startsWith(".") || SKIP_DIRS.has(entry.name)) continue;
+        const path = rel ? `${rel}/${entry.name}` : entry.name;
+        if (entry.isDirectory) await walk(path);
+        else if (entry.isFile) files.push(path);
+      }
+    };
+    await walk("").catch(() => {});
+    return files;
+  }
+
+  // Paths whose working-tree content differs from HEAD (modified, added or untracked)
+  private static async dirtyPaths(workdir: string): Promise<Set<string>> {
+    const status = await gitOutput(["status", "--porcelain", "-z", "--untracked-files=all"], workdir);
+    const dirty = new Set<string>();
+    if (!status) return dirty;
+    const entries = status.split("\0");
+    for (let i = 0; i < entries.length; i++) {
+      const entry = entries[i];
+      if (entry.length < 4) continue;
+      dirty.add(entry.slice(3));
+      // Renames and copies are followed by the original path
+      if (entry[0] === "R" || entry[0] === "C") i++;
+    }
+    return dirty;
+  }
+
+  private static async readFile(workdir: string, path: string): Promise<IndexedFile | null> {
+    try {
+      const stat = await Deno.stat(`${workdir}/${path}`);
+      if (!stat.isFile || stat.size > MAX_FILE_BYTES) return null;
+      const content = await Deno.readTextFile(`${workdir}/${path}`);
+      if (content.includes("\0")) return null;
+      const identifiers = new Set<string>();
+      for (const term of terms(content)) {
+        identifiers.add(term);
+        if (identifiers.size >= MAX_IDENTIFIERS) break;
+      }
+      return { path, content, identifiers, imports: extractImports(path, content) };
+    } catch {
+      return null;
+    }
+  }
+
+  // Index the non-test source files in `workdir`, reusing cached contents for files
+  // unchanged since HEAD
+  static async index(workdir: string): Promise<{ files: IndexedFile[]; allPaths: string[]; reused: number }> {
+    const [allPaths, dirty, head] = await Promise.all([
+      this.listFiles(workdir),
+      this.dirtyPaths(workdir),
+      gitOutput(["rev-parse", "HEAD"], workdir),
+    ]);
+    const cached = head ? this.commitCache(head.trim()) : new Map<string, IndexedFile>();
+    const sources = allPaths.filter((p) => SOURCE_EXTENSIONS.has(extname(p)) && !isTestPath(p));
+
+    let reused = 0;
+    const concurrency = envLimit("REPO_INDEX_READ_CONCURRENCY", 32);
+    const files = await mapWithConcurrency(sources, concurrency, async (path) => {
+      const clean = head !== null && !dirty.has(path);
+      const hit = clean ? cached.get(path) : undefined;
+      if (hit) {
+        reused++;
+        return hit;
+      }
+      const file = await this.readFile(workdir, path);
+      if (file && clean) cached.set(path, file);
+      return file;
+    });
+    return { files: files.filter((f): f is IndexedFile => f !== null), allPaths, reused };
+  }
+
+  // Score files against the prompt: rare prompt terms count more (idf), path hits count
+  // most, and files imported by a relevant file inherit part of its score
+  static rank(files: IndexedFile[], prompt: string): Array<{ file: IndexedFile; score: number }> {
+    const queryTerms = [...new Set(terms(prompt))].filter((t) => !STOPWORDS.has(t));
+    const n = files.length;
+    const weight = new Map<string, number>();
+    for (const term of queryTerms) {
+      const df = files.reduce((count, f) => count + (f.identifiers.has(term) ? 1 : 0), 0);
+      weight.set(term, Math.log(1 + n / (1 + df)));
+    }
+
+    const scores = new Map<string, number>();
+    for (const file of files) {
+      const pathTerms = new Set(terms(file.path));
+      let score = 0;
+      for (const term of queryTerms) {
+        const w = weight.get(term)!;
+        if (pathTerms.has(term)) score += 3 * w;
+        if (file.identifiers.has(term)) score += w;
+      }
+      const base = file.path.slice(file.path.lastIndexOf("/") + 1).replace(/\.[^.]+$/, "");
+      if (["index", "main", "lib", "mod", "app", "__init__"].includes(base)) score += 0.5;
+      // Prefer shallow files a little, and do not let huge files win on volume alone
+      score -= file.path.split("/").length * 0.05 + Math.log10(1 + file.content.length) * 0.05;
+      scores.set(file.path, score);
+    }
+
+    const paths = new Set(files.map((f) => f.path));
+    const boosts = new Map<string, number>();
+    for (const file of files) {
+      const score = scores.get(file.path)!;
+      if (score <= 0) continue;
+      for (const spec of file.imports) {
+        const target = resolveImport(file.path, spec, paths);
+        if (target && target !== file.path) boosts.set(target, Math.max(boosts.get(target) ?? 0, score * 0.5));
+      }
+    }
+
+    return files
+      .map((file) => ({ file, score: scores.get(file.path)! + (boosts.get(file.path) ?? 0) }))
+      .sort((a, b) => b.score - a.score || a.file.path.localeCompare(b.file.path));
+  }
+
+  private static buildTree(paths: string[]): string {
+    const sorted = [...paths].sort();
+    const lines = sorted.slice(0, MAX_TREE_LINES);
+    if (sorted.length > lines.length) lines.push(`... (${sorted.length - lines.length} more files)`);
+    return lines.join("\n");
+  }
+
+  // Tree plus the highest ranked files that fit in `tokenBudget` (REPO_CONTEXT_TOKENS, default 12000)
+  static async buildContext(workdir: string, prompt: string, tokenBudget?: number): Promise<RepoContext> {
+    const budget = tokenBudget ?? envLimit("REPO_CONTEXT_TOKENS", 12_000);
+    const { files, allPaths, reused } = await this.index(workdir);
+    const tree = this.buildTree(allPaths);
+
+    let remaining = budget - estimateTokens(tree);
+    const parts: string[] = [];
+    const included: string[] = [];
+    for (const { file } of this.rank(files, prompt)) {
+      if (remaining < 200) break;
+      const header = `--- ${file.path} ---\n`;
+      const cost = estimateTokens(header + file.content);
+      if (cost <= remaining) {
+        parts.push(`${header}${file.content}\n`);
+        remaining -= cost;
+      } else if (included.length === 0 || remaining >= 1000) {
+        // Keep the head of a file that does not fit, cut at a line boundary
+        const chars = (remaining - estimateTokens(header) - 10) * 4;
+        const head = file.content.slice(0, file.content.lastIndexOf("\n", chars) + 1 || chars);
+        parts.push(`${header}${head}... (truncated)\n`);
+        remaining -= estimateTokens(header + head) + 4;
+      } else {
+        continue;
+      }
+      included.push(file.path);
+    }
+
+    const context = parts.join("\n");
+    return {
+      tree,
+      context,
+      files: included,
+      tokens: budget - remaining,
+      indexedFiles: files.length,
+      reusedFiles: reused,
+    };
+  }
+}
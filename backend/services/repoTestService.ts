@@ -1,5 +1,19 @@
 import { DbService } from "./dbService.ts";
 import { OpenRouterService } from "./openRouterService.ts";
+import { type MaterializePhase, RepoCacheService } from "./repoCacheService.ts";
+import { type RepoContext, RepoIndexService } from "./repoIndexService.ts";
+import { ToolProbeService } from "./toolProbeService.ts";
+import { DepCacheService, type PreparedDependencies } from "./depCacheService.ts";
+import { envLimit, Semaphore } from "../utils/concurrency.ts";
+import { copyTree } from "../utils/fsCopy.ts";
+import { type OutputDelta, type ResourceLimits, runStreaming } from "../utils/subprocess.ts";
+import { git } from "../utils/git.ts";
+import { type RepoTestLimits, RepoTestTimeoutError, RunBudget } from "./runBudget.ts";
+import { type Span, SpanRecorder } from "../utils/spans.ts";
+import { gzip, gunzip } from "../utils/compression.ts";
+import { metrics } from "../utils/metrics.ts";
+import { WorkdirSnapshot } from "./workdirSnapshot.ts";
+import { StdoutReportParser, type TestCaseResult, type TestReport, TestReportService } from "./testReportService.ts";
 
 export interface CodingTool {
   id: string;
@@ -13,6 +27,8 @@ export interface CodingTool {
   apiKeyEnvVar?: string;
 }
 
+type CodingToolOverride = (tool: CodingTool, model: string, prompt: string, workdir: string) => Promise<string>;
+
 export const CODING_TOOLS: CodingTool[] = [
   {
     id: "aider",
@@ -50,24 +66,6 @@ export const CODING_TOOLS: CodingTool[] = [
   },
 ];
 
-// Check if a CLI tool is installed and available
-async function checkToolAvailable(command: string[]): Promise<boolean> {
-  if (command.length === 0) return true; // OpenRouter Direct is always available
-  
-  const toolName = command[0];
-  try {
-    const cmd = new Deno.Command(toolName, {
-      args: ["--version"],
-      stdout: "piped",
-      stderr: "piped",
-    });
-    const result = await cmd.output();
-    return result.success;
-  } catch {
-    return false;
-  }
-}
-
 export interface ToolAvailability {
   id: string;
   name: string;
@@ -75,6 +73,8 @@ export interface ToolAvailability {
   available: boolean;
   apiKeyEnvVar?: string;
   apiKeyConfigured?: boolean;
+  path?: string | null;
+  version?: string | null;
 }
 
 export interface RepoTestRequest {
@@ -84,8 +84,34 @@ export interface RepoTestRequest {
   test_command: string;    // e.g. "npm test", "pytest", "deno test"
   tool: string;            // coding tool id
   model: string;           // model identifier
+  limits?: RepoTestLimits; // per-phase timeouts, total budget, CPU/memory caps
+  iterations?: number;     // 1..MAX_ITERATIONS, default DEFAULT_ITERATIONS
+  strategy?: IterationStrategy;
+  incremental_tests?: IncrementalTestMode;
 }
 
+// refine: each iteration continues from the previous one, with its test failures in the prompt.
+// best_of_n: each iteration is an independent attempt from the post-install baseline; the best one counts.
+export type IterationStrategy = "refine" | "best_of_n";
+export const ITERATION_STRATEGIES: IterationStrategy[] = ["refine", "best_of_n"];
+
+// How refine iterations after the first run tests. off: always the full suite. failed_first:
+// the previous iteration's failing tests, then the full suite only if they all pass; the last
+// iteration always runs the full suite, so the run's totals cover all of it.
+// failed_only: just the previous failures, never the full suite; the run's totals then cover
+// only that subset, and final_test_scope says so.
+export type IncrementalTestMode = "off" | "failed_first" | "failed_only";
+export const INCREMENTAL_TEST_MODES: IncrementalTestMode[] = ["off", "failed_first", "failed_only"];
+
+// Re-run of the previous iteration's failing tests
+export interface FocusedTestRun {
+  command: string;
+  exit_code: number;
+  passed: number;
+  failed: number;
+  total: number;
+  duration_ms: number;
+}
 export interface IterationResult {
   iteration: number;
   tool_output: string;
@@ -96,6 +122,12 @@ export interface IterationResult {
   tests_failed: number;
   tests_total: number;
   duration_ms: number;
+  report_format: string | null; // structured report the counts came from; null means scraped from output
+  test_cases: TestCaseResult[]; // failing cases first, capped at MAX_CASES_IN_RESULT
+  files_changed: number | null; // vs. the baseline; the diff itself is in repo_test_iterations
+  diff_bytes: number | null;
+  test_scope: "full" | "failed"; // whether the tests_* counts cover the full suite or only the re-run failures
+  failed_first: FocusedTestRun | null;
 }
 
 export interface RepoTestResult {
@@ -107,116 +139,364 @@ export interface RepoTestResult {
   tool: string;
   model: string;
   status: "success" | "partial" | "fail" | "error";
+  strategy: IterationStrategy;
   iterations: IterationResult[];
+  best_iteration: number; // the iteration the final_* counts come from
   clone_duration_ms: number;
+  install_duration_ms: number;
   total_duration_ms: number;
+  spans: Span[]; // timing waterfall: clone > mirror/checkout, install, snapshot, then restore, prompt_build, tool, test_failed > parse, test > parse, diff per iteration
   final_tests_passed: number;
   final_tests_failed: number;
   final_tests_total: number;
+  // "failed" when the final_* counts cover only re-run failures (incremental_tests: failed_only)
+  final_test_scope: "full" | "failed";
   error?: string;
 }
 
 type ProgressCallback = (event: {
-  type: "status" | "clone" | "iteration_start" | "tool_output" | "test_result" | "complete" | "error";
+  type: "status" | "clone" | "install" | "iteration_start" | "tool_output" | "test_output" | "test_result" | "span" | "complete" | "error";
   message: string;
   data?: any;
 }) => void;
 
-const MAX_ITERATIONS = 2;
+export interface PreparedWorkspace {
+  workdir: string;
+  env: Record<string, string>; // extra env for tool and test commands
+  cloneDurationMs: number;
+  installDurationMs: number;
+  spans: Span[]; // preparation spans, relative to spanOrigin
+  spanOrigin: number;
+  dispose: () => Promise<void>;
+}
+
+export interface MatrixPair {
+  tool: string;
+  model: string;
+}
+
+export interface MatrixRequest {
+  repo_url: string;
+  ref: string;
+  prompt: string;
+  test_command: string;
+  pairs: MatrixPair[];
+  concurrency?: number; // further caps the scheduler
+  limits?: RepoTestLimits; // the total budget of each pair starts when the pair does
+  iterations?: number;
+  strategy?: IterationStrategy;
+  incremental_tests?: IncrementalTestMode;
+}
+
+export interface MatrixPairTag {
+  index: number;
+  tool: string;
+  model: string;
+}
+
+export interface MatrixPairResult extends MatrixPairTag {
+  runId: number;
+  result: RepoTestResult | null;
+  error: string | null;
+  duration_ms: number;
+}
+
+// `pair` is null for events about the shared workspace (clone, install)
+type MatrixProgressCallback = (pair: MatrixPairTag | null, event: Parameters<ProgressCallback>[0]) => void;
+
+const DEFAULT_ITERATIONS = 2;
+export const MAX_ITERATIONS = 10;
+// Every case is stored in repo_test_cases; results and SSE events carry at most this many
+const MAX_CASES_IN_RESULT = 200;
+
+const phaseDuration = metrics.histogram(
+  "repo_test_phase_duration_seconds",
+  "Repo test phases (clone, install, tool, test, ...) as recorded in run spans",
+  ["phase"],
+  [0.1, 0.5, 1, 5, 10, 30, 60, 120, 300, 600, 1800],
+);
+
+function observePhase(span: Span) {
+  phaseDuration.labels(span.name).observe(span.duration_ms / 1000);
+}
 
 export class RepoTestService {
+  private static codingToolOverride?: CodingToolOverride;
 
-  static async listTools(): Promise<ToolAvailability[]> {
-    const apiKeyRecord = DbService.getApiKey("OPENROUTER_API_KEY", "OpenRouter");
-    const openRouterKeyConfigured = !!apiKeyRecord?.key_value;
+  // Allows tests to stub the coding tool, so they do not depend on what is installed
+  static setCodingToolOverride(override?: CodingToolOverride) {
+    this.codingToolOverride = override;
+  }
 
-    const tools: ToolAvailability[] = [];
+  // Binaries are probed concurrently and cached by ToolProbeService; `refresh` forces a re-probe
+  static async listTools(refresh = false): Promise<ToolAvailability[]> {
+    const probes = await ToolProbeService.probeAll(
+      CODING_TOOLS.filter((t) => t.command.length > 0).map((t) => t.command[0]),
+      refresh,
+    );
+
+    // One query for every key instead of one per tool
+    const configuredKeys = new Set(
+      DbService.getApiKeys().filter((k) => k.key_value).map((k) => `${k.provider}\0${k.key_name}`),
+    );
+    const hasKey = (keyName: string, provider: string) => configuredKeys.has(`${provider}\0${keyName}`);
+    const openRouterKeyConfigured = hasKey("OPENROUTER_API_KEY", "OpenRouter");
 
-    for (const tool of CODING_TOOLS) {
-      const available = tool.id === "openrouter-direct" 
-        ? openRouterKeyConfigured 
-        : await checkToolAvailable(tool.command);
+    return CODING_TOOLS.map((tool) => {
+      const probe = tool.command.length > 0 ? probes.get(tool.command[0]) : undefined;
+      const available = tool.id === "openrouter-direct" ? openRouterKeyConfigured : probe?.available ?? false;
 
       let apiKeyConfigured: boolean | undefined;
       if (tool.apiKeyEnvVar === "OPENROUTER_API_KEY") {
         apiKeyConfigured = openRouterKeyConfigured;
       } else if (tool.apiKeyEnvVar) {
-        const key = DbService.getApiKey(tool.apiKeyEnvVar, tool.name);
-        apiKeyConfigured = !!key?.key_value;
+        apiKeyConfigured = hasKey(tool.apiKeyEnvVar, tool.name);
       }
 
-      tools.push({
+      return {
         id: tool.id,
         name: tool.name,
         description: tool.description,
         available,
         apiKeyEnvVar: tool.apiKeyEnvVar,
         apiKeyConfigured,
-      });
-    }
-
-    return tools;
+        path: probe?.path ?? null,
+        version: probe?.version ?? null,
+      };
+    });
   }
 
-  static async run(request: RepoTestRequest, onProgress?: ProgressCallback): Promise<RepoTestResult> {
-    const totalStart = Date.now();
-    const tool = CODING_TOOLS.find(t => t.id === request.tool);
-    if (!tool) throw new Error(`Unknown tool: ${request.tool}`);
+  private static getTool(id: string): CodingTool {
+    const tool = CODING_TOOLS.find(t => t.id === id);
+    if (!tool) throw new Error(`Unknown tool: ${id}`);
+    return tool;
+  }
 
-    // Create DB record
-    const runId = DbService.saveRepoTestRun({
+  private static createRunRecord(request: RepoTestRequest, status: string): number {
+    return DbService.saveRepoTestRun({
       repo_url: request.repo_url,
       ref: request.ref,
       prompt: request.prompt,
       test_command: request.test_command,
       tool: request.tool,
       model: request.model,
-      status: "running",
+      status,
     });
+  }
+
+  private static failRun(runId: number, e: unknown, startedAt: number, onProgress?: ProgressCallback) {
+    const error = e instanceof Error ? e.message : String(e);
+    if (e instanceof RepoTestTimeoutError) {
+      DbService.updateRepoTestRun(runId, { status: "timeout", timeout_phase: e.phase, error, total_duration_ms: Date.now() - startedAt });
+      onProgress?.({ type: "error", message: error, data: { status: "timeout", phase: e.phase, timeout_ms: e.timeoutMs } });
+      return;
+    }
+    DbService.updateRepoTestRun(runId, { status: "error", error, total_duration_ms: Date.now() - startedAt });
+    onProgress?.({ type: "error", message: error });
+  }
+
+  // `signal` cancels the run: the running phase's processes are killed and the run is failed
+  static async run(request: RepoTestRequest, onProgress?: ProgressCallback, signal?: AbortSignal): Promise<RepoTestResult> {
+    const totalStart = Date.now();
+    const tool = this.getTool(request.tool);
+    const budget = new RunBudget(request.limits, totalStart, signal);
+    const spans = new SpanRecorder((span) => {
+      observePhase(span);
+      onProgress?.({ type: "span", message: "", data: span });
+    });
+
+    // Create DB record
+    const runId = this.createRunRecord(request, "running");
 
     onProgress?.({ type: "status", message: "Starting repo test run..." });
 
+    let workspace: PreparedWorkspace | undefined;
+    try {
+      workspace = await this.prepareWorkspace(request.repo_url, request.ref, budget, spans, onProgress);
+      this.recordPreparation(runId, workspace);
+      return await this.executeRun(request, tool, runId, workspace, workspace.workdir, totalStart, budget, spans, onProgress);
+    } catch (e) {
+      this.failRun(runId, e, totalStart, onProgress);
+      throw e;
+    } finally {
+      DbService.saveRepoTestSpans(runId, spans.spans);
+      await workspace?.dispose();
+    }
+  }
+
+  // Clone (from the mirror cache) and install dependencies once. The returned
+  // workspace can be run in directly or copied per run by the matrix runner.
+  static async prepareWorkspace(
+    repoUrl: string,
+    ref: string,
+    budget: RunBudget,
+    spans: SpanRecorder,
+    onProgress?: ProgressCallback,
+  ): Promise<PreparedWorkspace> {
     let workdir = "";
-    const iterations: IterationResult[] = [];
+    let releaseMirror = () => {};
+    const dispose = async () => {
+      // Clean up cloned repo
+      if (workdir) {
+        try { await Deno.remove(workdir, { recursive: true }); } catch { /* ignore */ }
+      }
+      releaseMirror();
+      RepoCacheService.evictInBackground();
+    };
 
     try {
       // 1. Clone the repo
-      onProgress?.({ type: "clone", message: `Cloning ${request.repo_url}...` });
-      const cloneStart = Date.now();
-      workdir = await this.cloneRepo(request.repo_url, request.ref);
-      const cloneDuration = Date.now() - cloneStart;
-      onProgress?.({ type: "clone", message: `Cloned in ${cloneDuration}ms`, data: { duration_ms: cloneDuration } });
+      onProgress?.({ type: "clone", message: `Cloning ${repoUrl}...` });
+      const cloneStart = performance.now();
+      const workdirBase = `${Deno.cwd()}/backend/tmp/repo-tests`;
+      await Deno.mkdir(workdirBase, { recursive: true });
+      workdir = `${workdirBase}/${Date.now()}_${Math.random().toString(36).slice(2, 8)}`;
+      const cloned = await spans.time("clone", () => budget.phase("clone", (signal) => this.cloneRepo(repoUrl, ref, workdir, signal)));
+      releaseMirror = cloned.release;
+      for (const phase of cloned.phases) spans.record(phase.name, phase.start, phase.duration_ms, { parent: "clone" });
+      const cloneDuration = Math.round(performance.now() - cloneStart);
+      onProgress?.({ type: "clone", message: `Cloned in ${cloneDuration}ms${cloned.cached ? " (cached mirror)" : ""}`, data: { duration_ms: cloneDuration, cached: cloned.cached } });
+
+      // 2. Install dependencies (restored from the dependency cache when possible)
+      onProgress?.({ type: "install", message: "Installing dependencies..." });
+      const installStart = performance.now();
+      const deps = await spans.time("install", () => budget.phase("install", (signal) => this.installDependencies(workdir, signal)));
+      const installDuration = Math.round(performance.now() - installStart);
+      onProgress?.({
+        type: "install",
+        message: `Dependencies ready in ${installDuration}ms${deps.cached ? " (cached)" : ""}`,
+        data: { duration_ms: installDuration, cached: deps.cached, ecosystems: deps.ecosystems },
+      });
+
+      return {
+        workdir,
+        env: deps.env,
+        cloneDurationMs: cloneDuration,
+        installDurationMs: installDuration,
+        spans: [...spans.spans],
+        spanOrigin: spans.origin,
+        dispose,
+      };
+    } catch (e) {
+      await dispose();
+      throw e;
+    }
+  }
+
+  private static recordPreparation(runId: number, workspace: PreparedWorkspace) {
+    DbService.updateRepoTestRun(runId, {
+      clone_duration_ms: workspace.cloneDurationMs,
+      install_duration_ms: workspace.installDurationMs,
+      status: "running",
+    });
+  }
 
-      DbService.updateRepoTestRun(runId, { clone_duration_ms: cloneDuration, status: "running" });
+  // Iterate tool + tests inside `workdir` and record the outcome on `runId`
+  static async executeRun(
+    request: RepoTestRequest,
+    tool: CodingTool,
+    runId: number,
+    workspace: PreparedWorkspace,
+    workdir: string,
+    startedAt: number,
+    budget: RunBudget,
+    spans: SpanRecorder,
+    onProgress?: ProgressCallback,
+  ): Promise<RepoTestResult> {
+    const iterations: IterationResult[] = [];
+    const env = workspace.env;
+    const strategy = request.strategy ?? "refine";
+    const incremental = request.incremental_tests ?? "off";
+    const maxIterations = Math.min(Math.max(1, Math.floor(request.iterations ?? DEFAULT_ITERATIONS)), MAX_ITERATIONS);
 
-      // 2. Run up to MAX_ITERATIONS
-      let lastTestResult: { exit_code: number; stdout: string; stderr: string; passed: number; failed: number; total: number } | null = null;
+    // Baseline after clone and install: every iteration is diffed against it, and
+    // best-of-N attempts are restored to it instead of cloning and installing again
+    const snapshot = await spans.time("snapshot", () => WorkdirSnapshot.create(workdir));
 
-      for (let i = 1; i <= MAX_ITERATIONS; i++) {
-        onProgress?.({ type: "iteration_start", message: `Iteration ${i}/${MAX_ITERATIONS}`, data: { iteration: i } });
+    try {
+      // 3. Run up to maxIterations
+      let lastTestResult: Awaited<ReturnType<typeof RepoTestService.runTests>> | null = null;
+
+      for (let i = 1; i <= maxIterations; i++) {
+        onProgress?.({ type: "iteration_start", message: `Iteration ${i}/${maxIterations}`, data: { iteration: i, strategy } });
         const iterStart = Date.now();
 
-        // Build the prompt for this iteration
-        let iterPrompt: string;
-        if (i === 1) {
-          // First iteration: just the task prompt, no test details
-          iterPrompt = request.prompt;
-        } else {
-          // Second iteration: include test failure output (NOT the test source code)
-          iterPrompt = this.buildRetryPrompt(request.prompt, lastTestResult!);
+        if (strategy === "best_of_n" && i > 1) {
+          await spans.time("restore", () => snapshot.restore(), { iteration: i });
         }
 
+        // Build the prompt for this iteration
+        const iterPrompt = await spans.time("prompt_build", async () => {
+          // First iteration (and every best-of-N attempt): just the task prompt, no test details.
+          // Later refine iterations: include test failure output (NOT the test source code)
+          return i === 1 || strategy === "best_of_n" ? request.prompt : this.buildRetryPrompt(request.prompt, lastTestResult!);
+        }, { iteration: i });
+
         // Run the AI coding tool
-        const toolOutput = await this.runCodingTool(tool, request.model, iterPrompt, workdir);
+        // Live output is forwarded as { iteration, stream, delta } while the process runs
+        const toolOutput = await spans.time("tool", () =>
+          budget.phase("tool", (signal) =>
+            this.runCodingTool(tool, request.model, iterPrompt, workdir, env, (delta) =>
+              onProgress?.({ type: "tool_output", message: "", data: { iteration: i, stream: delta.stream, delta: delta.text } }),
+              signal, budget.resources)
+          ), { iteration: i });
         onProgress?.({ type: "tool_output", message: `Tool output (iteration ${i})`, data: { iteration: i, output: toolOutput.substring(0, 2000) } });
 
-        // Run the test suite
-        onProgress?.({ type: "status", message: `Running tests (iteration ${i})...` });
-        const testResult = await this.runTests(request.test_command, workdir);
+        // Run the test suite; `spanName` tells the full suite ("test") from a failed-first re-run ("test_failed")
+        const runSuite = (command: string, spanName: string) =>
+          spans.time(spanName, () =>
+            budget.phase("test", (signal) =>
+              this.runTests(command, workdir, env, (delta) =>
+                onProgress?.({ type: "test_output", message: "", data: { iteration: i, stream: delta.stream, delta: delta.text } }),
+                signal, budget.resources, (start, duration) => spans.record("parse", start, duration, { parent: spanName, iteration: i }))
+            ), { iteration: i });
+
+        // Incremental mode: when refining, re-run only what failed last time before (maybe) the full suite.
+        // failed_first's last iteration goes straight to the full suite: it decides the run's totals.
+        const focusThisIteration = strategy === "refine" &&
+          (incremental === "failed_only" || (incremental === "failed_first" && i < maxIterations));
+        const previousFailures = focusThisIteration && lastTestResult?.report
+          ? lastTestResult.report.cases.filter((c) => c.status === "failed")
+          : [];
+        const focusedCommand = previousFailures.length > 0
+          ? await TestReportService.focusOnFailures(request.test_command, workdir, previousFailures)
+          : null;
+
+        let failedFirst: FocusedTestRun | null = null;
+        let testResult: Awaited<ReturnType<typeof RepoTestService.runTests>> | null = null;
+        if (focusedCommand) {
+          onProgress?.({ type: "status", message: `Re-running ${previousFailures.length} previously failing test(s) (iteration ${i})...` });
+          const focusedStart = Date.now();
+          const focused = await runSuite(focusedCommand, "test_failed");
+          failedFirst = {
+            command: focusedCommand,
+            exit_code: focused.exit_code,
+            passed: focused.passed,
+            failed: focused.failed,
+            total: focused.total,
+            duration_ms: Date.now() - focusedStart,
+          };
+          const focusedPassed = focused.exit_code === 0 && focused.failed === 0;
+          // A filter that selected nothing says nothing; fall through to the full suite
+          if (focused.total > 0 && (!focusedPassed || incremental === "failed_only")) testResult = focused;
+        }
+        const testScope: "full" | "failed" = testResult ? "failed" : "full";
+        if (!testResult) {
+          onProgress?.({ type: "status", message: `Running tests (iteration ${i})...` });
+          testResult = await runSuite(request.test_command, "test");
+        }
         const iterDuration = Date.now() - iterStart;
 
         lastTestResult = testResult;
 
+        // A missing diff should not cost the run its result
+        const diff = await spans.time("diff", () =>
+          snapshot.diff().catch((error) => {
+            console.warn(`Failed to diff iteration ${i}:`, error);
+            return null;
+          }), { iteration: i });
+        const patch = diff ? new TextEncoder().encode(diff.patch) : null;
+
         const iterResult: IterationResult = {
           iteration: i,
           tool_output: toolOutput,
@@ -227,8 +507,31 @@ export class RepoTestService {
           tests_failed: testResult.failed,
           tests_total: testResult.total,
           duration_ms: iterDuration,
+          report_format: testResult.report?.format ?? null,
+          test_cases: testResult.report ? this.casesForResult(testResult.report.cases) : [],
+          files_changed: diff?.files_changed ?? null,
+          diff_bytes: patch?.length ?? null,
+          test_scope: testScope,
+          failed_first: failedFirst,
         };
         iterations.push(iterResult);
+        if (testResult.report) DbService.saveRepoTestCases(runId, i, testResult.report.cases);
+        DbService.saveRepoTestIteration(runId, {
+          iteration: i,
+          test_exit_code: testResult.exit_code,
+          tests_passed: testResult.passed,
+          tests_failed: testResult.failed,
+          tests_total: testResult.total,
+          duration_ms: iterDuration,
+          files_changed: iterResult.files_changed,
+          diff_bytes: iterResult.diff_bytes,
+          diff_gz: patch ? await gzip(patch) : null,
+          test_scope: testScope,
+          failed_first_passed: failedFirst?.passed ?? null,
+          failed_first_failed: failedFirst?.failed ?? null,
+          failed_first_total: failedFirst?.total ?? null,
+          failed_first_duration_ms: failedFirst?.duration_ms ?? null,
+        });
 
         onProgress?.({
           type: "test_result",
@@ -243,185 +546,294 @@ export class RepoTestService {
         }
 
         // If this was the last iteration and tests still fail, we're done
-        if (i === MAX_ITERATIONS) {
-          onProgress?.({ type: "status", message: `Tests still failing after ${MAX_ITERATIONS} iterations` });
+        if (i === maxIterations) {
+          onProgress?.({
+            type: "status",
+            message: strategy === "best_of_n"
+              ? `No attempt passed all tests in ${maxIterations} attempts`
+              : `Tests still failing after ${maxIterations} iterations`,
+          });
         }
       }
+    } finally {
+      await snapshot.dispose();
+    }
 
-      // Determine final status
-      const finalIter = iterations[iterations.length - 1];
-      const totalDuration = Date.now() - totalStart;
-      let status: "success" | "partial" | "fail";
-      if (finalIter.tests_failed === 0 && finalIter.test_exit_code === 0) {
-        status = "success";
-      } else if (finalIter.tests_passed > 0) {
-        status = "partial";
-      } else {
-        status = "fail";
-      }
+    // Determine final status: refine ends on its last iteration, best-of-N keeps its best attempt
+    const finalIter = strategy === "best_of_n" ? this.bestIteration(iterations) : iterations[iterations.length - 1];
+    const totalDuration = Date.now() - startedAt;
+    let status: "success" | "partial" | "fail";
+    if (finalIter.tests_failed === 0 && finalIter.test_exit_code === 0) {
+      status = "success";
+    } else if (finalIter.tests_passed > 0) {
+      status = "partial";
+    } else {
+      status = "fail";
+    }
 
-      // Update DB
-      DbService.updateRepoTestRun(runId, {
-        status,
-        tool_duration_ms: iterations.reduce((s, it) => s + it.duration_ms, 0),
-        test_duration_ms: iterations.reduce((s, it) => s + it.duration_ms, 0),
-        total_duration_ms: totalDuration,
-        tests_passed: finalIter.tests_passed,
-        tests_failed: finalIter.tests_failed,
-        tests_total: finalIter.tests_total,
-        test_output: finalIter.test_stdout + "\n" + finalIter.test_stderr,
-        tool_output: iterations.map(it => `--- Iteration ${it.iteration} ---\n${it.tool_output}`).join("\n\n"),
-      });
+    // Update DB
+    DbService.updateRepoTestRun(runId, {
+      status,
+      strategy,
+      best_iteration: finalIter.iteration,
+      tool_duration_ms: Math.round(spans.total("tool")),
+      test_duration_ms: Math.round(spans.total("test") + spans.total("test_failed")),
+      total_duration_ms: totalDuration,
+      tests_passed: finalIter.tests_passed,
+      tests_failed: finalIter.tests_failed,
+      tests_total: finalIter.tests_total,
+      test_scope: finalIter.test_scope,
+      test_output: finalIter.test_stdout + "\n" + finalIter.test_stderr,
+      tool_output: iterations.map(it => `--- Iteration ${it.iteration} ---\n${it.tool_output}`).join("\n\n"),
+    });
 
-      const result: RepoTestResult = {
-        runId,
-        repo_url: request.repo_url,
-        ref: request.ref,
-        prompt: request.prompt,
-        test_command: request.test_command,
-        tool: request.tool,
-        model: request.model,
-        status,
-        iterations,
-        clone_duration_ms: cloneDuration,
-        total_duration_ms: totalDuration,
-        final_tests_passed: finalIter.tests_passed,
-        final_tests_failed: finalIter.tests_failed,
-        final_tests_total: finalIter.tests_total,
-      };
+    const result: RepoTestResult = {
+      runId,
+      repo_url: request.repo_url,
+      ref: request.ref,
+      prompt: request.prompt,
+      test_command: request.test_command,
+      tool: request.tool,
+      model: request.model,
+      status,
+      strategy,
+      iterations,
+      best_iteration: finalIter.iteration,
+      clone_duration_ms: workspace.cloneDurationMs,
+      install_duration_ms: workspace.installDurationMs,
+      total_duration_ms: totalDuration,
+      spans: [...spans.spans],
+      final_tests_passed: finalIter.tests_passed,
+      final_tests_failed: finalIter.tests_failed,
+      final_tests_total: finalIter.tests_total,
+      final_test_scope: finalIter.test_scope,
+    };
 
-      onProgress?.({ type: "complete", message: "Run complete", data: result });
-      return result;
+    onProgress?.({ type: "complete", message: "Run complete", data: result });
+    return result;
+  }
 
-    } catch (e) {
-      const error = e instanceof Error ? e.message : String(e);
-      DbService.updateRepoTestRun(runId, { status: "error", error, total_duration_ms: Date.now() - totalStart });
-      onProgress?.({ type: "error", message: error });
-      throw e;
-    } finally {
-      // Clean up cloned repo
-      if (workdir) {
-        try { await Deno.remove(workdir, { recursive: true }); } catch { /* ignore */ }
+  // How many matrix pairs may run at once: bounded by CPU cores, by free memory over
+  // REPO_TEST_RUN_MEMORY_MB per run, and by REPO_TEST_MAX_CONCURRENCY / the request.
+  static matrixConcurrency(requested?: number): number {
+    const limits = [navigator.hardwareConcurrency || 4];
+    try {
+      // Only read memory info when already allowed; never trigger a permission prompt
+      if (Deno.permissions.querySync({ name: "sys", kind: "systemMemoryInfo" }).state === "granted") {
+        const perRunBytes = envLimit("REPO_TEST_RUN_MEMORY_MB", 1024) * 1024 * 1024;
+        limits.push(Math.floor(Deno.systemMemoryInfo().available / perRunBytes));
       }
+    } catch { /* memory info unavailable */ }
+    const configured = envLimit("REPO_TEST_MAX_CONCURRENCY", 0);
+    if (configured > 0) limits.push(configured);
+    if (requested && requested > 0) limits.push(Math.floor(requested));
+    return Math.max(1, Math.min(...limits));
+  }
+
+  // Run every (tool, model) pair against one repo/ref/prompt. The repo is cloned and
+  // installed once; each pair then works in its own copy-on-write copy of that
+  // workspace, and pairs run concurrently under matrixConcurrency(). `signal` cancels
+  // every pair, running or queued.
+  static async runMatrix(request: MatrixRequest, onEvent?: MatrixProgressCallback, signal?: AbortSignal): Promise<MatrixPairResult[]> {
+    const startedAt = Date.now();
+    const pairs = request.pairs.map((pair, index) => {
+      const runRequest: RepoTestRequest = { ...request, tool: pair.tool, model: pair.model };
+      return { index, ...pair, tool: this.getTool(pair.tool), runRequest };
+    });
+    const runIds = pairs.map((pair) => this.createRunRecord(pair.runRequest, "pending"));
+    const concurrency = this.matrixConcurrency(request.concurrency);
+    onEvent?.(null, { type: "status", message: `Preparing workspace for ${pairs.length} pairs (concurrency ${concurrency})` });
+
+    const prepSpans = new SpanRecorder((span) => {
+      observePhase(span);
+      onEvent?.(null, { type: "span", message: "", data: span });
+    });
+    const workspace = await this.prepareWorkspace(request.repo_url, request.ref, new RunBudget(request.limits, startedAt, signal), prepSpans, (event) => onEvent?.(null, event))
+      .catch((e) => {
+        runIds.forEach((runId) => {
+          this.failRun(runId, e, startedAt);
+          DbService.saveRepoTestSpans(runId, prepSpans.spans);
+        });
+        throw e;
+      });
+
+    const scheduler = new Semaphore(concurrency);
+    try {
+      return await Promise.all(pairs.map((pair, i) =>
+        scheduler.run(async (): Promise<MatrixPairResult> => {
+          const tag = { index: pair.index, tool: pair.tool.id, model: pair.model };
+          const progress: ProgressCallback = (event) => onEvent?.(tag, event);
+          const runId = runIds[i];
+          const pairStart = Date.now();
+          const workdir = `${workspace.workdir}-pair${pair.index}`;
+          const venv = `${workdir}-venv`;
+          // Pair spans share the matrix origin, so queueing shows up as a gap after preparation
+          const spans = new SpanRecorder((span) => {
+            observePhase(span);
+            progress({ type: "span", message: "", data: span });
+          }, workspace.spanOrigin);
+          spans.adopt(workspace.spans);
+          try {
+            signal?.throwIfAborted();
+            this.recordPreparation(runId, workspace);
+            progress({ type: "status", message: "Creating isolated worktree..." });
+            const env = await spans.time("worktree_copy", async () => {
+              await copyTree(workspace.workdir, workdir, "reflink");
+              return DepCacheService.isolateVenv(workspace.env, venv);
+            });
+            // Time spent queued for a slot does not count against the pair's budget; the shared preparation does
+            const budget = new RunBudget(request.limits, pairStart - workspace.cloneDurationMs - workspace.installDurationMs, signal);
+            const result = await this.executeRun(pair.runRequest, pair.tool, runId, { ...workspace, env }, workdir, startedAt, budget, spans, progress);
+            return { ...tag, runId, result, error: null, duration_ms: Date.now() - pairStart };
+          } catch (e) {
+            this.failRun(runId, e, startedAt, progress);
+            return { ...tag, runId, result: null, error: e instanceof Error ? e.message : String(e), duration_ms: Date.now() - pairStart };
+          } finally {
+            DbService.saveRepoTestSpans(runId, spans.spans);
+            try { await Deno.remove(workdir, { recursive: true }); } catch { /* ignore */ }
+            try { await Deno.remove(venv, { recursive: true }); } catch { /* ignore */ }
+          }
+        })
+      ));
+    } finally {
+      await workspace.dispose();
     }
   }
 
+  // Passing beats failing, then more passed tests, then fewer failures, then the earlier attempt
+  private static bestIteration(iterations: IterationResult[]): IterationResult {
+    const passing = (it: IterationResult) => it.test_exit_code === 0 && it.tests_failed === 0 ? 1 : 0;
+    return iterations.reduce((best, it) =>
+      passing(it) > passing(best) ||
+      (passing(it) === passing(best) && (it.tests_passed > best.tests_passed ||
+        (it.tests_passed === best.tests_passed && it.tests_failed < best.tests_failed)))
+        ? it
+        : best
+    );
+  }
+
   private static buildRetryPrompt(
     originalPrompt: string,
-    testResult: { stdout: string; stderr: string; passed: number; failed: number; total: number }
+    testResult: { stdout: string; stderr: string; passed: number; failed: number; total: number; report?: TestReport | null }
   ): string {
     // Give the model the original task + test failure output, but NOT the test source code
     const failureOutput = (testResult.stderr || testResult.stdout || "").substring(0, 4000);
+    // Names only: failure messages from some reporters quote the test source
+    const failingNames = (testResult.report?.cases ?? [])
+      .filter((c) => c.status === "failed")
+      .slice(0, 20)
+      .map((c) => `- ${c.suite ? `${c.suite} > ` : ""}${c.name}`);
     return (
       `${originalPrompt}\n\n` +
       `--- PREVIOUS ATTEMPT FAILED ---\n` +
       `Tests passed: ${testResult.passed}/${testResult.total}\n` +
       `Tests failed: ${testResult.failed}\n\n` +
+      (failingNames.length > 0 ? `Failing tests:\n${failingNames.join("\n")}\n\n` : "") +
       `Test runner output (this is the error output from running the test suite, NOT the test source code):\n` +
       `\`\`\`\n${failureOutput}\n\`\`\`\n\n` +
       `Please fix the code so that all tests pass. Do NOT modify any test files. Only fix the implementation code.`
     );
   }
 
-  private static async cloneRepo(repoUrl: string, ref: string): Promise<string> {
-    const tmpBase = `${Deno.cwd()}/backend/tmp/repo-tests`;
-    await Deno.mkdir(tmpBase, { recursive: true });
-    const workdir = `${tmpBase}/${Date.now()}_${Math.random().toString(36).slice(2, 8)}`;
+  // Materialize `workdir` from the local mirror cache; `release` must be called once the
+  // workdir is gone. Falls back to a direct network clone if the cache cannot be used.
+  private static async cloneRepo(
+    repoUrl: string,
+    ref: string,
+    workdir: string,
+    signal?: AbortSignal,
+  ): Promise<{ release: () => void; cached: boolean; phases: MaterializePhase[] }> {
+    let release = () => {};
+    let cached = false;
+    let phases: MaterializePhase[] = [];
+    try {
+      const materialized = await RepoCacheService.materialize(repoUrl, ref, workdir, signal);
+      release = materialized.release;
+      cached = materialized.cacheHit;
+      phases = materialized.phases;
+    } catch (e) {
+      if (signal?.aborted) throw e;
+      console.warn(`Repo cache unavailable for ${repoUrl}, cloning directly:`, e instanceof Error ? e.message : e);
+      await Deno.remove(workdir, { recursive: true }).catch(() => {});
+      await this.cloneDirect(repoUrl, ref, workdir, signal);
+    }
+
+    return { release, cached, phases };
+  }
+
+  // `signal` kills each git command's whole process group, including helpers such as
+  // git-remote-https that outlive a killed parent
+  private static async cloneDirect(repoUrl: string, ref: string, workdir: string, signal?: AbortSignal): Promise<void> {
+    const run = async (args: string[], cwd?: string) => {
+      const result = await git(args, { cwd, signal });
+      if (result.killed) throw new Error(`git ${args[0]} was stopped`);
+      return result;
+    };
 
     // Clone
-    const cloneCmd = new Deno.Command("git", {
-      args: ["clone", "--depth", "50", repoUrl, workdir],
-      stdout: "piped",
-      stderr: "piped",
-    });
-    const cloneResult = await cloneCmd.output();
+    const cloneResult = await run(["clone", "--depth", "50", repoUrl, workdir]);
     if (!cloneResult.success) {
-      const stderr = new TextDecoder().decode(cloneResult.stderr);
-      throw new Error(`Git clone failed: ${stderr}`);
+      throw new Error(`Git clone failed: ${cloneResult.stderr}`);
     }
 
     // Checkout the specific ref
-    const checkoutCmd = new Deno.Command("git", {
-      args: ["checkout", ref],
-      cwd: workdir,
-      stdout: "piped",
-      stderr: "piped",
-    });
-    const checkoutResult = await checkoutCmd.output();
+    const checkoutResult = await run(["checkout", ref], workdir);
     if (!checkoutResult.success) {
       // Try fetching the ref first (might be a remote branch or tag)
-      const fetchCmd = new Deno.Command("git", {
-        args: ["fetch", "origin", ref],
-        cwd: workdir,
-        stdout: "piped",
-        stderr: "piped",
-      });
-      await fetchCmd.output();
-      const retry = new Deno.Command("git", {
-        args: ["checkout", ref],
-        cwd: workdir,
-        stdout: "piped",
-        stderr: "piped",
-      });
-      const retryResult = await retry.output();
+      await run(["fetch", "origin", ref], workdir);
+      const retryResult = await run(["checkout", ref], workdir);
       if (!retryResult.success) {
         // Last resort: try FETCH_HEAD
-        const fetchHead = new Deno.Command("git", {
-          args: ["checkout", "FETCH_HEAD"],
-          cwd: workdir,
-          stdout: "piped",
-          stderr: "piped",
-        });
-        const fhResult = await fetchHead.output();
+        const fhResult = await run(["checkout", "FETCH_HEAD"], workdir);
         if (!fhResult.success) {
-          const stderr = new TextDecoder().decode(fhResult.stderr);
-          throw new Error(`Git checkout failed for ref '${ref}': ${stderr}`);
+          throw new Error(`Git checkout failed for ref '${ref}': ${fhResult.stderr}`);
         }
       }
     }
-
-    // Install dependencies if package.json/requirements.txt exists
-    await this.installDependencies(workdir);
-
-    return workdir;
   }
 
-  private static async installDependencies(workdir: string): Promise<void> {
-    // Check for common dependency files
+  private static async installDependencies(workdir: string, signal?: AbortSignal): Promise<PreparedDependencies> {
     try {
-      const stat = await Deno.stat(`${workdir}/package.json`);
-      if (stat.isFile) {
-        // Check for package-lock.json or yarn.lock
-        let installCmd: Deno.Command;
-        try {
-          await Deno.stat(`${workdir}/yarn.lock`);
-          installCmd = new Deno.Command("yarn", { args: ["install", "--frozen-lockfile"], cwd: workdir, stdout: "piped", stderr: "piped" });
-        } catch {
-          try {
-            await Deno.stat(`${workdir}/pnpm-lock.yaml`);
-            installCmd = new Deno.Command("pnpm", { args: ["install", "--frozen-lockfile"], cwd: workdir, stdout: "piped", stderr: "piped" });
-          } catch {
-            installCmd = new Deno.Command("npm", { args: ["install"], cwd: workdir, stdout: "piped", stderr: "piped" });
-          }
-        }
-        await installCmd.output();
-
-        // Exercism JS workaround: some exercises need babel preset installed separately
-        await this.installExercismBabelPreset(workdir);
-      }
-    } catch { /* no package.json */ }
+      return await DepCacheService.prepare(workdir, (dir) => this.installNodeDependencies(dir, signal), signal);
+    } catch (e) {
+      if (signal?.aborted) throw e;
+      console.warn("Dependency install failed:", e instanceof Error ? e.message : e);
+      return { ecosystems: [], cached: false, env: {} };
+    }
+  }
 
+  private static async installNodeDependencies(workdir: string, signal?: AbortSignal): Promise<void> {
+    // Check for package-lock.json or yarn.lock
+    let installCmd: [string, string[]];
     try {
-      const stat = await Deno.stat(`${workdir}/requirements.txt`);
-      if (stat.isFile) {
-        const cmd = new Deno.Command("pip", { args: ["install", "-r", "requirements.txt"], cwd: workdir, stdout: "piped", stderr: "piped" });
-        await cmd.output();
+      await Deno.stat(`${workdir}/yarn.lock`);
+      installCmd = ["yarn", ["install", "--frozen-lockfile"]];
+    } catch {
+      try {
+        await Deno.stat(`${workdir}/pnpm-lock.yaml`);
+        installCmd = ["pnpm", ["install", "--frozen-lockfile"]];
+      } catch {
+        installCmd = ["npm", ["install"]];
       }
-    } catch { /* no requirements.txt */ }
+    }
+    // Installers are chatty; streaming keeps only a bounded head/tail of their output
+    let result;
+    try {
+      result = await runStreaming(installCmd[0], { args: installCmd[1], cwd: workdir, signal });
+    } catch { /* installer not available */ }
+    // A killed or failed install must not be cached as complete
+    signal?.throwIfAborted();
+    if (result && !result.success) {
+      throw new Error(`${installCmd[0]} install exited with code ${result.code}: ${result.stderr.trim().slice(-500)}`);
+    }
+
+    // Exercism JS workaround: some exercises need babel preset installed separately
+    await this.installExercismBabelPreset(workdir, signal);
+    signal?.throwIfAborted();
   }
 
   // Exercism JavaScript repo workaround: exercises need @exercism/babel-preset-javascript
-  private static async installExercismBabelPreset(workdir: string): Promise<void> {
+  private static async installExercismBabelPreset(workdir: string, signal?: AbortSignal): Promise<void> {
     try {
       // Check if this looks like an Exercism exercise
       const babelConfig = await Deno.readTextFile(`${workdir}/babel.config.js`).catch(() => null);
@@ -431,17 +843,22 @@ export class RepoTestService {
       if (!config.includes("exercism")) return;
 
       // Try to install the babel preset
-      const cmd = new Deno.Command("npm", {
-        args: ["install", "--save-dev", "@exercism/babel-preset-javascript"],
-        cwd: workdir,
-        stdout: "piped",
-        stderr: "piped",
-      });
-      await cmd.output();
+      await runStreaming("npm", { args: ["install", "--save-dev", "@exercism/babel-preset-javascript"], cwd: workdir, signal });
     } catch { /* ignore errors */ }
   }
 
-  private static async runCodingTool(tool: CodingTool, model: string, prompt: string, workdir: string): Promise<string> {
+  private static async runCodingTool(
+    tool: CodingTool,
+    model: string,
+    prompt: string,
+    workdir: string,
+    extraEnv: Record<string, string> = {},
+    onOutput?: (delta: OutputDelta) => void,
+    signal?: AbortSignal,
+    limits?: ResourceLimits,
+  ): Promise<string> {
+    if (this.codingToolOverride) return await this.codingToolOverride(tool, model, prompt, workdir);
+
     // Special case: openrouter-direct calls the API without an external CLI tool
     if (tool.id === "openrouter-direct") {
       return await this.runOpenRouterDirect(model, prompt, workdir);
@@ -461,7 +878,7 @@ export class RepoTestService {
     );
 
     // Build env
-    const env: Record<string, string> = { ...tool.env };
+    const env: Record<string, string> = { ...extraEnv, ...tool.env };
     if (tool.apiKeyEnvVar) {
       const apiKeyRecord = DbService.getApiKey("OPENROUTER_API_KEY", "OpenRouter");
       if (apiKeyRecord?.key_value) {
@@ -474,18 +891,8 @@ export class RepoTestService {
       }
     }
 
-    const cmd = new Deno.Command(args[0], {
-      args: args.slice(1),
-      cwd: workdir,
-      stdout: "piped",
-      stderr: "piped",
-      env,
-    });
-
     try {
-      const result = await cmd.output();
-      const stdout = new TextDecoder().decode(result.stdout);
-      const stderr = new TextDecoder().decode(result.stderr);
+      const { stdout, stderr } = await runStreaming(args[0], { args: args.slice(1), cwd: workdir, env, onOutput, signal, limits });
       return stdout + (stderr ? `\n[STDERR]\n${stderr}` : "");
     } catch (e) {
       return `[Tool execution error: ${e instanceof Error ? e.message : String(e)}]`;
@@ -501,18 +908,13 @@ export class RepoTestService {
 
     const service = new OpenRouterService(apiKeyRecord.key_value);
 
-    // Read the project structure to give context
-    let fileList = "";
+    // Most relevant source files for this prompt, packed into a token budget
+    let repoContext: RepoContext | null = null;
     try {
-      fileList = await this.getFileTree(workdir, 3);
-    } catch { /* ignore */ }
-
-    // Read key source files (non-test files) for context
-    let sourceContext = "";
-    try {
-      sourceContext = await this.readSourceFiles(workdir);
-    } catch { /* ignore */ }
-
+      repoContext = await RepoIndexService.buildContext(workdir, prompt);
+    } catch (error) {
+      console.warn("Failed to index repository for context:", error);
+    }
     const systemPrompt = (
       `You are an expert programmer. You are given a codebase and a task to complete.\n` +
       `You must output ONLY the file changes needed. For each file you need to create or modify, ` +
@@ -522,8 +924,8 @@ export class RepoTestService {
       `--- END FILE ---\n\n` +
       `Do NOT modify test files. Only create/modify implementation files.\n` +
       `Do NOT include explanations outside the file blocks.\n\n` +
-      `Project structure:\n${fileList}\n\n` +
-      (sourceContext ? `Current source files:\n${sourceContext}\n\n` : "")
+      `Project structure:\n${repoContext?.tree ?? ""}\n\n` +
+      (repoContext?.context ? `Relevant source files:\n${repoContext.context}\n\n` : "")
     );
 
     const request = {
@@ -547,66 +949,6 @@ export class RepoTestService {
     return content;
   }
 
-  private static async getFileTree(dir: string, maxDepth: number, prefix = "", depth = 0): Promise<string> {
-    if (depth >= maxDepth) return "";
-    const lines: string[] = [];
-    try {
-      for await (const entry of Deno.readDir(dir)) {
-        if (entry.name.startsWith(".") || entry.name === "node_modules" || entry.name === "__pycache__" ||
-            entry.name === ".git" || entry.name === "venv" || entry.name === ".venv") continue;
-        if (entry.isDirectory) {
-          lines.push(`${prefix}${entry.name}/`);
-          const sub = await this.getFileTree(`${dir}/${entry.name}`, maxDepth, prefix + "  ", depth + 1);
-          if (sub) lines.push(sub);
-        } else {
-          lines.push(`${prefix}${entry.name}`);
-        }
-      }
-    } catch { /* ignore */ }
-    return lines.join("\n");
-  }
-
-  private static async readSourceFiles(workdir: string): Promise<string> {
-    const sourceExts = [".ts", ".js", ".py", ".rs", ".go", ".java", ".c", ".cpp", ".rb", ".ex", ".exs"];
-    const testPatterns = ["test", "spec", "_test", "test_"];
-    const files: string[] = [];
-
-    const walk = async (dir: string, rel: string) => {
-      try {
-        for await (const entry of Deno.readDir(dir)) {
-          if (entry.name.startsWith(".") || entry.name === "node_modules" || entry.name === "__pycache__" ||
-              entry.name === ".git" || entry.name === "venv" || entry.name === ".venv") continue;
-          const fullPath = `${dir}/${entry.name}`;
-          const relPath = rel ? `${rel}/${entry.name}` : entry.name;
-          if (entry.isDirectory) {
-            await walk(fullPath, relPath);
-          } else {
-            const ext = entry.name.substring(entry.name.lastIndexOf("."));
-            const nameLower = entry.name.toLowerCase();
-            const isTest = testPatterns.some(p => nameLower.includes(p));
-            if (sourceExts.includes(ext) && !isTest) {
-              files.push(fullPath + "|" + relPath);
-            }
-          }
-        }
-      } catch { /* ignore */ }
-    };
-
-    await walk(workdir, "");
-
-    // Read up to 10 source files, max 200 lines each
-    const parts: string[] = [];
-    for (const f of files.slice(0, 10)) {
-      const [fullPath, relPath] = f.split("|");
-      try {
-        const content = await Deno.readTextFile(fullPath);
-        const lines = content.split("\n").slice(0, 200).join("\n");
-        parts.push(`--- ${relPath} ---\n${lines}\n`);
-      } catch { /* ignore */ }
-    }
-    return parts.join("\n");
-  }
-
   private static async applyFileChanges(content: string, workdir: string): Promise<void> {
     // Parse --- FILE: path --- ... --- END FILE --- blocks
     const fileRegex = /--- FILE:\s*(.+?)\s*---\n([\s\S]*?)--- END FILE ---/g;
@@ -642,50 +984,68 @@ export class RepoTestService {
     }
   }
 
-  private static async runTests(testCommand: string, workdir: string): Promise<{
+  private static async runTests(
+    testCommand: string,
+    workdir: string,
+    env: Record<string, string> = {},
+    onOutput?: (delta: OutputDelta) => void,
+    signal?: AbortSignal,
+    limits?: ResourceLimits,
+    onParsed?: (start: number, durationMs: number) => void,
+  ): Promise<{
     exit_code: number; stdout: string; stderr: string;
     passed: number; failed: number; total: number;
+    report: TestReport | null;
   }> {
+    // Known runners get a reporter flag so results come from a structured report
+    const prepared = await TestReportService.prepare(testCommand, workdir);
+
     // Split command intelligently
-    const parts = testCommand.match(/(?:[^\s"']+|"[^"]*"|'[^']*')+/g) || [testCommand];
+    const parts = prepared.command.match(/(?:[^\s"']+|"[^"]*"|'[^']*')+/g) || [prepared.command];
     const cleanParts = parts.map(p => p.replace(/^["']|["']$/g, ""));
 
-    // Determine shell based on OS
+    // Determine shell based on OS; output keeps the first and last 25 KB of each stream,
+    // while line-based reports on stdout are parsed from the full, untruncated stream
     const isWindows = Deno.build.os === "windows";
-    let cmd: Deno.Command;
-    if (isWindows) {
-      cmd = new Deno.Command("cmd", {
-        args: ["/c", ...cleanParts],
-        cwd: workdir,
-        stdout: "piped",
-        stderr: "piped",
-      });
-    } else {
-      cmd = new Deno.Command("sh", {
-        args: ["-c", testCommand],
-        cwd: workdir,
-        stdout: "piped",
-        stderr: "piped",
-      });
-    }
-
-    const result = await cmd.output();
-    const stdout = new TextDecoder().decode(result.stdout);
-    const stderr = new TextDecoder().decode(result.stderr);
+    const stdoutReport = new StdoutReportParser();
+    const result = await runStreaming(isWindows ? "cmd" : "sh", {
+      args: isWindows ? ["/c", ...cleanParts] : ["-c", prepared.command],
+      cwd: workdir,
+      env,
+      onOutput,
+      onChunk: (delta) => {
+        if (delta.stream === "stdout") stdoutReport.push(delta.text);
+      },
+      maxBufferChars: 50000,
+      signal,
+      limits,
+    });
 
-    // Parse test results from output
-    const { passed, failed, total } = this.parseTestOutput(stdout + "\n" + stderr);
+    // Structured reports first; regex scraping of the output is the fallback
+    const parseStart = performance.now();
+    const report = (await TestReportService.readReportFile(prepared)) ?? stdoutReport.end();
+    const { passed, failed, total } = report
+      ? TestReportService.summarize(report.cases)
+      : this.parseTestOutput(result.stdout + "\n" + result.stderr);
+    onParsed?.(parseStart, performance.now() - parseStart);
 
     return {
       exit_code: result.code,
-      stdout: stdout.substring(0, 50000),
-      stderr: stderr.substring(0, 50000),
+      stdout: result.stdout,
+      stderr: result.stderr,
       passed,
       failed,
       total,
+      report,
     };
   }
 
+  private static casesForResult(cases: TestCaseResult[]): TestCaseResult[] {
+    if (cases.length <= MAX_CASES_IN_RESULT) return cases;
+    const rank = { failed: 0, skipped: 1, passed: 2 };
+    return [...cases].sort((a, b) => rank[a.status] - rank[b.status]).slice(0, MAX_CASES_IN_RESULT);
+  }
+
   private static parseTestOutput(output: string): { passed: number; failed: number; total: number } {
     let passed = 0, failed = 0, total = 0;
 
@@ -802,6 +1162,22 @@ export class RepoTestService {
   }
 
   static getRun(id: number) {
-    return DbService.getRepoTestRun(id);
+    const run = DbService.getRepoTestRun(id);
+    return run
+      ? {
+        ...run,
+        iterations: DbService.getRepoTestIterations(id),
+        test_cases: DbService.getRepoTestCases(id),
+        spans: DbService.getRepoTestSpans(id),
+      }
+      : undefined;
+  }
+
+  // Unified diff of an iteration against the baseline; undefined if there is no such
+  // iteration, null if no diff was recorded (e.g. the workdir was not a git checkout)
+  static async getIterationDiff(runId: number, iteration: number): Promise<string | null | undefined> {
+    const diff = DbService.getRepoTestIterationDiff(runId, iteration);
+    if (!diff) return diff;
+    return new TextDecoder().decode(await gunzip(diff));
   }
 }
@@ -0,0 +1,105 @@
+import { envLimit } from "../utils/concurrency.ts";
+import type { ResourceLimits } from "../utils/subprocess.ts";
+
+// Wall-clock and resource budgets for repo test runs. Each phase has its own timeout,
+// capped by whatever is left of the run's total budget. When it expires the phase's
+// AbortSignal fires, which kills the process group of the command it was running.
+
+export type RunPhase = "clone" | "install" | "tool" | "test";
+
+export interface RepoTestLimits {
+  clone_timeout_ms?: number;
+  install_timeout_ms?: number;
+  tool_timeout_ms?: number; // per iteration
+  test_timeout_ms?: number; // per iteration
+  total_timeout_ms?: number;
+  cpu_seconds?: number; // CPU time per tool/test process
+  memory_mb?: number; // address space per tool/test process
+}
+
+const DEFAULT_TIMEOUTS_MS: Record<RunPhase | "total", number> = {
+  clone: 5 * 60_000,
+  install: 10 * 60_000,
+  tool: 15 * 60_000,
+  test: 5 * 60_000,
+  total: 30 * 60_000,
+};
+
+export class RepoTestTimeoutError extends Error {
+  constructor(readonly phase: RunPhase, readonly timeoutMs: number, readonly totalBudget: boolean) {
+    super(totalBudget
+      ? `Run budget of ${timeoutMs}ms exhausted during ${phase}`
+      : `${phase} timed out after ${timeoutMs}ms`);
+    this.name = "RepoTestTimeoutError";
+  }
+}
+
+function positive(value: unknown): number | undefined {
+  return typeof value === "number" && Number.isFinite(value) && value > 0 ? value : undefined;
+}
+
+// Request values win over REPO_TEST_<PHASE>_TIMEOUT_MS, REPO_TEST_CPU_SECONDS and
+// REPO_TEST_MEMORY_MB; CPU and memory limits are off unless one of them is set. `cancel`
+// stops the run from outside (e.g. its job lost its lease): the current phase is killed
+// like on a timeout, rejecting with the signal's reason, and no further phase starts.
+export class RunBudget {
+  readonly timeouts: Record<RunPhase | "total", number>;
+  readonly resources: ResourceLimits;
+  private readonly deadline: number;
+
+  constructor(readonly limits: RepoTestLimits = {}, startedAt = Date.now(), private readonly cancel?: AbortSignal) {
+    const timeout = (phase: RunPhase | "total") =>
+      positive(limits[`${phase}_timeout_ms`]) ??
+        envLimit(`REPO_TEST_${phase.toUpperCase()}_TIMEOUT_MS`, DEFAULT_TIMEOUTS_MS[phase]);
+    this.timeouts = {
+      clone: timeout("clone"),
+      install: timeout("install"),
+      tool: timeout("tool"),
+      test: timeout("test"),
+      total: timeout("total"),
+    };
+    const cpuSeconds = positive(limits.cpu_seconds) ?? envLimit("REPO_TEST_CPU_SECONDS", 0);
+    const memoryMb = positive(limits.memory_mb) ?? envLimit("REPO_TEST_MEMORY_MB", 0);
+    this.resources = {
+      cpuSeconds: cpuSeconds || undefined,
+      memoryBytes: memoryMb ? memoryMb * 1024 * 1024 : undefined,
+    };
+    this.deadline = startedAt + this.timeouts.total;
+  }
+
+  remainingMs(): number {
+    return this.deadline - Date.now();
+  }
+
+  // Run `fn` with a signal that aborts when the phase timeout or the total budget
+  // runs out, whichever is first, and reject with RepoTestTimeoutError at that point
+  async phase<T>(phase: RunPhase, fn: (signal: AbortSignal) => Promise<T>): Promise<T> {
+    const remaining = this.remainingMs();
+    const ownLimit = this.timeouts[phase];
+    const totalBound = remaining < ownLimit;
+    const timeoutError = () => new RepoTestTimeoutError(phase, totalBound ? this.timeouts.total : ownLimit, totalBound);
+    this.cancel?.throwIfAborted();
+    if (remaining <= 0) throw timeoutError();
+
+    const controller = new AbortController();
+    let timer: number | undefined;
+    let onCancel = () => {};
+    const expired = new Promise<never>((_, reject) => {
+      // Reject first so work that settles synchronously on abort cannot win the race
+      const stop = (error: unknown) => {
+        reject(error);
+        controller.abort();
+      };
+      timer = setTimeout(() => stop(timeoutError()), Math.min(remaining, ownLimit));
+      onCancel = () => stop(this.cancel!.reason);
+      this.cancel?.addEventListener("abort", onCancel, { once: true });
+    });
+    try {
+      // Racing also covers work that cannot be killed, like an in-flight HTTP call
+      return await Promise.race([fn(controller.signal), expired]);
+    } finally {
+      clearTimeout(timer);
+      this.cancel?.removeEventListener("abort", onCancel);
+    }
+  }
+}
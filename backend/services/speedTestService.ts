@@ -1,5 +1,7 @@
 import { OpenRouterService, StreamChunk } from "./openRouterService.ts";
 import { DbService } from "./dbService.ts";
+import { ModelCatalogService } from "./modelCatalogService.ts";
+import { logger } from "../utils/logger.ts";
 
 export interface SpeedTestRequest {
   prompt: string;
@@ -36,6 +38,18 @@ export interface StreamingEvent {
   firstTokenTime?: number;
 }
 
+// Outcome of one streamed completion; latency is the time to the first token
+export interface StreamedCompletion {
+  model: string;
+  content: string;
+  reasoningContent: string;
+  responseTime: number;
+  latency: number | null;
+  tokensPerSecond: number | null;
+  totalTokens: number;
+  error: string | null;
+}
+
 export class SpeedTestService {
   static async runSpeedTest(request: SpeedTestRequest): Promise<SpeedTestComparison> {
     const startTime = Date.now();
@@ -65,8 +79,8 @@ export class SpeedTestService {
           messages: [
             { role: "user" as const, content: request.prompt },
           ],
-          temperature: request.temperature || 0.7,
-          max_tokens: request.max_tokens || 1000,
+          temperature: request.temperature ?? 0.7,
+          max_tokens: request.max_tokens ?? 1000,
         };
 
         const result = await service.generateCompletion(openRouterRequest, model);
@@ -120,6 +134,11 @@ export class SpeedTestService {
   }
 
   static async getAvailableModels(): Promise<any[]> {
+    return (await this.getModelCatalog()).models;
+  }
+
+  // Models plus a version for ETags; the catalog itself is shared and cached
+  static async getModelCatalog(): Promise<{ models: any[]; version: string }> {
     // Get the API key from the database
     const apiKeyRecord = DbService.getApiKey("OPENROUTER_API_KEY", "OpenRouter");
     
@@ -128,16 +147,16 @@ export class SpeedTestService {
         apiKeyRecord.key_value.trim() === "" ||
         (!apiKeyRecord.key_value.startsWith("sk-or-") && !apiKeyRecord.key_value.startsWith("sk-"))) {
       // Return empty array instead of throwing to allow graceful degradation
-      console.warn("OpenRouter API key not configured. Returning empty model list.");
-      return [];
+      logger.warn("OpenRouter API key not configured. Returning empty model list.");
+      return { models: [], version: "no-key" };
     }
 
     try {
-      const service = new OpenRouterService(apiKeyRecord.key_value);
-      return await service.getModels();
+      const { models, version } = await ModelCatalogService.get(apiKeyRecord.key_value);
+      return { models, version };
     } catch (error) {
-      console.error("Error fetching models from OpenRouter:", error);
-      return [];
+      logger.error("Error fetching models from OpenRouter", { error });
+      return { models: [], version: "unavailable" };
     }
   }
 
@@ -180,7 +199,7 @@ export class SpeedTestService {
       // Return hardcoded fallback
       return popularModelIds;
     } catch (error) {
-      console.error("Error getting popular models:", error);
+      logger.error("Error getting popular models", { error });
       // On error, return hardcoded fallback
       return [
         "openai/gpt-4o-mini",
@@ -192,16 +211,22 @@ export class SpeedTestService {
     }
   }
 
+  // The configured OpenRouter key, or null when it is missing or clearly not a key
+  static openRouterKey(): string | null {
+    const key = DbService.getApiKey("OPENROUTER_API_KEY", "OpenRouter")?.key_value;
+    if (!key || key === "your_openrouter_api_key_here" || key.trim() === "" ||
+        (!key.startsWith("sk-or-") && !key.startsWith("sk-"))) {
+      return null;
+    }
+    return key;
+  }
+
   static async runStreamingSpeedTest(
     request: SpeedTestRequest, 
     onEvent: (event: StreamingEvent) => void
   ): Promise<void> {
-    const apiKeyRecord = DbService.getApiKey("OPENROUTER_API_KEY", "OpenRouter");
-    
-    if (!apiKeyRecord || !apiKeyRecord.key_value || 
-        apiKeyRecord.key_value === "your_openrouter_api_key_here" || 
-        apiKeyRecord.key_value.trim() === "" ||
-        (!apiKeyRecord.key_value.startsWith("sk-or-") && !apiKeyRecord.key_value.startsWith("sk-"))) {
+    const apiKey = this.openRouterKey();
+    if (!apiKey) {
       onEvent({
         type: 'error',
         error: "Invalid OpenRouter API key. Please update your API key."
@@ -209,103 +234,135 @@ export class SpeedTestService {
       return;
     }
 
-    const service = new OpenRouterService(apiKeyRecord.key_value);
+    const service = new OpenRouterService(apiKey);
     
     // Process models in parallel
-    const promises = request.models.map(async (model) => {
-      const startTime = Date.now();
-      let firstTokenTime: number | null = null;
-      let tokenCount = 0;
-      let content = "";
-      let reasoningContent = "";
-      
-      onEvent({
-        type: 'start',
-        model
-      });
+    await Promise.all(request.models.map((model) => this.streamModel(service, model, request, onEvent)));
+  }
+
+  // Stream one model's completion of `request.prompt`, reporting start, first-token and
+  // throughput metrics, chunks, and complete or error as they happen; resolves with the totals
+  static async streamModel(
+    service: OpenRouterService,
+    model: string,
+    request: Omit<SpeedTestRequest, "models">,
+    onEvent: (event: StreamingEvent) => void
+  ): Promise<StreamedCompletion> {
+    const startTime = Date.now();
+    let firstTokenTime: number | null = null;
+    let tokenCount = 0;
+    let content = "";
+    let reasoningContent = "";
+    
+    onEvent({
+      type: 'start',
+      model
+    });
+    
+    try {
+      // Strip openrouter prefix if present (openrouter/provider/model -> provider/model)
+      const actualModel = model.startsWith('openrouter/') ? model.slice(11) : model;
       
-      try {
-        // Strip openrouter prefix if present (openrouter/provider/model -> provider/model)
-        const actualModel = model.startsWith('openrouter/') ? model.slice(11) : model;
-        
-        const openRouterRequest = {
-          model: actualModel,
-          messages: [{ role: "user" as const, content: request.prompt }],
-          temperature: request.temperature || 0.7,
-          max_tokens: request.max_tokens || 1000,
-        };
+      const openRouterRequest = {
+        model: actualModel,
+        messages: [{ role: "user" as const, content: request.prompt }],
+        temperature: request.temperature ?? 0.7,
+        max_tokens: request.max_tokens ?? 1000,
+      };
 
-        await service.generateStreamingCompletion(
-          openRouterRequest,
-          model,
-          (chunk: StreamChunk) => {
-            const now = Date.now();
+      const result = await service.generateStreamingCompletion(
+        openRouterRequest,
+        model,
+        (chunk: StreamChunk) => {
+          const now = Date.now();
+          
+          // Track first token time
+          if (firstTokenTime === null && (chunk.choices?.[0]?.delta?.content || chunk.choices?.[0]?.delta?.reasoning_content)) {
+            firstTokenTime = now;
+            const latency = now - startTime;
             
-            // Track first token time
-            if (firstTokenTime === null && (chunk.choices?.[0]?.delta?.content || chunk.choices?.[0]?.delta?.reasoning_content)) {
-              firstTokenTime = now;
-              const latency = now - startTime;
-              
-              onEvent({
-                type: 'metrics',
-                model,
-                latency,
-                firstTokenTime: latency
-              });
-            }
+            onEvent({
+              type: 'metrics',
+              model,
+              latency,
+              firstTokenTime: latency
+            });
+          }
+          
+          // Process content chunks
+          if (chunk.choices?.[0]?.delta?.content) {
+            content += chunk.choices[0].delta.content;
+            tokenCount++;
             
-            // Process content chunks
-            if (chunk.choices?.[0]?.delta?.content) {
-              content += chunk.choices[0].delta.content;
-              tokenCount++;
-              
-              onEvent({
-                type: 'chunk',
-                model,
-                content: chunk.choices[0].delta.content
-              });
-            }
+            onEvent({
+              type: 'chunk',
+              model,
+              content: chunk.choices[0].delta.content
+            });
+          }
+          
+          // Process reasoning chunks
+          if (chunk.choices?.[0]?.delta?.reasoning_content) {
+            reasoningContent += chunk.choices[0].delta.reasoning_content;
             
-            // Process reasoning chunks
-            if (chunk.choices?.[0]?.delta?.reasoning_content) {
-              reasoningContent += chunk.choices[0].delta.reasoning_content;
-              
-              onEvent({
-                type: 'chunk',
-                model,
-                reasoningContent: chunk.choices[0].delta.reasoning_content
-              });
-            }
+            onEvent({
+              type: 'chunk',
+              model,
+              reasoningContent: chunk.choices[0].delta.reasoning_content
+            });
+          }
+          
+          // Calculate tokens per second
+          if (firstTokenTime && tokenCount > 0) {
+            const elapsed = (now - firstTokenTime) / 1000;
+            const tokensPerSecond = elapsed > 0 ? tokenCount / elapsed : 0;
             
-            // Calculate tokens per second
-            if (firstTokenTime && tokenCount > 0) {
-              const elapsed = (now - firstTokenTime) / 1000;
-              const tokensPerSecond = elapsed > 0 ? tokenCount / elapsed : 0;
-              
-              onEvent({
-                type: 'metrics',
-                model,
-                tokensPerSecond,
-                totalTokens: tokenCount
-              });
-            }
+            onEvent({
+              type: 'metrics',
+              model,
+              tokensPerSecond,
+              totalTokens: tokenCount
+            });
           }
-        );
-        
-        onEvent({
-          type: 'complete',
-          model
-        });
-        
-      } catch (error) {
-        onEvent({
-          type: 'error',
-          model,
-          error: error instanceof Error ? error.message : "Unknown error"
-        });
-      }
-    });
-    
-    await Promise.all(promises);
+        }
+      );
+      if (result.error) throw new Error(result.error);
+      
+      onEvent({
+        type: 'complete',
+        model
+      });
+
+      // Usage from the provider when it reports it, otherwise content chunks
+      const totalTokens = result.response?.usage?.completion_tokens || tokenCount;
+      const elapsed = firstTokenTime === null ? 0 : (Date.now() - firstTokenTime) / 1000;
+      return {
+        model,
+        content,
+        reasoningContent,
+        responseTime: Date.now() - startTime,
+        latency: firstTokenTime === null ? null : firstTokenTime - startTime,
+        tokensPerSecond: elapsed > 0 ? totalTokens / elapsed : null,
+        totalTokens,
+        error: null,
+      };
+    } catch (error) {
+      const message = error instanceof Error ? error.message : "Unknown error";
+      onEvent({
+        type: 'error',
+        model,
+        error: message
+      });
+      return {
+        model,
+        content,
+        reasoningContent,
+        responseTime: Date.now() - startTime,
+        latency: null,
+        tokensPerSecond: null,
+        totalTokens: tokenCount,
+        error: message,
+      };
+    }
   }
 }
\ No newline at end of file
@@ -0,0 +1,413 @@
+// Machine-readable test reports for repo tests. Known runners get a reporter flag
+// injected into the test command (JUnit XML or Jest-style JSON written to a temp
+// file); line-oriented formats on stdout (TAP, `go test -json`, libtest JSON) are
+// detected and parsed while the process runs. Regex scraping of the console output
+// stays as the fallback when neither yields any test cases.
+
+export type TestCaseStatus = "passed" | "failed" | "skipped";
+
+export interface TestCaseResult {
+  suite: string | null;
+  name: string;
+  status: TestCaseStatus;
+  duration_ms: number | null;
+  message?: string;
+}
+
+export type ReportFormat = "junit" | "jest-json" | "tap" | "go-json" | "libtest-json";
+
+export interface PreparedTestCommand {
+  command: string;
+  reportFile?: string;
+  reportFormat?: "junit" | "jest-json";
+}
+
+export interface TestReport {
+  format: ReportFormat;
+  cases: TestCaseResult[];
+}
+
+const MAX_MESSAGE_CHARS = 2000;
+// Above this many failing tests a name filter is not worth the command-line length
+const MAX_FOCUSED_TESTS = 200;
+
+const XML_ENTITIES: Record<string, string> = { lt: "<", gt: ">", amp: "&", quot: '"', apos: "'" };
+
+function decodeXml(text: string): string {
+  return text.replace(/&(#x[0-9a-f]+|#\d+|\w+);/gi, (entity, code: string) => {
+    if (code[0] === "#") {
+      const n = code[1] === "x" || code[1] === "X" ? parseInt(code.slice(2), 16) : parseInt(code.slice(1));
+      return Number.isFinite(n) ? String.fromCodePoint(n) : entity;
+    }
+    return XML_ENTITIES[code] ?? entity;
+  });
+}
+
+function parseAttributes(tag: string): Record<string, string> {
+  const attrs: Record<string, string> = {};
+  for (const match of tag.matchAll(/([\w:.-]+)\s*=\s*(?:"([^"]*)"|'([^']*)')/g)) {
+    attrs[match[1]] = decodeXml(match[2] ?? match[3] ?? "");
+  }
+  return attrs;
+}
+
+function secondsToMs(value: string | number | undefined): number | null {
+  const seconds = typeof value === "number" ? value : parseFloat(value ?? "");
+  return Number.isFinite(seconds) ? Math.round(seconds * 1000) : null;
+}
+
+// Incremental JUnit XML reader: feed it chunks of any size and it emits one case per
+// <testcase>. Only the tags JUnit reports use are understood; everything else is skipped.
+export class JUnitStreamParser {
+  readonly cases: TestCaseResult[] = [];
+  private buffer = "";
+  private suites: string[] = [];
+  private current: TestCaseResult | null = null;
+  private capturingMessage = false;
+
+  push(chunk: string) {
+    this.buffer += chunk;
+    let pos = 0;
+    while (pos < this.buffer.length) {
+      const open = this.buffer.indexOf("<", pos);
+      if (open === -1) {
+        this.captureText(this.buffer.slice(pos));
+        pos = this.buffer.length;
+        break;
+      }
+      if (open > pos) this.captureText(this.buffer.slice(pos, open));
+
+      if (this.buffer.startsWith("<![CDATA[", open)) {
+        const end = this.buffer.indexOf("]]>", open);
+        if (end === -1) {
+          pos = open;
+          break;
+        }
+        this.captureText(this.buffer.slice(open + 9, end), false);
+        pos = end + 3;
+        continue;
+      }
+      if (this.buffer.startsWith("<!--", open)) {
+        const end = this.buffer.indexOf("-->", open);
+        if (end === -1) {
+          pos = open;
+          break;
+        }
+        pos = end + 3;
+        continue;
+      }
+      const close = this.tagEnd(open);
+      if (close === -1) {
+        pos = open;
+        break;
+      }
+      this.handleTag(this.buffer.slice(open + 1, close));
+      pos = close + 1;
+    }
+    this.buffer = this.buffer.slice(pos);
+  }
+
+  end(): TestCaseResult[] {
+    if (this.current) this.finishCase();
+    return this.cases;
+  }
+
+  // Index of the `>` closing the tag opened at `open`, skipping quoted attribute values
+  private tagEnd(open: number): number {
+    let quote = "";
+    for (let i = open + 1; i < this.buffer.length; i++) {
+      const ch = this.buffer[i];
+      if (quote) {
+        if (ch === quote) quote = "";
+      } else if (ch === '"' || ch === "'") {
+        quote = ch;
+      } else if (ch === ">") {
+        return i;
+      }
+    }
+    return -1;
+  }
+
+  private captureText(text: string, encoded = true) {
+    if (!this.capturingMessage || !this.current) return;
+    const message = (this.current.message ?? "") + (encoded ? decodeXml(text) : text);
+    this.current.message = message.slice(0, MAX_MESSAGE_CHARS);
+  }
+
+  private handleTag(raw: string) {
+    if (raw.startsWith("?") || raw.startsWith("!")) return;
+    const closing = raw.startsWith("/");
+    const selfClosing = raw.endsWith("/");
+    const body = raw.slice(closing ? 1 : 0, selfClosing ? -1 : undefined).trim();
+    const name = body.split(/\s/, 1)[0];
+
+    if (closing) {
+      if (name === "testsuite") this.suites.pop();
+      else if (name === "testcase") this.finishCase();
+      else if (name === "failure" || name === "error") this.capturingMessage = false;
+      return;
+    }
+
+    const attrs = parseAttributes(body);
+    switch (name) {
+      case "testsuite":
+        if (!selfClosing) this.suites.push(attrs.name ?? "");
+        break;
+      case "testcase":
+        if (this.current) this.finishCase();
+        this.current = {
+          suite: attrs.classname || this.suites[this.suites.length - 1] || null,
+          name: attrs.name ?? "",
+          status: "passed",
+          duration_ms: secondsToMs(attrs.time),
+        };
+        if (selfClosing) this.finishCase();
+        break;
+      case "failure":
+      case "error":
+        if (!this.current) break;
+        this.current.status = "failed";
+        if (attrs.message) this.current.message = attrs.message.slice(0, MAX_MESSAGE_CHARS);
+        this.capturingMessage = !selfClosing && !attrs.message;
+        break;
+      case "skipped":
+        if (this.current) this.current.status = "skipped";
+        break;
+    }
+  }
+
+  private finishCase() {
+    if (!this.current) return;
+    if (this.current.message) this.current.message = this.current.message.trim();
+    this.cases.push(this.current);
+    this.current = null;
+    this.capturingMessage = false;
+  }
+}
+
+// Jest and Vitest `--json` reports share this shape
+export function parseJestJson(text: string): TestCaseResult[] {
+  const report = JSON.parse(text);
+  const cases: TestCaseResult[] = [];
+  for (const file of report?.testResults ?? []) {
+    for (const assertion of file.assertionResults ?? []) {
+      const status: TestCaseStatus = assertion.status === "passed"
+        ? "passed"
+        : assertion.status === "failed" ? "failed" : "skipped";
+      const message = (assertion.failureMessages ?? []).join("\n").slice(0, MAX_MESSAGE_CHARS);
+      cases.push({
+        suite: [file.name, ...(assertion.ancestorTitles ?? [])].filter(Boolean).join(" > ") || null,
+        name: assertion.title ?? assertion.fullName ?? "",
+        status,
+        duration_ms: typeof assertion.duration === "number" ? Math.round(assertion.duration) : null,
+        ...(message ? { message } : {}),
+      });
+    }
+  }
+  return cases;
+}
+
+// Line-oriented reports on stdout, parsed while the test process is still running.
+// The format is decided by the first line that is unambiguously one of them.
+export class StdoutReportParser {
+  readonly cases: TestCaseResult[] = [];
+  format: ReportFormat | null = null;
+  private carry = "";
+  private lastTapCase: TestCaseResult | null = null;
+
+  push(text: string) {
+    const lines = (this.carry + text).split("\n");
+    this.carry = lines.pop() ?? "";
+    for (const line of lines) this.line(line.replace(/\r$/, ""));
+  }
+
+  end(): TestReport | null {
+    if (this.carry) this.line(this.carry);
+    this.carry = "";
+    return this.format && this.cases.length > 0 ? { format: this.format, cases: this.cases } : null;
+  }
+
+  private line(line: string) {
+    if (line.startsWith("{") && (this.format === null || this.format === "go-json" || this.format === "libtest-json")) {
+      this.jsonLine(line);
+      return;
+    }
+    if (this.format === null && /^TAP version \d+/.test(line)) {
+      this.format = "tap";
+      return;
+    }
+    if (this.format === "tap") this.tapLine(line);
+  }
+
+  private jsonLine(line: string) {
+    let event: any;
+    try {
+      event = JSON.parse(line);
+    } catch {
+      return;
+    }
+    // go test -json: {"Action":"pass","Package":"...","Test":"TestX","Elapsed":0.01}
+    if (typeof event?.Action === "string" && (this.format ?? "go-json") === "go-json") {
+      if (!event.Test || !["pass", "fail", "skip"].includes(event.Action)) return;
+      this.format = "go-json";
+      this.cases.push({
+        suite: event.Package ?? null,
+        name: event.Test,
+        status: event.Action === "pass" ? "passed" : event.Action === "fail" ? "failed" : "skipped",
+        duration_ms: secondsToMs(event.Elapsed),
+      });
+      return;
+    }
+    // libtest JSON (cargo test -- --format json): {"type":"test","event":"ok","name":"...","exec_time":0.001}
+    if (event?.type === "test" && (this.format ?? "libtest-json") === "libtest-json") {
+      if (!["ok", "failed", "ignored"].includes(event.event)) return;
+      this.format = "libtest-json";
+      this.cases.push({
+        suite: null,
+        name: event.name ?? "",
+        status: event.event === "ok" ? "passed" : event.event === "failed" ? "failed" : "skipped",
+        duration_ms: secondsToMs(event.exec_time),
+        ...(event.stdout && event.event === "failed" ? { message: String(event.stdout).slice(0, MAX_MESSAGE_CHARS) } : {}),
+      });
+    }
+  }
+
+  private tapLine(line: string) {
+    // Only top-level results; indented lines belong to subtests reported by their parent
+    const result = line.match(/^(not )?ok\b\s*\d*\s*(?:-\s*)?([^#]*?)\s*(?:#\s*(\w+).*)?$/);
+    if (result) {
+      const directive = result[3]?.toUpperCase();
+      this.lastTapCase = {
+        suite: null,
+        name: result[2],
+        status: directive === "SKIP" || directive === "TODO" ? "skipped" : result[1] ? "failed" : "passed",
+        duration_ms: null,
+      };
+      this.cases.push(this.lastTapCase);
+      return;
+    }
+    // node --test and others put timings in the YAML diagnostic block after the result
+    const duration = line.match(/^\s+duration_ms:\s*([\d.]+)/);
+    if (duration && this.lastTapCase && this.lastTapCase.duration_ms === null) {
+      this.lastTapCase.duration_ms = Math.round(parseFloat(duration[1]));
+    }
+  }
+}
+
+function shellQuote(value: string): string {
+  return Deno.build.os === "windows" ? `"${value}"` : `'${value.replace(/'/g, `'\\''`)}'`;
+}
+
+function exactNames(names: string[]): string {
+  return `^(${names.map((n) => n.replace(/[.*+?^${}()|[\]\\]/g, "\\$&")).join("|")})$`;
+}
+
+export class TestReportService {
+  static reportDir(): string {
+    return `${Deno.cwd()}/backend/tmp/test-reports`;
+  }
+
+  private static async packageTestScript(workdir: string): Promise<string> {
+    try {
+      const pkg = JSON.parse(await Deno.readTextFile(`${workdir}/package.json`));
+      return typeof pkg?.scripts?.test === "string" ? pkg.scripts.test : "";
+    } catch {
+      return "";
+    }
+  }
+
+  // Add a reporter flag for runners we recognise. Commands chained with shell operators are
+  // left alone since there is no telling which part the flag would end up on.
+  static async prepare(testCommand: string, workdir: string): Promise<PreparedTestCommand> {
+    if (/&&|\|\||[;|<>`]|\$\(/.test(testCommand)) return { command: testCommand };
+
+    const reportBase = `${this.reportDir()}/${crypto.randomUUID()}`;
+    const npmScript = testCommand.match(/^\s*(npm|yarn|pnpm)\s+(?:run\s+)?test\b/);
+    const runner = npmScript ? await this.packageTestScript(workdir) : testCommand;
+    // npm needs `--` to forward flags to the script; yarn and pnpm forward them as-is
+    const forward = npmScript?.[1] === "npm" && !/\s--(\s|$)/.test(testCommand) ? " --" : "";
+
+    let prepared: PreparedTestCommand | null = null;
+    if (/\bjest\b/.test(runner) && !/--json\b/.test(testCommand)) {
+      const file = `${reportBase}.json`;
+      prepared = { command: `${testCommand}${forward} --json --outputFile=${shellQuote(file)}`, reportFile: file, reportFormat: "jest-json" };
+    } else if (/\bvitest\b/.test(runner) && !/--reporter\b/.test(testCommand)) {
+      const file = `${reportBase}.xml`;
+      prepared = {
+        command: `${testCommand}${forward} --reporter=default --reporter=junit --outputFile.junit=${shellQuote(file)}`,
+        reportFile: file,
+        reportFormat: "junit",
+      };
+    } else if (/\bpytest\b/.test(runner) && !npmScript && !/--junit-?xml\b/.test(testCommand)) {
+      const file = `${reportBase}.xml`;
+      prepared = { command: `${testCommand} --junitxml=${shellQuote(file)}`, reportFile: file, reportFormat: "junit" };
+    } else if (/^\s*deno\s+test\b/.test(testCommand) && !/--junit-path\b/.test(testCommand)) {
+      // Flags have to come before file arguments, so insert right after `deno test`
+      const file = `${reportBase}.xml`;
+      prepared = {
+        command: testCommand.replace(/^(\s*deno\s+test)\b/, `$1 --junit-path=${shellQuote(file)}`),
+        reportFile: file,
+        reportFormat: "junit",
+      };
+    }
+    if (!prepared) return { command: testCommand };
+    await Deno.mkdir(this.reportDir(), { recursive: true });
+    return prepared;
+  }
+
+  // Rewrite `testCommand` to run only the tests that failed last time, or null when the
+  // runner has no way to select them. pytest and jest remember their own failures (in
+  // .pytest_cache and the jest cache); deno and go get the names as a filter. Runs through
+  // prepare() afterwards like any other command.
+  static async focusOnFailures(testCommand: string, workdir: string, failed: TestCaseResult[]): Promise<string | null> {
+    if (failed.length === 0 || failed.length > MAX_FOCUSED_TESTS) return null;
+    if (/&&|\|\||[;|<>`]|\$\(/.test(testCommand)) return null;
+
+    const npmScript = testCommand.match(/^\s*(npm|yarn|pnpm)\s+(?:run\s+)?test\b/);
+    const runner = npmScript ? await this.packageTestScript(workdir) : testCommand;
+    const forward = npmScript?.[1] === "npm" && !/\s--(\s|$)/.test(testCommand) ? " --" : "";
+
+    if (/\bjest\b/.test(runner)) return `${testCommand}${forward} --onlyFailures`;
+    if (/\bpytest\b/.test(runner) && !npmScript) return `${testCommand} --lf`;
+    if (/^\s*deno\s+test\b/.test(testCommand)) {
+      const names = [...new Set(failed.map((c) => c.name))];
+      // A replacer function, since the pattern contains `$` sequences replace() would expand
+      return testCommand.replace(/^\s*deno\s+test\b/, (m) => `${m} --filter ${shellQuote(`/${exactNames(names)}/`)}`);
+    }
+    if (/^\s*go\s+test\b/.test(testCommand)) {
+      // -run matches each level of a subtest name separately, so select whole top-level tests
+      const names = [...new Set(failed.map((c) => c.name.split("/")[0]))];
+      return testCommand.replace(/^\s*go\s+test\b/, (m) => `${m} -run ${shellQuote(exactNames(names))}`);
+    }
+    return null;
+  }
+
+  // Read (and delete) the injected report file, if the runner wrote one
+  static async readReportFile(prepared: PreparedTestCommand): Promise<TestReport | null> {
+    if (!prepared.reportFile || !prepared.reportFormat) return null;
+    try {
+      if (prepared.reportFormat === "jest-json") {
+        const cases = parseJestJson(await Deno.readTextFile(prepared.reportFile));
+        return cases.length > 0 ? { format: "jest-json", cases } : null;
+      }
+      const parser = new JUnitStreamParser();
+      const file = await Deno.open(prepared.reportFile, { read: true });
+      for await (const chunk of file.readable.pipeThrough(new TextDecoderStream())) parser.push(chunk);
+      const cases = parser.end();
+      return cases.length > 0 ? { format: "junit", cases } : null;
+    } catch {
+      return null;
+    } finally {
+      await Deno.remove(prepared.reportFile).catch(() => {});
+    }
+  }
+
+  static summarize(cases: TestCaseResult[]): { passed: number; failed: number; total: number } {
+    let passed = 0, failed = 0;
+    for (const c of cases) {
+      if (c.status === "passed") passed++;
+      else if (c.status === "failed") failed++;
+    }
+    return { passed, failed, total: passed + failed };
+  }
+}
@@ -0,0 +1,112 @@
+import { envLimit } from "../utils/concurrency.ts";
+
+// Availability of CLI tools, resolved through PATH and cached. Spawning `<tool> --version`
+// is slow for some tools (aider starts Python), so a binary is only re-probed when the file
+// PATH resolves it to changes (different path or mtime) or the result is older than the TTL
+// (TOOL_PROBE_TTL_MS, default 10 minutes). Lookups that miss PATH entirely spawn nothing.
+
+export interface ToolProbe {
+  binary: string;
+  available: boolean;
+  path: string | null; // resolved executable
+  version: string | null; // first line of `--version` output
+  checked_at: string;
+}
+
+interface CacheEntry {
+  probe: ToolProbe;
+  mtime: number | null;
+  probedAt: number;
+}
+
+const PROBE_TIMEOUT_MS = 10_000;
+
+export class ToolProbeService {
+  private static cache = new Map<string, CacheEntry>();
+  private static inflight = new Map<string, Promise<ToolProbe>>();
+
+  static clearCache() {
+    this.cache.clear();
+  }
+
+  private static ttlMs(): number {
+    return envLimit("TOOL_PROBE_TTL_MS", 10 * 60_000);
+  }
+
+  // Find `binary` on PATH the way a shell would, without spawning anything
+  static async resolve(binary: string): Promise<{ path: string; mtime: number | null } | null> {
+    const windows = Deno.build.os === "windows";
+    const candidates = binary.includes("/") || (windows && binary.includes("\\"))
+      ? [binary]
+      : (Deno.env.get("PATH") ?? "").split(windows ? ";" : ":").filter(Boolean).map((dir) => `${dir}/${binary}`);
+    const extensions = windows ? ["", ...(Deno.env.get("PATHEXT") ?? ".EXE;.CMD;.BAT").split(";")] : [""];
+
+    for (const candidate of candidates) {
+      for (const ext of extensions) {
+        try {
+          const stat = await Deno.stat(candidate + ext);
+          if (!stat.isFile) continue;
+          if (!windows && stat.mode !== null && (stat.mode & 0o111) === 0) continue;
+          return { path: candidate + ext, mtime: stat.mtime?.getTime() ?? null };
+        } catch { /* not here */ }
+      }
+    }
+    return null;
+  }
+
+  private static async runVersion(path: string): Promise<string | null> {
+    try {
+      const result = await new Deno.Command(path, {
+        args: ["--version"],
+        stdout: "piped",
+        stderr: "piped",
+        signal: AbortSignal.timeout(PROBE_TIMEOUT_MS),
+      }).output();
+      if (!result.success) return null;
+      const decoder = new TextDecoder();
+      const text = decoder.decode(result.stdout).trim() || decoder.decode(result.stderr).trim();
+      return text.split("\n")[0].trim() || "unknown";
+    } catch {
+      return null;
+    }
+  }
+
+  // Probe one binary, reusing the cached result unless it is stale. Concurrent callers
+  // for the same binary share one probe.
+  static probe(binary: string, force = false): Promise<ToolProbe> {
+    const existing = this.inflight.get(binary);
+    if (existing) return existing;
+
+    const promise = (async () => {
+      const resolved = await this.resolve(binary);
+      const cached = this.cache.get(binary);
+      if (
+        !force && cached && Date.now() - cached.probedAt < this.ttlMs() &&
+        cached.probe.path === (resolved?.path ?? null) && cached.mtime === (resolved?.mtime ?? null)
+      ) {
+        return cached.probe;
+      }
+
+      const version = resolved ? await this.runVersion(resolved.path) : null;
+      const probe: ToolProbe = {
+        binary,
+        available: version !== null,
+        path: resolved?.path ?? null,
+        version,
+        checked_at: new Date().toISOString(),
+      };
+      this.cache.set(binary, { probe, mtime: resolved?.mtime ?? null, probedAt: Date.now() });
+      return probe;
+    })();
+
+    this.inflight.set(binary, promise);
+    promise.finally(() => this.inflight.delete(binary)).catch(() => {});
+    return promise;
+  }
+
+  static async probeAll(binaries: string[], force = false): Promise<Map<string, ToolProbe>> {
+    const unique = [...new Set(binaries)];
+    const probes = await Promise.all(unique.map((b) => this.probe(b, force)));
+    return new Map(unique.map((b, i) => [b, probes[i]]));
+  }
+}
@@ -0,0 +1,95 @@
+import { copyTree } from "../utils/fsCopy.ts";
+import { git } from "../utils/git.ts";
+
+// Baseline snapshot of a prepared workdir (after clone and install), so iterations can be
+// diffed against it and fresh attempts can start from it without cloning again.
+//
+// In a git checkout the snapshot is a tree object written through a private index file,
+// seeded from the checkout's own index so only changed files are hashed. Restoring is a
+// `read-tree -u --reset` back to that tree, which touches only the files that differ.
+// The repo's real index, HEAD and refs are never modified. Outside git the baseline is a
+// reflink copy of the directory, and diffs are unavailable.
+
+// Installed dependencies are not part of the snapshot even when they are not ignored
+const EXCLUDED_PATHSPECS = [":(exclude)node_modules", ":(exclude).venv", ":(exclude)venv"];
+// Diffs larger than this are cut, e.g. when a tool writes build output into the tree
+const MAX_DIFF_BYTES = 5 * 1024 * 1024;
+
+export interface WorkdirDiff {
+  patch: string;
+  files_changed: number;
+  truncated: boolean;
+}
+
+export class WorkdirSnapshot {
+  private constructor(
+    readonly workdir: string,
+    readonly kind: "git" | "copy",
+    private baseline: string, // tree id, or path of the baseline copy
+    private readonly indexFile: string | null,
+  ) {}
+
+  static async create(workdir: string): Promise<WorkdirSnapshot> {
+    const gitPath = async (name: string) => {
+      const res = await git(["rev-parse", "--git-path", name], { cwd: workdir });
+      if (!res.success) return null;
+      const path = res.stdout.trim();
+      return path.startsWith("/") ? path : `${workdir}/${path}`;
+    };
+    const indexFile = await gitPath("arena-snapshot.index");
+    if (indexFile) {
+      const realIndex = await gitPath("index");
+      if (realIndex) await Deno.copyFile(realIndex, indexFile).catch(() => {});
+      const snapshot = new WorkdirSnapshot(workdir, "git", "", indexFile);
+      snapshot.baseline = await snapshot.writeTree();
+      return snapshot;
+    }
+
+    const copy = `${workdir}.baseline`;
+    await copyTree(workdir, copy, "reflink");
+    return new WorkdirSnapshot(workdir, "copy", copy, null);
+  }
+
+  // Record the current state of the workdir as a tree in the private index
+  private async writeTree(): Promise<string> {
+    const env = { GIT_INDEX_FILE: this.indexFile! };
+    const add = await git(["add", "-A", "--", ".", ...EXCLUDED_PATHSPECS], { cwd: this.workdir, env });
+    if (!add.success) throw new Error(`Snapshot failed: ${add.stderr.trim()}`);
+    const tree = await git(["write-tree"], { cwd: this.workdir, env });
+    if (!tree.success) throw new Error(`Snapshot failed: ${tree.stderr.trim()}`);
+    return tree.stdout.trim();
+  }
+
+  // Changes in the workdir since the baseline, as a binary-safe unified diff
+  async diff(): Promise<WorkdirDiff | null> {
+    if (this.kind !== "git") return null;
+    const tree = await this.writeTree();
+    const res = await git(["diff", "--binary", "--no-color", "--no-ext-diff", this.baseline, tree], { cwd: this.workdir });
+    if (!res.success) throw new Error(`Diff failed: ${res.stderr.trim()}`);
+    const files = res.stdout.match(/^diff --git /gm)?.length ?? 0;
+    const truncated = res.stdout.length > MAX_DIFF_BYTES;
+    return {
+      patch: truncated ? `${res.stdout.slice(0, MAX_DIFF_BYTES)}\n... (diff truncated)\n` : res.stdout,
+      files_changed: files,
+      truncated,
+    };
+  }
+
+  // Put the workdir back to the baseline
+  async restore(): Promise<void> {
+    if (this.kind === "copy") {
+      await Deno.remove(this.workdir, { recursive: true });
+      await copyTree(this.baseline, this.workdir, "reflink");
+      return;
+    }
+    // Refresh the private index first so files added since the baseline get removed
+    await this.writeTree();
+    const res = await git(["read-tree", "-u", "--reset", this.baseline], { cwd: this.workdir, env: { GIT_INDEX_FILE: this.indexFile! } });
+    if (!res.success) throw new Error(`Restore failed: ${res.stderr.trim()}`);
+  }
+
+  async dispose(): Promise<void> {
+    const path = this.kind === "git" ? this.indexFile! : this.baseline;
+    await Deno.remove(path, { recursive: true }).catch(() => {});
+  }
+}
@@ -1,4 +1,7 @@
-import { DB } from "sqlite";
+import { DB, type PreparedQuery } from "sqlite";
+import { type HistogramChild, metrics } from "./utils/metrics.ts";
+import { tracer } from "./utils/tracing.ts";
+import { clusterRole, coordinatorClient } from "./utils/cluster.ts";
 
 export interface RunHistory {
   id: number;
@@ -47,11 +50,125 @@ export interface LLMModel {
 
 export interface ExecResult { lastInsertRowId: number; changes: number }
 
-class SQLiteDB {
+export type JobStatus = "queued" | "running" | "succeeded" | "failed" | "cancelled";
+
+export interface Job {
+  id: number;
+  type: string;
+  payload: any;
+  priority: number;
+  status: JobStatus;
+  idempotency_key: string | null;
+  attempts: number;
+  max_attempts: number;
+  lease_owner: string | null;
+  lease_expires_at: number | null;
+  run_id: string | null;
+  result?: any;
+  error: string | null;
+  created_at: string;
+  started_at: string | null;
+  finished_at: string | null;
+}
+
+export interface SuitePromptInput {
+  prompt: string;
+  external_id?: string | null;
+  temperature?: number | null;
+  max_tokens?: number | null;
+}
+
+export interface SuitePrompt extends Required<SuitePromptInput> {
+  id: number;
+  suite_id: number;
+  position: number;
+}
+
+export interface PromptSuite {
+  id: number;
+  name: string;
+  description: string | null;
+  created_at: string;
+  prompt_count: number;
+}
+
+export type SuiteBatchStatus = "queued" | "running" | "completed" | "failed";
+
+export interface SuiteBatch {
+  id: number;
+  suite_id: number;
+  models: string[];
+  temperature: number | null;
+  max_tokens: number | null;
+  status: SuiteBatchStatus;
+  job_id: number | null;
+  idempotency_key: string | null;
+  created_at: string;
+  finished_at: string | null;
+}
+
+export interface SuiteBatchCell {
+  prompt_id: number;
+  model: string;
+  status: "succeeded" | "failed";
+  response_time_ms: number;
+  latency_ms: number | null;
+  tokens_per_second: number | null;
+  total_tokens: number;
+  error: string | null;
+}
+
+// Per-model totals over a batch's cells; averages cover succeeded cells
+export interface SuiteModelAggregate {
+  model: string;
+  cells: number;
+  succeeded: number;
+  failed: number;
+  avg_latency_ms: number | null;
+  avg_tokens_per_second: number | null;
+  avg_response_time_ms: number | null;
+  total_tokens: number;
+}
+
+export interface EnqueueJob {
+  type: string;
+  payload: any;
+  priority?: number;
+  idempotencyKey?: string | null;
+  joinActive?: boolean;
+  maxAttempts?: number;
+}
+
+export const VERSIONED_TABLES = ["run_history", "test_results"] as const;
+export type VersionedTable = typeof VERSIONED_TABLES[number];
+
+const queryDuration = metrics.histogram(
+  "db_query_duration_seconds",
+  "SQLite statement latency, by statement kind and table",
+  ["statement"],
+  [0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1],
+);
+// Statement name and latency series per SQL string, resolved once; statements are literals
+// in code, so this stays small
+const statements = new Map<string, { name: string; series: HistogramChild }>();
+
+function statementFor(sql: string): { name: string; series: HistogramChild } {
+  let statement = statements.get(sql);
+  if (!statement) {
+    const kind = sql.trimStart().split(/\s/, 1)[0].toUpperCase();
+    const table = sql.match(/\b(?:FROM|INTO|UPDATE|TABLE)\s+(\w+)/i)?.[1] ?? "";
+    const name = table ? `${kind} ${table}` : kind;
+    statement = { name, series: queryDuration.labels(name) };
+    statements.set(sql, statement);
+  }
+  return statement;
+}
+
+export class SQLiteDB {
   private db: DB;
+  private versionQuery: PreparedQuery<[number]> | null = null;
 
-  constructor() {
-    const databasePath = (globalThis as any).Deno?.env?.get("DATABASE_PATH") || "./llm_speed_test.db";
+  constructor(databasePath: string = (globalThis as any).Deno?.env?.get("DATABASE_PATH") || "./llm_speed_test.db") {
     this.db = new DB(databasePath);
     this.initSchema();
     this.seedProviders();
@@ -133,6 +250,18 @@ class SQLiteDB {
       created_at TEXT DEFAULT CURRENT_TIMESTAMP
     )`);
 
+    this.db.execute(`CREATE TABLE IF NOT EXISTS code_completions (
+      id INTEGER PRIMARY KEY AUTOINCREMENT,
+      model TEXT NOT NULL,
+      prompt_hash TEXT NOT NULL,
+      temperature REAL NOT NULL,
+      sample_index INTEGER NOT NULL,
+      code TEXT NOT NULL,
+      generation TEXT,
+      created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+      UNIQUE (model, prompt_hash, temperature, sample_index)
+    )`);
+
     this.db.execute(`CREATE TABLE IF NOT EXISTS repo_test_runs (
       id INTEGER PRIMARY KEY AUTOINCREMENT,
       repo_url TEXT NOT NULL,
@@ -154,6 +283,152 @@ class SQLiteDB {
       error TEXT,
       created_at TEXT DEFAULT CURRENT_TIMESTAMP
     )`);
+
+    this.db.execute(`CREATE TABLE IF NOT EXISTS repo_test_cases (
+      id INTEGER PRIMARY KEY AUTOINCREMENT,
+      run_id INTEGER NOT NULL,
+      iteration INTEGER NOT NULL,
+      suite TEXT,
+      name TEXT NOT NULL,
+      status TEXT NOT NULL,
+      duration_ms INTEGER,
+      message TEXT
+    )`);
+    this.db.execute(`CREATE INDEX IF NOT EXISTS idx_repo_test_cases_run ON repo_test_cases (run_id, iteration)`);
+
+    this.db.execute(`CREATE TABLE IF NOT EXISTS repo_test_spans (
+      id INTEGER PRIMARY KEY AUTOINCREMENT,
+      run_id INTEGER NOT NULL,
+      name TEXT NOT NULL,
+      parent TEXT,
+      iteration INTEGER,
+      start_ms REAL NOT NULL,
+      duration_ms REAL NOT NULL
+    )`);
+    this.db.execute(`CREATE INDEX IF NOT EXISTS idx_repo_test_spans_run ON repo_test_spans (run_id)`);
+
+    this.db.execute(`CREATE TABLE IF NOT EXISTS repo_test_iterations (
+      id INTEGER PRIMARY KEY AUTOINCREMENT,
+      run_id INTEGER NOT NULL,
+      iteration INTEGER NOT NULL,
+      test_exit_code INTEGER,
+      tests_passed INTEGER DEFAULT 0,
+      tests_failed INTEGER DEFAULT 0,
+      tests_total INTEGER DEFAULT 0,
+      duration_ms INTEGER,
+      files_changed INTEGER,
+      diff_bytes INTEGER,
+      diff_gz BLOB
+    )`);
+    this.db.execute(`CREATE INDEX IF NOT EXISTS idx_repo_test_iterations_run ON repo_test_iterations (run_id, iteration)`);
+
+    // Change counters for tables behind polled endpoints, bumped by triggers so every writer
+    // counts. They seed ETags, so a poll with nothing new is answered without reading the table.
+    // Counters start at the creation time, so a recreated database does not reuse old values.
+    this.db.execute(`CREATE TABLE IF NOT EXISTS table_versions (
+      name TEXT PRIMARY KEY,
+      version INTEGER NOT NULL
+    )`);
+    for (const table of VERSIONED_TABLES) {
+      this.db.query("INSERT OR IGNORE INTO table_versions (name, version) VALUES (?, ?)", [table, Date.now()]);
+      for (const event of ["INSERT", "UPDATE", "DELETE"]) {
+        this.db.execute(`CREATE TRIGGER IF NOT EXISTS ${table}_version_${event.toLowerCase()} AFTER ${event} ON ${table}
+          BEGIN UPDATE table_versions SET version = version + 1 WHERE name = '${table}'; END`);
+      }
+    }
+
+    // Background job queue. A running job holds a lease (epoch ms) that its executor renews; once
+    // it lapses, e.g. because the process died, the job is claimed again until max_attempts.
+    this.db.execute(`CREATE TABLE IF NOT EXISTS jobs (
+      id INTEGER PRIMARY KEY AUTOINCREMENT,
+      type TEXT NOT NULL,
+      payload TEXT NOT NULL,
+      priority INTEGER NOT NULL DEFAULT 0,
+      status TEXT NOT NULL DEFAULT 'queued',
+      idempotency_key TEXT UNIQUE,
+      attempts INTEGER NOT NULL DEFAULT 0,
+      max_attempts INTEGER NOT NULL DEFAULT 3,
+      lease_owner TEXT,
+      lease_expires_at INTEGER,
+      run_id TEXT,
+      result TEXT,
+      error TEXT,
+      created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+      started_at TEXT,
+      finished_at TEXT
+    )`);
+    this.db.execute(`CREATE INDEX IF NOT EXISTS idx_jobs_claim ON jobs (status, priority DESC, id)`);
+
+    // Named prompt suites, and batches that run every prompt of a suite against a model list.
+    // A batch cell is one (prompt, model) result; its metrics also go to test_results.
+    this.db.execute(`CREATE TABLE IF NOT EXISTS prompt_suites (
+      id INTEGER PRIMARY KEY AUTOINCREMENT,
+      name TEXT NOT NULL UNIQUE,
+      description TEXT,
+      created_at TEXT DEFAULT CURRENT_TIMESTAMP
+    )`);
+
+    this.db.execute(`CREATE TABLE IF NOT EXISTS prompt_suite_prompts (
+      id INTEGER PRIMARY KEY AUTOINCREMENT,
+      suite_id INTEGER NOT NULL,
+      position INTEGER NOT NULL,
+      external_id TEXT,
+      prompt TEXT NOT NULL,
+      temperature REAL,
+      max_tokens INTEGER,
+      UNIQUE (suite_id, position)
+    )`);
+
+    this.db.execute(`CREATE TABLE IF NOT EXISTS suite_batches (
+      id INTEGER PRIMARY KEY AUTOINCREMENT,
+      suite_id INTEGER NOT NULL,
+      models TEXT NOT NULL,
+      temperature REAL,
+      max_tokens INTEGER,
+      status TEXT NOT NULL DEFAULT 'queued',
+      job_id INTEGER,
+      idempotency_key TEXT UNIQUE,
+      created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+      finished_at TEXT
+    )`);
+    this.db.execute(`CREATE INDEX IF NOT EXISTS idx_suite_batches_suite ON suite_batches (suite_id, id)`);
+
+    this.db.execute(`CREATE TABLE IF NOT EXISTS suite_batch_cells (
+      batch_id INTEGER NOT NULL,
+      prompt_id INTEGER NOT NULL,
+      model TEXT NOT NULL,
+      status TEXT NOT NULL,
+      test_result_id INTEGER,
+      response_time_ms INTEGER,
+      latency_ms INTEGER,
+      tokens_per_second REAL,
+      total_tokens INTEGER,
+      error TEXT,
+      created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+      PRIMARY KEY (batch_id, prompt_id, model)
+    )`);
+
+    // Columns added after the initial release; CREATE TABLE IF NOT EXISTS leaves old databases untouched
+    this.addColumnIfMissing("code_eval_runs", "source_run_id", "INTEGER");
+    this.addColumnIfMissing("repo_test_runs", "install_duration_ms", "INTEGER");
+    this.addColumnIfMissing("repo_test_runs", "timeout_phase", "TEXT");
+    this.addColumnIfMissing("repo_test_runs", "strategy", "TEXT");
+    this.addColumnIfMissing("repo_test_runs", "best_iteration", "INTEGER");
+    this.addColumnIfMissing("repo_test_runs", "test_scope", "TEXT");
+    this.addColumnIfMissing("repo_test_iterations", "test_scope", "TEXT");
+    this.addColumnIfMissing("repo_test_iterations", "failed_first_passed", "INTEGER");
+    this.addColumnIfMissing("repo_test_iterations", "failed_first_failed", "INTEGER");
+    this.addColumnIfMissing("repo_test_iterations", "failed_first_total", "INTEGER");
+    this.addColumnIfMissing("repo_test_iterations", "failed_first_duration_ms", "INTEGER");
+    this.addColumnIfMissing("test_results", "latency_ms", "INTEGER");
+    this.addColumnIfMissing("test_results", "tokens_per_second", "REAL");
+    this.addColumnIfMissing("test_results", "total_tokens", "INTEGER");
+  }
+
+  private addColumnIfMissing(table: string, column: string, definition: string) {
+    const columns = this.query<{ name: string }>(`PRAGMA table_info(${table})`);
+    if (columns.some((c) => c.name === column)) return;
+    this.db.execute(`ALTER TABLE ${table} ADD COLUMN ${column} ${definition}`);
   }
 
   private seedProviders() {
@@ -194,18 +469,59 @@ class SQLiteDB {
 
   // Generic query/execute
   query<T = any>(sql: string, params: any[] = []): T[] {
-    const q = this.db.prepareQuery(sql);
-    const rows = q.allEntries(params);
-    q.finalize();
-    return rows as unknown as T[];
+    return this.timed(sql, () => {
+      const q = this.db.prepareQuery(sql);
+      const rows = q.allEntries(params);
+      q.finalize();
+      return rows as unknown as T[];
+    });
   }
 
   execute(sql: string, params: any[] = []): ExecResult {
-    const q = this.db.prepareQuery(sql);
-    const result = q.execute(params);
-    const lastId = (this.db as any).lastInsertRowId as number | undefined;
-    q.finalize();
-    return { lastInsertRowId: lastId ?? 0, changes: (result as any)?.changes ?? 0 };
+    return this.timed(sql, () => {
+      const q = this.db.prepareQuery(sql);
+      q.execute(params);
+      q.finalize();
+      // PreparedQuery.execute returns nothing; the connection reports the last statement's effect
+      return { lastInsertRowId: this.db.lastInsertRowId, changes: this.db.changes };
+    });
+  }
+
+  // Latency metric per statement, plus a client span when the caller is being traced
+  private timed<T>(sql: string, run: () => T): T {
+    const statement = statementFor(sql);
+    const start = performance.now();
+    const span = tracer.enabled
+      ? tracer.startSpan(statement.name, { kind: "client", attributes: { "db.system": "sqlite", "db.statement": sql } })
+      : null;
+    try {
+      return run();
+    } catch (error) {
+      span?.recordError(error);
+      throw error;
+    } finally {
+      span?.end();
+      statement.series.observeSince(start);
+    }
+  }
+
+  // Change counter of a table in VERSIONED_TABLES
+  getTableVersion(table: VersionedTable): number {
+    const q = this.versionQuery ??= this.db.prepareQuery<[number]>("SELECT version FROM table_versions WHERE name = ?");
+    return q.first([table])?.[0] ?? 0;
+  }
+
+  // Test results; one row per completion, whichever feature made it
+  createTestResult(result: {
+    prompt: string; provider: string; model: string; response_time: number; response_text?: string; status: string;
+    latency_ms?: number | null; tokens_per_second?: number | null; total_tokens?: number | null;
+  }): number {
+    return this.execute(
+      `INSERT INTO test_results (prompt, provider, model, response_time, response_text, status, latency_ms, tokens_per_second, total_tokens)
+       VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)`,
+      [result.prompt, result.provider, result.model, result.response_time, result.response_text ?? null, result.status,
+        result.latency_ms ?? null, result.tokens_per_second ?? null, result.total_tokens ?? null]
+    ).lastInsertRowId;
   }
 
   // Run history
@@ -381,17 +697,69 @@ class SQLiteDB {
   }
 
   // Code evaluation runs
-  saveCodeEvalRun(run: { exerciseId: string; exerciseName: string; testCount: number; models: string[]; results: any[] }): number {
+  saveCodeEvalRun(run: { exerciseId: string; exerciseName: string; testCount: number; models: string[]; results: any[]; sourceRunId?: number | null }): number {
     const res = this.execute(
-      "INSERT INTO code_eval_runs (exerciseId, exerciseName, testCount, models, results) VALUES (?, ?, ?, ?, ?)",
-      [run.exerciseId, run.exerciseName, run.testCount, JSON.stringify(run.models), JSON.stringify(run.results)]
+      "INSERT INTO code_eval_runs (exerciseId, exerciseName, testCount, models, results, source_run_id) VALUES (?, ?, ?, ?, ?, ?)",
+      [run.exerciseId, run.exerciseName, run.testCount, JSON.stringify(run.models), JSON.stringify(run.results), run.sourceRunId ?? null]
     );
     return res.lastInsertRowId;
   }
 
+  private mapCodeEvalRun(row: any): any {
+    const { source_run_id, ...rest } = row;
+    return { ...rest, sourceRunId: source_run_id ?? null, models: JSON.parse(row.models), results: JSON.parse(row.results) };
+  }
+
   getCodeEvalRuns(limit: number = 50): any[] {
     const rows = this.query<any>("SELECT * FROM code_eval_runs ORDER BY created_at DESC LIMIT ?", [limit]);
-    return rows.map((r) => ({ ...r, models: JSON.parse(r.models), results: JSON.parse(r.results) }));
+    return rows.map((r) => this.mapCodeEvalRun(r));
+  }
+
+  getCodeEvalRun(id: number): any | undefined {
+    const row = this.query<any>("SELECT * FROM code_eval_runs WHERE id = ?", [id])[0];
+    return row ? this.mapCodeEvalRun(row) : undefined;
+  }
+
+  // Dates are compared as dates, so "2026-01-01" and "2026-01-01T00:00:00Z" both work; a
+  // date-only endDate includes that whole day
+  findCodeEvalRuns(filter: { exerciseId?: string; model?: string; startDate?: string; endDate?: string; limit: number }): any[] {
+    const where: string[] = [];
+    const params: any[] = [];
+    if (filter.exerciseId) {
+      where.push("exerciseId = ?");
+      params.push(filter.exerciseId);
+    }
+    if (filter.model) {
+      where.push("EXISTS (SELECT 1 FROM json_each(code_eval_runs.models) WHERE value = ?)");
+      params.push(filter.model);
+    }
+    if (filter.startDate) {
+      where.push("datetime(created_at) >= datetime(?)");
+      params.push(filter.startDate);
+    }
+    if (filter.endDate) {
+      where.push(/^\d{4}-\d{2}-\d{2}$/.test(filter.endDate) ? "date(created_at) <= date(?)" : "datetime(created_at) <= datetime(?)");
+      params.push(filter.endDate);
+    }
+    params.push(filter.limit);
+    const sql = `SELECT * FROM code_eval_runs ${where.length ? `WHERE ${where.join(" AND ")}` : ""} ORDER BY created_at DESC, id DESC LIMIT ?`;
+    return this.query<any>(sql, params).map((r) => this.mapCodeEvalRun(r));
+  }
+
+  // Cached code completions, keyed by (model, prompt hash, temperature, sample index)
+  getCodeCompletion(model: string, promptHash: string, temperature: number, sampleIndex: number): { code: string; generation: any } | undefined {
+    const row = this.query<any>(
+      "SELECT code, generation FROM code_completions WHERE model = ? AND prompt_hash = ? AND temperature = ? AND sample_index = ?",
+      [model, promptHash, temperature, sampleIndex]
+    )[0];
+    return row ? { code: row.code, generation: row.generation ? JSON.parse(row.generation) : null } : undefined;
+  }
+
+  saveCodeCompletion(entry: { model: string; promptHash: string; temperature: number; sampleIndex: number; code: string; generation?: any }): void {
+    this.execute(
+      "INSERT OR REPLACE INTO code_completions (model, prompt_hash, temperature, sample_index, code, generation) VALUES (?, ?, ?, ?, ?, ?)",
+      [entry.model, entry.promptHash, entry.temperature, entry.sampleIndex, entry.code, entry.generation ? JSON.stringify(entry.generation) : null]
+    );
   }
 
   // Repo test runs
@@ -414,7 +782,7 @@ class SQLiteDB {
   }
 
   updateRepoTestRun(id: number, updates: Record<string, any>): boolean {
-    const allowed = ["status","clone_duration_ms","tool_duration_ms","test_duration_ms","total_duration_ms","tests_passed","tests_failed","tests_total","test_output","tool_output","error"];
+    const allowed = ["status","clone_duration_ms","install_duration_ms","tool_duration_ms","test_duration_ms","total_duration_ms","tests_passed","tests_failed","tests_total","test_output","tool_output","error","timeout_phase","strategy","best_iteration","test_scope"];
     const fields: string[] = [];
     const params: any[] = [];
     for (const key of allowed) {
@@ -429,16 +797,358 @@ class SQLiteDB {
     return res.changes > 0;
   }
 
+  saveRepoTestCases(runId: number, iteration: number, cases: Array<{
+    suite: string | null; name: string; status: string; duration_ms: number | null; message?: string;
+  }>): void {
+    if (cases.length === 0) return;
+    this.db.transaction(() => {
+      const stmt = this.db.prepareQuery(
+        "INSERT INTO repo_test_cases (run_id, iteration, suite, name, status, duration_ms, message) VALUES (?, ?, ?, ?, ?, ?, ?)"
+      );
+      try {
+        for (const c of cases) {
+          stmt.execute([runId, iteration, c.suite, c.name, c.status, c.duration_ms, c.message ?? null]);
+        }
+      } finally {
+        stmt.finalize();
+      }
+    });
+  }
+
+  getRepoTestCases(runId: number): any[] {
+    return this.query<any>(
+      "SELECT iteration, suite, name, status, duration_ms, message FROM repo_test_cases WHERE run_id = ? ORDER BY iteration, id",
+      [runId]
+    );
+  }
+
+  saveRepoTestSpans(runId: number, spans: Array<{
+    name: string; parent: string | null; iteration: number | null; start_ms: number; duration_ms: number;
+  }>): void {
+    if (spans.length === 0) return;
+    this.db.transaction(() => {
+      const stmt = this.db.prepareQuery(
+        "INSERT INTO repo_test_spans (run_id, name, parent, iteration, start_ms, duration_ms) VALUES (?, ?, ?, ?, ?, ?)"
+      );
+      try {
+        for (const s of spans) stmt.execute([runId, s.name, s.parent, s.iteration, s.start_ms, s.duration_ms]);
+      } finally {
+        stmt.finalize();
+      }
+    });
+  }
+
+  // Ordered by start time, i.e. ready to draw as a waterfall
+  getRepoTestSpans(runId: number): any[] {
+    return this.query<any>(
+      "SELECT name, parent, iteration, start_ms, duration_ms FROM repo_test_spans WHERE run_id = ? ORDER BY start_ms, id",
+      [runId]
+    );
+  }
+
   getRepoTestRuns(limit: number = 50): any[] {
     return this.query<any>("SELECT * FROM repo_test_runs ORDER BY created_at DESC LIMIT ?", [limit]);
   }
 
+  saveRepoTestIteration(runId: number, iteration: {
+    iteration: number; test_exit_code: number; tests_passed: number; tests_failed: number; tests_total: number;
+    duration_ms: number; files_changed: number | null; diff_bytes: number | null; diff_gz: Uint8Array | null;
+    test_scope: string; failed_first_passed: number | null; failed_first_failed: number | null;
+    failed_first_total: number | null; failed_first_duration_ms: number | null;
+  }): void {
+    this.execute(
+      `INSERT INTO repo_test_iterations (run_id, iteration, test_exit_code, tests_passed, tests_failed, tests_total, duration_ms,
+         files_changed, diff_bytes, diff_gz, test_scope, failed_first_passed, failed_first_failed, failed_first_total, failed_first_duration_ms)
+       VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)`,
+      [runId, iteration.iteration, iteration.test_exit_code, iteration.tests_passed, iteration.tests_failed, iteration.tests_total,
+       iteration.duration_ms, iteration.files_changed, iteration.diff_bytes, iteration.diff_gz, iteration.test_scope,
+       iteration.failed_first_passed, iteration.failed_first_failed, iteration.failed_first_total, iteration.failed_first_duration_ms]
+    );
+  }
+
+  // Without the diffs themselves; see getRepoTestIterationDiff
+  getRepoTestIterations(runId: number): any[] {
+    return this.query<any>(
+      `SELECT iteration, test_exit_code, tests_passed, tests_failed, tests_total, duration_ms, files_changed, diff_bytes,
+         test_scope, failed_first_passed, failed_first_failed, failed_first_total, failed_first_duration_ms
+       FROM repo_test_iterations WHERE run_id = ? ORDER BY iteration`,
+      [runId]
+    );
+  }
+
+  getRepoTestIterationDiff(runId: number, iteration: number): Uint8Array | null | undefined {
+    const rows = this.query<{ diff_gz: Uint8Array | null }>(
+      "SELECT diff_gz FROM repo_test_iterations WHERE run_id = ? AND iteration = ?",
+      [runId, iteration]
+    );
+    return rows.length === 0 ? undefined : rows[0].diff_gz;
+  }
+
   getRepoTestRun(id: number): any | undefined {
     const rows = this.query<any>("SELECT * FROM repo_test_runs WHERE id = ?", [id]);
     return rows[0];
   }
+
+  // Jobs. Each method is one call, so it stays atomic when cluster workers run it on the primary.
+  private jobFromRow(row: any): Job {
+    return {
+      ...row,
+      payload: JSON.parse(row.payload),
+      ...(row.result !== undefined ? { result: row.result === null ? null : JSON.parse(row.result) } : {}),
+    };
+  }
+
+  // Returns the existing job instead when the idempotency key was used before, or with
+  // `joinActive`, when a queued or running job of the type has the same payload
+  enqueueJob(job: EnqueueJob): { job: Job; created: boolean } {
+    const payload = JSON.stringify(job.payload ?? null);
+    return this.db.transaction(() => {
+      const existing = (job.idempotencyKey
+        ? this.query<any>("SELECT * FROM jobs WHERE idempotency_key = ?", [job.idempotencyKey])[0]
+        : undefined) ?? (job.joinActive
+        ? this.query<any>(
+          "SELECT * FROM jobs WHERE type = ? AND payload = ? AND status IN ('queued', 'running') ORDER BY id DESC LIMIT 1",
+          [job.type, payload]
+        )[0]
+        : undefined);
+      if (existing) return { job: this.jobFromRow(existing), created: false };
+      const { lastInsertRowId } = this.execute(
+        "INSERT INTO jobs (type, payload, priority, idempotency_key, max_attempts) VALUES (?, ?, ?, ?, ?)",
+        [job.type, payload, job.priority ?? 0, job.idempotencyKey || null, job.maxAttempts ?? 3]
+      );
+      return { job: this.getJob(lastInsertRowId)!, created: true };
+    });
+  }
+
+  getJob(id: number): Job | undefined {
+    const row = this.query<any>("SELECT * FROM jobs WHERE id = ?", [id])[0];
+    return row ? this.jobFromRow(row) : undefined;
+  }
+
+  // Newest first, without results
+  listJobs(limit: number = 50, status?: JobStatus): Job[] {
+    const columns = "id, type, payload, priority, status, idempotency_key, attempts, max_attempts, lease_owner, lease_expires_at, run_id, error, created_at, started_at, finished_at";
+    const rows = status
+      ? this.query<any>(`SELECT ${columns} FROM jobs WHERE status = ? ORDER BY id DESC LIMIT ?`, [status, limit])
+      : this.query<any>(`SELECT ${columns} FROM jobs ORDER BY id DESC LIMIT ?`, [limit]);
+    return rows.map((row) => this.jobFromRow(row));
+  }
+
+  // Lease the highest-priority job whose type is under its concurrency limit: a queued one, or a
+  // running one whose lease lapsed. Lapsed jobs out of attempts are failed on the way.
+  claimJob(owner: string, limits: Record<string, number>, leaseMs: number): Job | undefined {
+    return this.db.transaction(() => {
+      const now = Date.now();
+      this.execute(
+        `UPDATE jobs SET status = 'failed', error = 'Lease expired after ' || attempts || ' attempt(s)', lease_owner = NULL, finished_at = CURRENT_TIMESTAMP
+         WHERE status = 'running' AND lease_expires_at < ? AND attempts >= max_attempts`,
+        [now]
+      );
+      const running = new Map(
+        this.query<{ type: string; c: number }>(
+          "SELECT type, COUNT(*) as c FROM jobs WHERE status = 'running' AND lease_expires_at >= ? GROUP BY type",
+          [now]
+        ).map((r) => [r.type, r.c])
+      );
+      const types = Object.keys(limits).filter((type) => (running.get(type) ?? 0) < limits[type]);
+      if (types.length === 0) return undefined;
+
+      const next = this.query<{ id: number }>(
+        `SELECT id FROM jobs WHERE type IN (${types.map(() => "?").join(", ")})
+         AND (status = 'queued' OR (status = 'running' AND lease_expires_at < ?))
+         ORDER BY priority DESC, id LIMIT 1`,
+        [...types, now]
+      )[0];
+      if (!next) return undefined;
+      this.execute(
+        `UPDATE jobs SET status = 'running', attempts = attempts + 1, lease_owner = ?, lease_expires_at = ?, run_id = NULL, error = NULL, started_at = CURRENT_TIMESTAMP
+         WHERE id = ?`,
+        [owner, now + leaseMs, next.id]
+      );
+      return this.getJob(next.id);
+    });
+  }
+
+  // The writes below only apply while `owner` still holds the lease, so an executor that lost
+  // its job to a retry cannot overwrite the retry's outcome
+  setJobRun(id: number, owner: string, runId: string): boolean {
+    return this.execute("UPDATE jobs SET run_id = ? WHERE id = ? AND lease_owner = ? AND status = 'running'", [runId, id, owner]).changes > 0;
+  }
+
+  heartbeatJob(id: number, owner: string, leaseMs: number): boolean {
+    return this.execute(
+      "UPDATE jobs SET lease_expires_at = ? WHERE id = ? AND lease_owner = ? AND status = 'running'",
+      [Date.now() + leaseMs, id, owner]
+    ).changes > 0;
+  }
+
+  completeJob(id: number, owner: string, result: any): boolean {
+    return this.execute(
+      "UPDATE jobs SET status = 'succeeded', result = ?, lease_owner = NULL, finished_at = CURRENT_TIMESTAMP WHERE id = ? AND lease_owner = ? AND status = 'running'",
+      [JSON.stringify(result ?? null), id, owner]
+    ).changes > 0;
+  }
+
+  failJob(id: number, owner: string, error: string): boolean {
+    return this.execute(
+      "UPDATE jobs SET status = 'failed', error = ?, lease_owner = NULL, finished_at = CURRENT_TIMESTAMP WHERE id = ? AND lease_owner = ? AND status = 'running'",
+      [error, id, owner]
+    ).changes > 0;
+  }
+
+  // Only queued jobs; a running one has to finish
+  cancelJob(id: number): boolean {
+    return this.execute(
+      "UPDATE jobs SET status = 'cancelled', finished_at = CURRENT_TIMESTAMP WHERE id = ? AND status = 'queued'",
+      [id]
+    ).changes > 0;
+  }
+
+  // Prompt suites
+  createPromptSuite(suite: { name: string; description?: string | null; prompts: SuitePromptInput[] }): number {
+    return this.db.transaction(() => {
+      const { lastInsertRowId } = this.execute(
+        "INSERT INTO prompt_suites (name, description) VALUES (?, ?)",
+        [suite.name, suite.description ?? null]
+      );
+      const stmt = this.db.prepareQuery(
+        "INSERT INTO prompt_suite_prompts (suite_id, position, external_id, prompt, temperature, max_tokens) VALUES (?, ?, ?, ?, ?, ?)"
+      );
+      suite.prompts.forEach((p, position) => {
+        stmt.execute([lastInsertRowId, position, p.external_id ?? null, p.prompt, p.temperature ?? null, p.max_tokens ?? null]);
+      });
+      stmt.finalize();
+      return lastInsertRowId;
+    });
+  }
+
+  getPromptSuites(): PromptSuite[] {
+    return this.query<PromptSuite>(
+      `SELECT s.*, (SELECT COUNT(*) FROM prompt_suite_prompts p WHERE p.suite_id = s.id) as prompt_count
+       FROM prompt_suites s ORDER BY s.id DESC`
+    );
+  }
+
+  getPromptSuite(idOrName: number | string): PromptSuite | undefined {
+    const column = typeof idOrName === "number" ? "s.id" : "s.name";
+    return this.query<PromptSuite>(
+      `SELECT s.*, (SELECT COUNT(*) FROM prompt_suite_prompts p WHERE p.suite_id = s.id) as prompt_count
+       FROM prompt_suites s WHERE ${column} = ?`,
+      [idOrName]
+    )[0];
+  }
+
+  getSuitePrompts(suiteId: number): SuitePrompt[] {
+    return this.query<SuitePrompt>("SELECT * FROM prompt_suite_prompts WHERE suite_id = ? ORDER BY position", [suiteId]);
+  }
+
+  // Suite batches. Returns the existing batch instead when the idempotency key was used before.
+  createSuiteBatch(batch: { suiteId: number; models: string[]; temperature?: number | null; maxTokens?: number | null; idempotencyKey?: string | null }): { batch: SuiteBatch; created: boolean } {
+    return this.db.transaction(() => {
+      if (batch.idempotencyKey) {
+        const existing = this.query<any>("SELECT id FROM suite_batches WHERE idempotency_key = ?", [batch.idempotencyKey])[0];
+        if (existing) return { batch: this.getSuiteBatch(existing.id)!, created: false };
+      }
+      const { lastInsertRowId } = this.execute(
+        "INSERT INTO suite_batches (suite_id, models, temperature, max_tokens, idempotency_key) VALUES (?, ?, ?, ?, ?)",
+        [batch.suiteId, JSON.stringify(batch.models), batch.temperature ?? null, batch.maxTokens ?? null, batch.idempotencyKey || null]
+      );
+      return { batch: this.getSuiteBatch(lastInsertRowId)!, created: true };
+    });
+  }
+
+  getSuiteBatch(id: number): SuiteBatch | undefined {
+    const row = this.query<any>("SELECT * FROM suite_batches WHERE id = ?", [id])[0];
+    return row ? { ...row, models: JSON.parse(row.models) } : undefined;
+  }
+
+  getSuiteBatches(suiteId: number, limit: number = 50): SuiteBatch[] {
+    return this.query<any>("SELECT * FROM suite_batches WHERE suite_id = ? ORDER BY id DESC LIMIT ?", [suiteId, limit])
+      .map((row) => ({ ...row, models: JSON.parse(row.models) }));
+  }
+
+  updateSuiteBatch(id: number, updates: { status?: SuiteBatchStatus; job_id?: number; finished?: boolean }): boolean {
+    const sets: string[] = [];
+    const params: any[] = [];
+    if (updates.status !== undefined) { sets.push("status = ?"); params.push(updates.status); }
+    if (updates.job_id !== undefined) { sets.push("job_id = ?"); params.push(updates.job_id); }
+    if (updates.finished !== undefined) sets.push(updates.finished ? "finished_at = CURRENT_TIMESTAMP" : "finished_at = NULL");
+    if (sets.length === 0) return false;
+    return this.execute(`UPDATE suite_batches SET ${sets.join(", ")} WHERE id = ?`, [...params, id]).changes > 0;
+  }
+
+  // A finished cell, recorded as a test result like any other completion and as the batch's
+  // cell; a retried cell replaces its earlier outcome
+  saveSuiteBatchCell(batchId: number, prompt: string, cell: SuiteBatchCell & { response_text: string }): void {
+    this.db.transaction(() => {
+      const testResultId = this.createTestResult({
+        prompt,
+        provider: "OpenRouter",
+        model: cell.model,
+        response_time: cell.response_time_ms,
+        response_text: cell.response_text,
+        status: cell.error ? `error: ${cell.error}` : "completed",
+        latency_ms: cell.latency_ms,
+        tokens_per_second: cell.tokens_per_second,
+        total_tokens: cell.total_tokens,
+      });
+      this.execute(
+        `INSERT OR REPLACE INTO suite_batch_cells
+         (batch_id, prompt_id, model, status, test_result_id, response_time_ms, latency_ms, tokens_per_second, total_tokens, error)
+         VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)`,
+        [batchId, cell.prompt_id, cell.model, cell.status, testResultId, cell.response_time_ms, cell.latency_ms,
+          cell.tokens_per_second, cell.total_tokens, cell.error]
+      );
+    });
+  }
+
+  // In prompt order, with each prompt's position and external id
+  getSuiteBatchCells(batchId: number, limit: number = 500, offset: number = 0): any[] {
+    return this.query<any>(
+      `SELECT c.*, p.position, p.external_id FROM suite_batch_cells c
+       JOIN prompt_suite_prompts p ON p.id = c.prompt_id
+       WHERE c.batch_id = ? ORDER BY p.position, c.model LIMIT ? OFFSET ?`,
+      [batchId, limit, offset]
+    );
+  }
+
+  // "<prompt id>:<model>" of every cell that succeeded, i.e. that a resumed batch skips
+  getSucceededSuiteCells(batchId: number): string[] {
+    return this.query<{ prompt_id: number; model: string }>(
+      "SELECT prompt_id, model FROM suite_batch_cells WHERE batch_id = ? AND status = 'succeeded'",
+      [batchId]
+    ).map((c) => `${c.prompt_id}:${c.model}`);
+  }
+
+  getSuiteBatchAggregates(batchId: number, model?: string): SuiteModelAggregate[] {
+    return this.query<SuiteModelAggregate>(
+      `SELECT model,
+         COUNT(*) as cells,
+         SUM(status = 'succeeded') as succeeded,
+         SUM(status = 'failed') as failed,
+         AVG(CASE WHEN status = 'succeeded' THEN latency_ms END) as avg_latency_ms,
+         AVG(CASE WHEN status = 'succeeded' THEN tokens_per_second END) as avg_tokens_per_second,
+         AVG(CASE WHEN status = 'succeeded' THEN response_time_ms END) as avg_response_time_ms,
+         COALESCE(SUM(total_tokens), 0) as total_tokens
+       FROM suite_batch_cells WHERE batch_id = ?${model === undefined ? "" : " AND model = ?"}
+       GROUP BY model ORDER BY model`,
+      model === undefined ? [batchId] : [batchId, model]
+    );
+  }
+
+  // At startup nothing can still be running: expire running jobs' leases so they are claimed
+  // again, and close repo test runs that no job will finish
+  recoverInterruptedWork(): { jobs: number; repoTestRuns: number } {
+    return this.db.transaction(() => ({
+      jobs: this.execute("UPDATE jobs SET lease_expires_at = 0 WHERE status = 'running'").changes,
+      repoTestRuns: this.execute(
+        "UPDATE repo_test_runs SET status = 'error', error = 'Interrupted by a server restart' WHERE status IN ('pending', 'running')"
+      ).changes,
+    }));
+  }
 }
 
-const sqliteDb = new SQLiteDB();
+// Cluster workers never open the file: their calls run on the primary's connection
+const sqliteDb: SQLiteDB = clusterRole() === "worker" ? coordinatorClient<SQLiteDB>() : new SQLiteDB();
 export default sqliteDb;
 
@@ -0,0 +1,106 @@
+import { assertEquals, assertStringIncludes } from "https://deno.land/std@0.224.0/assert/mod.ts";
+import { clusterSize, decodeValue, encodeValue, gather, onCollect, publish, startCluster, subscribe } from "../utils/cluster.ts";
+import { Registry } from "../utils/metrics.ts";
+
+Deno.test("clusterSize: unset, numbers, auto and junk", () => {
+  assertEquals(clusterSize(undefined), 1);
+  assertEquals(clusterSize("4"), 4);
+  assertEquals(clusterSize("auto"), navigator.hardwareConcurrency || 1);
+  assertEquals(clusterSize("0"), 1);
+  assertEquals(clusterSize("many"), 1);
+});
+
+Deno.test("encodeValue/decodeValue: keep rows, undefined results and byte blobs", () => {
+  const diff = new Uint8Array(70_000).map((_, i) => i % 251);
+  const decoded = decodeValue(encodeValue([true, { rows: [{ id: 1, name: "a" }], diff }])) as [boolean, any];
+  assertEquals(decoded[0], true);
+  assertEquals(decoded[1].rows, [{ id: 1, name: "a" }]);
+  assertEquals(decoded[1].diff, diff);
+  assertEquals(decodeValue(encodeValue(undefined)), undefined);
+});
+
+Deno.test("Registry.renderMerged: sums series from several threads", () => {
+  const snapshot = (requests: number, open: number, latencies: number[]) => {
+    const registry = new Registry();
+    registry.counter("requests_total", "Requests", ["code"]).labels("200").inc(requests);
+    registry.gauge("streams_open", "Open streams").set(open);
+    const latency = registry.histogram("latency_seconds", "Latency", [], [0.1, 1]);
+    latencies.forEach((value) => latency.observe(value));
+    return registry.snapshot();
+  };
+
+  const text = Registry.renderMerged([snapshot(2, 1, [0.05]), snapshot(3, 2, [0.5, 5])]);
+  assertStringIncludes(text, "# TYPE requests_total counter\n");
+  assertStringIncludes(text, 'requests_total{code="200"} 5\n');
+  assertStringIncludes(text, "streams_open 3\n");
+  assertStringIncludes(text, 'latency_seconds_bucket{le="0.1"} 1\n');
+  assertStringIncludes(text, 'latency_seconds_bucket{le="1"} 2\n');
+  assertStringIncludes(text, 'latency_seconds_bucket{le="+Inf"} 3\n');
+  assertStringIncludes(text, "latency_seconds_count 3\n");
+});
+
+Deno.test("gather: answers from this thread alone outside a cluster", async () => {
+  onCollect("cluster-test", () => ({ ok: true }));
+  assertEquals(await gather("cluster-test"), [{ ok: true }]);
+  assertEquals(await gather("cluster-test-unknown"), [null]);
+});
+
+Deno.test({
+  name: "startCluster: workers call the primary's database synchronously, drop late answers, and restart after crashes",
+  sanitizeOps: false,
+  sanitizeResources: false,
+}, async () => {
+  const calls: string[] = [];
+  const exits: number[] = [];
+  const reports: any[] = [];
+  let reported: () => void = () => {};
+  const unsubscribe = subscribe("cluster-test-report", (report) => {
+    reports.push(report);
+    reported();
+  });
+  const nextReport = () => new Promise<void>((resolve) => reported = resolve);
+
+  let firstReport = nextReport();
+  const stop = startCluster({
+    workers: 1,
+    entry: new URL("./fixtures/clusterWorker.ts", import.meta.url),
+    execute: (method, args) => {
+      calls.push(method);
+      if (method === "echo") return args[0];
+      if (method === "big") return "x".repeat(args[0] as number);
+      if (method === "slow") {
+        // Blocks the primary well past the worker's timeout for this call
+        const until = Date.now() + 500;
+        while (Date.now() < until) { /* busy */ }
+        return "slow";
+      }
+      throw new Error(`no such method: ${method}`);
+    },
+    onWorkerExit: (id) => exits.push(id),
+  });
+
+  try {
+    await firstReport;
+    assertEquals(calls, ["echo", "fail", "big", "slow", "echo"]);
+    assertEquals(reports[0], {
+      worker: 1,
+      echoed: { id: 1, blob: new Uint8Array([1, 2, 3]) },
+      error: "no such method: fail",
+      // Larger than the 1 MiB shared buffer, so it came back in two chunks
+      bigLength: 1536 * 1024,
+      bigIntact: true,
+      timedOut: true,
+      afterTimeout: "after",
+    });
+
+    firstReport = nextReport();
+    publish("cluster-test-crash", null);
+    await firstReport;
+    assertEquals(exits, [1]);
+    assertEquals(reports[1].worker, 1);
+    assertEquals(calls.length, 10);
+  } finally {
+    stop();
+    unsubscribe();
+  }
+});
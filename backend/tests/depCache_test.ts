@@ -0,0 +1,94 @@
+import { assertEquals, assertRejects } from "https://deno.land/std@0.224.0/assert/mod.ts";
+import { DepCacheService } from "../services/depCacheService.ts";
+import { RepoTestService } from "../services/repoTestService.ts";
+
+const npmInstalled = await new Deno.Command("npm", { args: ["--version"], stdout: "null", stderr: "null" })
+  .output()
+  .then((r) => r.success, () => false);
+
+Deno.test("DepCacheService: installs once per lockfile and restores node_modules afterwards", async () => {
+  const root = await Deno.makeTempDir();
+  const previousDir = Deno.env.get("DEP_CACHE_DIR");
+  Deno.env.set("DEP_CACHE_DIR", `${root}/cache`);
+  try {
+    const makeWorkdir = async (name: string, lock: string) => {
+      const dir = `${root}/${name}`;
+      await Deno.mkdir(dir);
+      await Deno.writeTextFile(`${dir}/package.json`, `{"name":"demo"}`);
+      await Deno.writeTextFile(`${dir}/package-lock.json`, lock);
+      return dir;
+    };
+    let installs = 0;
+    const install = async (dir: string) => {
+      installs++;
+      await Deno.mkdir(`${dir}/node_modules/left-pad`, { recursive: true });
+      await Deno.writeTextFile(`${dir}/node_modules/left-pad/index.js`, "module.exports = 1;");
+    };
+
+    const first = await DepCacheService.prepare(await makeWorkdir("a", "v1"), install);
+    assertEquals(first.cached, false);
+    assertEquals(first.ecosystems, ["node"]);
+
+    const secondDir = await makeWorkdir("b", "v1");
+    const second = await DepCacheService.prepare(secondDir, install);
+    assertEquals(second.cached, true);
+    assertEquals(installs, 1);
+    assertEquals(await Deno.readTextFile(`${secondDir}/node_modules/left-pad/index.js`), "module.exports = 1;");
+
+    // A different lockfile is a different cache entry
+    const third = await DepCacheService.prepare(await makeWorkdir("c", "v2"), install);
+    assertEquals(third.cached, false);
+    assertEquals(installs, 2);
+  } finally {
+    if (previousDir === undefined) Deno.env.delete("DEP_CACHE_DIR");
+    else Deno.env.set("DEP_CACHE_DIR", previousDir);
+    await Deno.remove(root, { recursive: true }).catch(() => {});
+  }
+});
+
+Deno.test({
+  name: "installNodeDependencies: a failed npm install throws, so its partial node_modules is not cached",
+  ignore: !npmInstalled,
+}, async () => {
+  const root = await Deno.makeTempDir();
+  const previousDir = Deno.env.get("DEP_CACHE_DIR");
+  Deno.env.set("DEP_CACHE_DIR", `${root}/cache`);
+  const service = RepoTestService as unknown as { installNodeDependencies: (workdir: string) => Promise<void> };
+  try {
+    const dir = `${root}/work`;
+    await Deno.mkdir(`${dir}/node_modules/partial`, { recursive: true });
+    await Deno.mkdir(`${root}/cache`);
+    await Deno.writeTextFile(`${dir}/node_modules/partial/index.js`, "");
+    await Deno.writeTextFile(`${dir}/package.json`, `{"name":`);
+
+    await assertRejects(() => DepCacheService.prepare(dir, (workdir) => service.installNodeDependencies(workdir)));
+    const entries: string[] = [];
+    for await (const entry of Deno.readDir(`${root}/cache`)) entries.push(entry.name);
+    assertEquals(entries, []);
+  } finally {
+    if (previousDir === undefined) Deno.env.delete("DEP_CACHE_DIR");
+    else Deno.env.set("DEP_CACHE_DIR", previousDir);
+    await Deno.remove(root, { recursive: true }).catch(() => {});
+  }
+});
+
+Deno.test("isolateVenv: copies the venv and points its scripts and env at the copy", async () => {
+  const root = await Deno.makeTempDir();
+  try {
+    const venv = `${root}/cache/venv`;
+    await Deno.mkdir(`${venv}/bin`, { recursive: true });
+    await Deno.writeTextFile(`${venv}/bin/pip`, `#!${venv}/bin/python\nimport pip\n`);
+    await Deno.writeTextFile(`${venv}/bin/activate`, `VIRTUAL_ENV="${venv}"\n`);
+    const env = { VIRTUAL_ENV: venv, PATH: `${venv}/bin:/usr/bin` };
+
+    const isolated = await DepCacheService.isolateVenv(env, `${root}/pair-venv`);
+    assertEquals(isolated, { VIRTUAL_ENV: `${root}/pair-venv`, PATH: `${root}/pair-venv/bin:/usr/bin` });
+    assertEquals(await Deno.readTextFile(`${root}/pair-venv/bin/pip`), `#!${root}/pair-venv/bin/python\nimport pip\n`);
+    assertEquals(await Deno.readTextFile(`${root}/pair-venv/bin/activate`), `VIRTUAL_ENV="${root}/pair-venv"\n`);
+    // The cached venv is untouched
+    assertEquals(await Deno.readTextFile(`${venv}/bin/pip`), `#!${venv}/bin/python\nimport pip\n`);
+    assertEquals(await DepCacheService.isolateVenv({}, `${root}/unused`), {});
+  } finally {
+    await Deno.remove(root, { recursive: true }).catch(() => {});
+  }
+});
@@ -5,6 +5,7 @@ import {
 import { Application } from "oak";
 import exercismRoutes from "../routes/exercism.ts";
 import { ExercismService } from "../services/exercismService.ts";
+import { JobService } from "../services/jobService.ts";
 
 const PASSING_ISOGRAM = `
 export default function isIsogram(s: string): boolean {
@@ -57,6 +58,8 @@ Deno.test({
   });
 
   let recordedRunId = 0;
+  // Runs execute as background jobs
+  JobService.start();
 
   try {
     await t.step("lists exercises", async () => {
@@ -115,6 +118,76 @@ Deno.test({
       assertEquals(generatorCalls["local-fail"], 1);
     });
 
+    await t.step("streams phase events and persists the run once", async () => {
+      const response = await handleRequest(
+        new Request("http://localhost/api/exercism/run-stream", {
+          method: "POST",
+          headers: { "content-type": "application/json" },
+          body: JSON.stringify({
+            exerciseId: "isogram",
+            models: ["stream-pass", "stream-fail"],
+            testCount: 3,
+          }),
+        }),
+      );
+      assertEquals(response.status, 200);
+      assertEquals(response.headers.get("content-type"), "text/event-stream");
+      const text = await response.text();
+      const events = text
+        .split("\n\n")
+        .map((chunk) => chunk.trim())
+        .filter((chunk) => chunk.startsWith("data: ") && chunk !== "data: [DONE]")
+        .map((chunk) => JSON.parse(chunk.slice(6)));
+
+      const types = events.map((e: any) => e.type);
+      assertEquals(types[0], "run_start");
+      for (const phase of ["generation_start", "generation_done", "lint", "compile", "score", "model_complete"]) {
+        assertEquals(types.filter((type: string) => type === phase).length, 2, `expected two ${phase} events`);
+      }
+      const cases = events.filter((e: any) => e.type === "test_case" && e.model === "stream-pass");
+      assertEquals(cases.length, 3);
+      assert(cases.every((e: any) => e.passed));
+
+      const complete = events[events.length - 1];
+      assertEquals(complete.type, "run_complete");
+      assert(complete.runId > 0);
+      assertEquals(complete.results.length, 2);
+      assertEquals(generatorCalls["stream-pass"], 1);
+    });
+
+    await t.step("re-evaluates a recorded run without calling the generator", async () => {
+      const callsBefore = { ...generatorCalls };
+      const response = await handleRequest(
+        new Request("http://localhost/api/exercism/reevaluate", {
+          method: "POST",
+          headers: { "content-type": "application/json" },
+          body: JSON.stringify({ runId: recordedRunId }),
+        }),
+      );
+      assertEquals(response.status, 200);
+      const { success, data } = await response.json();
+      assertEquals(success, true);
+      assertEquals(generatorCalls, callsBefore);
+      assertEquals(data.runs.length, 1);
+      const [rerun] = data.runs;
+      assertEquals(rerun.sourceRunId, recordedRunId);
+      assert(rerun.runId > recordedRunId);
+      const passing = rerun.results.find((r: any) => r.model === "local-pass");
+      const failing = rerun.results.find((r: any) => r.model === "local-fail");
+      assertEquals(passing.testsPassed, passing.testsTotal);
+      assert(failing.testsPassed < failing.testsTotal);
+
+      const missing = await handleRequest(
+        new Request("http://localhost/api/exercism/reevaluate", {
+          method: "POST",
+          headers: { "content-type": "application/json" },
+          body: JSON.stringify({ runId: 999_999_999 }),
+        }),
+      );
+      assertEquals(missing.status, 404);
+      await missing.body?.cancel();
+    });
+
     await t.step("exercism history contains the recorded run", async () => {
       const response = await handleRequest(
         new Request("http://localhost/api/exercism/history?limit=5"),
@@ -131,6 +204,7 @@ Deno.test({
       assert(recent.results.length >= 1);
     });
   } finally {
+    JobService.stop();
     ExercismService.setCodeGeneratorOverride(undefined);
   }
 });
@@ -1,5 +1,6 @@
-import { assertEquals, assert } from "https://deno.land/std@0.224.0/assert/mod.ts";
-import { ExercismService } from "../services/exercismService.ts";
+import { assertEquals, assert, assertAlmostEquals } from "https://deno.land/std@0.224.0/assert/mod.ts";
+import { ExercismService, estimatePassAtK } from "../services/exercismService.ts";
+import { SQLiteDB } from "../sqliteDb.ts";
 
 Deno.test("evaluateSolution: default testCount is 10 and passes with correct solution", async () => {
   const code = `export default function isIsogram(s: string): boolean {
@@ -42,3 +43,57 @@ Deno.test("evaluateSolution: lint warnings are counted and reduce score (non-zer
   assert(res.score >= 0 && res.score <= 100);
 });
 
+
+Deno.test("estimatePassAtK: matches the closed-form unbiased estimator", () => {
+  assertEquals(estimatePassAtK(5, 0, 1), 0);
+  assertEquals(estimatePassAtK(5, 5, 1), 1);
+  assertAlmostEquals(estimatePassAtK(4, 2, 1), 0.5);
+  // 1 - C(8, 2) / C(10, 2) = 1 - 28/45
+  assertAlmostEquals(estimatePassAtK(10, 2, 2), 1 - 28 / 45);
+  // Fewer failures than k means some draw always contains a success
+  assertEquals(estimatePassAtK(4, 2, 3), 1);
+});
+
+Deno.test({
+  name: "run: samples > 1 evaluates every sample and reports pass@1/pass@k",
+  sanitizeOps: false,
+  sanitizeResources: false,
+}, async () => {
+  const passing = `export default function isIsogram(s: string): boolean {
+    const letters = s.toLowerCase().replace(/[ -]/g, "");
+    return new Set(letters).size === letters.length;
+  }`;
+  const failing = `export default function isIsogram(_s: string): boolean { return true; }`;
+  let calls = 0;
+  ExercismService.setCodeGeneratorOverride(() => Promise.resolve(calls++ % 2 === 0 ? passing : failing));
+  try {
+    const res = await ExercismService.run({ exerciseId: "isogram", models: ["sampled"], testCount: 5, samples: 4, concurrency: 2 });
+    assertEquals(calls, 4);
+    assertEquals(res.samples, 4);
+    const [result] = res.results;
+    assertEquals(result.samples?.length, 4);
+    assertEquals(result.k, 4);
+    assertAlmostEquals(result.passAt1!, 0.5);
+    assertEquals(result.passAtK, 1);
+    // The representative entry is the best-scoring sample
+    assertEquals(result.testsPassed, result.testsTotal);
+  } finally {
+    ExercismService.setCodeGeneratorOverride(undefined);
+  }
+});
+
+Deno.test("findCodeEvalRuns: filters by model in SQL and compares dates as dates", () => {
+  const db = new SQLiteDB(":memory:");
+  const save = (models: string[], createdAt: string) => {
+    const id = db.saveCodeEvalRun({ exerciseId: "isogram", exerciseName: "Isogram", testCount: 10, models, results: [] });
+    db.execute("UPDATE code_eval_runs SET created_at = ? WHERE id = ?", [createdAt, id]);
+    return id;
+  };
+  const older = save(["a/model"], "2026-01-01 15:00:00");
+  const newer = save(["b/model"], "2026-01-02 09:00:00");
+
+  // The matching run is older than `limit` newer runs, so filtering after LIMIT would miss it
+  assertEquals(db.findCodeEvalRuns({ model: "a/model", limit: 1 }).map((r) => r.id), [older]);
+  assertEquals(db.findCodeEvalRuns({ endDate: "2026-01-01", limit: 10 }).map((r) => r.id), [older]);
+  assertEquals(db.findCodeEvalRuns({ startDate: "2026-01-01T20:00:00Z", limit: 10 }).map((r) => r.id), [newer]);
+});
@@ -0,0 +1,38 @@
+// A cluster worker for tests/cluster_test.ts: makes a few database calls through the primary,
+// reports what came back on the "cluster-test-report" topic, and crashes when asked to.
+import { callCoordinator, type ClusterWorkerInit, initClusterWorker, publish, subscribe, workerId } from "../../utils/cluster.ts";
+
+const scope = globalThis as unknown as {
+  addEventListener(type: "message", listener: (event: MessageEvent) => void): void;
+};
+
+scope.addEventListener("message", (event: MessageEvent<ClusterWorkerInit>) => {
+  if (event.data?.kind !== "init") return;
+  initClusterWorker(event.data);
+
+  const echoed = callCoordinator("echo", [{ id: 1, blob: new Uint8Array([1, 2, 3]) }]);
+  let error: string | null = null;
+  try {
+    callCoordinator("fail", []);
+  } catch (e) {
+    error = e instanceof Error ? e.message : String(e);
+  }
+  const big = callCoordinator("big", [1536 * 1024]) as string;
+  // The primary answers this one after the worker gave up on it; that answer must not be
+  // taken for the next call's
+  let timedOut = false;
+  try {
+    callCoordinator("slow", [], 100);
+  } catch {
+    timedOut = true;
+  }
+  const afterTimeout = callCoordinator("echo", ["after"]);
+
+  subscribe("cluster-test-crash", () => {
+    // Thrown outside the bus's handler so it reaches the worker's error event
+    setTimeout(() => {
+      throw new Error("crash requested");
+    });
+  });
+  publish("cluster-test-report", { worker: workerId(), echoed, error, bigLength: big.length, bigIntact: /^x*$/.test(big), timedOut, afterTimeout });
+});
@@ -0,0 +1,8 @@
+import { git as runGit } from "../../utils/git.ts";
+
+// git for building test repos: commits get a fixed identity, and a failing command throws
+export async function git(args: string[], cwd: string): Promise<string> {
+  const result = await runGit(["-c", "user.name=test", "-c", "user.email=test@example.com", ...args], { cwd });
+  if (!result.success) throw new Error(`git ${args.join(" ")} failed: ${result.stderr.trim()}`);
+  return result.stdout.trim();
+}
@@ -0,0 +1,71 @@
+import { assertEquals } from "https://deno.land/std@0.224.0/assert/mod.ts";
+import { Application } from "oak";
+import { gunzip } from "../utils/compression.ts";
+import { ifNoneMatch, notModified } from "../utils/httpCache.ts";
+import { compressResponses, negotiateEncoding } from "../utils/responseCompression.ts";
+import { RouteTable } from "../utils/routeTable.ts";
+
+function serve(table: RouteTable) {
+  const app = new Application();
+  app.use(compressResponses({ threshold: 64 }));
+  app.use(table.routes());
+  return (path: string, headers: Record<string, string> = {}) =>
+    (app as unknown as { handle: (req: Request) => Promise<Response> }).handle(new Request(`http://localhost${path}`, { headers }));
+}
+
+Deno.test("negotiateEncoding: honours q-values and prefers brotli on ties", () => {
+  assertEquals(negotiateEncoding("gzip, deflate, br"), "br");
+  assertEquals(negotiateEncoding("br;q=0.5, gzip"), "gzip");
+  assertEquals(negotiateEncoding("br;q=0, *;q=0.1"), "gzip");
+  assertEquals(negotiateEncoding("identity"), null);
+  assertEquals(negotiateEncoding(null), null);
+});
+
+Deno.test("ifNoneMatch: matches lists, weak tags, wildcards and encoded variants", () => {
+  assertEquals(ifNoneMatch('"a.1"', '"a.1"'), true);
+  assertEquals(ifNoneMatch('"x", W/"a.1-gzip"', '"a.1"'), true);
+  assertEquals(ifNoneMatch("*", '"a.1"'), true);
+  assertEquals(ifNoneMatch('"a.2"', '"a.1"'), false);
+  assertEquals(ifNoneMatch(null, '"a.1"'), false);
+});
+
+Deno.test("notModified + compressResponses: 304 for a current copy, encoded body and tag otherwise", async () => {
+  let version = 1;
+  let built = 0;
+  const table = new RouteTable();
+  table.get("/data", (ctx) => {
+    if (notModified(ctx, "data", version)) return;
+    built++;
+    ctx.response.body = { rows: Array.from({ length: 50 }, (_, i) => ({ id: i, name: `row ${i}` })) };
+  });
+  table.get("/small", (ctx) => { ctx.response.body = { ok: true }; });
+  const handle = serve(table);
+
+  const plain = await handle("/data");
+  assertEquals(plain.headers.get("ETag"), '"data.1"');
+  assertEquals(plain.headers.get("Content-Encoding"), null);
+  assertEquals((await plain.json()).rows.length, 50);
+
+  const zipped = await handle("/data", { "Accept-Encoding": "gzip" });
+  assertEquals(zipped.headers.get("Content-Encoding"), "gzip");
+  assertEquals(zipped.headers.get("ETag"), '"data.1-gzip"');
+  assertEquals(zipped.headers.get("Vary"), "Accept-Encoding");
+  const text = new TextDecoder().decode(await gunzip(new Uint8Array(await zipped.arrayBuffer())));
+  assertEquals(JSON.parse(text).rows[49].name, "row 49");
+
+  const cached = await handle("/data", { "Accept-Encoding": "gzip", "If-None-Match": '"data.1-gzip"' });
+  assertEquals(cached.status, 304);
+  assertEquals(cached.headers.get("Content-Encoding"), null);
+  await cached.body?.cancel();
+  assertEquals(built, 2);
+
+  version++;
+  const changed = await handle("/data", { "If-None-Match": '"data.1"' });
+  assertEquals(changed.status, 200);
+  assertEquals(changed.headers.get("ETag"), '"data.2"');
+  await changed.body?.cancel();
+
+  const small = await handle("/small", { "Accept-Encoding": "br" });
+  assertEquals(small.headers.get("Content-Encoding"), null);
+  assertEquals(await small.json(), { ok: true });
+});
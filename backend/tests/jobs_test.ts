@@ -0,0 +1,143 @@
+import { assertEquals } from "https://deno.land/std@0.224.0/assert/mod.ts";
+import { Application } from "oak";
+import { SQLiteDB } from "../sqliteDb.ts";
+import { JobService } from "../services/jobService.ts";
+import { DbService } from "../services/dbService.ts";
+import { runEvents } from "../utils/runEvents.ts";
+import jobRoutes from "../routes/jobs.ts";
+
+Deno.test("claimJob: highest priority first, within each type's concurrency limit", () => {
+  const db = new SQLiteDB(":memory:");
+  const low = db.enqueueJob({ type: "a", payload: { n: 1 } }).job;
+  const high = db.enqueueJob({ type: "a", payload: { n: 2 }, priority: 5 }).job;
+  const other = db.enqueueJob({ type: "b", payload: { n: 3 } }).job;
+
+  const first = db.claimJob("w1", { a: 1, b: 1 }, 60_000);
+  assertEquals(first?.id, high.id);
+  assertEquals(first?.status, "running");
+  assertEquals(first?.attempts, 1);
+  // `a` is at its limit, so `b` goes next even though it is older
+  assertEquals(db.claimJob("w1", { a: 1, b: 1 }, 60_000)?.id, other.id);
+  assertEquals(db.claimJob("w1", { a: 1, b: 1 }, 60_000), undefined);
+
+  assertEquals(db.completeJob(high.id, "w1", { ok: true }), true);
+  assertEquals(db.getJob(high.id)?.result, { ok: true });
+  assertEquals(db.claimJob("w1", { a: 1, b: 1 }, 60_000)?.id, low.id);
+});
+
+Deno.test("enqueueJob: idempotency keys and joining active jobs return the existing job", () => {
+  const db = new SQLiteDB(":memory:");
+  const first = db.enqueueJob({ type: "a", payload: { n: 1 }, idempotencyKey: "k1" });
+  const again = db.enqueueJob({ type: "a", payload: { n: 2 }, idempotencyKey: "k1" });
+  assertEquals(first.created, true);
+  assertEquals(again, { job: first.job, created: false });
+
+  assertEquals(db.enqueueJob({ type: "a", payload: { n: 1 }, joinActive: true }).job.id, first.job.id);
+  assertEquals(db.enqueueJob({ type: "a", payload: { n: 1 } }).created, true);
+
+  assertEquals(db.cancelJob(first.job.id), true);
+  assertEquals(db.cancelJob(first.job.id), false);
+  assertEquals(db.enqueueJob({ type: "a", payload: { n: 1 }, idempotencyKey: "k1" }).job.status, "cancelled");
+});
+
+Deno.test("claimJob: retries lapsed leases until max_attempts, and stale owners cannot finish", () => {
+  const db = new SQLiteDB(":memory:");
+  const { job } = db.enqueueJob({ type: "a", payload: {}, maxAttempts: 2 });
+
+  assertEquals(db.claimJob("w1", { a: 1 }, -1)?.attempts, 1);
+  const retry = db.claimJob("w2", { a: 1 }, -1);
+  assertEquals(retry?.attempts, 2);
+  assertEquals(retry?.lease_owner, "w2");
+  assertEquals(db.completeJob(job.id, "w1", null), false);
+  assertEquals(db.heartbeatJob(job.id, "w1", 60_000), false);
+
+  // The second lease lapsed too, with no attempts left
+  assertEquals(db.claimJob("w3", { a: 1 }, 60_000), undefined);
+  assertEquals(db.getJob(job.id)?.status, "failed");
+});
+
+Deno.test("recoverInterruptedWork: requeues running jobs and closes unfinished repo test runs", () => {
+  const db = new SQLiteDB(":memory:");
+  const { job } = db.enqueueJob({ type: "a", payload: {} });
+  db.claimJob("w1", { a: 1 }, 60_000);
+  db.execute(
+    "INSERT INTO repo_test_runs (repo_url, ref, prompt, test_command, tool, model, status) VALUES ('r', 'main', 'p', 't', 'aider', 'm', 'running')"
+  );
+
+  assertEquals(db.recoverInterruptedWork(), { jobs: 1, repoTestRuns: 1 });
+  assertEquals(db.claimJob("w2", { a: 1 }, 60_000)?.id, job.id);
+  assertEquals(db.query("SELECT status, error FROM repo_test_runs"), [{ status: "error", error: "Interrupted by a server restart" }]);
+});
+
+Deno.test("follow: ids carry the attempt, and an earlier attempt's Last-Event-ID replays the current one", async () => {
+  const type = `jobs-test-${crypto.randomUUID()}`;
+  const { job } = DbService.enqueueJob({ type, payload: {} });
+  const attempt = (owner: string, events: number) => {
+    DbService.claimJob(owner, { [type]: 1 }, -1);
+    const run = runEvents.create(`job:${type}`);
+    DbService.setJobRun(job.id, owner, run.id);
+    for (let i = 1; i <= events; i++) run.append({ type: "status", message: `${owner} ${i}` });
+    run.finish();
+  };
+  // The first attempt's lease lapses after three events; the retry writes two
+  attempt("w1", 3);
+  attempt("w2", 2);
+  DbService.completeJob(job.id, "w2", null);
+
+  const ids = async (resume: { attempt: number; after: number }) => {
+    const seen: string[] = [];
+    for await (const frame of JobService.follow(job.id, resume)) seen.push(frame.id ?? "notice");
+    return seen;
+  };
+  assertEquals(await ids({ attempt: 1, after: 2 }), ["2-1", "2-2"]);
+  assertEquals(await ids({ attempt: 2, after: 1 }), ["2-2"]);
+});
+
+Deno.test({
+  name: "POST /api/jobs: queues a job, runs it in the background and reports it",
+  sanitizeOps: false,
+  sanitizeResources: false,
+}, async () => {
+  const app = new Application();
+  app.use(jobRoutes.routes());
+  const handle = (path: string, init?: RequestInit) =>
+    (app as unknown as { handle: (req: Request) => Promise<Response> }).handle(new Request(`http://localhost${path}`, init));
+  const post = (body: unknown, headers: Record<string, string> = {}) =>
+    handle("/api/jobs", { method: "POST", headers: { "content-type": "application/json", ...headers }, body: JSON.stringify(body) });
+
+  JobService.register("jobs-test-echo", (payload: { text: string }, { run }) => {
+    run.append({ type: "status", message: payload.text });
+    return Promise.resolve({ echoed: payload.text });
+  }, { validate: (payload) => typeof payload?.text === "string" ? null : "text is required" });
+  JobService.start();
+
+  try {
+    const key = crypto.randomUUID();
+    const created = await post({ type: "jobs-test-echo", payload: { text: "hi" } }, { "Idempotency-Key": key });
+    assertEquals(created.status, 202);
+    const { data: job } = await created.json();
+
+    const duplicate = await post({ type: "jobs-test-echo", payload: { text: "hi" } }, { "Idempotency-Key": key });
+    assertEquals(duplicate.status, 200);
+    assertEquals((await duplicate.json()).data.id, job.id);
+
+    assertEquals((await JobService.wait(job.id)).status, "succeeded");
+    const status = await (await handle(`/api/jobs/${job.id}`)).json();
+    assertEquals(status.data.status, "succeeded");
+    assertEquals(status.data.result, { echoed: "hi" });
+
+    const events = await handle(`/api/jobs/${job.id}/events`);
+    assertEquals(events.headers.get("X-Resume-Url"), `/api/jobs/${job.id}/events`);
+    assertEquals(events.headers.get("X-Run-Id"), null);
+    assertEquals(await events.text(), `id: 1-1\ndata: {"type":"status","message":"hi"}\n\ndata: [DONE]\n\n`);
+
+    const invalid = await post({ type: "jobs-test-echo", payload: {} });
+    assertEquals(invalid.status, 400);
+    await invalid.body?.cancel();
+    const unknown = await post({ type: "nope", payload: {} });
+    assertEquals(unknown.status, 400);
+    await unknown.body?.cancel();
+  } finally {
+    JobService.stop();
+  }
+});
@@ -0,0 +1,78 @@
+import { assertEquals, assertStringIncludes } from "https://deno.land/std@0.224.0/assert/mod.ts";
+import { type LogSink, Logger, RotatingFileSink } from "../utils/logger.ts";
+
+class MemorySink implements LogSink {
+  text = "";
+
+  write(text: string) {
+    this.text += text;
+    return Promise.resolve();
+  }
+
+  writeSync(text: string) {
+    this.text += text;
+  }
+
+  get records(): any[] {
+    return this.text.trim().split("\n").filter(Boolean).map((line) => JSON.parse(line));
+  }
+}
+
+Deno.test("Logger: filters by level, caps fields and flushes in order", async () => {
+  const sink = new MemorySink();
+  const logger = Logger.create({ sink, level: "info", maxFieldChars: 10 }).child({ component: "test" });
+
+  logger.debug("hidden");
+  logger.info("saved", { runId: 7, prompt: "x".repeat(25), nested: { text: "y".repeat(50) } });
+  logger.error("failed", { error: new Error("boom") });
+  assertEquals(sink.text, "");
+  await logger.flush();
+
+  const [saved, failed] = sink.records;
+  assertEquals(sink.records.length, 2);
+  assertEquals(saved.msg, "saved");
+  assertEquals(saved.component, "test");
+  assertEquals(saved.runId, 7);
+  assertEquals(saved.prompt, "xxxxxxxxxx…[+15 chars]");
+  assertEquals(typeof saved.nested, "string");
+  assertEquals(failed.level, "error");
+  assertEquals(failed.error.message, "boom");
+});
+
+Deno.test("Logger: rate limits repeated warnings and reports how many were dropped", async () => {
+  const sink = new MemorySink();
+  const logger = Logger.create({ sink, rateLimit: { perWindow: 2, windowMs: 20 } });
+
+  for (let i = 0; i < 5; i++) logger.warn("Skipping malformed chunk", { i });
+  logger.warn("Something else");
+  await new Promise((resolve) => setTimeout(resolve, 30));
+  logger.warn("Skipping malformed chunk", { i: 5 });
+  await logger.flush();
+
+  const chunks = sink.records.filter((r) => r.msg === "Skipping malformed chunk");
+  assertEquals(chunks.map((r) => r.i), [0, 1, 5]);
+  assertEquals(chunks[2].suppressed, 3);
+  assertEquals(sink.records.filter((r) => r.msg === "Something else").length, 1);
+});
+
+Deno.test("Logger: text format", async () => {
+  const sink = new MemorySink();
+  const logger = Logger.create({ sink, format: "text" });
+  logger.info("request", { method: "GET", path: "/api/run-history", note: "two words" });
+  await logger.flush();
+  assertStringIncludes(sink.text, 'INFO  request method=GET path=/api/run-history note="two words"\n');
+});
+
+Deno.test("RotatingFileSink: rolls files over at the size limit", async () => {
+  const dir = await Deno.makeTempDir();
+  try {
+    const sink = new RotatingFileSink(`${dir}/app.log`, 10, 2);
+    for (const line of ["aaaaaaa\n", "bbbbbbb\n", "ccccccc\n", "ddddddd\n"]) await sink.write(line);
+    assertEquals(await Deno.readTextFile(`${dir}/app.log`), "ddddddd\n");
+    assertEquals(await Deno.readTextFile(`${dir}/app.log.1`), "ccccccc\n");
+    assertEquals(await Deno.readTextFile(`${dir}/app.log.2`), "bbbbbbb\n");
+    assertEquals(await Deno.stat(`${dir}/app.log.3`).then(() => true, () => false), false);
+  } finally {
+    await Deno.remove(dir, { recursive: true });
+  }
+});
@@ -0,0 +1,74 @@
+import { assertEquals, assertStringIncludes, assertThrows } from "https://deno.land/std@0.224.0/assert/mod.ts";
+import { Application } from "oak";
+import { httpMetrics } from "../utils/httpMetrics.ts";
+import { metrics, Registry } from "../utils/metrics.ts";
+import { RouteTable } from "../utils/routeTable.ts";
+
+Deno.test("Registry: renders counters, gauges and cumulative histogram buckets", () => {
+  const registry = new Registry();
+  const requests = registry.counter("requests_total", "Requests", ["code"]);
+  const open = registry.gauge("open_things", "Open things");
+  const latency = registry.histogram("latency_seconds", "Latency", ["model"], [0.1, 1]);
+
+  requests.labels("200").inc();
+  requests.labels("200").inc(2);
+  requests.labels('we"ird\n').inc();
+  open.inc();
+  open.inc();
+  open.dec();
+  const child = latency.labels("m");
+  child.observe(0.05);
+  child.observe(0.1);
+  child.observe(0.5);
+  child.observe(3);
+
+  const text = registry.render();
+  assertStringIncludes(text, "# TYPE requests_total counter\n");
+  assertStringIncludes(text, 'requests_total{code="200"} 3\n');
+  assertStringIncludes(text, 'requests_total{code="we\\"ird\\n"} 1\n');
+  assertStringIncludes(text, "open_things 1\n");
+  assertStringIncludes(text, 'latency_seconds_bucket{model="m",le="0.1"} 2\n');
+  assertStringIncludes(text, 'latency_seconds_bucket{model="m",le="1"} 3\n');
+  assertStringIncludes(text, 'latency_seconds_bucket{model="m",le="+Inf"} 4\n');
+  assertStringIncludes(text, 'latency_seconds_sum{model="m"} 3.65\n');
+  assertStringIncludes(text, 'latency_seconds_count{model="m"} 4\n');
+});
+
+Deno.test("Registry: rejects duplicate names and wrong label counts", () => {
+  const registry = new Registry();
+  const counter = registry.counter("x_total", "X", ["a"]);
+  assertThrows(() => registry.gauge("x_total", "X again"), Error, "already registered");
+  assertThrows(() => counter.labels("a", "b"), Error, "expects labels a");
+});
+
+Deno.test("httpMetrics: records route patterns and open SSE streams", async () => {
+  const table = new RouteTable({ prefix: "/metrics-test" });
+  table.get("/items/:id", (ctx) => { ctx.response.body = { id: ctx.params.id }; });
+  table.get("/events", (ctx) => {
+    ctx.response.headers.set("Content-Type", "text/event-stream");
+    ctx.response.body = new ReadableStream({
+      start(controller) {
+        controller.enqueue(new TextEncoder().encode("data: 1\n\n"));
+      },
+    });
+  });
+  const app = new Application();
+  app.use(httpMetrics());
+  app.use(table.routes());
+  const handle = (path: string) =>
+    (app as unknown as { handle: (req: Request) => Promise<Response> }).handle(new Request(`http://localhost${path}`));
+
+  await (await handle("/metrics-test/items/1")).body?.cancel();
+  await (await handle("/metrics-test/items/2")).body?.cancel();
+  assertStringIncludes(
+    metrics.render(),
+    'http_request_duration_seconds_count{method="GET",route="/metrics-test/items/:id",status="200"} 2\n',
+  );
+
+  const stream = await handle("/metrics-test/events");
+  const reader = stream.body!.getReader();
+  assertEquals(new TextDecoder().decode((await reader.read()).value), "data: 1\n\n");
+  assertStringIncludes(metrics.render(), 'sse_streams_active{route="/metrics-test/events"} 1\n');
+  await reader.cancel();
+  assertStringIncludes(metrics.render(), 'sse_streams_active{route="/metrics-test/events"} 0\n');
+});
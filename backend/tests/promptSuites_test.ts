@@ -0,0 +1,177 @@
+import { assertEquals } from "https://deno.land/std@0.224.0/assert/mod.ts";
+import { Application } from "oak";
+import { PromptSuiteService, type SuiteBatchEvent } from "../services/promptSuiteService.ts";
+import { DbService } from "../services/dbService.ts";
+import { SpeedTestService } from "../services/speedTestService.ts";
+import type { OpenRouterService } from "../services/openRouterService.ts";
+import { JobService } from "../services/jobService.ts";
+import promptSuiteRoutes from "../routes/promptSuites.ts";
+
+Deno.test("parseJsonl: strings and objects per line, errors by line number", () => {
+  const { prompts, errors } = PromptSuiteService.parseJsonl(
+    `"Say hi"\n\n{"id": 7, "prompt": "Count to 3", "temperature": 0.2}\n{"prompt": ""}\nnot json\n`
+  );
+  assertEquals(prompts, [
+    { prompt: "Say hi", external_id: null, temperature: null, max_tokens: null },
+    { prompt: "Count to 3", external_id: "7", temperature: 0.2, max_tokens: null },
+  ]);
+  assertEquals(errors, ["line 4: prompt must be a non-empty string", "line 5: not valid JSON"]);
+});
+
+Deno.test("promptFrom and invalidBatch: max_tokens must be positive, temperature may be 0", () => {
+  assertEquals(PromptSuiteService.promptFrom({ prompt: "x", max_tokens: 0 }), "max_tokens must be a positive number");
+  assertEquals(PromptSuiteService.invalidBatch({ models: ["m/a"], max_tokens: 0 }), "max_tokens must be a positive number");
+  assertEquals(PromptSuiteService.invalidBatch({ models: ["m/a"], temperature: 0, max_tokens: 1 }), null);
+});
+
+Deno.test({
+  name: "runBatch: a prompt's temperature 0 reaches the completion call, and the cell is saved as a test result",
+  sanitizeOps: false,
+  sanitizeResources: false,
+}, async () => {
+  const suiteId = DbService.createPromptSuite({
+    name: `suite-${crypto.randomUUID()}`,
+    prompts: [{ prompt: "cold", temperature: 0 }],
+  });
+  const { batch } = DbService.createSuiteBatch({ suiteId, models: ["m/a"], temperature: 0.9, maxTokens: 64 });
+
+  const requests: unknown[] = [];
+  PromptSuiteService.setCompletionOverride((model, request) => {
+    requests.push(request);
+    return Promise.resolve({
+      model, content: "ok", reasoningContent: "", responseTime: 30, latency: 12, tokensPerSecond: 40, totalTokens: 7, error: null,
+    });
+  });
+
+  try {
+    await PromptSuiteService.runBatch(batch.id, () => {});
+    assertEquals(requests, [{ prompt: "cold", temperature: 0, max_tokens: 64 }]);
+    const [cell] = DbService.getSuiteBatchCells(batch.id, 10, 0);
+    const result = DbService.getTestResults(1000).find((r) => r.id === cell.test_result_id);
+    assertEquals(
+      [result?.model, result?.response_text, result?.latency_ms, result?.tokens_per_second, result?.total_tokens],
+      ["m/a", "ok", 12, 40, 7],
+    );
+  } finally {
+    PromptSuiteService.setCompletionOverride();
+  }
+});
+
+Deno.test("streamModel: temperature 0 is sent as 0, not the default", async () => {
+  const sent: { temperature?: number; max_tokens?: number }[] = [];
+  const service = {
+    generateStreamingCompletion: (request: { temperature?: number; max_tokens?: number }) => {
+      sent.push(request);
+      return Promise.resolve({ responseTime: 1, response: null, error: null });
+    },
+  } as unknown as OpenRouterService;
+
+  await SpeedTestService.streamModel(service, "m/a", { prompt: "x", temperature: 0 }, () => {});
+  assertEquals([sent[0].temperature, sent[0].max_tokens], [0, 1000]);
+});
+
+Deno.test({
+  name: "runBatch: runs every prompt x model cell, and a resumed batch only runs the ones that did not succeed",
+  sanitizeOps: false,
+  sanitizeResources: false,
+}, async () => {
+  const suiteId = DbService.createPromptSuite({
+    name: `suite-${crypto.randomUUID()}`,
+    prompts: [{ prompt: "one" }, { prompt: "two" }, { prompt: "three" }],
+  });
+  const { batch } = DbService.createSuiteBatch({ suiteId, models: ["m/a", "m/b"] });
+
+  const calls: string[] = [];
+  let flaky = true;
+  PromptSuiteService.setCompletionOverride((model, prompt) => {
+    calls.push(`${model}:${prompt.prompt}`);
+    if (model === "m/b" && prompt.prompt === "two" && flaky) return Promise.reject(new Error("upstream 502"));
+    return Promise.resolve({
+      model, content: `${prompt.prompt}!`, reasoningContent: "", responseTime: 100, latency: 10,
+      tokensPerSecond: model === "m/a" ? 50 : 20, totalTokens: 5, error: null,
+    });
+  });
+
+  try {
+    const events: SuiteBatchEvent[] = [];
+    const first = await PromptSuiteService.runBatch(batch.id, (event) => events.push(event));
+    assertEquals(calls.length, 6);
+    assertEquals(events.map((e) => e.type), ["batch_start", ...Array(6).fill("cell_complete"), "batch_complete"]);
+    assertEquals(first?.progress, { done: 5, total: 6 });
+    const failed = PromptSuiteService.describeBatch(DbService.getSuiteBatch(batch.id)!);
+    assertEquals(failed.status, "completed");
+    assertEquals(failed.progress, { done: 5, failed: 1, total: 6 });
+
+    calls.length = 0;
+    flaky = false;
+    const resumed = await PromptSuiteService.runBatch(batch.id, () => {});
+    assertEquals(calls, ["m/b:two"]);
+    assertEquals(resumed?.progress, { done: 6, total: 6 });
+
+    const aggregates = Object.fromEntries(resumed!.aggregates.map((a) => [a.model, a]));
+    assertEquals(aggregates["m/a"].succeeded, 3);
+    assertEquals(aggregates["m/b"].succeeded, 3);
+    assertEquals(aggregates["m/b"].failed, 0);
+    assertEquals(aggregates["m/a"].avg_tokens_per_second, 50);
+    assertEquals(DbService.getSuiteBatchCells(batch.id, 10, 0).length, 6);
+  } finally {
+    PromptSuiteService.setCompletionOverride();
+  }
+});
+
+Deno.test({
+  name: "POST /api/prompt-suites: imports JSONL and runs a batch as a job",
+  sanitizeOps: false,
+  sanitizeResources: false,
+}, async () => {
+  const app = new Application();
+  app.use(promptSuiteRoutes.routes());
+  const handle = (path: string, init?: RequestInit) =>
+    (app as unknown as { handle: (req: Request) => Promise<Response> }).handle(new Request(`http://localhost${path}`, init));
+
+  PromptSuiteService.setCompletionOverride((model, prompt) => Promise.resolve({
+    model, content: prompt.prompt, reasoningContent: "", responseTime: 1, latency: 1, tokensPerSecond: 1, totalTokens: 1, error: null,
+  }));
+  JobService.start();
+
+  try {
+    const name = `suite-${crypto.randomUUID()}`;
+    const created = await handle(`/api/prompt-suites?name=${name}`, {
+      method: "POST",
+      headers: { "content-type": "application/x-ndjson" },
+      body: `"a"\n"b"\n`,
+    });
+    assertEquals(created.status, 201);
+    const { data: suite } = await created.json();
+    assertEquals(suite.prompt_count, 2);
+
+    const duplicate = await handle(`/api/prompt-suites?name=${name}`, {
+      method: "POST",
+      headers: { "content-type": "application/x-ndjson" },
+      body: `"a"\n`,
+    });
+    assertEquals(duplicate.status, 409);
+    await duplicate.body?.cancel();
+
+    const started = await handle(`/api/prompt-suites/${suite.id}/batches`, {
+      method: "POST",
+      headers: { "content-type": "application/json" },
+      body: JSON.stringify({ models: ["m/a", "m/b"] }),
+    });
+    assertEquals(started.status, 202);
+    const { data: batch } = await started.json();
+    assertEquals(batch.events_url, `/api/prompt-suites/batches/${batch.id}/events`);
+
+    assertEquals((await JobService.wait(batch.job.id)).status, "succeeded");
+    const status = await (await handle(`/api/prompt-suites/batches/${batch.id}`)).json();
+    assertEquals(status.data.status, "completed");
+    assertEquals(status.data.progress, { done: 4, failed: 0, total: 4 });
+
+    const resume = await handle(`/api/prompt-suites/batches/${batch.id}/resume`, { method: "POST" });
+    assertEquals(resume.status, 409);
+    await resume.body?.cancel();
+  } finally {
+    JobService.stop();
+    PromptSuiteService.setCompletionOverride();
+  }
+});
@@ -0,0 +1,80 @@
+import { assert, assertEquals } from "https://deno.land/std@0.224.0/assert/mod.ts";
+import { PropertySuiteService } from "../services/propertySuiteService.ts";
+import { ExercismService } from "../services/exercismService.ts";
+import { isIsogramReference } from "../exercism/isogram/property.ts";
+import { isLeapReference } from "../exercism/leap/property.ts";
+import { acronymReference } from "../exercism/acronym/property.ts";
+import { ACRONYM_CASES } from "../exercism/acronym/cases.ts";
+
+Deno.test("buildFixture: same seed yields identical fixtures", () => {
+  const a = PropertySuiteService.buildFixture("acronym", 7, 200);
+  const b = PropertySuiteService.buildFixture("acronym", 7, 200);
+  const c = PropertySuiteService.buildFixture("acronym", 8, 200);
+  assertEquals(a, b);
+  assert(JSON.stringify(a.inputs) !== JSON.stringify(c.inputs));
+});
+
+Deno.test("buildFixture: boolean oracles are stored as a bit string", () => {
+  const fixture = PropertySuiteService.buildFixture("leap", 1, 500);
+  assertEquals(typeof fixture.expected, "string");
+  assertEquals((fixture.expected as string).length, 500);
+  assert((fixture.expected as string).includes("1") && (fixture.expected as string).includes("0"));
+});
+
+Deno.test("run: reference implementations pass every generated case", () => {
+  const fixture = PropertySuiteService.buildFixture("isogram", 42, 2000);
+  const result = PropertySuiteService.run("isogram", (s) => isIsogramReference(s as string), fixture);
+  assertEquals(result.passed, 2000);
+  assertEquals(result.counterexample, undefined);
+
+  const leap = PropertySuiteService.buildFixture("leap", 42, 2000);
+  assertEquals(PropertySuiteService.run("leap", (y) => isLeapReference(y as number), leap).passed, 2000);
+});
+
+Deno.test("acronymReference: agrees with every hand-written acronym case", () => {
+  for (const { input, expected } of ACRONYM_CASES) assertEquals(acronymReference(input), expected, input);
+  assertEquals(acronymReference("AbcDef"), "AD");
+});
+
+Deno.test("run: failing solutions report a shrunk counterexample", () => {
+  // Case-sensitive isogram check: minimal failure is a single letter in both cases
+  const caseSensitive = (s: unknown) => {
+    const letters = (s as string).replace(/[ -]/g, "");
+    return new Set(letters).size === letters.length;
+  };
+  const isogram = PropertySuiteService.run("isogram", caseSensitive, PropertySuiteService.buildFixture("isogram", 42, 2000));
+  assert(isogram.passed < isogram.total);
+  const input = isogram.counterexample!.input as string;
+  assertEquals(input.length, 2);
+  assertEquals(input[0].toLowerCase(), input[1].toLowerCase());
+
+  const leap = PropertySuiteService.run("leap", (y) => (y as number) % 4 === 0, PropertySuiteService.buildFixture("leap", 42, 2000));
+  const year = leap.counterexample!.input as number;
+  assert(year % 100 === 0 && year % 400 !== 0);
+  assertEquals(leap.counterexample!.expected, false);
+  assertEquals(leap.counterexample!.actual, true);
+});
+
+Deno.test({
+  name: "run: generatedCases adds a generated section and blends it into the score",
+  sanitizeOps: false,
+  sanitizeResources: false,
+}, async () => {
+  const caseSensitive = `export default function isIsogram(s: string): boolean {
+    const letters = s.replace(/[ -]/g, "");
+    return new Set(letters).size === letters.length;
+  }`;
+  ExercismService.setCodeGeneratorOverride(() => Promise.resolve(caseSensitive));
+  try {
+    const res = await ExercismService.run({ exerciseId: "isogram", models: ["generated"], testCount: 3, generatedCases: 1000, seed: 3 });
+    const [result] = res.results;
+    assert(result.generated);
+    assertEquals(result.generated.total, 1000);
+    assertEquals(result.generated.seed, 3);
+    assert(result.generated.passed < result.generated.total);
+    assert(result.generated.counterexample);
+    assert(result.score < 100);
+  } finally {
+    ExercismService.setCodeGeneratorOverride(undefined);
+  }
+});
@@ -0,0 +1,48 @@
+import { assertEquals } from "https://deno.land/std@0.224.0/assert/mod.ts";
+import { RepoCacheService } from "../services/repoCacheService.ts";
+import { git } from "./helpers/git.ts";
+
+Deno.test("RepoCacheService: materializes refs from a shared mirror and evicts idle mirrors", async () => {
+  const root = await Deno.makeTempDir();
+  const previousDir = Deno.env.get("REPO_CACHE_DIR");
+  Deno.env.set("REPO_CACHE_DIR", `${root}/cache`);
+  try {
+    const upstream = `${root}/upstream`;
+    await Deno.mkdir(upstream);
+    await git(["init", "-q", "-b", "main"], upstream);
+    await Deno.writeTextFile(`${upstream}/file.txt`, "one");
+    await git(["add", "file.txt"], upstream);
+    await git(["commit", "-q", "-m", "one"], upstream);
+    const firstSha = await git(["rev-parse", "HEAD"], upstream);
+    await Deno.writeTextFile(`${upstream}/file.txt`, "two");
+    await git(["commit", "-q", "-am", "two"], upstream);
+
+    const first = await RepoCacheService.materialize(upstream, "main", `${root}/w1`);
+    assertEquals(first.cacheHit, false);
+    assertEquals(await Deno.readTextFile(`${root}/w1/file.txt`), "two");
+
+    // Concurrent runs share the mirror; a SHA already present needs no fetch
+    const [second, third] = await Promise.all([
+      RepoCacheService.materialize(upstream, firstSha, `${root}/w2`),
+      RepoCacheService.materialize(upstream, "main", `${root}/w3`),
+    ]);
+    assertEquals(second.cacheHit, true);
+    assertEquals(second.sha, firstSha);
+    assertEquals(await Deno.readTextFile(`${root}/w2/file.txt`), "one");
+    assertEquals(third.sha, first.sha);
+    assertEquals(await git(["remote", "get-url", "origin"], `${root}/w2`), upstream);
+
+    // Leased mirrors survive eviction even when over budget
+    Deno.env.set("REPO_CACHE_MAX_BYTES", "1");
+    assertEquals((await RepoCacheService.evict()).removed.length, 0);
+
+    for (const materialized of [first, second, third]) materialized.release();
+    const { removed } = await RepoCacheService.evict();
+    assertEquals(removed.length, 1);
+  } finally {
+    if (previousDir === undefined) Deno.env.delete("REPO_CACHE_DIR");
+    else Deno.env.set("REPO_CACHE_DIR", previousDir);
+    Deno.env.delete("REPO_CACHE_MAX_BYTES");
+    await Deno.remove(root, { recursive: true }).catch(() => {});
+  }
+});
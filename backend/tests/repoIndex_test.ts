@@ -0,0 +1,82 @@
+import { assert, assertEquals, assertStringIncludes } from "https://deno.land/std@0.224.0/assert/mod.ts";
+import { isTestPath, RepoIndexService, terms } from "../services/repoIndexService.ts";
+import { git } from "./helpers/git.ts";
+
+async function makeRepo(): Promise<string> {
+  const dir = await Deno.makeTempDir();
+  const files: Record<string, string> = {
+    ".gitignore": "generated/\n",
+    "src/index.ts": `import { parseInvoice } from "./billing/invoice.ts";\nexport const run = () => parseInvoice("");\n`,
+    "src/billing/invoice.ts": `import { roundCents } from "../util/money.ts";\nexport function parseInvoice(s: string) { return roundCents(s.length); }\n`,
+    "src/util/money.ts": `export function roundCents(n: number) { return Math.round(n * 100) / 100; }\n`,
+    "src/ui/button.ts": `export function renderButton(label: string) { return "<button>" + label; }\n`,
+    "src/billing/invoice.test.ts": `import { parseInvoice } from "./invoice.ts";\n`,
+    "generated/big.ts": `export const parseInvoiceGenerated = 1;\n`,
+  };
+  for (const [path, content] of Object.entries(files)) {
+    await Deno.mkdir(`${dir}/${path.slice(0, path.lastIndexOf("/") + 1) || "."}`, { recursive: true });
+    await Deno.writeTextFile(`${dir}/${path}`, content);
+  }
+  await git(["init", "-q"], dir);
+  await git(["add", "-A"], dir);
+  await git(["commit", "-q", "-m", "init"], dir);
+  return dir;
+}
+
+Deno.test("terms: splits camelCase and snake_case", () => {
+  assertEquals(terms("parseInvoice round_cents"), ["parseinvoice", "parse", "invoice", "round_cents", "round", "cents"]);
+});
+
+Deno.test("isTestPath: matches test names and test directories", () => {
+  assert(isTestPath("src/foo.test.ts"));
+  assert(isTestPath("tests/helpers.py"));
+  assert(isTestPath("pkg/__tests__/a.js"));
+  assert(!isTestPath("src/billing/invoice.ts"));
+});
+
+Deno.test("RepoIndexService.buildContext: ranks by prompt, follows imports, skips ignored and test files", async () => {
+  RepoIndexService.clearCache();
+  const dir = await makeRepo();
+  try {
+    const ctx = await RepoIndexService.buildContext(dir, "Fix parseInvoice so totals are rounded");
+
+    assertEquals(ctx.files[0], "src/billing/invoice.ts");
+    // Imported by the top file, so it ranks above the unrelated one
+    assert(ctx.files.indexOf("src/util/money.ts") < ctx.files.indexOf("src/ui/button.ts"));
+    assert(!ctx.files.includes("src/billing/invoice.test.ts"));
+    assert(!ctx.tree.includes("generated/"));
+    assertStringIncludes(ctx.context, "--- src/billing/invoice.ts ---");
+  } finally {
+    await Deno.remove(dir, { recursive: true });
+  }
+});
+
+Deno.test("RepoIndexService.buildContext: reuses the index for the same commit and re-reads dirty files", async () => {
+  RepoIndexService.clearCache();
+  const dir = await makeRepo();
+  try {
+    const first = await RepoIndexService.buildContext(dir, "render button");
+    assertEquals(first.reusedFiles, 0);
+
+    await Deno.writeTextFile(`${dir}/src/ui/button.ts`, `export function renderButtonV2() {}\n`);
+    const second = await RepoIndexService.buildContext(dir, "render button");
+    assertEquals(second.reusedFiles, first.indexedFiles - 1);
+    assertStringIncludes(second.context, "renderButtonV2");
+  } finally {
+    await Deno.remove(dir, { recursive: true });
+  }
+});
+
+Deno.test("RepoIndexService.buildContext: stays within the token budget", async () => {
+  RepoIndexService.clearCache();
+  const dir = await makeRepo();
+  try {
+    await Deno.writeTextFile(`${dir}/src/billing/invoice.ts`, "// parseInvoice\n".repeat(2000));
+    const ctx = await RepoIndexService.buildContext(dir, "parseInvoice", 1500);
+    assert(ctx.tokens <= 1500);
+    assertEquals(ctx.files[0], "src/billing/invoice.ts");
+    assertStringIncludes(ctx.context, "... (truncated)");
+  } finally {
+    await Deno.remove(dir, { recursive: true });
+  }
+});
@@ -0,0 +1,110 @@
+import { assert, assertEquals } from "https://deno.land/std@0.224.0/assert/mod.ts";
+import { RepoTestService } from "../services/repoTestService.ts";
+import { DbService } from "../services/dbService.ts";
+import { git } from "./helpers/git.ts";
+
+Deno.test({
+  name: "runMatrix: prepares one workspace and runs every pair in its own copy",
+  sanitizeOps: false,
+  sanitizeResources: false,
+}, async () => {
+  const root = await Deno.makeTempDir();
+  const previousDir = Deno.env.get("REPO_CACHE_DIR");
+  Deno.env.set("REPO_CACHE_DIR", `${root}/cache`);
+  const toolCalls: string[] = [];
+  RepoTestService.setCodingToolOverride((tool, model) => {
+    toolCalls.push(`${tool.id}:${model}`);
+    return Promise.resolve("");
+  });
+  try {
+    const upstream = `${root}/upstream`;
+    await Deno.mkdir(upstream);
+    await git(["init", "-q", "-b", "main"], upstream);
+    await Deno.writeTextFile(`${upstream}/README.md`, "demo");
+    await git(["add", "README.md"], upstream);
+    await git(["commit", "-q", "-m", "init"], upstream);
+
+    const events: Array<{ pair: unknown; type: string }> = [];
+    // The test command fails if another pair already touched the same directory
+    const results = await RepoTestService.runMatrix(
+      {
+        repo_url: upstream,
+        ref: "main",
+        prompt: "noop",
+        test_command: "test ! -f marker && touch marker",
+        pairs: [
+          { tool: "copilot-cli", model: "model-a" },
+          { tool: "copilot-cli", model: "model-b" },
+        ],
+        concurrency: 2,
+      },
+      (pair, event) => events.push({ pair, type: event.type }),
+    );
+
+    assertEquals(results.length, 2);
+    for (const result of results) {
+      assertEquals(result.error, null);
+      assertEquals(result.result?.status, "success");
+    }
+    assertEquals(events.filter((e) => e.type === "clone" && e.pair === null).length, 2);
+    assertEquals(events.filter((e) => e.type === "complete").length, 2);
+    assert(events.filter((e) => e.type === "complete").every((e) => e.pair !== null));
+    assertEquals(toolCalls.sort(), ["copilot-cli:model-a", "copilot-cli:model-b"]);
+  } finally {
+    RepoTestService.setCodingToolOverride();
+    if (previousDir === undefined) Deno.env.delete("REPO_CACHE_DIR");
+    else Deno.env.set("REPO_CACHE_DIR", previousDir);
+    await Deno.remove(root, { recursive: true }).catch(() => {});
+  }
+});
+
+Deno.test({
+  name: "run: failed_first runs the full suite on the last iteration, so run totals cover all of it",
+  sanitizeOps: false,
+  sanitizeResources: false,
+}, async () => {
+  const root = await Deno.makeTempDir();
+  const previousDir = Deno.env.get("REPO_CACHE_DIR");
+  Deno.env.set("REPO_CACHE_DIR", `${root}/cache`);
+  // The tool changes nothing, so "c" keeps failing
+  RepoTestService.setCodingToolOverride(() => Promise.resolve(""));
+  try {
+    const upstream = `${root}/upstream`;
+    await Deno.mkdir(upstream);
+    await git(["init", "-q", "-b", "main"], upstream);
+    await Deno.writeTextFile(
+      `${upstream}/suite_test.ts`,
+      `Deno.test("a", () => {});\nDeno.test("b", () => {});\nDeno.test("c", () => { throw new Error("no"); });\n`,
+    );
+    await git(["add", "suite_test.ts"], upstream);
+    await git(["commit", "-q", "-m", "init"], upstream);
+
+    const result = await RepoTestService.run({
+      repo_url: upstream,
+      ref: "main",
+      prompt: "noop",
+      test_command: "deno test",
+      tool: "copilot-cli",
+      model: "model-a",
+      iterations: 3,
+      strategy: "refine",
+      incremental_tests: "failed_first",
+    });
+
+    assertEquals(result.iterations.map((it) => [it.test_scope, it.tests_passed, it.tests_total]), [
+      ["full", 2, 3],
+      ["failed", 0, 1],
+      ["full", 2, 3],
+    ]);
+    assertEquals(result.iterations[2].failed_first, null);
+    assertEquals([result.final_tests_passed, result.final_tests_total, result.final_test_scope], [2, 3, "full"]);
+    assertEquals(result.status, "partial");
+    const run = DbService.getRepoTestRun(result.runId);
+    assertEquals([run.tests_passed, run.tests_total, run.test_scope], [2, 3, "full"]);
+  } finally {
+    RepoTestService.setCodingToolOverride();
+    if (previousDir === undefined) Deno.env.delete("REPO_CACHE_DIR");
+    else Deno.env.set("REPO_CACHE_DIR", previousDir);
+    await Deno.remove(root, { recursive: true }).catch(() => {});
+  }
+});
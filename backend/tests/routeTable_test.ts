@@ -0,0 +1,73 @@
+import { assertEquals, assertThrows } from "https://deno.land/std@0.224.0/assert/mod.ts";
+import { Application } from "oak";
+import { compileBodySchema, RouteTable } from "../utils/routeTable.ts";
+
+function serve(table: RouteTable) {
+  const app = new Application();
+  app.use(table.routes());
+  app.use(table.allowedMethods());
+  return (path: string, init?: RequestInit) =>
+    (app as unknown as { handle: (req: Request) => Promise<Response> }).handle(new Request(`http://localhost${path}`, init));
+}
+
+Deno.test("RouteTable: static segments win over params, and params are decoded", async () => {
+  const items = new RouteTable({ prefix: "/api/items" });
+  items.get("/:id", (ctx) => { ctx.response.body = { id: ctx.params.id }; });
+  items.get("/special", (ctx) => { ctx.response.body = { special: true }; });
+  items.get("/:id/parts/:part", (ctx) => { ctx.response.body = ctx.params; });
+  const other = new RouteTable();
+  other.get("/", (ctx) => { ctx.response.body = { root: true }; });
+  const handle = serve(RouteTable.merge(items, other).compile());
+
+  assertEquals(await (await handle("/api/items/special")).json(), { special: true });
+  assertEquals(await (await handle("/api/items/a%20b")).json(), { id: "a b" });
+  assertEquals(await (await handle("/api/items/7/parts/x/")).json(), { id: "7", part: "x" });
+  assertEquals(await (await handle("/")).json(), { root: true });
+  assertEquals((await handle("/api/items/7/parts")).status, 404);
+});
+
+Deno.test("RouteTable: 405 with Allow for a known path and an unregistered method", async () => {
+  const table = new RouteTable();
+  table.get("/thing", (ctx) => { ctx.response.body = {}; });
+  const handle = serve(table);
+
+  const response = await handle("/thing", { method: "DELETE" });
+  assertEquals(response.status, 405);
+  assertEquals(response.headers.get("Allow"), "GET, HEAD, OPTIONS");
+  await response.body?.cancel();
+});
+
+Deno.test("RouteTable: validates bodies against the route schema", async () => {
+  const table = new RouteTable();
+  table.post("/save", { body: { name: "string", tags: "array", count: "integer?" } }, (ctx) => {
+    ctx.response.body = { name: ctx.body.name, tags: ctx.body.tags.length };
+  });
+  const handle = serve(table);
+  const post = (body: string) => handle("/save", { method: "POST", body, headers: { "Content-Type": "application/json" } });
+
+  assertEquals(await (await post(JSON.stringify({ name: "a", tags: [1, 2] }))).json(), { name: "a", tags: 2 });
+
+  const missing = await post(JSON.stringify({ tags: [] }));
+  assertEquals(missing.status, 400);
+  assertEquals((await missing.json()).error, "Missing required fields: name");
+
+  const invalid = await post("{");
+  assertEquals(invalid.status, 400);
+  await invalid.body?.cancel();
+});
+
+Deno.test("compileBodySchema: reports the first mistyped field", () => {
+  const check = compileBodySchema({ models: "array", temperature: "number?" });
+  assertEquals(check({ models: [] }), null);
+  assertEquals(check({ models: "x" }), "models must be an array");
+  assertEquals(check({ models: [], temperature: "hot" }), "temperature must be a number");
+  assertEquals(check([]), "Request body must be a JSON object");
+});
+
+Deno.test("RouteTable: duplicate routes fail at compile time", () => {
+  const a = new RouteTable();
+  a.get("/x/:id", () => {});
+  const b = new RouteTable();
+  b.get("/x/:other", () => {});
+  assertThrows(() => RouteTable.merge(a, b).compile(), Error, "Duplicate route: GET /x/:other");
+});
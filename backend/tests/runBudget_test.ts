@@ -0,0 +1,46 @@
+import { assert, assertEquals, assertRejects } from "https://deno.land/std@0.224.0/assert/mod.ts";
+import { RepoTestTimeoutError, RunBudget } from "../services/runBudget.ts";
+
+Deno.test("RunBudget: request limits override defaults", () => {
+  const budget = new RunBudget({ test_timeout_ms: 1234, memory_mb: 256 });
+  assertEquals(budget.timeouts.test, 1234);
+  assert(budget.timeouts.tool > 0);
+  assertEquals(budget.resources.memoryBytes, 256 * 1024 * 1024);
+});
+
+Deno.test("RunBudget: a phase over its own timeout is aborted and reported", async () => {
+  const budget = new RunBudget({ tool_timeout_ms: 50 });
+  let aborted = false;
+  const error = await assertRejects(
+    () =>
+      budget.phase("tool", (signal) =>
+        new Promise<void>((resolve) => {
+          signal.addEventListener("abort", () => {
+            aborted = true;
+            // Settling on abort must not win over the timeout
+            resolve();
+          });
+        })),
+    RepoTestTimeoutError,
+  );
+  assert(aborted);
+  assertEquals(error.phase, "tool");
+  assertEquals(error.totalBudget, false);
+});
+
+Deno.test("RunBudget: the total budget caps every phase", async () => {
+  const budget = new RunBudget({ total_timeout_ms: 50, test_timeout_ms: 60_000 });
+  const error = await assertRejects(
+    () => budget.phase("test", (signal) => new Promise<void>((resolve) => signal.addEventListener("abort", () => resolve()))),
+    RepoTestTimeoutError,
+  );
+  assertEquals(error.phase, "test");
+  assertEquals(error.totalBudget, true);
+  // Once spent, later phases fail immediately
+  await assertRejects(() => budget.phase("tool", () => Promise.resolve()), RepoTestTimeoutError);
+});
+
+Deno.test("RunBudget: phases that finish in time return their value", async () => {
+  const budget = new RunBudget({ clone_timeout_ms: 1000 });
+  assertEquals(await budget.phase("clone", () => Promise.resolve(42)), 42);
+});
@@ -0,0 +1,119 @@
+import { assertEquals } from "https://deno.land/std@0.224.0/assert/mod.ts";
+import { Application } from "oak";
+import { RunEventLog, RunEventRegistry, runEvents } from "../utils/runEvents.ts";
+import runRoutes from "../routes/runs.ts";
+
+async function collect(feed: AsyncGenerator<{ seq: number; json: string }>) {
+  const frames = [];
+  for await (const frame of feed) frames.push(frame);
+  return frames;
+}
+
+Deno.test("RunEventLog: replays from the ring and reports what a small ring dropped", async () => {
+  const log = new RunEventLog("r1", "test", { capacity: 3 });
+  for (let i = 1; i <= 5; i++) log.append({ i });
+  log.finish();
+
+  const tail = await log.replay(3);
+  assertEquals(tail.frames.map((f) => f.seq), [4, 5]);
+  assertEquals(tail.dropped, undefined);
+
+  const all = await collect(log.follow(0));
+  assertEquals(all.map((f) => f.seq), [0, 3, 4, 5]);
+  assertEquals(JSON.parse(all[0].json), { type: "events_dropped", from: 1, to: 2 });
+  assertEquals(JSON.parse(all[1].json), { i: 3 });
+});
+
+Deno.test("RunEventLog: spills evicted events to disk and replays them in order", async () => {
+  const dir = await Deno.makeTempDir();
+  try {
+    const log = new RunEventLog("r2", "test", { capacity: 2, spillDir: dir });
+    for (let i = 1; i <= 6; i++) log.append({ i });
+    log.finish();
+    const frames = await collect(log.follow(1));
+    assertEquals(frames.map((f) => JSON.parse(f.json).i), [2, 3, 4, 5, 6]);
+    assertEquals(frames.map((f) => f.seq), [2, 3, 4, 5, 6]);
+    await log.dispose();
+    assertEquals(await Deno.stat(`${dir}/r2.events`).then(() => true, () => false), false);
+  } finally {
+    await Deno.remove(dir, { recursive: true });
+  }
+});
+
+Deno.test("RunEventLog: followers wait for new events and stop when the run finishes", async () => {
+  const log = new RunEventLog("r3", "test");
+  const following = collect(log.follow(0));
+  log.append({ type: "start" });
+  await new Promise((resolve) => setTimeout(resolve, 5));
+  log.append({ type: "complete" });
+  log.finish();
+  assertEquals((await following).map((f) => JSON.parse(f.json).type), ["start", "complete"]);
+});
+
+Deno.test("RunEventRegistry: expires finished runs after retention", async () => {
+  const registry = new RunEventRegistry({ capacity: 10, spillDir: "unused", retentionMs: 0 });
+  const log = registry.create("test");
+  assertEquals(await registry.open(log.id, 0) !== null, true);
+  log.finish();
+  await new Promise((resolve) => setTimeout(resolve, 2));
+  registry.create("test");
+  assertEquals(registry.get(log.id), undefined);
+  assertEquals(await registry.open(log.id, 0), null);
+});
+
+Deno.test("GET /api/runs/:id/events: resumes after Last-Event-ID", async () => {
+  const app = new Application();
+  app.use(runRoutes.routes());
+  const handle = (path: string, headers: Record<string, string> = {}) =>
+    (app as unknown as { handle: (req: Request) => Promise<Response> }).handle(new Request(`http://localhost${path}`, { headers }));
+
+  const log = runEvents.create("test");
+  log.append({ type: "start" });
+  log.append({ type: "chunk", content: "a" });
+  log.append({ type: "complete" });
+  log.finish();
+
+  const response = await handle(`/api/runs/${log.id}/events`, { "Last-Event-ID": "1" });
+  assertEquals(response.headers.get("Content-Type"), "text/event-stream");
+  assertEquals(response.headers.get("X-Run-Id"), log.id);
+  assertEquals(
+    await response.text(),
+    `id: 2\ndata: {"type":"chunk","content":"a"}\n\nid: 3\ndata: {"type":"complete"}\n\ndata: [DONE]\n\n`,
+  );
+
+  const missing = await handle("/api/runs/nope/events");
+  assertEquals(missing.status, 404);
+  await missing.body?.cancel();
+});
+
+Deno.test("RunEventRegistry.start: runs once and coalesces identical requests that opt in", async () => {
+  const registry = new RunEventRegistry({ capacity: 10, spillDir: "unused", retentionMs: 60_000, coalesceWindowMs: 60_000 });
+  let executions = 0;
+  let release!: () => void;
+  const gate = new Promise<void>((resolve) => release = resolve);
+  const execute = async (run: RunEventLog) => {
+    executions++;
+    run.append({ type: "start" });
+    await gate;
+    run.append({ type: "complete" });
+  };
+
+  const first = await registry.start("test", execute, { coalesce: { prompt: "p", models: ["a", "b"] } });
+  const same = await registry.start("test", execute, { coalesce: { models: ["a", "b"], prompt: "p" } });
+  const other = await registry.start("test", execute, { coalesce: { prompt: "q", models: ["a", "b"] } });
+  const optedOut = await registry.start("test", execute);
+  assertEquals(first.coalesced, false);
+  assertEquals(same, { id: first.id, coalesced: true });
+  assertEquals(other.id === first.id, false);
+  assertEquals(optedOut.id === first.id, false);
+  assertEquals(executions, 3);
+
+  // Two subscribers read independently; the run does not wait for either
+  const fast = collect((await registry.open(first.id, 0))!);
+  const slow = (await registry.open(first.id, 0))!;
+  assertEquals(registry.list().find((r) => r.id === first.id)?.subscribers, 1);
+  release();
+  assertEquals((await fast).map((f) => JSON.parse(f.json).type), ["start", "complete"]);
+  assertEquals((await collect(slow)).length, 2);
+  assertEquals(registry.get(first.id)?.finished, true);
+});
@@ -0,0 +1,30 @@
+import { assert, assertEquals, assertRejects } from "https://deno.land/std@0.224.0/assert/mod.ts";
+import { type Span, SpanRecorder } from "../utils/spans.ts";
+
+Deno.test("SpanRecorder: records spans relative to the origin, including failed ones", async () => {
+  const emitted: Span[] = [];
+  const recorder = new SpanRecorder((span) => emitted.push(span));
+
+  await recorder.time("tool", () => new Promise((resolve) => setTimeout(resolve, 20)), { iteration: 1 });
+  await assertRejects(() => recorder.time("test", () => Promise.reject(new Error("boom")), { iteration: 1 }));
+  recorder.record("parse", recorder.origin + 5, 1.234, { parent: "test", iteration: 1 });
+
+  assertEquals(emitted.map((s) => s.name), ["tool", "test", "parse"]);
+  const [tool, test, parse] = recorder.spans;
+  assert(tool.duration_ms >= 15);
+  assertEquals(tool.iteration, 1);
+  assert(test.start_ms >= tool.start_ms + tool.duration_ms - 1);
+  assertEquals(parse, { name: "parse", parent: "test", iteration: 1, start_ms: 5, duration_ms: 1.2 });
+  assertEquals(recorder.total("tool"), tool.duration_ms);
+});
+
+Deno.test("SpanRecorder: adopted spans keep their offsets and count towards totals", () => {
+  const shared = new SpanRecorder(undefined, 1000);
+  shared.record("clone", 1000, 40);
+  const pair = new SpanRecorder(undefined, shared.origin);
+  pair.adopt(shared.spans);
+  pair.record("tool", 1100, 10);
+
+  assertEquals(pair.spans.map((s) => [s.name, s.start_ms]), [["clone", 0], ["tool", 100]]);
+  assertEquals(pair.total("clone"), 40);
+});
@@ -0,0 +1,62 @@
+import { assert, assertEquals } from "https://deno.land/std@0.224.0/assert/mod.ts";
+import { HeadTailBuffer, runStreaming } from "../utils/subprocess.ts";
+
+Deno.test("HeadTailBuffer: keeps head and tail within the limit", () => {
+  const buffer = new HeadTailBuffer(10);
+  buffer.append("abcdefgh");
+  assertEquals(buffer.toString(), "abcdefgh");
+  assertEquals(buffer.truncated, false);
+
+  for (let i = 0; i < 100; i++) buffer.append("xyz");
+  buffer.append("END");
+  const text = buffer.toString();
+  assert(text.startsWith("abcde"));
+  assert(text.endsWith("zEND"));
+  assert(text.includes("characters truncated"));
+  assertEquals(buffer.truncated, true);
+});
+
+Deno.test({
+  name: "runStreaming: forwards throttled deltas and bounds retained output",
+  ignore: Deno.build.os === "windows",
+}, async () => {
+  const deltas: string[] = [];
+  const result = await runStreaming("sh", {
+    args: ["-c", "i=0; while [ $i -lt 2000 ]; do echo line-$i; i=$((i+1)); done; echo oops >&2; exit 3"],
+    onOutput: (delta) => {
+      if (delta.stream === "stdout") deltas.push(delta.text);
+    },
+    throttleMs: 10,
+    maxBufferChars: 1000,
+    maxDeltaChars: 1_000_000,
+  });
+
+  assertEquals(result.code, 3);
+  assertEquals(result.success, false);
+  assertEquals(result.stderr.trim(), "oops");
+  assert(result.truncated);
+  assert(result.stdout.startsWith("line-0\n"));
+  assert(result.stdout.trimEnd().endsWith("line-1999"));
+  assert(result.stdout.length < 1100);
+  // Every byte reached the listener, batched into far fewer calls than lines
+  assertEquals(deltas.join("").split("\n").filter(Boolean).length, 2000);
+  assert(deltas.length < 2000);
+});
+
+Deno.test({
+  name: "runStreaming: aborting kills the whole process group",
+  ignore: Deno.build.os === "windows",
+}, async () => {
+  const controller = new AbortController();
+  setTimeout(() => controller.abort(), 200);
+  // The background sleeps hold the pipes open; only a group kill lets this return quickly
+  const result = await runStreaming("sh", {
+    args: ["-c", "sleep 30 & sleep 30 & echo started; wait"],
+    signal: controller.signal,
+  });
+
+  assert(result.killed);
+  assertEquals(result.success, false);
+  assertEquals(result.stdout.trim(), "started");
+  assert(result.durationMs < 10_000);
+});
@@ -0,0 +1,143 @@
+import { assertEquals, assertStringIncludes } from "https://deno.land/std@0.224.0/assert/mod.ts";
+import {
+  JUnitStreamParser,
+  parseJestJson,
+  StdoutReportParser,
+  TestReportService,
+} from "../services/testReportService.ts";
+
+const JUNIT = `<?xml version="1.0" encoding="UTF-8"?>
+<!-- generated -->
+<testsuites>
+  <testsuite name="math" tests="3">
+    <testcase classname="math.add" name="adds &amp; carries" time="0.012"/>
+    <testcase classname="math.sub" name="subtracts" time="1.5">
+      <failure><![CDATA[expected 1 > 2]]></failure>
+    </testcase>
+    <testcase name="later" time="0"><skipped message="todo"/></testcase>
+  </testsuite>
+</testsuites>`;
+
+Deno.test("JUnitStreamParser: parses a report fed in arbitrary chunks", () => {
+  const parser = new JUnitStreamParser();
+  for (let i = 0; i < JUNIT.length; i += 7) parser.push(JUNIT.slice(i, i + 7));
+  const cases = parser.end();
+
+  assertEquals(cases.map((c) => [c.suite, c.name, c.status, c.duration_ms]), [
+    ["math.add", "adds & carries", "passed", 12],
+    ["math.sub", "subtracts", "failed", 1500],
+    ["math", "later", "skipped", 0],
+  ]);
+  assertEquals(cases[1].message, "expected 1 > 2");
+});
+
+Deno.test("parseJestJson: maps assertion results", () => {
+  const cases = parseJestJson(JSON.stringify({
+    testResults: [{
+      name: "/repo/sum.test.js",
+      assertionResults: [
+        { ancestorTitles: ["sum"], title: "adds", status: "passed", duration: 3 },
+        { ancestorTitles: ["sum"], title: "overflows", status: "failed", duration: null, failureMessages: ["boom"] },
+        { ancestorTitles: [], title: "pending", status: "todo" },
+      ],
+    }],
+  }));
+
+  assertEquals(cases.map((c) => [c.suite, c.name, c.status, c.duration_ms]), [
+    ["/repo/sum.test.js > sum", "adds", "passed", 3],
+    ["/repo/sum.test.js > sum", "overflows", "failed", null],
+    ["/repo/sum.test.js", "pending", "skipped", null],
+  ]);
+  assertEquals(cases[1].message, "boom");
+});
+
+Deno.test("StdoutReportParser: reads TAP with node-style durations", () => {
+  const parser = new StdoutReportParser();
+  parser.push("TAP version 13\n# Subtest: a\nok 1 - a\n  ---\n  duration_ms: 4.6\n  ...\nnot ok 2 - b\n");
+  parser.push("ok 3 - c # SKIP not yet\n    ok 1 - nested\n1..3");
+  const report = parser.end();
+
+  assertEquals(report?.format, "tap");
+  assertEquals(report?.cases.map((c) => [c.name, c.status, c.duration_ms]), [
+    ["a", "passed", 5],
+    ["b", "failed", null],
+    ["c", "skipped", null],
+  ]);
+});
+
+Deno.test("StdoutReportParser: reads go test -json split mid-line", () => {
+  const lines = [
+    `{"Action":"run","Package":"p","Test":"TestA"}`,
+    `{"Action":"pass","Package":"p","Test":"TestA","Elapsed":0.25}`,
+    `{"Action":"fail","Package":"p","Test":"TestB","Elapsed":0}`,
+    `{"Action":"fail","Package":"p","Elapsed":0.3}`,
+  ].join("\n");
+  const parser = new StdoutReportParser();
+  parser.push(lines.slice(0, 50));
+  parser.push(lines.slice(50));
+  const report = parser.end();
+
+  assertEquals(report?.format, "go-json");
+  assertEquals(report?.cases.map((c) => [c.name, c.status, c.duration_ms]), [
+    ["TestA", "passed", 250],
+    ["TestB", "failed", 0],
+  ]);
+});
+
+Deno.test("StdoutReportParser: plain output yields no report", () => {
+  const parser = new StdoutReportParser();
+  parser.push("ok 1 looks like TAP but has no header\n5 passed\n");
+  assertEquals(parser.end(), null);
+});
+
+Deno.test("TestReportService.prepare: injects reporters only for recognised simple commands", async () => {
+  const workdir = await Deno.makeTempDir();
+  try {
+    await Deno.writeTextFile(`${workdir}/package.json`, JSON.stringify({ scripts: { test: "jest --ci" } }));
+
+    const npm = await TestReportService.prepare("npm test", workdir);
+    assertStringIncludes(npm.command, "npm test -- --json --outputFile=");
+    assertEquals(npm.reportFormat, "jest-json");
+
+    const pytest = await TestReportService.prepare("python -m pytest -q", workdir);
+    assertStringIncludes(pytest.command, "--junitxml=");
+    assertEquals(pytest.reportFormat, "junit");
+
+    const deno = await TestReportService.prepare("deno test -A tests/", workdir);
+    assertEquals(deno.command.startsWith("deno test --junit-path="), true);
+    assertEquals(deno.command.endsWith(" -A tests/"), true);
+
+    assertEquals(await TestReportService.prepare("pytest && echo ok", workdir), { command: "pytest && echo ok" });
+    assertEquals(await TestReportService.prepare("make test", workdir), { command: "make test" });
+  } finally {
+    await Deno.remove(workdir, { recursive: true });
+  }
+});
+
+Deno.test("TestReportService.focusOnFailures: selects previous failures per runner", async () => {
+  const workdir = await Deno.makeTempDir();
+  const failed = (...names: string[]) => names.map((name) => ({ suite: null, name, status: "failed" as const, duration_ms: null }));
+  try {
+    await Deno.writeTextFile(`${workdir}/package.json`, JSON.stringify({ scripts: { test: "jest" } }));
+
+    assertEquals(await TestReportService.focusOnFailures("npm test", workdir, failed("a")), "npm test -- --onlyFailures");
+    assertEquals(await TestReportService.focusOnFailures("pytest -q", workdir, failed("a")), "pytest -q --lf");
+    assertEquals(
+      await TestReportService.focusOnFailures("deno test -A", workdir, failed("adds $1", "b.c")),
+      "deno test --filter '/^(adds \\$1|b\\.c)$/' -A",
+    );
+    assertEquals(
+      await TestReportService.focusOnFailures("go test ./...", workdir, failed("TestA/sub", "TestA/other", "TestB")),
+      "go test -run '^(TestA|TestB)$' ./...",
+    );
+
+    // The focused command still gets its reporter flag, without a second `--`
+    const prepared = await TestReportService.prepare("npm test -- --onlyFailures", workdir);
+    assertStringIncludes(prepared.command, "npm test -- --onlyFailures --json --outputFile=");
+
+    assertEquals(await TestReportService.focusOnFailures("make test", workdir, failed("a")), null);
+    assertEquals(await TestReportService.focusOnFailures("pytest", workdir, []), null);
+  } finally {
+    await Deno.remove(workdir, { recursive: true });
+  }
+});
@@ -0,0 +1,47 @@
+import { assertEquals } from "https://deno.land/std@0.224.0/assert/mod.ts";
+import { ToolProbeService } from "../services/toolProbeService.ts";
+
+Deno.test({
+  name: "ToolProbeService: caches probes until the binary on PATH changes",
+  ignore: Deno.build.os === "windows",
+  fn: async () => {
+    ToolProbeService.clearCache();
+    const dir = await Deno.makeTempDir();
+    const originalPath = Deno.env.get("PATH") ?? "";
+    const writeTool = async (version: string) => {
+      await Deno.writeTextFile(`${dir}/faketool`, `#!/bin/sh\necho x >> "${dir}/calls"\necho "faketool ${version}"\n`);
+      await Deno.chmod(`${dir}/faketool`, 0o755);
+    };
+    const calls = async () => (await Deno.readTextFile(`${dir}/calls`)).trim().split("\n").length;
+    try {
+      await writeTool("1.0");
+      Deno.env.set("PATH", `${dir}:${originalPath}`);
+
+      const [a, b] = await Promise.all([ToolProbeService.probe("faketool"), ToolProbeService.probe("faketool")]);
+      assertEquals(a, b);
+      assertEquals(a.available, true);
+      assertEquals(a.path, `${dir}/faketool`);
+      assertEquals(a.version, "faketool 1.0");
+      assertEquals(await calls(), 1);
+
+      await ToolProbeService.probe("faketool");
+      assertEquals(await calls(), 1);
+
+      await ToolProbeService.probe("faketool", true);
+      assertEquals(await calls(), 2);
+
+      // A reinstalled binary has a new mtime and is probed again
+      await writeTool("2.0");
+      await Deno.utime(`${dir}/faketool`, new Date(), new Date(Date.now() + 5000));
+      assertEquals((await ToolProbeService.probe("faketool")).version, "faketool 2.0");
+      assertEquals(await calls(), 3);
+
+      const missing = await ToolProbeService.probe("definitely-not-a-real-tool-xyz");
+      assertEquals(missing.available, false);
+      assertEquals(missing.path, null);
+    } finally {
+      Deno.env.set("PATH", originalPath);
+      await Deno.remove(dir, { recursive: true });
+    }
+  },
+});
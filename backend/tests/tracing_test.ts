@@ -0,0 +1,59 @@
+import { assert, assertEquals } from "https://deno.land/std@0.224.0/assert/mod.ts";
+import { type SpanExporter, Tracer } from "../utils/tracing.ts";
+
+class MemoryExporter implements SpanExporter {
+  payloads: any[] = [];
+
+  export(payload: string) {
+    this.payloads.push(JSON.parse(payload));
+    return Promise.resolve();
+  }
+
+  get spans(): any[] {
+    return this.payloads.flatMap((p) => p.resourceSpans[0].scopeSpans[0].spans);
+  }
+}
+
+Deno.test("Tracer: disabled without exporters, and spans need a sampled parent", () => {
+  const disabled = new Tracer({ exporters: [] });
+  assertEquals(disabled.enabled, false);
+  assertEquals(disabled.startRootSpan("GET"), null);
+
+  const tracer = new Tracer({ exporters: [new MemoryExporter()] });
+  assertEquals(tracer.startSpan("orphan"), null);
+  const unsampled = new Tracer({ exporters: [new MemoryExporter()], sampleRate: 0 });
+  assertEquals(unsampled.startRootSpan("GET"), null);
+});
+
+Deno.test("Tracer: children follow the active span across awaits and export as OTLP/JSON", async () => {
+  const exporter = new MemoryExporter();
+  const tracer = new Tracer({ exporters: [exporter], sampleRate: 0 });
+  const traceId = "0af7651916cd43dd8448eb211c80319c";
+
+  // A sampled traceparent overrides the sample rate
+  const root = tracer.startRootSpan("GET /api/x", { traceparent: `00-${traceId}-b7ad6b7169203331-01`, attributes: { "http.route": "/api/x" } })!;
+  assert(root);
+  await tracer.withSpan(root, async () => {
+    await tracer.trace("load", async () => {
+      await new Promise((resolve) => setTimeout(resolve, 1));
+      tracer.startSpan("SELECT run_history", { kind: "client" })!.end();
+    });
+    await tracer.trace("fail", () => Promise.reject(new Error("boom"))).catch(() => {});
+  });
+  root.end();
+  await tracer.flush();
+
+  const spans = exporter.spans;
+  const byName = Object.fromEntries(spans.map((s) => [s.name, s]));
+  assertEquals(spans.length, 4);
+  assert(spans.every((s) => s.traceId === traceId));
+  assertEquals(byName["GET /api/x"].parentSpanId, "b7ad6b7169203331");
+  assertEquals(byName["GET /api/x"].kind, 2);
+  assertEquals(byName["load"].parentSpanId, byName["GET /api/x"].spanId);
+  assertEquals(byName["SELECT run_history"].parentSpanId, byName["load"].spanId);
+  assertEquals(byName["SELECT run_history"].kind, 3);
+  assertEquals(byName["fail"].status, { code: 2, message: "boom" });
+  assertEquals(byName["GET /api/x"].attributes, [{ key: "http.route", value: { stringValue: "/api/x" } }]);
+  assert(BigInt(byName["load"].endTimeUnixNano) >= BigInt(byName["load"].startTimeUnixNano));
+  assertEquals(exporter.payloads[0].resourceSpans[0].resource.attributes[0].key, "service.name");
+});
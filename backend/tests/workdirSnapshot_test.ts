@@ -0,0 +1,79 @@
+import { assertEquals, assertStringIncludes } from "https://deno.land/std@0.224.0/assert/mod.ts";
+import { WorkdirSnapshot } from "../services/workdirSnapshot.ts";
+import { gunzip, gzip } from "../utils/compression.ts";
+import { git } from "./helpers/git.ts";
+
+async function exists(path: string): Promise<boolean> {
+  return await Deno.stat(path).then(() => true, () => false);
+}
+
+Deno.test("WorkdirSnapshot: diffs against and restores the git baseline without touching the repo index", async () => {
+  const dir = await Deno.makeTempDir();
+  try {
+    await Deno.writeTextFile(`${dir}/a.txt`, "a\n");
+    await Deno.writeTextFile(`${dir}/b.txt`, "b\n");
+    await git(["init", "-q"], dir);
+    await git(["add", "-A"], dir);
+    await git(["commit", "-q", "-m", "init"], dir);
+    // Installed after clone: part of the baseline, so not part of any diff
+    await Deno.writeTextFile(`${dir}/generated.txt`, "installed\n");
+    await Deno.mkdir(`${dir}/node_modules`);
+    await Deno.writeTextFile(`${dir}/node_modules/dep.js`, "dep\n");
+
+    const snapshot = await WorkdirSnapshot.create(dir);
+    assertEquals(snapshot.kind, "git");
+    try {
+      await Deno.writeTextFile(`${dir}/a.txt`, "changed\n");
+      await Deno.remove(`${dir}/b.txt`);
+      await Deno.writeTextFile(`${dir}/c.txt`, "new\n");
+
+      const diff = await snapshot.diff();
+      assertEquals(diff?.files_changed, 3);
+      assertStringIncludes(diff!.patch, "+changed");
+      assertStringIncludes(diff!.patch, "new file mode");
+
+      await snapshot.restore();
+      assertEquals(await Deno.readTextFile(`${dir}/a.txt`), "a\n");
+      assertEquals(await Deno.readTextFile(`${dir}/b.txt`), "b\n");
+      assertEquals(await exists(`${dir}/c.txt`), false);
+      assertEquals(await Deno.readTextFile(`${dir}/generated.txt`), "installed\n");
+      assertEquals(await exists(`${dir}/node_modules/dep.js`), true);
+      assertEquals((await snapshot.diff())?.files_changed, 0);
+      assertEquals(await git(["status", "--porcelain", "--", "a.txt", "b.txt", "c.txt"], dir), "");
+    } finally {
+      await snapshot.dispose();
+    }
+  } finally {
+    await Deno.remove(dir, { recursive: true });
+  }
+});
+
+Deno.test("WorkdirSnapshot: falls back to a directory copy outside git", async () => {
+  const parent = await Deno.makeTempDir();
+  const dir = `${parent}/work`;
+  try {
+    await Deno.mkdir(dir);
+    await Deno.writeTextFile(`${dir}/a.txt`, "a\n");
+
+    const snapshot = await WorkdirSnapshot.create(dir);
+    assertEquals(snapshot.kind, "copy");
+    await Deno.writeTextFile(`${dir}/a.txt`, "changed\n");
+    await Deno.writeTextFile(`${dir}/b.txt`, "new\n");
+    assertEquals(await snapshot.diff(), null);
+
+    await snapshot.restore();
+    assertEquals(await Deno.readTextFile(`${dir}/a.txt`), "a\n");
+    assertEquals(await exists(`${dir}/b.txt`), false);
+    await snapshot.dispose();
+    assertEquals(await exists(`${dir}.baseline`), false);
+  } finally {
+    await Deno.remove(parent, { recursive: true });
+  }
+});
+
+Deno.test("gzip: round-trips text", async () => {
+  const text = "diff --git a/x b/x\n".repeat(100);
+  const compressed = await gzip(text);
+  assertEquals(compressed.length < text.length, true);
+  assertEquals(new TextDecoder().decode(await gunzip(compressed)), text);
+});
@@ -0,0 +1,422 @@
+// Worker-per-core serving: one primary thread, N HTTP workers listening on the same port.
+//
+// CLUSTER_WORKERS=N (or "auto" for one per core) starts N Web Workers that each run the full
+// app and bind PORT with `reusePort`, so the kernel spreads connections, and with them SSE
+// runs, across event loops. The primary serves no HTTP. It owns the only SQLite connection
+// and runs every database call for the workers, one at a time, which keeps a single writer
+// without relying on file locking.
+//
+// Database calls stay synchronous in the workers: the call is posted to the primary and the
+// worker blocks on a SharedArrayBuffer until the result is written back (in chunks when it
+// is larger than the buffer). Everything else goes through a small message bus relayed by
+// the primary: `publish`/`subscribe` for notifications and `gather`, which asks every thread
+// for its local view (metrics, open streams) so any worker can answer for the whole process.
+
+import { tracer } from "./tracing.ts";
+
+export type ClusterRole = "single" | "primary" | "worker";
+
+export interface ClusterWorkerInit {
+  kind: "init";
+  workerId: number;
+  control: SharedArrayBuffer;
+  data: SharedArrayBuffer;
+}
+
+interface WorkerScope {
+  postMessage(message: unknown): void;
+  addEventListener(type: "message", listener: (event: MessageEvent) => void): void;
+}
+
+// control[0] holds the call state: IDLE, the call's id while the worker waits for it, or minus
+// the id once a chunk of that call's answer is in the data buffer. control[1] holds the total
+// result size, control[2] this chunk's size. The primary only marks a chunk ready by swapping
+// id for -id, so the late answer to a call the worker gave up on is dropped, never read as the
+// answer to its next call.
+const IDLE = 0;
+const MAX_CALL_ID = 0x7fffffff;
+const RPC_BUFFER_BYTES = 1024 * 1024;
+const RPC_TIMEOUT_MS = 30_000;
+const GATHER_TIMEOUT_MS = 2000;
+const RESTART_DELAY_MS = 1000;
+
+const encoder = new TextEncoder();
+const decoder = new TextDecoder();
+
+let role: ClusterRole = "single";
+let workerContext: { id: number; control: Int32Array; data: Uint8Array } | null = null;
+let nextCallId = 1;
+const subscribers = new Map<string, Set<(data: unknown) => void>>();
+const collectors = new Map<string, (arg: any) => unknown>();
+
+export function clusterRole(): ClusterRole {
+  return role;
+}
+
+// 0 on the primary and in single-process mode, 1..N in HTTP workers
+export function workerId(): number {
+  return workerContext?.id ?? 0;
+}
+
+// CLUSTER_WORKERS: unset or 1 for one process, a number, or "auto" for one worker per core
+export function clusterSize(value = Deno.env.get("CLUSTER_WORKERS")): number {
+  if (!value) return 1;
+  if (value.trim().toLowerCase() === "auto") return navigator.hardwareConcurrency || 1;
+  const parsed = parseInt(value);
+  return Number.isFinite(parsed) && parsed > 0 ? parsed : 1;
+}
+
+// Values crossing threads: JSON, with Uint8Array (diff blobs) carried as base64
+function bytesToBase64(bytes: Uint8Array): string {
+  let binary = "";
+  for (let i = 0; i < bytes.length; i += 0x8000) {
+    binary += String.fromCharCode(...bytes.subarray(i, i + 0x8000));
+  }
+  return btoa(binary);
+}
+
+export function encodeValue(value: unknown): Uint8Array {
+  return encoder.encode(JSON.stringify({ v: value }, (_key, v) => v instanceof Uint8Array ? { $bytes: bytesToBase64(v) } : v));
+}
+
+export function decodeValue(bytes: Uint8Array): unknown {
+  return JSON.parse(decoder.decode(bytes), (_key, v) => {
+    if (v !== null && typeof v === "object" && typeof v.$bytes === "string" && Object.keys(v).length === 1) {
+      return Uint8Array.from(atob(v.$bytes), (c) => c.charCodeAt(0));
+    }
+    return v;
+  }).v;
+}
+
+function scope(): WorkerScope {
+  return globalThis as unknown as WorkerScope;
+}
+
+// ---- Worker side ----------------------------------------------------------------------------
+
+// Called by worker.ts with the primary's init message, before the app (and the database) loads
+export function initClusterWorker(init: ClusterWorkerInit) {
+  role = "worker";
+  workerContext = {
+    id: init.workerId,
+    control: new Int32Array(init.control),
+    data: new Uint8Array(init.data),
+  };
+  scope().addEventListener("message", (event) => {
+    const message = event.data;
+    switch (message?.kind) {
+      case "message":
+        deliver(message.topic, message.data);
+        break;
+      case "collect":
+        collectLocal(message.topic, message.arg).then((data) => scope().postMessage({ kind: "collected", id: message.id, data }));
+        break;
+      case "gathered":
+        pendingGathers.get(message.id)?.(message.results);
+        pendingGathers.delete(message.id);
+        break;
+    }
+  });
+}
+
+// Wait until the primary marks a chunk of call `id` ready. False once timed out, with the state
+// back to IDLE so a late answer to this call is dropped.
+function waitForChunk(control: Int32Array, id: number, timeoutMs: number): boolean {
+  const deadline = Date.now() + timeoutMs;
+  while (Atomics.load(control, 0) === id) {
+    const remaining = deadline - Date.now();
+    // The answer may land between the wait timing out and this swap
+    if (remaining <= 0) return Atomics.compareExchange(control, 0, id, IDLE) !== id;
+    Atomics.wait(control, 0, id, remaining);
+  }
+  return true;
+}
+
+// Run `method` with `args` on the primary's database and wait for the result
+export function callCoordinator(method: string, args: unknown[], timeoutMs = RPC_TIMEOUT_MS): unknown {
+  const context = workerContext;
+  if (!context) throw new Error("Not running as a cluster worker");
+  const { control, data } = context;
+  const id = nextCallId;
+  nextCallId = id === MAX_CALL_ID ? 1 : id + 1;
+  Atomics.store(control, 0, id);
+  scope().postMessage({ kind: "db", id, payload: encodeValue([method, args]) });
+
+  const chunks: Uint8Array[] = [];
+  let received = 0;
+  while (true) {
+    if (!waitForChunk(control, id, timeoutMs)) {
+      throw new Error(`Database coordinator did not answer ${method} within ${timeoutMs}ms`);
+    }
+    const total = control[1];
+    const length = control[2];
+    chunks.push(data.slice(0, length));
+    received += length;
+    if (received >= total) break;
+    Atomics.store(control, 0, id);
+    scope().postMessage({ kind: "db-more", id });
+  }
+  Atomics.store(control, 0, IDLE);
+
+  const bytes = chunks.length === 1 ? chunks[0] : new Uint8Array(received);
+  if (chunks.length > 1) {
+    let offset = 0;
+    for (const chunk of chunks) {
+      bytes.set(chunk, offset);
+      offset += chunk.length;
+    }
+  }
+  const [ok, value] = decodeValue(bytes) as [boolean, unknown];
+  if (!ok) throw new Error(String(value));
+  return value;
+}
+
+// An object whose method calls run on the primary, standing in for the database in workers.
+// The statements themselves are timed and traced on the primary; a traced request gets one
+// span per call here covering the round trip.
+export function coordinatorClient<T extends object>(): T {
+  return new Proxy({}, {
+    get(_target, prop) {
+      if (typeof prop !== "string" || prop === "then") return undefined;
+      return (...args: unknown[]) => {
+        const span = tracer.enabled ? tracer.startSpan(`db ${prop}`, { kind: "client", attributes: { "db.system": "sqlite" } }) : null;
+        try {
+          return callCoordinator(prop, args);
+        } catch (error) {
+          span?.recordError(error);
+          throw error;
+        } finally {
+          span?.end();
+        }
+      };
+    },
+  }) as T;
+}
+
+// ---- Bus ------------------------------------------------------------------------------------
+
+const pendingGathers = new Map<number, (results: unknown[]) => void>();
+let nextGatherId = 1;
+
+function deliver(topic: string, data: unknown) {
+  for (const handler of subscribers.get(topic) ?? []) {
+    try {
+      handler(data);
+    } catch { /* one bad subscriber must not stop the rest */ }
+  }
+}
+
+async function collectLocal(topic: string, arg: unknown): Promise<unknown> {
+  try {
+    return (await collectors.get(topic)?.(arg)) ?? null;
+  } catch {
+    return null;
+  }
+}
+
+// Deliver `data` to subscribers of `topic` on every other thread
+export function publish(topic: string, data: unknown) {
+  if (role === "worker") scope().postMessage({ kind: "publish", topic, data });
+  else if (role === "primary") primary?.broadcast(topic, data, null);
+}
+
+export function subscribe(topic: string, handler: (data: unknown) => void): () => void {
+  let handlers = subscribers.get(topic);
+  if (!handlers) subscribers.set(topic, handlers = new Set());
+  handlers.add(handler);
+  return () => handlers!.delete(handler);
+}
+
+// Answer `gather(topic, arg)` from this thread; null or undefined means nothing to report
+export function onCollect<A = undefined>(topic: string, collect: (arg: A) => unknown) {
+  collectors.set(topic, collect);
+}
+
+// This thread's answer to `topic` followed by every other thread's, the primary's included.
+// Threads that do not answer within a couple of seconds are left out.
+export async function gather(topic: string, arg?: unknown): Promise<unknown[]> {
+  if (role === "single") return [await collectLocal(topic, arg)];
+  if (role === "primary") return primary!.gather(topic, arg, null);
+  const id = nextGatherId++;
+  const [local, others] = await Promise.all([
+    collectLocal(topic, arg),
+    new Promise<unknown[]>((resolve) => {
+      pendingGathers.set(id, resolve);
+      scope().postMessage({ kind: "gather", id, topic, arg });
+    }),
+  ]);
+  return [local, ...others];
+}
+
+// ---- Primary side ---------------------------------------------------------------------------
+
+export interface ClusterOptions {
+  workers: number;
+  // Module URL of the worker entry point
+  entry: string | URL;
+  // Runs a database call for a worker; throws to send the error back
+  execute: (method: string, args: unknown[]) => unknown;
+  onWorkerExit?: (workerId: number, error: unknown) => void;
+}
+
+interface WorkerSlot {
+  id: number;
+  worker: Worker;
+  control: Int32Array;
+  data: Uint8Array;
+  callId: number; // the call `response` answers
+  response: Uint8Array | null;
+  offset: number;
+}
+
+class Primary {
+  private readonly slots = new Map<number, WorkerSlot>();
+  private readonly gathers = new Map<number, { results: unknown[]; waiting: Set<number>; done: (results: unknown[]) => void }>();
+  private nextId = 1;
+  private stopped = false;
+
+  constructor(private readonly options: ClusterOptions) {}
+
+  start() {
+    for (let id = 1; id <= this.options.workers; id++) this.spawn(id);
+  }
+
+  stop() {
+    this.stopped = true;
+    for (const slot of this.slots.values()) slot.worker.terminate();
+    this.slots.clear();
+  }
+
+  private spawn(id: number) {
+    const control = new SharedArrayBuffer(3 * Int32Array.BYTES_PER_ELEMENT);
+    const data = new SharedArrayBuffer(RPC_BUFFER_BYTES);
+    const worker = new Worker(this.options.entry, { type: "module", name: `http-${id}` });
+    const slot: WorkerSlot = { id, worker, control: new Int32Array(control), data: new Uint8Array(data), callId: 0, response: null, offset: 0 };
+    this.slots.set(id, slot);
+    worker.addEventListener("message", (event) => this.handle(slot, event.data));
+    worker.addEventListener("error", (event) => {
+      event.preventDefault();
+      this.restart(slot, event.error ?? event.message);
+    });
+    const init: ClusterWorkerInit = { kind: "init", workerId: id, control, data };
+    worker.postMessage(init);
+  }
+
+  private restart(slot: WorkerSlot, error: unknown) {
+    if (this.slots.get(slot.id) !== slot) return;
+    slot.worker.terminate();
+    this.slots.delete(slot.id);
+    for (const [gatherId, pending] of this.gathers) {
+      if (pending.waiting.delete(slot.id) && pending.waiting.size === 0) this.finish(gatherId);
+    }
+    this.options.onWorkerExit?.(slot.id, error);
+    if (!this.stopped) setTimeout(() => !this.stopped && this.spawn(slot.id), RESTART_DELAY_MS);
+  }
+
+  private handle(slot: WorkerSlot, message: any) {
+    switch (message?.kind) {
+      case "db":
+        this.runDb(slot, message.id, message.payload);
+        break;
+      case "db-more":
+        if (message.id === slot.callId) this.sendChunk(slot);
+        break;
+      case "publish":
+        this.broadcast(message.topic, message.data, slot.id);
+        break;
+      case "gather":
+        this.gather(message.topic, message.arg, slot.id).then((results) =>
+          slot.worker.postMessage({ kind: "gathered", id: message.id, results })
+        );
+        break;
+      case "collected":
+        this.collected(message.id, slot.id, message.data);
+        break;
+    }
+  }
+
+  private runDb(slot: WorkerSlot, callId: number, payload: Uint8Array) {
+    let response: Uint8Array;
+    try {
+      const [method, args] = decodeValue(payload) as [string, unknown[]];
+      response = encodeValue([true, this.options.execute(method, args)]);
+    } catch (error) {
+      response = encodeValue([false, error instanceof Error ? error.message : String(error)]);
+    }
+    slot.callId = callId;
+    slot.response = response;
+    slot.offset = 0;
+    this.sendChunk(slot);
+  }
+
+  private sendChunk(slot: WorkerSlot) {
+    const response = slot.response;
+    if (!response) return;
+    // The worker timed out on this call and may be waiting on another one
+    if (Atomics.load(slot.control, 0) !== slot.callId) {
+      slot.response = null;
+      return;
+    }
+    const length = Math.min(slot.data.length, response.length - slot.offset);
+    slot.data.set(response.subarray(slot.offset, slot.offset + length));
+    slot.offset += length;
+    if (slot.offset >= response.length) slot.response = null;
+    Atomics.store(slot.control, 1, response.length);
+    Atomics.store(slot.control, 2, length);
+    if (Atomics.compareExchange(slot.control, 0, slot.callId, -slot.callId) === slot.callId) {
+      Atomics.notify(slot.control, 0);
+    } else {
+      slot.response = null;
+    }
+  }
+
+  broadcast(topic: string, data: unknown, from: number | null) {
+    for (const slot of this.slots.values()) {
+      if (slot.id !== from) slot.worker.postMessage({ kind: "message", topic, data });
+    }
+    if (from !== null) deliver(topic, data);
+  }
+
+  // The primary's answer (as thread 0) and those of every worker except `from`, which answers for itself
+  gather(topic: string, arg: unknown, from: number | null): Promise<unknown[]> {
+    const id = this.nextId++;
+    const workers = [...this.slots.keys()].filter((slotId) => slotId !== from);
+    return new Promise((resolve) => {
+      this.gathers.set(id, { results: [], waiting: new Set([0, ...workers]), done: resolve });
+      for (const slotId of workers) this.slots.get(slotId)!.worker.postMessage({ kind: "collect", id, topic, arg });
+      collectLocal(topic, arg).then((data) => this.collected(id, 0, data));
+      const timer = setTimeout(() => this.finish(id), GATHER_TIMEOUT_MS);
+      Deno.unrefTimer(timer);
+    });
+  }
+
+  private collected(id: number, from: number, data: unknown) {
+    const pending = this.gathers.get(id);
+    if (pending?.waiting.delete(from)) {
+      pending.results.push(data);
+      if (pending.waiting.size === 0) this.finish(id);
+    }
+  }
+
+  private finish(id: number) {
+    const pending = this.gathers.get(id);
+    if (!pending) return;
+    this.gathers.delete(id);
+    pending.done(pending.results);
+  }
+}
+
+let primary: Primary | null = null;
+
+// Start the HTTP workers from this (the primary) thread. Returns a function that stops them.
+export function startCluster(options: ClusterOptions): () => void {
+  if (primary) throw new Error("Cluster already started");
+  role = "primary";
+  primary = new Primary(options);
+  primary.start();
+  return () => {
+    primary?.stop();
+    primary = null;
+    role = "single";
+  };
+}
@@ -0,0 +1,55 @@
+// Counting semaphore used to bound fan-out (LLM calls, subprocesses, ...)
+export class Semaphore {
+  private available: number;
+  private waiters: Array<() => void> = [];
+
+  constructor(readonly limit: number) {
+    this.available = Math.max(1, Math.floor(limit));
+  }
+
+  async acquire(): Promise<() => void> {
+    if (this.available > 0) {
+      this.available--;
+    } else {
+      await new Promise<void>((resolve) => this.waiters.push(resolve));
+    }
+    let released = false;
+    return () => {
+      if (released) return;
+      released = true;
+      const next = this.waiters.shift();
+      if (next) next();
+      else this.available++;
+    };
+  }
+
+  async run<T>(fn: () => Promise<T>): Promise<T> {
+    const release = await this.acquire();
+    try {
+      return await fn();
+    } finally {
+      release();
+    }
+  }
+
+  get pending(): number {
+    return this.waiters.length;
+  }
+}
+
+// Like Promise.all(items.map(fn)) but with at most `limit` calls in flight
+export async function mapWithConcurrency<T, R>(
+  items: readonly T[],
+  limit: number,
+  fn: (item: T, index: number) => Promise<R>,
+): Promise<R[]> {
+  const semaphore = new Semaphore(limit);
+  return await Promise.all(items.map((item, index) => semaphore.run(() => fn(item, index))));
+}
+
+// Positive integer from an env var, falling back to `fallback`
+export function envLimit(name: string, fallback: number): number {
+  const raw = Deno.env.get(name);
+  const parsed = raw ? parseInt(raw) : NaN;
+  return Number.isFinite(parsed) && parsed > 0 ? parsed : fallback;
+}
@@ -0,0 +1,29 @@
+// reflink: copy-on-write clone where the filesystem supports it, plain copy otherwise
+// hardlink: fastest, but writes through either path are visible in both
+// copy: always a full copy
+export type LinkMode = "reflink" | "hardlink" | "copy";
+
+// Recursive copy of `src` to `dst` (which must not exist yet); uses `cp` where
+// available and falls back to Deno APIs
+export async function copyTree(src: string, dst: string, mode: LinkMode = "reflink"): Promise<void> {
+  if (Deno.build.os !== "windows") {
+    const flags = mode === "hardlink" ? ["-al"] : mode === "reflink" ? ["-a", "--reflink=auto"] : ["-a"];
+    try {
+      const res = await new Deno.Command("cp", { args: [...flags, src, dst], stdout: "null", stderr: "null" }).output();
+      if (res.success) return;
+    } catch { /* fall through to the portable copy */ }
+    await Deno.remove(dst, { recursive: true }).catch(() => {});
+  }
+  await copyTreePortable(src, dst);
+}
+
+async function copyTreePortable(src: string, dst: string): Promise<void> {
+  await Deno.mkdir(dst, { recursive: true });
+  for await (const entry of Deno.readDir(src)) {
+    const from = `${src}/${entry.name}`;
+    const to = `${dst}/${entry.name}`;
+    if (entry.isSymlink) await Deno.symlink(await Deno.readLink(from), to);
+    else if (entry.isDirectory) await copyTreePortable(from, to);
+    else await Deno.copyFile(from, to);
+  }
+}
@@ -0,0 +1,39 @@
+import { runStreaming } from "./subprocess.ts";
+
+// git for the repo cache, the repo indexer and workdir snapshots. Commands go through
+// runStreaming, so `signal` kills git's whole process group (git-remote-https included),
+// and their output is kept whole rather than cut to a head and tail. Paths in the output
+// are never octal-quoted (core.quotepath=off).
+
+export interface GitOptions {
+  cwd?: string;
+  env?: Record<string, string>;
+  signal?: AbortSignal;
+}
+
+export interface GitResult {
+  success: boolean;
+  code: number;
+  stdout: string;
+  stderr: string;
+  killed: boolean; // stopped because `signal` aborted
+}
+
+export async function git(args: string[], options: GitOptions = {}): Promise<GitResult> {
+  const { success, code, stdout, stderr, killed } = await runStreaming("git", {
+    ...options,
+    args: ["-c", "core.quotepath=off", ...args],
+    maxBufferChars: Number.MAX_SAFE_INTEGER,
+  });
+  return { success, code, stdout, stderr, killed };
+}
+
+// stdout of a git command, or null when it fails or git is not installed
+export async function gitOutput(args: string[], cwd: string): Promise<string | null> {
+  try {
+    const result = await git(args, { cwd });
+    return result.success ? result.stdout : null;
+  } catch {
+    return null;
+  }
+}
@@ -0,0 +1,35 @@
+import type { Context } from "https://deno.land/x/oak@v12.6.1/mod.ts";
+
+// Conditional GET for polled endpoints. The ETag is built from something cheaper than the
+// response itself (a table change counter, a catalog version), so a handler can answer
+// `304 Not Modified` before it queries or serializes anything.
+
+// Suffix the compression middleware adds to the ETag of an encoded representation
+const ENCODING_SUFFIX = /-(?:br|gzip)$/;
+
+export function etag(...parts: Array<string | number>): string {
+  return `"${parts.join(".").replace(/[^\x21\x23-\x7e]/g, "_")}"`;
+}
+
+// True when If-None-Match names `tag` (weak comparison, any content-coding)
+export function ifNoneMatch(header: string | null, tag: string): boolean {
+  if (!header) return false;
+  const wanted = tag.slice(1, -1);
+  return header.split(",").some((candidate) => {
+    const value = candidate.trim();
+    if (value === "*") return true;
+    const opaque = value.replace(/^W\//, "").replace(/^"|"$/g, "");
+    return opaque.replace(ENCODING_SUFFIX, "") === wanted;
+  });
+}
+
+// Set the validator for this response; answers 304 and returns true when the client's copy is current
+export function notModified(ctx: Context, ...parts: Array<string | number>): boolean {
+  const tag = etag(...parts);
+  ctx.response.headers.set("ETag", tag);
+  // Caches may keep the response but must revalidate it on every use
+  ctx.response.headers.set("Cache-Control", "no-cache");
+  if (!ifNoneMatch(ctx.request.headers.get("If-None-Match"), tag)) return false;
+  ctx.response.status = 304;
+  return true;
+}
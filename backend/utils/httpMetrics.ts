@@ -0,0 +1,71 @@
+import type { Middleware } from "https://deno.land/x/oak@v12.6.1/mod.ts";
+import { metrics } from "./metrics.ts";
+
+// Request metrics by route pattern (set by RouteTable on ctx.state.route), so /api/repo-test/runs/7
+// and /runs/8 share one series. Durations end when the response head is ready; streamed bodies
+// are tracked separately as open Server-Sent Event streams.
+
+const requestDuration = metrics.histogram(
+  "http_request_duration_seconds",
+  "Time until the response is ready to send, by route pattern",
+  ["method", "route", "status"],
+);
+const sseStreams = metrics.gauge("sse_streams_active", "Server-Sent Event streams currently open", ["route"]);
+
+// Pass `body` through, keeping `gauge` raised until it ends or the client goes away
+function trackStream(body: ReadableStream<Uint8Array>, gauge: { inc(): void; dec(): void }): ReadableStream<Uint8Array> {
+  const reader = body.getReader();
+  let open = true;
+  const close = () => {
+    if (open) {
+      open = false;
+      gauge.dec();
+    }
+  };
+  gauge.inc();
+  return new ReadableStream<Uint8Array>({
+    async pull(controller) {
+      try {
+        const { done, value } = await reader.read();
+        if (done) {
+          close();
+          controller.close();
+        } else {
+          controller.enqueue(value);
+        }
+      } catch (error) {
+        close();
+        controller.error(error);
+      }
+    },
+    cancel(reason) {
+      close();
+      return reader.cancel(reason);
+    },
+  });
+}
+
+// Open SSE streams on this thread by route
+export function openStreams(): Record<string, number> {
+  return Object.fromEntries(sseStreams.snapshot().series.map((series) => [series.values[0], series.value ?? 0]));
+}
+
+export function httpMetrics(): Middleware {
+  return async (ctx, next) => {
+    const start = performance.now();
+    let status: number | undefined;
+    try {
+      await next();
+    } catch (error) {
+      status = 500;
+      throw error;
+    } finally {
+      const route = (ctx.state as { route?: string }).route ?? "unmatched";
+      requestDuration.labels(ctx.request.method, route, String(status ?? ctx.response.status)).observeSince(start);
+      const body = ctx.response.body;
+      if (status === undefined && body instanceof ReadableStream && ctx.response.headers.get("Content-Type")?.startsWith("text/event-stream")) {
+        ctx.response.body = trackStream(body, sseStreams.labels(route));
+      }
+    }
+  };
+}
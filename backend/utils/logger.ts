@@ -0,0 +1,288 @@
+// Structured logger that formats on the calling path but writes in the background.
+//
+// Records are rendered to one line each (JSON, or key=value text with LOG_FORMAT=text), buffered,
+// and written in batches to stdout or to a size-rotated file (LOG_FILE, LOG_FILE_MAX_BYTES,
+// LOG_FILE_KEEP). Field values are capped at LOG_MAX_FIELD_CHARS so a model response or a
+// stack trace cannot turn one record into megabytes. Warnings and errors with the same message
+// are rate limited per window, with a count of what was dropped. Debug records, which carry
+// request lines and payload summaries, are off unless LOG_LEVEL=debug.
+
+export type LogLevel = "debug" | "info" | "warn" | "error";
+export type LogFields = Record<string, unknown>;
+
+export interface LogOptions {
+  // Keep this fraction of the calls, e.g. 0.01 for a per-request line under load
+  sample?: number;
+}
+
+const LEVELS: Record<LogLevel, number> = { debug: 10, info: 20, warn: 30, error: 40 };
+
+export interface LogSink {
+  write(text: string): Promise<void>;
+  writeSync(text: string): void;
+}
+
+const encoder = new TextEncoder();
+
+export class StdoutSink implements LogSink {
+  async write(text: string) {
+    const bytes = encoder.encode(text);
+    let written = 0;
+    while (written < bytes.length) written += await Deno.stdout.write(bytes.subarray(written));
+  }
+
+  writeSync(text: string) {
+    const bytes = encoder.encode(text);
+    let written = 0;
+    while (written < bytes.length) written += Deno.stdout.writeSync(bytes.subarray(written));
+  }
+}
+
+// Appends to `path`; past `maxBytes` the file becomes path.1, path.1 becomes path.2, and so on
+// up to `keep` old files
+export class RotatingFileSink implements LogSink {
+  private size: number | null = null;
+
+  constructor(readonly path: string, private readonly maxBytes: number, private readonly keep: number) {}
+
+  private async rotate() {
+    for (let i = this.keep - 1; i >= 1; i--) {
+      await Deno.rename(`${this.path}.${i}`, `${this.path}.${i + 1}`).catch(() => {});
+    }
+    if (this.keep > 0) await Deno.rename(this.path, `${this.path}.1`).catch(() => {});
+    else await Deno.remove(this.path).catch(() => {});
+    this.size = 0;
+  }
+
+  async write(text: string) {
+    const bytes = encoder.encode(text);
+    this.size ??= await Deno.stat(this.path).then((s) => s.size, () => 0);
+    if (this.size > 0 && this.size + bytes.length > this.maxBytes) await this.rotate();
+    await Deno.writeFile(this.path, bytes, { append: true });
+    this.size += bytes.length;
+  }
+
+  writeSync(text: string) {
+    const bytes = encoder.encode(text);
+    Deno.writeFileSync(this.path, bytes, { append: true });
+    if (this.size !== null) this.size += bytes.length;
+  }
+}
+
+export interface LoggerConfig {
+  sink: LogSink;
+  level?: LogLevel;
+  format?: "json" | "text";
+  maxFieldChars?: number;
+  rateLimit?: { perWindow: number; windowMs: number };
+  maxBufferedBytes?: number;
+  flushIntervalMs?: number;
+}
+
+interface Shared {
+  sink: LogSink;
+  threshold: number;
+  format: "json" | "text";
+  maxFieldChars: number;
+  rateLimit: { perWindow: number; windowMs: number };
+  maxBufferedBytes: number;
+  flushIntervalMs: number;
+  buffer: string[];
+  bufferedBytes: number;
+  dropped: number;
+  timer: number | undefined;
+  writing: Promise<void>;
+  windows: Map<string, { start: number; count: number; suppressed: number }>;
+}
+
+function cap(text: string, max: number): string {
+  return text.length > max ? `${text.slice(0, max)}…[+${text.length - max} chars]` : text;
+}
+
+export class Logger {
+  private constructor(private readonly shared: Shared, private readonly context: LogFields) {}
+
+  static create(config: LoggerConfig): Logger {
+    return new Logger({
+      sink: config.sink,
+      threshold: LEVELS[config.level ?? "info"],
+      format: config.format ?? "json",
+      maxFieldChars: config.maxFieldChars ?? 2000,
+      rateLimit: config.rateLimit ?? { perWindow: 10, windowMs: 10_000 },
+      maxBufferedBytes: config.maxBufferedBytes ?? 4 * 1024 * 1024,
+      flushIntervalMs: config.flushIntervalMs ?? 100,
+      buffer: [],
+      bufferedBytes: 0,
+      dropped: 0,
+      timer: undefined,
+      writing: Promise.resolve(),
+      windows: new Map(),
+    }, {});
+  }
+
+  static fromEnv(): Logger {
+    const env = (name: string) => Deno.env.get(name);
+    const int = (name: string, fallback: number) => {
+      const parsed = parseInt(env(name) ?? "");
+      return Number.isFinite(parsed) && parsed >= 0 ? parsed : fallback;
+    };
+    const level = env("LOG_LEVEL")?.toLowerCase();
+    const file = env("LOG_FILE");
+    return Logger.create({
+      sink: file ? new RotatingFileSink(file, int("LOG_FILE_MAX_BYTES", 10 * 1024 * 1024), int("LOG_FILE_KEEP", 3)) : new StdoutSink(),
+      level: level && level in LEVELS ? level as LogLevel : "info",
+      format: env("LOG_FORMAT") === "text" ? "text" : "json",
+      maxFieldChars: int("LOG_MAX_FIELD_CHARS", 2000),
+    });
+  }
+
+  // A logger that adds `context` to every record
+  child(context: LogFields): Logger {
+    return new Logger(this.shared, { ...this.context, ...context });
+  }
+
+  // Check before building expensive fields
+  enabled(level: LogLevel): boolean {
+    return LEVELS[level] >= this.shared.threshold;
+  }
+
+  debug(msg: string, fields?: LogFields, options?: LogOptions) {
+    this.log("debug", msg, fields, options);
+  }
+
+  info(msg: string, fields?: LogFields, options?: LogOptions) {
+    this.log("info", msg, fields, options);
+  }
+
+  warn(msg: string, fields?: LogFields, options?: LogOptions) {
+    this.log("warn", msg, fields, options);
+  }
+
+  error(msg: string, fields?: LogFields, options?: LogOptions) {
+    this.log("error", msg, fields, options);
+  }
+
+  log(level: LogLevel, msg: string, fields?: LogFields, options?: LogOptions) {
+    if (LEVELS[level] < this.shared.threshold) return;
+    if (options?.sample !== undefined && Math.random() >= options.sample) return;
+    let suppressed = 0;
+    if (LEVELS[level] >= LEVELS.warn) {
+      const allowed = this.admit(msg);
+      if (allowed === false) return;
+      suppressed = allowed;
+    }
+    const record: LogFields = { time: new Date().toISOString(), level, msg, ...this.context, ...fields };
+    if (suppressed > 0) record.suppressed = suppressed;
+    this.enqueue(this.render(record));
+    if (level === "error") this.scheduleFlush(0);
+  }
+
+  // Rate limit by message: false to drop, otherwise how many were dropped since the last one let through
+  private admit(msg: string): number | false {
+    const { windows, rateLimit } = this.shared;
+    const now = Date.now();
+    const window = windows.get(msg);
+    if (!window || now - window.start >= rateLimit.windowMs) {
+      const suppressed = window?.suppressed ?? 0;
+      if (!window && windows.size >= 1000) windows.clear();
+      windows.set(msg, { start: now, count: 1, suppressed: 0 });
+      return suppressed;
+    }
+    if (window.count >= rateLimit.perWindow) {
+      window.suppressed++;
+      return false;
+    }
+    window.count++;
+    return 0;
+  }
+
+  private value(value: unknown): unknown {
+    const max = this.shared.maxFieldChars;
+    if (typeof value === "string") return cap(value, max);
+    if (value instanceof Error) {
+      return { name: value.name, message: cap(value.message, max), stack: value.stack ? cap(value.stack, max) : undefined };
+    }
+    if (value !== null && typeof value === "object") {
+      let json: string;
+      try {
+        json = JSON.stringify(value);
+      } catch {
+        return "[unserializable]";
+      }
+      return json.length > max ? cap(json, max) : value;
+    }
+    return value;
+  }
+
+  private render(record: LogFields): string {
+    const entries = Object.entries(record).map(([key, value]) => [key, this.value(value)] as const);
+    if (this.shared.format === "json") return JSON.stringify(Object.fromEntries(entries)) + "\n";
+    const [[, time], [, level], [, msg], ...rest] = entries;
+    const fields = rest
+      .filter(([, value]) => value !== undefined)
+      .map(([key, value]) => `${key}=${typeof value === "string" && !/[\s"=]/.test(value) ? value : JSON.stringify(value)}`);
+    return `${time} ${String(level).toUpperCase().padEnd(5)} ${msg}${fields.length ? " " + fields.join(" ") : ""}\n`;
+  }
+
+  private enqueue(line: string) {
+    const shared = this.shared;
+    // Under a write stall, shed the oldest records rather than grow without bound
+    while (shared.bufferedBytes + line.length > shared.maxBufferedBytes && shared.buffer.length > 0) {
+      shared.bufferedBytes -= shared.buffer.shift()!.length;
+      shared.dropped++;
+    }
+    shared.buffer.push(line);
+    shared.bufferedBytes += line.length;
+    this.scheduleFlush(shared.flushIntervalMs);
+  }
+
+  private scheduleFlush(delayMs: number) {
+    const shared = this.shared;
+    if (shared.timer !== undefined) {
+      if (delayMs > 0) return;
+      clearTimeout(shared.timer);
+    }
+    shared.timer = setTimeout(() => this.flush(), delayMs);
+    Deno.unrefTimer(shared.timer);
+  }
+
+  private take(): string {
+    const shared = this.shared;
+    if (shared.timer !== undefined) {
+      clearTimeout(shared.timer);
+      shared.timer = undefined;
+    }
+    let text = shared.buffer.join("");
+    if (shared.dropped > 0) {
+      text += this.render({ time: new Date().toISOString(), level: "warn", msg: "Log buffer full, records dropped", dropped: shared.dropped });
+      shared.dropped = 0;
+    }
+    shared.buffer = [];
+    shared.bufferedBytes = 0;
+    return text;
+  }
+
+  // Write out everything buffered; writes are serialized and never throw
+  flush(): Promise<void> {
+    const text = this.take();
+    if (!text) return this.shared.writing;
+    const sink = this.shared.sink;
+    this.shared.writing = this.shared.writing
+      .then(() => sink.write(text))
+      .catch((error) => console.error("Log write failed:", error));
+    return this.shared.writing;
+  }
+
+  // For process exit, when nothing async will run again
+  flushSync() {
+    const text = this.take();
+    if (!text) return;
+    try {
+      this.shared.sink.writeSync(text);
+    } catch { /* nowhere left to report it */ }
+  }
+}
+
+export const logger = Logger.fromEnv();
+
+globalThis.addEventListener("unload", () => logger.flushSync());
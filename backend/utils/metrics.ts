@@ -0,0 +1,314 @@
+// Counters, gauges and histograms rendered in the Prometheus text format (version 0.0.4).
+//
+// Recording is synchronous and allocation-free once a label set has been seen: `labels()`
+// returns a child that hot paths can keep (one per stream, model or statement) and whose
+// `inc`/`observe` only touch numbers. JavaScript runs one callback at a time, so no locking
+// is needed. Label sets should stay bounded: route patterns rather than URLs, model ids,
+// statement shapes rather than SQL with values in it.
+
+import { onCollect } from "./cluster.ts";
+
+export type MetricType = "counter" | "gauge" | "histogram";
+
+// A metric's current values as plain data, for combining registries from several threads
+export interface MetricSnapshot {
+  name: string;
+  help: string;
+  type: MetricType;
+  labelNames: readonly string[];
+  buckets?: readonly number[];
+  series: Array<{ values: string[]; value?: number; counts?: number[]; sum?: number; count?: number }>;
+}
+
+// Seconds, from 5ms to 2 minutes; suits HTTP handlers, upstream calls and subprocesses
+export const DEFAULT_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120];
+
+function escapeLabel(value: string): string {
+  return value.replace(/\\/g, "\\\\").replace(/\n/g, "\\n").replace(/"/g, '\\"');
+}
+
+function formatValue(value: number): string {
+  if (Number.isNaN(value)) return "NaN";
+  if (value === Infinity) return "+Inf";
+  if (value === -Infinity) return "-Inf";
+  return String(value);
+}
+
+abstract class Metric<Child> {
+  private readonly children = new Map<string, { values: string[]; child: Child }>();
+
+  constructor(
+    readonly name: string,
+    readonly help: string,
+    readonly labelNames: readonly string[],
+  ) {}
+
+  abstract readonly type: MetricType;
+  protected abstract create(): Child;
+  protected abstract sample(values: string[], child: Child): string[];
+  protected abstract read(child: Child): Omit<MetricSnapshot["series"][number], "values">;
+  abstract add(child: Child, series: MetricSnapshot["series"][number]): void;
+
+  // The series for these label values, created on first use
+  labels(...values: string[]): Child {
+    if (values.length !== this.labelNames.length) {
+      throw new Error(`${this.name} expects labels ${this.labelNames.join(", ") || "(none)"}`);
+    }
+    const key = values.length === 1 ? values[0] : values.join("\u0000");
+    let entry = this.children.get(key);
+    if (!entry) this.children.set(key, entry = { values, child: this.create() });
+    return entry.child;
+  }
+
+  protected labelString(values: string[], extra?: string): string {
+    const pairs = this.labelNames.map((name, i) => `${name}="${escapeLabel(values[i])}"`);
+    if (extra) pairs.push(extra);
+    return pairs.length > 0 ? `{${pairs.join(",")}}` : "";
+  }
+
+  render(): string {
+    const lines = [`# HELP ${this.name} ${this.help}`, `# TYPE ${this.name} ${this.type}`];
+    for (const { values, child } of this.children.values()) {
+      lines.push(...this.sample(values, child));
+    }
+    return lines.join("\n");
+  }
+
+  snapshot(): MetricSnapshot {
+    const series = [...this.children.values()].map(({ values, child }) => ({ values, ...this.read(child) }));
+    return { name: this.name, help: this.help, type: this.type, labelNames: this.labelNames, series };
+  }
+
+  reset() {
+    this.children.clear();
+  }
+}
+
+export class CounterChild {
+  value = 0;
+
+  inc(amount = 1) {
+    this.value += amount;
+  }
+}
+
+export class Counter extends Metric<CounterChild> {
+  readonly type = "counter";
+
+  protected create() {
+    return new CounterChild();
+  }
+
+  protected sample(values: string[], child: CounterChild) {
+    return [`${this.name}${this.labelString(values)} ${formatValue(child.value)}`];
+  }
+
+  protected read(child: CounterChild) {
+    return { value: child.value };
+  }
+
+  add(child: CounterChild, series: MetricSnapshot["series"][number]) {
+    child.value += series.value ?? 0;
+  }
+
+  inc(amount = 1) {
+    this.labels().inc(amount);
+  }
+}
+
+export class GaugeChild {
+  value = 0;
+
+  set(value: number) {
+    this.value = value;
+  }
+
+  inc(amount = 1) {
+    this.value += amount;
+  }
+
+  dec(amount = 1) {
+    this.value -= amount;
+  }
+}
+
+export class Gauge extends Metric<GaugeChild> {
+  readonly type = "gauge";
+
+  protected create() {
+    return new GaugeChild();
+  }
+
+  protected sample(values: string[], child: GaugeChild) {
+    return [`${this.name}${this.labelString(values)} ${formatValue(child.value)}`];
+  }
+
+  protected read(child: GaugeChild) {
+    return { value: child.value };
+  }
+
+  // Gauges add up across threads: open streams, queue depths
+  add(child: GaugeChild, series: MetricSnapshot["series"][number]) {
+    child.value += series.value ?? 0;
+  }
+
+  set(value: number) {
+    this.labels().set(value);
+  }
+
+  inc(amount = 1) {
+    this.labels().inc(amount);
+  }
+
+  dec(amount = 1) {
+    this.labels().dec(amount);
+  }
+}
+
+export class HistogramChild {
+  // counts[i] is the number of observations in (buckets[i-1], buckets[i]]; the last slot is +Inf
+  readonly counts: Float64Array;
+  sum = 0;
+  count = 0;
+
+  constructor(private readonly buckets: readonly number[]) {
+    this.counts = new Float64Array(buckets.length + 1);
+  }
+
+  observe(value: number) {
+    let i = 0;
+    while (i < this.buckets.length && value > this.buckets[i]) i++;
+    this.counts[i]++;
+    this.sum += value;
+    this.count++;
+  }
+
+  // Observe the seconds elapsed since `start`, a performance.now() timestamp
+  observeSince(start: number) {
+    this.observe((performance.now() - start) / 1000);
+  }
+}
+
+export class Histogram extends Metric<HistogramChild> {
+  readonly type = "histogram";
+
+  constructor(name: string, help: string, labelNames: readonly string[], readonly buckets: readonly number[] = DEFAULT_BUCKETS) {
+    super(name, help, labelNames);
+  }
+
+  protected create() {
+    return new HistogramChild(this.buckets);
+  }
+
+  protected sample(values: string[], child: HistogramChild): string[] {
+    const lines: string[] = [];
+    let cumulative = 0;
+    this.buckets.forEach((bound, i) => {
+      cumulative += child.counts[i];
+      lines.push(`${this.name}_bucket${this.labelString(values, `le="${formatValue(bound)}"`)} ${cumulative}`);
+    });
+    lines.push(`${this.name}_bucket${this.labelString(values, 'le="+Inf"')} ${child.count}`);
+    lines.push(`${this.name}_sum${this.labelString(values)} ${formatValue(child.sum)}`);
+    lines.push(`${this.name}_count${this.labelString(values)} ${child.count}`);
+    return lines;
+  }
+
+  protected read(child: HistogramChild) {
+    return { counts: Array.from(child.counts), sum: child.sum, count: child.count };
+  }
+
+  add(child: HistogramChild, series: MetricSnapshot["series"][number]) {
+    series.counts?.forEach((count, i) => child.counts[i] += count);
+    child.sum += series.sum ?? 0;
+    child.count += series.count ?? 0;
+  }
+
+  override snapshot(): MetricSnapshot {
+    return { ...super.snapshot(), buckets: this.buckets };
+  }
+
+  observe(value: number) {
+    this.labels().observe(value);
+  }
+}
+
+export class Registry {
+  private readonly metrics = new Map<string, Metric<unknown>>();
+
+  private register<M extends Metric<unknown>>(metric: M): M {
+    if (this.metrics.has(metric.name)) throw new Error(`Metric already registered: ${metric.name}`);
+    this.metrics.set(metric.name, metric);
+    return metric;
+  }
+
+  counter(name: string, help: string, labelNames: readonly string[] = []): Counter {
+    return this.register(new Counter(name, help, labelNames));
+  }
+
+  gauge(name: string, help: string, labelNames: readonly string[] = []): Gauge {
+    return this.register(new Gauge(name, help, labelNames));
+  }
+
+  histogram(name: string, help: string, labelNames: readonly string[] = [], buckets?: readonly number[]): Histogram {
+    return this.register(new Histogram(name, help, labelNames, buckets));
+  }
+
+  render(): string {
+    return [...this.metrics.values()].map((metric) => metric.render()).join("\n") + "\n";
+  }
+
+  snapshot(): MetricSnapshot[] {
+    return [...this.metrics.values()].map((metric) => metric.snapshot());
+  }
+
+  // Sum snapshots taken on several threads into one exposition, series by series
+  static renderMerged(snapshots: MetricSnapshot[][]): string {
+    const merged = new Registry();
+    for (const family of snapshots.flat()) {
+      let metric = merged.metrics.get(family.name);
+      if (!metric) {
+        const { name, help, labelNames } = family;
+        metric = family.type === "counter"
+          ? merged.counter(name, help, labelNames)
+          : family.type === "gauge"
+          ? merged.gauge(name, help, labelNames)
+          : merged.histogram(name, help, labelNames, family.buckets);
+      }
+      if (metric.type !== family.type) continue;
+      for (const series of family.series) metric.add(metric.labels(...series.values), series);
+    }
+    return merged.render();
+  }
+}
+
+// This thread's registry; /metrics merges the ones from every cluster thread
+export const metrics = new Registry();
+
+onCollect("metrics", () => metrics.snapshot());
+
+export const PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8";
+
+const eventLoopLag = metrics.histogram(
+  "event_loop_lag_seconds",
+  "Delay of a periodic timer past its due time",
+  [],
+  [0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5],
+);
+let eventLoopTimer: number | undefined;
+
+// Sample event-loop lag every `intervalMs`; the timer does not keep the process alive
+export function monitorEventLoop(intervalMs = 500): () => void {
+  if (eventLoopTimer === undefined) {
+    let due = performance.now() + intervalMs;
+    eventLoopTimer = setInterval(() => {
+      const now = performance.now();
+      eventLoopLag.observe(Math.max(0, now - due) / 1000);
+      due = now + intervalMs;
+    }, intervalMs);
+    Deno.unrefTimer(eventLoopTimer);
+  }
+  return () => {
+    clearInterval(eventLoopTimer);
+    eventLoopTimer = undefined;
+  };
+}
@@ -0,0 +1,70 @@
+import type { Middleware } from "https://deno.land/x/oak@v12.6.1/mod.ts";
+import { brotli, gzip } from "./compression.ts";
+import { envLimit } from "./concurrency.ts";
+
+// Compresses buffered responses (JSON objects, strings, byte arrays) for clients that accept
+// it. Streams, including Server-Sent Events, pass through untouched: compressing them would
+// buffer events. Small bodies are not worth the CPU or the extra header bytes.
+
+export type ContentCoding = "br" | "gzip";
+
+// Ties go to the first entry
+const SUPPORTED: ContentCoding[] = ["br", "gzip"];
+
+// The preferred coding in an Accept-Encoding header, or null for identity
+export function negotiateEncoding(header: string | null): ContentCoding | null {
+  if (!header) return null;
+  const weights = new Map<string, number>();
+  for (const part of header.split(",")) {
+    const [name, ...params] = part.trim().toLowerCase().split(";");
+    if (!name) continue;
+    const q = params.map((p) => p.trim()).find((p) => p.startsWith("q="));
+    const weight = q ? parseFloat(q.slice(2)) : 1;
+    weights.set(name, Number.isFinite(weight) ? weight : 0);
+  }
+  let best: ContentCoding | null = null;
+  let bestWeight = 0;
+  for (const coding of SUPPORTED) {
+    const weight = weights.get(coding) ?? weights.get("*") ?? 0;
+    if (weight > bestWeight) {
+      best = coding;
+      bestWeight = weight;
+    }
+  }
+  return best;
+}
+
+const encoder = new TextEncoder();
+
+export function compressResponses(options: { threshold?: number } = {}): Middleware {
+  const threshold = options.threshold ?? envLimit("COMPRESSION_MIN_BYTES", 1024);
+  return async (ctx, next) => {
+    await next();
+    const response = ctx.response;
+    const { body, headers } = response;
+    if (ctx.request.method === "HEAD" || response.status === 204 || response.status === 304) return;
+    if (headers.has("Content-Encoding") || headers.get("Content-Type")?.startsWith("text/event-stream")) return;
+
+    let bytes: Uint8Array;
+    if (body instanceof Uint8Array) {
+      bytes = body;
+    } else if (typeof body === "string" && headers.has("Content-Type")) {
+      bytes = encoder.encode(body);
+    } else if (body !== null && typeof body === "object" && (Array.isArray(body) || Object.getPrototypeOf(body) === Object.prototype)) {
+      bytes = encoder.encode(JSON.stringify(body));
+      if (!headers.has("Content-Type")) headers.set("Content-Type", "application/json; charset=UTF-8");
+    } else {
+      return;
+    }
+    if (bytes.length < threshold) return;
+
+    headers.append("Vary", "Accept-Encoding");
+    const coding = negotiateEncoding(ctx.request.headers.get("Accept-Encoding"));
+    if (!coding) return;
+    response.body = coding === "br" ? await brotli(bytes) : await gzip(bytes);
+    headers.set("Content-Encoding", coding);
+    // A strong validator names one representation, so each encoding gets its own
+    const tag = headers.get("ETag");
+    if (tag?.endsWith('"')) headers.set("ETag", `${tag.slice(0, -1)}-${coding}"`);
+  };
+}
@@ -0,0 +1,255 @@
+import type { Context, Middleware } from "https://deno.land/x/oak@v12.6.1/mod.ts";
+import { logger } from "./logger.ts";
+
+// Segment trie router with the same surface as oak's Router (`get`/`post`/..., `routes()`,
+// `allowedMethods()`). Routes from every module are merged into one table at startup, so a
+// request costs one walk down the trie instead of a regex test per registered route.
+// Static segments win over `:params`; params are URI-decoded and typed from the path.
+// A route can declare a body schema, checked before its handler runs.
+
+type ParamNames<Path extends string> = Path extends `${string}:${infer Param}/${infer Rest}`
+  ? Param | ParamNames<`/${Rest}`>
+  : Path extends `${string}:${infer Param}` ? Param
+  : never;
+
+export type RouteParams<Path extends string> = { [K in ParamNames<Path>]: string };
+
+type FieldType = "string" | "number" | "integer" | "boolean" | "array" | "object";
+export type BodySchema = Record<string, FieldType | `${FieldType}?`>;
+
+interface FieldTypes {
+  string: string;
+  number: number;
+  integer: number;
+  boolean: boolean;
+  array: unknown[];
+  object: Record<string, unknown>;
+}
+
+type RequiredKeys<S extends BodySchema> = { [K in keyof S]: S[K] extends `${string}?` ? never : K }[keyof S];
+type OptionalKeys<S extends BodySchema> = Exclude<keyof S, RequiredKeys<S>>;
+export type BodyOf<S extends BodySchema> =
+  & { [K in RequiredKeys<S>]: FieldTypes[S[K] & keyof FieldTypes] }
+  & { [K in OptionalKeys<S>]?: S[K] extends `${infer T}?` ? FieldTypes[T & keyof FieldTypes] : never };
+
+export type RouteContext<Params = Record<string, string>, Body = unknown> = Context & {
+  params: Params;
+  body: Body; // the validated JSON body; only set for routes with a body schema
+};
+
+export type RouteHandler<Params = Record<string, string>, Body = unknown> = (
+  ctx: RouteContext<Params, Body>,
+) => unknown;
+
+interface RouteDefinition {
+  method: string;
+  path: string;
+  paramNames: string[];
+  handler: RouteHandler<any, any>;
+  validate: ((body: unknown) => string | null) | null;
+}
+
+interface TrieNode {
+  statics: Map<string, TrieNode>;
+  param: TrieNode | null;
+  routes: Map<string, RouteDefinition>;
+}
+
+const newNode = (): TrieNode => ({ statics: new Map(), param: null, routes: new Map() });
+
+function segments(path: string): string[] {
+  return path.split("/").filter(Boolean);
+}
+
+const FIELD_CHECKS: Record<FieldType, (value: unknown) => boolean> = {
+  string: (v) => typeof v === "string",
+  number: (v) => typeof v === "number" && Number.isFinite(v),
+  integer: (v) => Number.isInteger(v),
+  boolean: (v) => typeof v === "boolean",
+  array: (v) => Array.isArray(v),
+  object: (v) => typeof v === "object" && v !== null && !Array.isArray(v),
+};
+
+// Turn a schema into a checker once, at registration, rather than interpreting it per request
+export function compileBodySchema(schema: BodySchema): (body: unknown) => string | null {
+  const fields = Object.entries(schema).map(([name, spec]) => {
+    const optional = spec.endsWith("?");
+    const type = (optional ? spec.slice(0, -1) : spec) as FieldType;
+    return { name, optional, type, check: FIELD_CHECKS[type] };
+  });
+  return (body) => {
+    if (!FIELD_CHECKS.object(body)) return "Request body must be a JSON object";
+    const record = body as Record<string, unknown>;
+    const missing = fields.filter((f) => !f.optional && (record[f.name] === undefined || record[f.name] === null || record[f.name] === ""));
+    if (missing.length > 0) return `Missing required fields: ${missing.map((f) => f.name).join(", ")}`;
+    for (const f of fields) {
+      const value = record[f.name];
+      if (value === undefined || value === null) continue;
+      if (!f.check(value)) return `${f.name} must be ${/^[aeiou]/.test(f.type) ? "an" : "a"} ${f.type}`;
+    }
+    return null;
+  };
+}
+
+export class RouteTable {
+  private readonly prefix: string;
+  private readonly definitions: RouteDefinition[] = [];
+  private root: TrieNode | null = null;
+
+  constructor(options: { prefix?: string } = {}) {
+    this.prefix = options.prefix ?? "";
+  }
+
+  // One table holding the routes of all `tables`
+  static merge(...tables: RouteTable[]): RouteTable {
+    const merged = new RouteTable();
+    for (const table of tables) merged.definitions.push(...table.definitions);
+    return merged;
+  }
+
+  get<P extends string>(path: P, handler: RouteHandler<RouteParams<P>>): this;
+  get<P extends string, S extends BodySchema>(path: P, options: { body: S }, handler: RouteHandler<RouteParams<P>, BodyOf<S>>): this;
+  get(path: string, ...rest: unknown[]): this {
+    return this.add("GET", path, rest);
+  }
+
+  post<P extends string>(path: P, handler: RouteHandler<RouteParams<P>>): this;
+  post<P extends string, S extends BodySchema>(path: P, options: { body: S }, handler: RouteHandler<RouteParams<P>, BodyOf<S>>): this;
+  post(path: string, ...rest: unknown[]): this {
+    return this.add("POST", path, rest);
+  }
+
+  put<P extends string>(path: P, handler: RouteHandler<RouteParams<P>>): this;
+  put<P extends string, S extends BodySchema>(path: P, options: { body: S }, handler: RouteHandler<RouteParams<P>, BodyOf<S>>): this;
+  put(path: string, ...rest: unknown[]): this {
+    return this.add("PUT", path, rest);
+  }
+
+  delete<P extends string>(path: P, handler: RouteHandler<RouteParams<P>>): this;
+  delete(path: string, ...rest: unknown[]): this {
+    return this.add("DELETE", path, rest);
+  }
+
+  private add(method: string, path: string, rest: unknown[]): this {
+    const [options, handler] = rest.length === 1
+      ? [{}, rest[0] as RouteHandler]
+      : [rest[0] as { body?: BodySchema }, rest[1] as RouteHandler];
+    const fullPath = `${this.prefix}${path}`;
+    this.definitions.push({
+      method,
+      path: fullPath,
+      paramNames: segments(fullPath).filter((s) => s.startsWith(":")).map((s) => s.slice(1)),
+      handler,
+      validate: options.body ? compileBodySchema(options.body) : null,
+    });
+    this.root = null;
+    return this;
+  }
+
+  // Build the trie now, so duplicate routes fail at startup; otherwise it is built on first use
+  compile(): this {
+    this.root = this.build();
+    return this;
+  }
+
+  private build(): TrieNode {
+    const root = newNode();
+    for (const def of this.definitions) {
+      let node = root;
+      for (const segment of segments(def.path)) {
+        if (segment.startsWith(":")) {
+          node = node.param ??= newNode();
+        } else {
+          let next = node.statics.get(segment);
+          if (!next) node.statics.set(segment, next = newNode());
+          node = next;
+        }
+      }
+      if (node.routes.has(def.method)) throw new Error(`Duplicate route: ${def.method} ${def.path}`);
+      node.routes.set(def.method, def);
+    }
+    return root;
+  }
+
+  // The trie node for `pathname` plus the raw param values on the way, or null
+  private match(pathname: string): { node: TrieNode; values: string[] } | null {
+    const root = this.root ??= this.build();
+    const parts = segments(pathname);
+    const values: string[] = [];
+    const walk = (node: TrieNode, i: number): TrieNode | null => {
+      if (i === parts.length) return node.routes.size > 0 ? node : null;
+      const next = node.statics.get(parts[i]);
+      if (next) {
+        const found = walk(next, i + 1);
+        if (found) return found;
+      }
+      if (node.param) {
+        values.push(parts[i]);
+        const found = walk(node.param, i + 1);
+        if (found) return found;
+        values.pop();
+      }
+      return null;
+    };
+    const node = walk(root, 0);
+    return node ? { node, values } : null;
+  }
+
+  routes(): Middleware {
+    return async (ctx, next) => {
+      const match = this.match(ctx.request.url.pathname);
+      const method = ctx.request.method;
+      const route = match?.node.routes.get(method) ?? (method === "HEAD" ? match?.node.routes.get("GET") : undefined);
+      if (!match || !route) return next();
+
+      // The pattern, not the URL, identifies the route in logs and metrics
+      (ctx.state as { route?: string }).route = route.path;
+      const routeCtx = ctx as RouteContext<Record<string, string>, unknown>;
+      const params: Record<string, string> = {};
+      route.paramNames.forEach((name, i) => {
+        try {
+          params[name] = decodeURIComponent(match.values[i]);
+        } catch {
+          params[name] = match.values[i];
+        }
+      });
+      routeCtx.params = params;
+
+      if (route.validate) {
+        let body: unknown;
+        try {
+          body = await ctx.request.body({ type: "json" }).value;
+        } catch {
+          ctx.response.status = 400;
+          ctx.response.body = { success: false, error: "Invalid JSON body" };
+          return;
+        }
+        const error = route.validate(body);
+        if (error) {
+          logger.warn("Rejected request body", { method: ctx.request.method, path: ctx.request.url.pathname, error });
+          ctx.response.status = 400;
+          ctx.response.body = { success: false, error };
+          return;
+        }
+        routeCtx.body = body;
+      }
+      await route.handler(routeCtx);
+    };
+  }
+
+  // 405 (or the Allow list for OPTIONS) when the path exists but the method does not
+  allowedMethods(): Middleware {
+    return async (ctx, next) => {
+      await next();
+      if (ctx.response.status !== 404 || ctx.response.body !== undefined) return;
+      const match = this.match(ctx.request.url.pathname);
+      const method = ctx.request.method;
+      if (!match || match.node.routes.has(method) || (method === "HEAD" && match.node.routes.has("GET"))) return;
+      const allowed = [...match.node.routes.keys()];
+      if (allowed.includes("GET")) allowed.push("HEAD");
+      allowed.push("OPTIONS");
+      ctx.response.headers.set("Allow", allowed.join(", "));
+      ctx.response.status = method === "OPTIONS" ? 200 : 405;
+    };
+  }
+}
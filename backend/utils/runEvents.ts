@@ -0,0 +1,404 @@
+// Per-run event logs, so a client whose stream drops can reattach and replay what it missed.
+//
+// Every streamed run (speed test, repo test) gets an id, sent as the X-Run-Id header, and every
+// event a sequence number, sent as the SSE `id:` line. The newest RUN_EVENT_BUFFER events of a
+// run stay in memory in a ring; runs created with `spill` (long repo runs) append older events
+// to RUN_EVENT_DIR/<id>.events instead of dropping them. Finished runs are kept for
+// RUN_EVENT_RETENTION_MS so a late reattach still gets the end of the run.
+//
+// A run executes once, on the server, whether or not anyone is reading (`start`). Any number
+// of SSE or WebSocket subscribers follow its log, each from its own position. Callers can opt
+// in to coalescing: a request whose parameters match a run that is still going, or finished
+// within RUN_COALESCE_WINDOW_MS, attaches to that run instead of starting another.
+//
+// Readers pull: `follow()` yields from where the reader is, falling back to the spill file when
+// it has fallen behind the ring, and waits for new events once it has caught up. A slow reader
+// therefore never holds events in memory on its own behalf. In cluster mode a run lives on the
+// worker that started it; the others reach it through `gather`, polling for new events.
+
+import { envLimit } from "./concurrency.ts";
+import { clusterRole, gather, onCollect, workerId } from "./cluster.ts";
+import { logger } from "./logger.ts";
+
+export interface RunEventFrame {
+  // 0 for notices that are not part of the run, such as a gap report
+  seq: number;
+  // The event, already serialized
+  json: string;
+  // SSE id to send instead of `seq`, for streams that span several logs (job attempts)
+  id?: string;
+}
+
+export interface RunEventBatch {
+  frames: RunEventFrame[];
+  // Events that are gone: evicted from the ring of a run that does not spill
+  dropped?: { from: number; to: number };
+}
+
+export interface RunEventLogOptions {
+  capacity?: number;
+  // Directory for events evicted from the ring; null to drop them
+  spillDir?: string | null;
+}
+
+const REPLAY_BATCH = 1000;
+const REMOTE_POLL_MS = 250;
+
+// JSON with sorted keys, so equal parameters give equal coalescing keys
+export function stableStringify(value: unknown): string {
+  if (Array.isArray(value)) return `[${value.map(stableStringify).join(",")}]`;
+  if (value !== null && typeof value === "object") {
+    const entries = Object.entries(value as Record<string, unknown>)
+      .filter(([, v]) => v !== undefined)
+      .sort(([a], [b]) => a < b ? -1 : a > b ? 1 : 0);
+    return `{${entries.map(([k, v]) => `${JSON.stringify(k)}:${stableStringify(v)}`).join(",")}}`;
+  }
+  return JSON.stringify(value) ?? "null";
+}
+
+function droppedNotice(dropped: { from: number; to: number }): RunEventFrame {
+  return { seq: 0, json: JSON.stringify({ type: "events_dropped", from: dropped.from, to: dropped.to }) };
+}
+
+export class RunEventLog {
+  readonly startedAt = Date.now();
+  finishedAt: number | null = null;
+  private readonly capacity: number;
+  private readonly ring: Array<string | undefined>;
+  private nextSeq = 1;
+  private readonly spillPath: string | null;
+  private spillQueue: string[] = [];
+  private spillWriting: Promise<void> = Promise.resolve();
+  private spillFailed = false;
+  private wake: { promise: Promise<void>; resolve: () => void } | null = null;
+  // Readers currently following the log
+  subscribers = 0;
+
+  constructor(readonly id: string, readonly kind: string, options: RunEventLogOptions = {}) {
+    this.capacity = Math.max(1, options.capacity ?? 5000);
+    this.ring = new Array(this.capacity);
+    this.spillPath = options.spillDir ? `${options.spillDir}/${id}.events` : null;
+  }
+
+  get finished(): boolean {
+    return this.finishedAt !== null;
+  }
+
+  get lastSeq(): number {
+    return this.nextSeq - 1;
+  }
+
+  private get firstInMemory(): number {
+    return Math.max(1, this.nextSeq - this.capacity);
+  }
+
+  // Record an event and wake followers; returns its sequence number
+  append(event: unknown): number {
+    if (this.finished) return 0;
+    const seq = this.nextSeq++;
+    const slot = seq % this.capacity;
+    const evicted = this.ring[slot];
+    if (evicted !== undefined && this.spillPath && !this.spillFailed) this.spill(seq - this.capacity, evicted);
+    this.ring[slot] = JSON.stringify(event);
+    this.notify();
+    return seq;
+  }
+
+  finish() {
+    if (this.finished) return;
+    this.finishedAt = Date.now();
+    this.notify();
+  }
+
+  private spill(seq: number, json: string) {
+    this.spillQueue.push(`${seq}\t${json}\n`);
+    if (this.spillQueue.length === 1) this.spillWriting = this.spillWriting.then(() => this.writeSpill());
+  }
+
+  private async writeSpill() {
+    const text = this.spillQueue.join("");
+    this.spillQueue = [];
+    if (!text || this.spillFailed) return;
+    try {
+      await Deno.mkdir(this.spillPath!.slice(0, this.spillPath!.lastIndexOf("/")), { recursive: true });
+      await Deno.writeTextFile(this.spillPath!, text, { append: true });
+    } catch (error) {
+      // Later replays report the missing range as dropped
+      this.spillFailed = true;
+      logger.warn("Failed to spill run events", { run: this.id, error });
+    }
+  }
+
+  // Up to `limit` events after `after`, from the spill file and then the ring
+  async replay(after: number, limit = REPLAY_BATCH): Promise<RunEventBatch> {
+    const frames: RunEventFrame[] = [];
+    let cursor = after;
+    let dropped: RunEventBatch["dropped"];
+
+    // The ring can move on while the file is read, so read again until caught up with it
+    while (frames.length < limit && cursor + 1 < this.firstInMemory && this.spillPath && !this.spillFailed) {
+      while (this.spillQueue.length > 0) await this.spillWriting;
+      const start = cursor;
+      const text = await Deno.readTextFile(this.spillPath).catch(() => "");
+      for (const line of text.split("\n")) {
+        if (frames.length >= limit) break;
+        const tab = line.indexOf("\t");
+        const seq = tab > 0 ? parseInt(line.slice(0, tab)) : 0;
+        if (seq > cursor) {
+          frames.push({ seq, json: line.slice(tab + 1) });
+          cursor = seq;
+        }
+      }
+      if (cursor === start) break;
+    }
+    if (frames.length < limit && cursor + 1 < this.firstInMemory) {
+      dropped = { from: cursor + 1, to: this.firstInMemory - 1 };
+      cursor = dropped.to;
+    }
+    for (let seq = cursor + 1; seq <= this.lastSeq && frames.length < limit; seq++) {
+      frames.push({ seq, json: this.ring[seq % this.capacity]! });
+    }
+    return { frames, dropped };
+  }
+
+  // Events after `after` as they arrive, ending when the run has finished and everything is sent
+  async *follow(after: number, signal?: AbortSignal): AsyncGenerator<RunEventFrame> {
+    let cursor = after;
+    this.subscribers++;
+    try {
+      while (!signal?.aborted) {
+        if (cursor < this.lastSeq) {
+          const { frames, dropped } = await this.replay(cursor);
+          if (dropped) {
+            yield droppedNotice(dropped);
+            cursor = dropped.to;
+          }
+          for (const frame of frames) {
+            yield frame;
+            cursor = frame.seq;
+          }
+          continue;
+        }
+        if (this.finished) return;
+        await this.changed(signal);
+      }
+    } finally {
+      this.subscribers--;
+    }
+  }
+
+  private changed(signal?: AbortSignal): Promise<void> {
+    if (!this.wake) {
+      let resolve!: () => void;
+      const promise = new Promise<void>((r) => resolve = r);
+      this.wake = { promise, resolve };
+    }
+    const wake = this.wake.promise;
+    if (!signal) return wake;
+    return new Promise((resolve) => {
+      const onAbort = () => resolve();
+      signal.addEventListener("abort", onAbort, { once: true });
+      wake.then(() => {
+        signal.removeEventListener("abort", onAbort);
+        resolve();
+      });
+    });
+  }
+
+  private notify() {
+    const wake = this.wake;
+    this.wake = null;
+    wake?.resolve();
+  }
+
+  async dispose() {
+    this.finish();
+    if (this.spillPath) await Deno.remove(this.spillPath).catch(() => {});
+  }
+}
+
+interface RemoteBatch extends RunEventBatch {
+  finished: boolean;
+}
+
+export interface RunSummary {
+  id: string;
+  kind: string;
+  startedAt: string;
+  finishedAt: string | null;
+  events: number;
+  subscribers: number;
+  worker: number;
+}
+
+export interface RunStartOptions {
+  spill?: boolean;
+  // The request's parameters; identical ones attach to a recent run instead of starting another
+  coalesce?: unknown;
+}
+
+export interface RunEventRegistryOptions {
+  capacity: number;
+  spillDir: string;
+  retentionMs: number;
+  coalesceWindowMs?: number;
+}
+
+export class RunEventRegistry {
+  private readonly logs = new Map<string, RunEventLog>();
+  private readonly coalescing = new Map<string, RunEventLog>();
+  private readonly starting = new Map<string, Promise<{ id: string; coalesced: boolean }>>();
+
+  constructor(private readonly options: RunEventRegistryOptions) {}
+
+  static fromEnv(): RunEventRegistry {
+    return new RunEventRegistry({
+      capacity: envLimit("RUN_EVENT_BUFFER", 5000),
+      spillDir: Deno.env.get("RUN_EVENT_DIR") || `${Deno.cwd()}/backend/tmp/run-events`,
+      retentionMs: envLimit("RUN_EVENT_RETENTION_MS", 10 * 60_000),
+      coalesceWindowMs: envLimit("RUN_COALESCE_WINDOW_MS", 10_000),
+    });
+  }
+
+  // Run `execute` in the background with a new log, finished when it settles. With
+  // `options.coalesce`, returns a matching recent run instead, from any worker.
+  async start(
+    kind: string,
+    execute: (run: RunEventLog) => Promise<unknown>,
+    options: RunStartOptions = {},
+  ): Promise<{ id: string; coalesced: boolean }> {
+    this.sweep();
+    if (options.coalesce === undefined) return { id: this.launch(kind, execute, options.spill, null).id, coalesced: false };
+
+    const key = `${kind}\u0000${stableStringify(options.coalesce)}`;
+    const local = this.coalescable(key);
+    if (local) return { id: local, coalesced: true };
+    const pending = this.starting.get(key);
+    if (pending) return { id: (await pending).id, coalesced: true };
+
+    const starting = (async () => {
+      if (clusterRole() !== "single") {
+        const ids = (await gather("run-coalesce", key)).filter(Boolean) as string[];
+        if (ids.length > 0) return { id: ids[0], coalesced: true };
+      }
+      return { id: this.launch(kind, execute, options.spill, key).id, coalesced: false };
+    })();
+    this.starting.set(key, starting);
+    try {
+      return await starting;
+    } finally {
+      this.starting.delete(key);
+    }
+  }
+
+  private launch(kind: string, execute: (run: RunEventLog) => Promise<unknown>, spill: boolean | undefined, key: string | null) {
+    const run = this.create(kind, { spill });
+    if (key) this.coalescing.set(key, run);
+    execute(run)
+      .catch((error) => {
+        logger.error("Run failed", { run: run.id, kind, error });
+        run.append({ type: "error", error: error instanceof Error ? error.message : "Unknown error" });
+      })
+      .finally(() => run.finish());
+    return run;
+  }
+
+  // The id of this thread's run for `key`, if it can still be joined
+  coalescable(key: string): string | null {
+    const run = this.coalescing.get(key);
+    if (!run) return null;
+    if (run.finishedAt === null || Date.now() - run.finishedAt < (this.options.coalesceWindowMs ?? 10_000)) return run.id;
+    this.coalescing.delete(key);
+    return null;
+  }
+
+  // This thread's runs, newest first
+  list(): RunSummary[] {
+    this.sweep();
+    return [...this.logs.values()].reverse().map((log) => ({
+      id: log.id,
+      kind: log.kind,
+      startedAt: new Date(log.startedAt).toISOString(),
+      finishedAt: log.finishedAt === null ? null : new Date(log.finishedAt).toISOString(),
+      events: log.lastSeq,
+      subscribers: log.subscribers,
+      worker: workerId(),
+    }));
+  }
+
+  // A log for a new run; `spill` keeps events the ring evicts on disk
+  create(kind: string, options: { spill?: boolean } = {}): RunEventLog {
+    this.sweep();
+    const log = new RunEventLog(crypto.randomUUID(), kind, {
+      capacity: this.options.capacity,
+      spillDir: options.spill ? this.options.spillDir : null,
+    });
+    this.logs.set(log.id, log);
+    return log;
+  }
+
+  get(id: string): RunEventLog | undefined {
+    return this.logs.get(id);
+  }
+
+  // Drop finished runs past retention
+  private sweep() {
+    const cutoff = Date.now() - this.options.retentionMs;
+    for (const [id, log] of this.logs) {
+      if (log.finishedAt !== null && log.finishedAt < cutoff) {
+        this.logs.delete(id);
+        log.dispose();
+      }
+    }
+    for (const key of this.coalescing.keys()) this.coalescable(key);
+  }
+
+  // Events of run `id` after `after`, or null when no thread knows the run
+  async open(id: string, after: number, signal?: AbortSignal): Promise<AsyncGenerator<RunEventFrame> | null> {
+    this.sweep();
+    const log = this.logs.get(id);
+    if (log) return log.follow(after, signal);
+    const first = await this.fetchRemote(id, after);
+    return first ? this.followRemote(id, after, first, signal) : null;
+  }
+
+  // Answer another worker's `fetchRemote`
+  async collect(request: { id: string; after: number }): Promise<RemoteBatch | null> {
+    const log = this.logs.get(request?.id);
+    if (!log) return null;
+    const finished = log.finished;
+    const batch = await log.replay(request.after);
+    const last = batch.frames.at(-1)?.seq ?? batch.dropped?.to ?? request.after;
+    return { ...batch, finished: finished && last >= log.lastSeq };
+  }
+
+  private async fetchRemote(id: string, after: number): Promise<RemoteBatch | null> {
+    const results = await gather("run-events", { id, after }) as Array<RemoteBatch | null>;
+    return results.find((result) => result) ?? null;
+  }
+
+  private async *followRemote(id: string, after: number, first: RemoteBatch, signal?: AbortSignal): AsyncGenerator<RunEventFrame> {
+    let batch: RemoteBatch | null = first;
+    let cursor = after;
+    while (batch) {
+      if (batch.dropped) {
+        yield droppedNotice(batch.dropped);
+        cursor = batch.dropped.to;
+      }
+      for (const frame of batch.frames) {
+        yield frame;
+        cursor = frame.seq;
+      }
+      if (batch.finished || signal?.aborted) return;
+      if (batch.frames.length === 0) await new Promise((resolve) => setTimeout(resolve, REMOTE_POLL_MS));
+      // Null when the run has expired or its worker went away
+      batch = await this.fetchRemote(id, cursor);
+    }
+  }
+}
+
+export const runEvents = RunEventRegistry.fromEnv();
+
+onCollect("run-events", (request: { id: string; after: number }) => runEvents.collect(request));
+onCollect("run-coalesce", (key: string) => runEvents.coalescable(key));
+onCollect("runs", () => runEvents.list());
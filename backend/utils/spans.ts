@@ -0,0 +1,63 @@
+// Monotonic timing spans, laid out as a waterfall relative to a common origin.
+// Timestamps come from performance.now(), so wall-clock adjustments cannot skew them.
+
+export interface Span {
+  name: string;
+  parent: string | null;
+  iteration: number | null;
+  start_ms: number; // offset from the recorder's origin
+  duration_ms: number;
+}
+
+export interface SpanOptions {
+  parent?: string;
+  iteration?: number;
+}
+
+function round(ms: number): number {
+  return Math.round(ms * 10) / 10;
+}
+
+export class SpanRecorder {
+  readonly spans: Span[] = [];
+
+  constructor(
+    private onSpan?: (span: Span) => void,
+    readonly origin = performance.now(),
+  ) {}
+
+  // `start` is a performance.now() timestamp
+  record(name: string, start: number, durationMs: number, options: SpanOptions = {}): Span {
+    const span: Span = {
+      name,
+      parent: options.parent ?? null,
+      iteration: options.iteration ?? null,
+      start_ms: round(start - this.origin),
+      duration_ms: round(durationMs),
+    };
+    this.spans.push(span);
+    try {
+      this.onSpan?.(span);
+    } catch { /* listeners must not break the run */ }
+    return span;
+  }
+
+  // Time `fn`, recording the span whether it resolves or throws
+  async time<T>(name: string, fn: () => Promise<T>, options?: SpanOptions): Promise<T> {
+    const start = performance.now();
+    try {
+      return await fn();
+    } finally {
+      this.record(name, start, performance.now() - start, options);
+    }
+  }
+
+  // Copy spans recorded elsewhere against the same origin (e.g. a shared preparation phase)
+  adopt(spans: Span[]) {
+    this.spans.push(...spans);
+  }
+
+  total(name: string): number {
+    return round(this.spans.filter((s) => s.name === name).reduce((sum, s) => sum + s.duration_ms, 0));
+  }
+}
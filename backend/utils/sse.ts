@@ -0,0 +1,148 @@
+import type { Context } from "https://deno.land/x/oak@v12.6.1/mod.ts";
+import { logger } from "./logger.ts";
+import type { RunEventFrame } from "./runEvents.ts";
+
+export type SseSend<E> = (event: E) => void;
+
+export interface SseOptions {
+  // Emit a trailing `data: [DONE]` line once the producer settles
+  doneSentinel?: boolean;
+}
+
+// Resolve the abort signal of the underlying request (oak exposes it in different places)
+export function getRequestSignal(ctx: Context): AbortSignal | undefined {
+  const request = ctx.request as { signal?: AbortSignal; originalRequest?: { signal?: AbortSignal; request?: Request } };
+  return request.signal ?? request.originalRequest?.signal ?? request.originalRequest?.request?.signal;
+}
+
+// Set up Server-Sent Events on the response and drive `producer` until it settles.
+// The producer keeps running if the client goes away; events are just dropped.
+export function respondWithSse<E>(
+  ctx: Context,
+  producer: (send: SseSend<E | { type: "error"; error: string }>, signal: AbortSignal) => Promise<void>,
+  options: SseOptions = {},
+): void {
+  ctx.response.headers.set("Content-Type", "text/event-stream");
+  ctx.response.headers.set("Cache-Control", "no-cache");
+  ctx.response.headers.set("Connection", "keep-alive");
+  ctx.response.headers.set("X-Accel-Buffering", "no");
+
+  const encoder = new TextEncoder();
+  const abort = new AbortController();
+  let closeStream: (() => void) | undefined;
+
+  const body = new ReadableStream<Uint8Array>({
+    start(controller) {
+      let streamClosed = false;
+      const cleanupCallbacks: Array<() => void> = [];
+
+      const closeIfNeeded = () => {
+        if (streamClosed) return;
+        streamClosed = true;
+        try {
+          controller.close();
+        } catch { /* already closed */ }
+        cleanupCallbacks.forEach((cleanup) => cleanup());
+        abort.abort();
+      };
+      closeStream = closeIfNeeded;
+
+      const enqueue = (text: string) => {
+        if (streamClosed) return;
+        try {
+          controller.enqueue(encoder.encode(text));
+        } catch (enqueueError) {
+          logger.error("Failed to enqueue SSE event", { error: enqueueError });
+          closeIfNeeded();
+        }
+      };
+
+      const send = (event: unknown) => enqueue(`data: ${JSON.stringify(event)}\n\n`);
+
+      const requestSignal = getRequestSignal(ctx);
+      if (requestSignal) {
+        const abortHandler = () => closeIfNeeded();
+        requestSignal.addEventListener("abort", abortHandler);
+        cleanupCallbacks.push(() => requestSignal.removeEventListener("abort", abortHandler));
+      }
+
+      producer(send, abort.signal)
+        .catch((error) => {
+          send({ type: "error", error: error instanceof Error ? error.message : "Unknown error" });
+        })
+        .finally(() => {
+          if (options.doneSentinel) enqueue("data: [DONE]\n\n");
+          closeIfNeeded();
+        });
+    },
+    cancel() {
+      closeStream?.();
+    },
+  });
+
+  ctx.response.body = body;
+}
+
+// Last-Event-ID header (sent by EventSource on reconnect) or ?after=; null when malformed
+export function resumeFrom(ctx: Context): number | null {
+  const after = parseInt(ctx.request.headers.get("Last-Event-ID") ?? ctx.request.url.searchParams.get("after") ?? "0");
+  return Number.isInteger(after) && after >= 0 ? after : null;
+}
+
+// Stream a run's event log: one `id: <seq>` frame per event, then `data: [DONE]` once the run
+// has finished. Frames are pulled as the client reads, so a slow client only falls behind in
+// the log, which it can replay from. The run itself carries on when the client goes away.
+// X-Resume-Url is where the client reattaches with Last-Event-ID; X-Run-Id is only sent for
+// streams of a single run log (`runId` null otherwise).
+export function respondWithRunEvents(
+  ctx: Context,
+  runId: string | null,
+  feed: AsyncGenerator<RunEventFrame>,
+  abort: AbortController,
+  resumeUrl = `/api/runs/${runId}/events`,
+): void {
+  ctx.response.headers.set("Content-Type", "text/event-stream");
+  ctx.response.headers.set("Cache-Control", "no-cache");
+  ctx.response.headers.set("Connection", "keep-alive");
+  ctx.response.headers.set("X-Accel-Buffering", "no");
+  if (runId !== null) ctx.response.headers.set("X-Run-Id", runId);
+  ctx.response.headers.set("X-Resume-Url", resumeUrl);
+  ctx.response.headers.set("Access-Control-Expose-Headers", "X-Run-Id, X-Resume-Url, X-Run-Coalesced");
+
+  const encoder = new TextEncoder();
+  const requestSignal = getRequestSignal(ctx);
+  const stop = () => abort.abort();
+  requestSignal?.addEventListener("abort", stop);
+  let done = false;
+
+  ctx.response.body = new ReadableStream<Uint8Array>({
+    async pull(controller) {
+      if (done) return;
+      try {
+        const next = await feed.next();
+        if (next.done) {
+          done = true;
+          if (!abort.signal.aborted) controller.enqueue(encoder.encode("data: [DONE]\n\n"));
+          controller.close();
+          requestSignal?.removeEventListener("abort", stop);
+          return;
+        }
+        const { seq, json, id } = next.value;
+        controller.enqueue(encoder.encode(`${seq > 0 ? `id: ${id ?? seq}\n` : ""}data: ${json}\n\n`));
+      } catch (error) {
+        done = true;
+        logger.error("Failed to stream run events", { run: runId ?? resumeUrl, error });
+        try {
+          controller.enqueue(encoder.encode(`data: ${JSON.stringify({ type: "error", error: "Event stream failed" })}\n\n`));
+          controller.close();
+        } catch { /* already closed */ }
+      }
+    },
+    cancel() {
+      done = true;
+      stop();
+      requestSignal?.removeEventListener("abort", stop);
+      feed.return(undefined).catch(() => {});
+    },
+  });
+}
@@ -0,0 +1,234 @@
+// Spawn a process with piped output that is decoded as it arrives, forwarded in
+// throttled deltas and retained in bounded head/tail buffers, so memory stays
+// constant however much the process prints.
+
+import { metrics } from "./metrics.ts";
+
+export type OutputStream = "stdout" | "stderr";
+
+export interface OutputDelta {
+  stream: OutputStream;
+  text: string;
+}
+
+export interface StreamingCommandOptions {
+  args?: string[];
+  cwd?: string;
+  env?: Record<string, string>;
+  onOutput?: (delta: OutputDelta) => void;
+  onChunk?: (delta: OutputDelta) => void; // every decoded chunk as it arrives, unthrottled and never skipped
+  throttleMs?: number; // minimum gap between onOutput calls per stream, default 250
+  maxBufferChars?: number; // retained output per stream (head + tail), default 50_000
+  maxDeltaChars?: number; // largest single delta; older unsent text is skipped, default 16_384
+  signal?: AbortSignal; // kills the whole process group when aborted
+  limits?: ResourceLimits; // applied with prlimit on Linux when available
+}
+
+export interface ResourceLimits {
+  cpuSeconds?: number;
+  memoryBytes?: number; // address space
+}
+
+export interface StreamingCommandResult {
+  code: number;
+  success: boolean;
+  stdout: string;
+  stderr: string;
+  truncated: boolean;
+  killed: boolean; // terminated because the signal aborted
+  durationMs: number;
+}
+
+const KILL_GRACE_MS = 2000;
+
+const processDuration = metrics.histogram(
+  "subprocess_duration_seconds",
+  "Wall time of processes started through runStreaming, by executable and outcome",
+  ["command", "outcome"],
+  [0.1, 0.5, 1, 5, 10, 30, 60, 120, 300, 600, 1800],
+);
+
+let toolProbe: Promise<{ setsid: boolean; prlimit: boolean }> | undefined;
+
+async function hasCommand(command: string): Promise<boolean> {
+  try {
+    const res = await new Deno.Command(command, { args: ["--version"], stdout: "null", stderr: "null" }).output();
+    return res.success;
+  } catch {
+    return false;
+  }
+}
+
+// setsid puts the child in its own process group so a timeout can kill everything it
+// spawned (test runners, watchers, agents' sub-shells), not just the direct child
+function probeTools(): Promise<{ setsid: boolean; prlimit: boolean }> {
+  if (Deno.build.os !== "linux") return Promise.resolve({ setsid: false, prlimit: false });
+  toolProbe ??= Promise.all([hasCommand("setsid"), hasCommand("prlimit")]).then(([setsid, prlimit]) => ({ setsid, prlimit }));
+  return toolProbe;
+}
+
+async function wrapCommand(command: string, args: string[], limits?: ResourceLimits): Promise<{ command: string; args: string[]; group: boolean }> {
+  const tools = await probeTools();
+  let argv = [command, ...args];
+  const limitArgs: string[] = [];
+  if (limits?.cpuSeconds) limitArgs.push(`--cpu=${Math.ceil(limits.cpuSeconds)}`);
+  if (limits?.memoryBytes) limitArgs.push(`--as=${Math.floor(limits.memoryBytes)}`);
+  if (tools.prlimit && limitArgs.length > 0) argv = ["prlimit", ...limitArgs, "--", ...argv];
+  if (tools.setsid) argv = ["setsid", ...argv];
+  return { command: argv[0], args: argv.slice(1), group: tools.setsid };
+}
+
+function killTree(child: Deno.ChildProcess, group: boolean, signal: Deno.Signal) {
+  try {
+    // A negative pid addresses the whole process group
+    if (group) Deno.kill(-child.pid, signal);
+    else child.kill(signal);
+  } catch { /* already exited */ }
+}
+
+// Keeps the first and last `limit / 2` characters of everything appended to it
+export class HeadTailBuffer {
+  private head = "";
+  private tail = "";
+  private dropped = 0;
+  private readonly headLimit: number;
+  private readonly tailLimit: number;
+
+  constructor(limit: number) {
+    this.headLimit = Math.floor(limit / 2);
+    this.tailLimit = limit - this.headLimit;
+  }
+
+  append(text: string) {
+    if (this.head.length < this.headLimit) {
+      const take = this.headLimit - this.head.length;
+      this.head += text.slice(0, take);
+      text = text.slice(take);
+    }
+    if (!text) return;
+    this.tail += text;
+    // Trim in amortized chunks rather than on every append
+    if (this.tail.length > this.tailLimit * 2) {
+      this.dropped += this.tail.length - this.tailLimit;
+      this.tail = this.tail.slice(-this.tailLimit);
+    }
+  }
+
+  get truncated(): boolean {
+    return this.dropped > 0 || this.tail.length > this.tailLimit;
+  }
+
+  toString(): string {
+    const overflow = this.dropped + Math.max(0, this.tail.length - this.tailLimit);
+    const tail = this.tail.slice(-this.tailLimit);
+    return overflow > 0 ? `${this.head}\n... [${overflow} characters truncated] ...\n${tail}` : this.head + tail;
+  }
+}
+
+class DeltaThrottle {
+  private pending = "";
+  private skipped = 0;
+  private timer: number | undefined;
+  private lastFlush = 0;
+
+  constructor(
+    private stream: OutputStream,
+    private onOutput: (delta: OutputDelta) => void,
+    private throttleMs: number,
+    private maxDeltaChars: number,
+  ) {}
+
+  push(text: string) {
+    this.pending += text;
+    if (this.pending.length > this.maxDeltaChars) {
+      this.skipped += this.pending.length - this.maxDeltaChars;
+      this.pending = this.pending.slice(-this.maxDeltaChars);
+    }
+    if (this.timer !== undefined) return;
+    const wait = Math.max(0, this.lastFlush + this.throttleMs - Date.now());
+    this.timer = setTimeout(() => this.flush(), wait);
+  }
+
+  flush() {
+    if (this.timer !== undefined) {
+      clearTimeout(this.timer);
+      this.timer = undefined;
+    }
+    if (!this.pending) return;
+    const prefix = this.skipped > 0 ? `... [${this.skipped} characters skipped] ...\n` : "";
+    const text = prefix + this.pending;
+    this.pending = "";
+    this.skipped = 0;
+    this.lastFlush = Date.now();
+    try {
+      this.onOutput({ stream: this.stream, text });
+    } catch { /* listener errors must not break the process pipes */ }
+  }
+}
+
+export async function runStreaming(command: string, options: StreamingCommandOptions = {}): Promise<StreamingCommandResult> {
+  const start = Date.now();
+  const maxBufferChars = options.maxBufferChars ?? 50_000;
+  if (options.signal?.aborted) throw new Error("Aborted before start");
+  const wrapped = await wrapCommand(command, options.args ?? [], options.limits);
+  const child = new Deno.Command(wrapped.command, {
+    args: wrapped.args,
+    cwd: options.cwd,
+    env: options.env,
+    stdin: "null",
+    stdout: "piped",
+    stderr: "piped",
+  }).spawn();
+
+  // SIGTERM first, SIGKILL after a grace period for processes that ignore it
+  let killed = false;
+  let forceKill: number | undefined;
+  const onAbort = () => {
+    killed = true;
+    killTree(child, wrapped.group, "SIGTERM");
+    forceKill = setTimeout(() => killTree(child, wrapped.group, "SIGKILL"), KILL_GRACE_MS);
+  };
+  options.signal?.addEventListener("abort", onAbort, { once: true });
+
+  const buffers = { stdout: new HeadTailBuffer(maxBufferChars), stderr: new HeadTailBuffer(maxBufferChars) };
+
+  const pump = async (stream: OutputStream, readable: ReadableStream<Uint8Array>) => {
+    const throttle = options.onOutput
+      ? new DeltaThrottle(stream, options.onOutput, options.throttleMs ?? 250, options.maxDeltaChars ?? 16_384)
+      : undefined;
+    try {
+      for await (const text of readable.pipeThrough(new TextDecoderStream())) {
+        buffers[stream].append(text);
+        options.onChunk?.({ stream, text });
+        throttle?.push(text);
+      }
+    } finally {
+      throttle?.flush();
+    }
+  };
+
+  let status: Deno.CommandStatus;
+  try {
+    [status] = await Promise.all([
+      child.status,
+      pump("stdout", child.stdout),
+      pump("stderr", child.stderr),
+    ]);
+  } finally {
+    options.signal?.removeEventListener("abort", onAbort);
+    if (forceKill !== undefined) clearTimeout(forceKill);
+  }
+
+  const executable = command.split(/[\\/]/).pop() || command;
+  processDuration.labels(executable, killed ? "killed" : status.success ? "success" : "failure").observe((Date.now() - start) / 1000);
+
+  return {
+    code: status.code,
+    success: status.success,
+    stdout: buffers.stdout.toString(),
+    stderr: buffers.stderr.toString(),
+    truncated: buffers.stdout.truncated || buffers.stderr.truncated,
+    killed,
+    durationMs: Date.now() - start,
+  };
+}
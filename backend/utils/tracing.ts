@@ -0,0 +1,352 @@
+import { AsyncLocalStorage } from "node:async_hooks";
+import type { Middleware } from "https://deno.land/x/oak@v12.6.1/mod.ts";
+
+// Opt-in request tracing with the OpenTelemetry span model, exported as OTLP/JSON.
+//
+// Tracing is on when an exporter is configured:
+//   TRACE_DIR             append one ExportTraceServiceRequest per line to <dir>/traces.jsonl
+//   TRACE_OTLP_ENDPOINT   POST the same payloads to a collector (e.g. http://localhost:4318/v1/traces)
+//   TRACE_SAMPLE_RATE     fraction of requests traced, default 1; an incoming `traceparent`
+//                         header decides for its own request
+//
+// Spans only start under a sampled request, so DB calls and upstream requests outside one are
+// never traced. When tracing is off, `tracer.enabled` is false, the request middleware is not
+// installed, and instrumented call sites skip everything behind that one check.
+
+export type SpanKind = "internal" | "server" | "client";
+export type AttributeValue = string | number | boolean;
+export type Attributes = Record<string, AttributeValue | undefined>;
+
+// OTLP enum values
+const SPAN_KIND = { internal: 1, server: 2, client: 3 } as const;
+const STATUS_OK = 1;
+const STATUS_ERROR = 2;
+
+const MAX_QUEUED_SPANS = 4096;
+const EXPORT_BATCH_SIZE = 512;
+const EXPORT_INTERVAL_MS = 2000;
+
+function randomHex(bytes: number): string {
+  return Array.from(crypto.getRandomValues(new Uint8Array(bytes)), (b) => b.toString(16).padStart(2, "0")).join("");
+}
+
+// Wall-clock nanoseconds from the monotonic clock, as OTLP/JSON wants (a decimal string)
+function nowNanos(): string {
+  const micros = Math.round((performance.timeOrigin + performance.now()) * 1000);
+  return (BigInt(micros) * 1000n).toString();
+}
+
+function otlpValue(value: AttributeValue) {
+  if (typeof value === "string") return { stringValue: value };
+  if (typeof value === "boolean") return { boolValue: value };
+  return Number.isInteger(value) ? { intValue: String(value) } : { doubleValue: value };
+}
+
+function otlpAttributes(attributes: Attributes) {
+  return Object.entries(attributes)
+    .filter((entry): entry is [string, AttributeValue] => entry[1] !== undefined)
+    .map(([key, value]) => ({ key, value: otlpValue(value) }));
+}
+
+export class Span {
+  readonly spanId = randomHex(8);
+  private readonly startTime = nowNanos();
+  private endTime: string | null = null;
+  private readonly attributes: Attributes;
+  private readonly events: Array<{ name: string; timeUnixNano: string; attributes: Attributes }> = [];
+  private status: { code: number; message?: string } = { code: 0 };
+
+  constructor(
+    private readonly tracer: Tracer,
+    public name: string,
+    readonly traceId: string,
+    readonly parentSpanId: string | null,
+    private readonly kind: SpanKind,
+    attributes: Attributes = {},
+  ) {
+    this.attributes = { ...attributes };
+  }
+
+  setAttribute(key: string, value: AttributeValue | undefined): this {
+    this.attributes[key] = value;
+    return this;
+  }
+
+  setAttributes(attributes: Attributes): this {
+    Object.assign(this.attributes, attributes);
+    return this;
+  }
+
+  addEvent(name: string, attributes: Attributes = {}): this {
+    this.events.push({ name, timeUnixNano: nowNanos(), attributes });
+    return this;
+  }
+
+  setOk(): this {
+    this.status = { code: STATUS_OK };
+    return this;
+  }
+
+  recordError(error: unknown): this {
+    const message = error instanceof Error ? error.message : String(error);
+    this.status = { code: STATUS_ERROR, message };
+    return this.addEvent("exception", {
+      "exception.type": error instanceof Error ? error.name : typeof error,
+      "exception.message": message,
+    });
+  }
+
+  // Ending twice is a no-op, so `finally` blocks can end spans unconditionally
+  end() {
+    if (this.endTime !== null) return;
+    this.endTime = nowNanos();
+    this.tracer.enqueue(this);
+  }
+
+  get traceparent(): string {
+    return `00-${this.traceId}-${this.spanId}-01`;
+  }
+
+  toOtlp() {
+    return {
+      traceId: this.traceId,
+      spanId: this.spanId,
+      ...(this.parentSpanId ? { parentSpanId: this.parentSpanId } : {}),
+      name: this.name,
+      kind: SPAN_KIND[this.kind],
+      startTimeUnixNano: this.startTime,
+      endTimeUnixNano: this.endTime ?? nowNanos(),
+      attributes: otlpAttributes(this.attributes),
+      events: this.events.map((event) => ({ ...event, attributes: otlpAttributes(event.attributes) })),
+      status: this.status,
+    };
+  }
+}
+
+export interface SpanExporter {
+  export(payload: string): Promise<void>;
+}
+
+// The OTLP file exporter layout: one JSON request per line
+export class FileSpanExporter implements SpanExporter {
+  constructor(private readonly dir: string) {}
+
+  async export(payload: string) {
+    await Deno.mkdir(this.dir, { recursive: true });
+    await Deno.writeTextFile(`${this.dir}/traces.jsonl`, payload + "\n", { append: true });
+  }
+}
+
+export class OtlpHttpExporter implements SpanExporter {
+  constructor(private readonly endpoint: string) {}
+
+  async export(payload: string) {
+    const response = await fetch(this.endpoint, {
+      method: "POST",
+      headers: { "Content-Type": "application/json" },
+      body: payload,
+      signal: AbortSignal.timeout(10_000),
+    });
+    await response.body?.cancel();
+    if (!response.ok) throw new Error(`Collector returned ${response.status}`);
+  }
+}
+
+export interface TracerConfig {
+  exporters: SpanExporter[];
+  sampleRate?: number; // 0..1, default 1
+  serviceName?: string;
+}
+
+// W3C trace context: version-traceid-parentid-flags
+const TRACEPARENT = /^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$/;
+
+export class Tracer {
+  readonly enabled: boolean;
+  private readonly sampleRate: number;
+  private readonly serviceName: string;
+  private readonly storage: AsyncLocalStorage<Span> | null;
+  private queue: Span[] = [];
+  private timer: number | undefined;
+  private exporting: Promise<void> = Promise.resolve();
+  dropped = 0;
+
+  constructor(private readonly config: TracerConfig) {
+    this.enabled = config.exporters.length > 0;
+    this.sampleRate = Math.min(1, Math.max(0, config.sampleRate ?? 1));
+    this.serviceName = config.serviceName ?? "llm-arena-backend";
+    // Only created when needed, so a disabled tracer costs nothing per await
+    this.storage = this.enabled ? new AsyncLocalStorage<Span>() : null;
+  }
+
+  static fromEnv(): Tracer {
+    const exporters: SpanExporter[] = [];
+    const dir = Deno.env.get("TRACE_DIR");
+    const endpoint = Deno.env.get("TRACE_OTLP_ENDPOINT");
+    if (dir) exporters.push(new FileSpanExporter(dir));
+    if (endpoint) exporters.push(new OtlpHttpExporter(endpoint));
+    const rate = parseFloat(Deno.env.get("TRACE_SAMPLE_RATE") ?? "");
+    return new Tracer({ exporters, sampleRate: Number.isFinite(rate) ? rate : 1 });
+  }
+
+  activeSpan(): Span | undefined {
+    return this.storage?.getStore();
+  }
+
+  // A root span if this request is sampled, else null. `traceparent` continues a caller's trace.
+  startRootSpan(name: string, options: { kind?: SpanKind; traceparent?: string | null; attributes?: Attributes } = {}): Span | null {
+    if (!this.enabled) return null;
+    const parent = options.traceparent ? TRACEPARENT.exec(options.traceparent.trim().toLowerCase()) : null;
+    const sampled = parent ? (parseInt(parent[3], 16) & 1) === 1 : Math.random() < this.sampleRate;
+    if (!sampled) return null;
+    return new Span(this, name, parent?.[1] ?? randomHex(16), parent?.[2] ?? null, options.kind ?? "server", options.attributes);
+  }
+
+  // A child of the active span, or null outside a sampled trace
+  startSpan(name: string, options: { kind?: SpanKind; attributes?: Attributes } = {}): Span | null {
+    const parent = this.storage?.getStore();
+    if (!parent) return null;
+    return new Span(this, name, parent.traceId, parent.spanId, options.kind ?? "internal", options.attributes);
+  }
+
+  // Run `fn` with `span` as the parent of spans started inside it
+  withSpan<T>(span: Span | null, fn: () => T): T {
+    return span && this.storage ? this.storage.run(span, fn) : fn();
+  }
+
+  // Time `fn` as a child span, recording a thrown error
+  async trace<T>(name: string, fn: (span: Span | null) => Promise<T>, attributes?: Attributes): Promise<T> {
+    const span = this.enabled ? this.startSpan(name, { attributes }) : null;
+    if (!span) return fn(null);
+    try {
+      return await this.withSpan(span, () => fn(span));
+    } catch (error) {
+      span.recordError(error);
+      throw error;
+    } finally {
+      span.end();
+    }
+  }
+
+  enqueue(span: Span) {
+    if (this.queue.length >= MAX_QUEUED_SPANS) {
+      this.queue.shift();
+      this.dropped++;
+    }
+    this.queue.push(span);
+    if (this.queue.length >= EXPORT_BATCH_SIZE) {
+      this.flush();
+    } else if (this.timer === undefined) {
+      this.timer = setTimeout(() => this.flush(), EXPORT_INTERVAL_MS);
+      Deno.unrefTimer(this.timer);
+    }
+  }
+
+  // Export everything queued so far; exports run one at a time and never throw
+  flush(): Promise<void> {
+    if (this.timer !== undefined) {
+      clearTimeout(this.timer);
+      this.timer = undefined;
+    }
+    const batch = this.queue;
+    this.queue = [];
+    if (batch.length === 0) return this.exporting;
+    const payload = JSON.stringify({
+      resourceSpans: [{
+        resource: { attributes: otlpAttributes({ "service.name": this.serviceName }) },
+        scopeSpans: [{ scope: { name: "llm-arena" }, spans: batch.map((span) => span.toOtlp()) }],
+      }],
+    });
+    this.exporting = this.exporting.then(() =>
+      Promise.all(this.config.exporters.map((exporter) =>
+        exporter.export(payload).catch((error) => console.warn("Trace export failed:", error instanceof Error ? error.message : error))
+      )).then(() => {})
+    );
+    return this.exporting;
+  }
+}
+
+export const tracer = Tracer.fromEnv();
+
+// Pass a streamed body through, recording how long the stream waited on its producer
+// (e.g. the upstream model) versus on the client reading it (backpressure)
+function traceStream(body: ReadableStream<Uint8Array>, span: Span): ReadableStream<Uint8Array> {
+  const reader = body.getReader();
+  let chunks = 0;
+  let bytes = 0;
+  let producerWaitMs = 0;
+  let clientWaitMs = 0;
+  let lastEnqueue = performance.now();
+  const finish = (error?: unknown) => {
+    span.setAttributes({
+      "sse.events": chunks,
+      "sse.bytes": bytes,
+      "sse.producer_wait_ms": Math.round(producerWaitMs),
+      "sse.client_wait_ms": Math.round(clientWaitMs),
+    });
+    if (error !== undefined) span.recordError(error);
+    span.end();
+  };
+  return new ReadableStream<Uint8Array>({
+    async pull(controller) {
+      const pulled = performance.now();
+      clientWaitMs += pulled - lastEnqueue;
+      try {
+        const { done, value } = await reader.read();
+        const read = performance.now();
+        producerWaitMs += read - pulled;
+        if (done) {
+          finish();
+          controller.close();
+          return;
+        }
+        chunks++;
+        bytes += value.byteLength;
+        lastEnqueue = read;
+        controller.enqueue(value);
+      } catch (error) {
+        finish(error);
+        controller.error(error);
+      }
+    },
+    cancel(reason) {
+      span.addEvent("client_disconnected");
+      finish();
+      return reader.cancel(reason);
+    },
+  }, { highWaterMark: 0 });
+}
+
+// Root span per request, named after the route pattern once routing has run.
+// Installed only when tracing is enabled.
+export function traceRequests(): Middleware {
+  return async (ctx, next) => {
+    const span = tracer.startRootSpan(`${ctx.request.method}`, {
+      kind: "server",
+      traceparent: ctx.request.headers.get("traceparent"),
+      attributes: { "http.request.method": ctx.request.method, "url.path": ctx.request.url.pathname },
+    });
+    if (!span) return next();
+    ctx.response.headers.set("traceresponse", span.traceparent);
+    try {
+      await tracer.withSpan(span, next);
+    } catch (error) {
+      span.recordError(error);
+      throw error;
+    } finally {
+      const route = (ctx.state as { route?: string }).route;
+      if (route) {
+        span.name = `${ctx.request.method} ${route}`;
+        span.setAttribute("http.route", route);
+      }
+      span.setAttribute("http.response.status_code", ctx.response.status);
+      if (ctx.response.status >= 500) span.recordError(`HTTP ${ctx.response.status}`);
+      const body = ctx.response.body;
+      if (body instanceof ReadableStream && ctx.response.headers.get("Content-Type")?.startsWith("text/event-stream")) {
+        const stream = tracer.withSpan(span, () => tracer.startSpan("sse.stream", { kind: "internal" }))!;
+        ctx.response.body = traceStream(body, stream);
+      }
+      span.end();
+    }
+  };
+}
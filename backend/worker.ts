@@ -0,0 +1,21 @@
+// Entry point for one HTTP worker in cluster mode (see utils/cluster.ts). The app is imported
+// only after the init message, so the database module sees it is running in a worker and
+// routes its calls to the primary instead of opening the file itself.
+import { type ClusterWorkerInit, initClusterWorker } from "./utils/cluster.ts";
+
+const scope = globalThis as unknown as {
+  addEventListener(type: "message", listener: (event: MessageEvent) => void): void;
+};
+
+scope.addEventListener("message", async (event: MessageEvent<ClusterWorkerInit>) => {
+  if (event.data?.kind !== "init") return;
+  initClusterWorker(event.data);
+  const { createApp, startBackgroundTasks } = await import("./app.ts");
+  const { logger } = await import("./utils/logger.ts");
+
+  const port = parseInt(Deno.env.get("PORT") || "6100");
+  const app = createApp();
+  startBackgroundTasks();
+  logger.debug("HTTP worker listening", { worker: event.data.workerId, port });
+  await app.listen({ port, reusePort: true });
+});
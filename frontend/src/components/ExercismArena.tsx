@@ -4,7 +4,7 @@ import { Button } from '@/components/ui/button';
 import { Input } from '@/components/ui/input';
 import { Badge } from '@/components/ui/badge';
 import { Loader2, Play, CheckCircle2, AlertCircle, Check } from 'lucide-react';
-import { apiService, type Exercise, type CodeEvalResult, type LLMModel, type OpenRouterModel } from '@/services/api';
+import { apiService, type Exercise, type CodeEvalResult, type ExercismStreamEvent, type LLMModel, type OpenRouterModel } from '@/services/api';
 import { useToast } from '@/hooks/use-toast';
 
 interface Props { onBack?: () => void }
@@ -19,6 +19,7 @@ export default function ExercismArena({ onBack }: Props) {
   const [selectedModels, setSelectedModels] = useState<string[]>([]);
   const [isRunning, setIsRunning] = useState(false);
   const [results, setResults] = useState<Record<string, CodeEvalResult | { error: string }>>({});
+  const [phases, setPhases] = useState<Record<string, string>>({});
 
   useEffect(() => {
     (async () => {
@@ -104,14 +105,34 @@ export default function ExercismArena({ onBack }: Props) {
     }
     setIsRunning(true);
     setResults({});
-    try {
-      const response = await apiService.runExercism(selectedExercise, selectedModels, testCount);
-      const data = (response as any).data ?? response;
-      const map: Record<string, CodeEvalResult> = {};
-      for (const r of data.results as CodeEvalResult[]) {
-        map[r.model] = r;
+    setPhases({});
+    const describePhase = (event: ExercismStreamEvent): string | undefined => {
+      switch (event.type) {
+        case 'generation_start': return 'Generating...';
+        case 'first_token': return `Generating (TTFT ${event.ttftMs}ms)...`;
+        case 'generation_done': return 'Linting...';
+        case 'lint': return 'Compiling...';
+        case 'compile': return event.passed ? 'Running tests...' : 'Compile failed';
+        case 'test_case': return `Running tests (${(event.caseIndex ?? 0) + 1} done)...`;
+        default: return undefined;
       }
-      setResults(map);
+    };
+    try {
+      await apiService.runExercismStream({ exerciseId: selectedExercise, models: selectedModels, testCount }, (event) => {
+        if (event.type === 'model_complete' && event.model && event.result) {
+          const result = event.result;
+          setResults(prev => ({ ...prev, [event.model!]: result }));
+          return;
+        }
+        if (event.type === 'error' && !event.model) {
+          toast({ variant: 'destructive', title: 'Run failed', description: event.error });
+          return;
+        }
+        const phase = describePhase(event);
+        if (phase && event.model) {
+          setPhases(prev => ({ ...prev, [event.model!]: phase }));
+        }
+      });
     } catch (error) {
       console.error(error);
       toast({ variant: 'destructive', title: 'Run failed', description: (error as Error).message });
@@ -245,10 +266,12 @@ export default function ExercismArena({ onBack }: Props) {
                         <div>Score: {r.score}</div>
                         <div>Lint warnings: {r.lintWarnings}</div>
                         <div>Lint errors: {r.lintErrors}</div>
+                        {r.generation?.ttftMs != null && <div>TTFT: {r.generation.ttftMs}ms</div>}
+                        {r.generation?.tokensPerSecond != null && <div>Tokens/s: {r.generation.tokensPerSecond.toFixed(1)}</div>}
                       </div>
                     </>
                   ) : isRunning ? (
-                    <div className="flex items-center gap-2 text-muted-foreground"><Loader2 className="h-4 w-4 animate-spin"/>Running...</div>
+                    <div className="flex items-center gap-2 text-muted-foreground"><Loader2 className="h-4 w-4 animate-spin"/>{phases[model] ?? 'Running...'}</div>
                   ) : (
                     <div className="text-muted-foreground">No result</div>
                   )}
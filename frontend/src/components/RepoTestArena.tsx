@@ -4,8 +4,8 @@ import { Button } from '@/components/ui/button';
 import { Input } from '@/components/ui/input';
 import { Badge } from '@/components/ui/badge';
 import { Checkbox } from '@/components/ui/checkbox';
-import { Loader2, Play, CheckCircle2, AlertCircle, GitBranch, Terminal, Clock, RotateCcw, ChevronDown, ChevronUp, Trophy, Users } from 'lucide-react';
-import { apiService, type CodingTool, type RepoTestProgressEvent, type RepoTestResult, type RepoTestHistoryEntry, type OpenRouterFreeModel, type BatchLeaderboardEntry, type BatchProgressEvent } from '@/services/api';
+import { Loader2, Play, CheckCircle2, AlertCircle, GitBranch, Terminal, Clock, RotateCcw, RefreshCw, ChevronDown, ChevronUp, Trophy, Users } from 'lucide-react';
+import { apiService, type CodingTool, type RepoTestProgressEvent, type RepoTestResult, type RepoTestHistoryEntry, type OpenRouterFreeModel, type RepoTestStrategy, type RepoTestIncrementalMode, type BatchLeaderboardEntry, type BatchProgressEvent } from '@/services/api';
 import { useToast } from '@/hooks/use-toast';
 import { ScrollArea } from '@/components/ui/scroll-area';
 
@@ -33,6 +33,9 @@ export default function RepoTestArena({ onBack }: Props) {
   const [ref, setRef] = useState('main');
   const [prompt, setPrompt] = useState('');
   const [testCommand, setTestCommand] = useState('npm test');
+  const [iterationCount, setIterationCount] = useState(2);
+  const [strategy, setStrategy] = useState<RepoTestStrategy>('refine');
+  const [incrementalTests, setIncrementalTests] = useState<RepoTestIncrementalMode>('off');
   const [selectedTool, setSelectedTool] = useState('openrouter-direct');
   const [selectedModels, setSelectedModels] = useState<string[]>([FALLBACK_MODELS[0].id]);
   const [customModel, setCustomModel] = useState('');
@@ -42,6 +45,7 @@ export default function RepoTestArena({ onBack }: Props) {
   const [isBatchMode, setIsBatchMode] = useState(false);
   const [progressLog, setProgressLog] = useState<(RepoTestProgressEvent | BatchProgressEvent)[]>([]);
   const [result, setResult] = useState<RepoTestResult | null>(null);
+  const [liveOutput, setLiveOutput] = useState('');
   const [batchLeaderboard, setBatchLeaderboard] = useState<BatchLeaderboardEntry[] | null>(null);
 
   // History state
@@ -50,12 +54,24 @@ export default function RepoTestArena({ onBack }: Props) {
 
   // Tools and models
   const [tools, setTools] = useState<CodingTool[]>([]);
+  const [toolsRefreshing, setToolsRefreshing] = useState(false);
   const [availableModels, setAvailableModels] = useState<OpenRouterFreeModel[]>(FALLBACK_MODELS);
   const [modelsLoading, setModelsLoading] = useState(true);
 
   // Expanded iteration details
   const [expandedIteration, setExpandedIteration] = useState<number | null>(null);
 
+  const refreshTools = async () => {
+    setToolsRefreshing(true);
+    try {
+      const res = await apiService.refreshRepoTestTools();
+      const data = (res as any).data ?? res;
+      if (Array.isArray(data)) setTools(data);
+    } catch { /* ignore */ } finally {
+      setToolsRefreshing(false);
+    }
+  };
+
   // Fetch tools and models on mount
   useEffect(() => {
     (async () => {
@@ -126,6 +142,7 @@ export default function RepoTestArena({ onBack }: Props) {
 
     setIsRunning(true);
     setProgressLog([]);
+    setLiveOutput('');
     setResult(null);
     setBatchLeaderboard(null);
     setExpandedIteration(null);
@@ -143,12 +160,24 @@ export default function RepoTestArena({ onBack }: Props) {
     }
   };
 
+  // Keep only the last 20k characters so a chatty tool cannot grow the page without bound
+  const appendLiveOutput = (delta: string) => {
+    setLiveOutput(prev => (prev + delta).slice(-20000));
+  };
+
   const runSingle = async () => {
     const model = customModel.trim() || selectedModels[0];
 
     await apiService.runRepoTestStream(
-      { repo_url: repoUrl, ref, prompt, test_command: testCommand, tool: selectedTool, model },
+      { repo_url: repoUrl, ref, prompt, test_command: testCommand, tool: selectedTool, model, iterations: iterationCount, strategy, incremental_tests: incrementalTests },
       (event) => {
+        // Output deltas go to the live terminal instead of the progress log
+        if (event.data?.delta !== undefined) {
+          appendLiveOutput(event.data.delta);
+          return;
+        }
+        // Spans arrive again in the final result's waterfall
+        if (event.type === 'span') return;
         setProgressLog(prev => [...prev, event]);
         if (event.type === 'complete' && event.data) {
           setResult(event.data as RepoTestResult);
@@ -164,8 +193,9 @@ export default function RepoTestArena({ onBack }: Props) {
     const models = customModel.trim() ? [customModel.trim(), ...selectedModels] : selectedModels;
 
     await apiService.runRepoTestBatch(
-      { repo_url: repoUrl, ref, prompt, test_command: testCommand, tool: selectedTool, models },
+      { repo_url: repoUrl, ref, prompt, test_command: testCommand, tool: selectedTool, models, iterations: iterationCount, strategy, incremental_tests: incrementalTests },
       (event) => {
+        if (event.type === 'model_progress' && (event.data?.data?.delta !== undefined || event.data?.type === 'span')) return;
         setProgressLog(prev => [...prev, event]);
         
         if (event.type === 'batch_complete' && event.data?.leaderboard) {
@@ -193,6 +223,7 @@ export default function RepoTestArena({ onBack }: Props) {
       case 'partial': return 'text-yellow-500';
       case 'fail': return 'text-red-500';
       case 'error': return 'text-red-500';
+      case 'timeout': return 'text-orange-500';
       case 'running': return 'text-blue-500';
       default: return 'text-muted-foreground';
     }
@@ -204,6 +235,7 @@ export default function RepoTestArena({ onBack }: Props) {
       case 'partial': return <Badge className="bg-yellow-500/20 text-yellow-400 border-yellow-500/30">PARTIAL</Badge>;
       case 'fail': return <Badge className="bg-red-500/20 text-red-400 border-red-500/30">FAIL</Badge>;
       case 'error': return <Badge className="bg-red-500/20 text-red-400 border-red-500/30">ERROR</Badge>;
+      case 'timeout': return <Badge className="bg-orange-500/20 text-orange-400 border-orange-500/30">TIMEOUT</Badge>;
       default: return <Badge variant="outline">{status}</Badge>;
     }
   };
@@ -276,7 +308,18 @@ export default function RepoTestArena({ onBack }: Props) {
           {/* Row 3: Tool + Models + Test Command */}
           <div className="grid grid-cols-1 md:grid-cols-3 gap-4">
             <div>
-              <label className="text-sm font-medium flex items-center gap-1"><Terminal className="h-3.5 w-3.5" /> AI Coding Tool</label>
+              <label className="text-sm font-medium flex items-center gap-1">
+                <Terminal className="h-3.5 w-3.5" /> AI Coding Tool
+                <button
+                  type="button"
+                  className="ml-auto text-muted-foreground hover:text-foreground"
+                  title="Re-check installed tools"
+                  onClick={refreshTools}
+                  disabled={toolsRefreshing}
+                >
+                  <RefreshCw className={`h-3.5 w-3.5 ${toolsRefreshing ? 'animate-spin' : ''}`} />
+                </button>
+              </label>
               <select
                 className="mt-1 w-full border rounded-md bg-background p-2 text-sm"
                 value={selectedTool}
@@ -288,7 +331,7 @@ export default function RepoTestArena({ onBack }: Props) {
                     value={t.id}
                     disabled={!t.available}
                   >
-                    {t.name} - {t.description} {!t.available ? '(not installed)' : t.apiKeyEnvVar && !t.apiKeyConfigured ? '(API key needed)' : ''}
+                    {t.name}{t.version ? ` (${t.version})` : ''} - {t.description} {!t.available ? '(not installed)' : t.apiKeyEnvVar && !t.apiKeyConfigured ? '(API key needed)' : ''}
                   </option>
                 )) : (
                   <>
@@ -358,6 +401,39 @@ export default function RepoTestArena({ onBack }: Props) {
               />
               <div className="text-xs text-muted-foreground mt-1">e.g. npm test, pytest, deno test, cargo test, go test ./...</div>
             </div>
+            <div>
+              <label className="text-sm font-medium">Iterations</label>
+              <div className="mt-1 flex gap-2">
+                <Input
+                  type="number"
+                  min={1}
+                  max={10}
+                  className="w-20"
+                  value={iterationCount}
+                  onChange={(e) => setIterationCount(Math.min(10, Math.max(1, parseInt(e.target.value) || 1)))}
+                />
+                <select
+                  className="flex-1 border rounded-md bg-background p-2 text-sm"
+                  value={strategy}
+                  onChange={(e) => setStrategy(e.target.value as RepoTestStrategy)}
+                >
+                  <option value="refine">Refine (retry with test failures)</option>
+                  <option value="best_of_n">Best of N (fresh attempts)</option>
+                </select>
+              </div>
+              {strategy === 'refine' && iterationCount > 1 && (
+                <select
+                  className="mt-2 w-full border rounded-md bg-background p-2 text-sm"
+                  value={incrementalTests}
+                  onChange={(e) => setIncrementalTests(e.target.value as RepoTestIncrementalMode)}
+                >
+                  <option value="off">Retries run the full suite</option>
+                  <option value="failed_first">Retries run failing tests first, then the full suite</option>
+                  <option value="failed_only">Retries run only the failing tests</option>
+                </select>
+              )}
+              <div className="text-xs text-muted-foreground mt-1">Best of N restores the installed baseline before each attempt</div>
+            </div>
           </div>
 
           {/* Run button */}
@@ -408,6 +484,23 @@ export default function RepoTestArena({ onBack }: Props) {
         </Card>
       )}
 
+      {/* Live Output */}
+      {liveOutput && (
+        <Card>
+          <CardHeader className="py-3">
+            <CardTitle className="text-base flex items-center gap-2">
+              <Terminal className="h-4 w-4" />
+              Live Output
+            </CardTitle>
+          </CardHeader>
+          <CardContent className="p-0">
+            <ScrollArea className="h-[240px]">
+              <pre className="p-4 font-mono text-xs whitespace-pre-wrap break-all">{liveOutput}</pre>
+            </ScrollArea>
+          </CardContent>
+        </Card>
+      )}
+
       {/* Batch Leaderboard */}
       {batchLeaderboard && batchLeaderboard.length > 0 && (
         <Card className="border-purple-500/40">
@@ -484,9 +577,9 @@ export default function RepoTestArena({ onBack }: Props) {
           </CardHeader>
           <CardContent className="space-y-4">
             {/* Summary */}
-            <div className="grid grid-cols-2 md:grid-cols-5 gap-4 text-sm">
+            <div className="grid grid-cols-2 md:grid-cols-6 gap-4 text-sm">
               <div>
-                <div className="text-muted-foreground">Tests Passed</div>
+                <div className="text-muted-foreground">Tests Passed{result.final_test_scope === "failed" ? " (re-run failures only)" : ""}</div>
                 <div className="text-2xl font-bold">{result.final_tests_passed}<span className="text-muted-foreground text-base">/{result.final_tests_total}</span></div>
               </div>
               <div>
@@ -497,6 +590,10 @@ export default function RepoTestArena({ onBack }: Props) {
                 <div className="text-muted-foreground">Clone Time</div>
                 <div className="text-lg font-semibold">{(result.clone_duration_ms / 1000).toFixed(1)}s</div>
               </div>
+              <div>
+                <div className="text-muted-foreground">Install Time</div>
+                <div className="text-lg font-semibold">{(result.install_duration_ms / 1000).toFixed(1)}s</div>
+              </div>
               <div>
                 <div className="text-muted-foreground">Tool</div>
                 <div className="text-lg font-semibold">{result.tool}</div>
@@ -507,6 +604,30 @@ export default function RepoTestArena({ onBack }: Props) {
               </div>
             </div>
 
+            {/* Timing waterfall */}
+            {result.spans?.length > 0 && (
+              <div className="space-y-1">
+                <h4 className="text-sm font-medium">Timing</h4>
+                {(() => {
+                  const end = Math.max(...result.spans.map(s => s.start_ms + s.duration_ms), 1);
+                  return [...result.spans].sort((a, b) => a.start_ms - b.start_ms).map((span, idx) => (
+                    <div key={idx} className="flex items-center gap-2 text-xs">
+                      <span className={`w-40 shrink-0 truncate ${span.parent ? 'pl-4 text-muted-foreground' : ''}`}>
+                        {span.name}{span.iteration !== null ? ` #${span.iteration}` : ''}
+                      </span>
+                      <div className="relative flex-1 h-3 bg-muted/30 rounded">
+                        <div
+                          className={`absolute h-3 rounded ${span.parent ? 'bg-blue-400/50' : 'bg-blue-500'}`}
+                          style={{ left: `${(span.start_ms / end) * 100}%`, width: `${Math.max((span.duration_ms / end) * 100, 0.5)}%` }}
+                        />
+                      </div>
+                      <span className="w-16 shrink-0 text-right text-muted-foreground">{(span.duration_ms / 1000).toFixed(2)}s</span>
+                    </div>
+                  ));
+                })()}
+              </div>
+            )}
+
             {/* Iterations */}
             <div className="space-y-2">
               <h4 className="text-sm font-medium">Iterations</h4>
@@ -518,6 +639,9 @@ export default function RepoTestArena({ onBack }: Props) {
                   >
                     <div className="flex items-center gap-3">
                       <Badge variant="outline">#{iter.iteration}</Badge>
+                      {result.strategy === 'best_of_n' && result.best_iteration === iter.iteration && (
+                        <Badge className="bg-yellow-500/20 text-yellow-400 border-yellow-500/30">BEST</Badge>
+                      )}
                       <span className="text-sm">
                         {iter.tests_passed}/{iter.tests_total} passed
                       </span>
@@ -527,11 +651,45 @@ export default function RepoTestArena({ onBack }: Props) {
                         <Badge className="bg-red-500/20 text-red-400 border-red-500/30">FAIL</Badge>
                       )}
                       <span className="text-xs text-muted-foreground">{(iter.duration_ms / 1000).toFixed(1)}s</span>
+                      {iter.failed_first && (
+                        <span className="text-xs text-muted-foreground">
+                          failing first: {iter.failed_first.passed}/{iter.failed_first.total} in {(iter.failed_first.duration_ms / 1000).toFixed(1)}s
+                          {iter.test_scope === 'failed' ? ' (full suite skipped)' : ''}
+                        </span>
+                      )}
+                      {iter.files_changed !== null && (
+                        <span className="text-xs text-muted-foreground">{iter.files_changed} file(s) changed</span>
+                      )}
                     </div>
                     {expandedIteration === iter.iteration ? <ChevronUp className="h-4 w-4" /> : <ChevronDown className="h-4 w-4" />}
                   </button>
                   {expandedIteration === iter.iteration && (
                     <div className="px-3 pb-3 space-y-2">
+                      {iter.files_changed !== null && (
+                        <a
+                          className="text-xs text-blue-400 hover:underline"
+                          href={apiService.repoTestIterationDiffUrl(result.runId, iter.iteration)}
+                          target="_blank"
+                          rel="noreferrer"
+                        >
+                          View diff against baseline ({iter.diff_bytes} bytes)
+                        </a>
+                      )}
+                      {iter.test_cases?.length > 0 && (
+                        <div>
+                          <div className="text-xs font-medium text-muted-foreground mb-1">Test Cases ({iter.report_format})</div>
+                          <div className="text-xs bg-black/40 rounded p-2 overflow-auto max-h-[200px] space-y-0.5">
+                            {iter.test_cases.map((c, idx) => (
+                              <div key={idx} className="flex items-center justify-between gap-2">
+                                <span className={c.status === 'passed' ? 'text-green-400' : c.status === 'failed' ? 'text-red-400' : 'text-muted-foreground'}>
+                                  {c.suite ? `${c.suite} › ` : ''}{c.name}
+                                </span>
+                                <span className="text-muted-foreground">{c.duration_ms !== null ? `${c.duration_ms}ms` : ''}</span>
+                              </div>
+                            ))}
+                          </div>
+                        </div>
+                      )}
                       <div>
                         <div className="text-xs font-medium text-muted-foreground mb-1">Test Output</div>
                         <pre className="text-xs bg-black/40 rounded p-2 overflow-auto max-h-[200px] whitespace-pre-wrap">
@@ -568,6 +726,9 @@ export default function RepoTestArena({ onBack }: Props) {
                   <div key={run.id} className="flex items-center justify-between p-2 border rounded text-sm">
                     <div className="flex items-center gap-3">
                       {statusBadge(run.status)}
+                      {run.status === 'timeout' && run.timeout_phase && (
+                        <span className="text-xs text-orange-400">in {run.timeout_phase}</span>
+                      )}
                       <span className="font-mono text-xs">{run.repo_url.replace('https://github.com/', '')}</span>
                       <span className="text-xs text-muted-foreground">@{run.ref}</span>
                       <span className="text-xs text-muted-foreground">{run.tool} / {run.model.split('/').pop()}</span>
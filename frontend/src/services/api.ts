@@ -135,6 +135,35 @@ export interface CodeEvalResult {
   testsTotal: number;
   score: number;
   error?: string;
+  generation?: {
+    durationMs: number;
+    ttftMs: number | null;
+    tokensPerSecond: number | null;
+    completionTokens: number;
+  };
+  generated?: {
+    seed: number;
+    passed: number;
+    total: number;
+    counterexample?: { input: unknown; expected: unknown; actual: unknown; shrinkSteps: number };
+  };
+}
+
+export interface ExercismStreamEvent {
+  type: 'run_start' | 'generation_start' | 'first_token' | 'generation_done' | 'lint' | 'compile' | 'test_case' | 'generated' | 'score' | 'model_complete' | 'run_complete' | 'error';
+  model?: string;
+  ttftMs?: number | null;
+  tokensPerSecond?: number | null;
+  durationMs?: number;
+  caseIndex?: number;
+  passed?: boolean;
+  testsPassed?: number;
+  testsTotal?: number;
+  score?: number;
+  result?: CodeEvalResult;
+  results?: CodeEvalResult[];
+  runId?: number;
+  error?: string;
 }
 
 export interface CodeEvalRun {
@@ -155,6 +184,8 @@ export interface CodingTool {
   available: boolean;
   apiKeyEnvVar?: string;
   apiKeyConfigured?: boolean;
+  path?: string | null;
+  version?: string | null;
 }
 
 export interface OpenRouterFreeModel {
@@ -171,17 +202,34 @@ export interface BatchLeaderboardEntry {
   tests_passed: number;
   tests_total: number;
   tests_failed: number;
+  test_scope: "full" | "failed";
   duration_ms: number;
   iterations: number;
   error?: string;
 }
 
 export interface BatchProgressEvent {
-  type: "batch_start" | "model_start" | "model_progress" | "model_complete" | "model_error" | "batch_complete" | "error";
+  type: "status" | "batch_start" | "model_start" | "model_progress" | "model_complete" | "model_error" | "batch_complete" | "error";
   message: string;
   data?: any;
 }
 
+export interface RepoTestSpan {
+  name: string;
+  parent: string | null;
+  iteration: number | null;
+  start_ms: number;
+  duration_ms: number;
+}
+
+export interface RepoTestCase {
+  suite: string | null;
+  name: string;
+  status: "passed" | "failed" | "skipped";
+  duration_ms: number | null;
+  message?: string | null;
+}
+
 export interface RepoTestIterationResult {
   iteration: number;
   tool_output: string;
@@ -192,8 +240,24 @@ export interface RepoTestIterationResult {
   tests_failed: number;
   tests_total: number;
   duration_ms: number;
+  report_format: string | null;
+  test_cases: RepoTestCase[];
+  files_changed: number | null;
+  diff_bytes: number | null;
+  test_scope: "full" | "failed";
+  failed_first: {
+    command: string;
+    exit_code: number;
+    passed: number;
+    failed: number;
+    total: number;
+    duration_ms: number;
+  } | null;
 }
 
+export type RepoTestStrategy = "refine" | "best_of_n";
+export type RepoTestIncrementalMode = "off" | "failed_first" | "failed_only";
+
 export interface RepoTestResult {
   runId: number;
   repo_url: string;
@@ -203,17 +267,22 @@ export interface RepoTestResult {
   tool: string;
   model: string;
   status: "success" | "partial" | "fail" | "error";
+  strategy: RepoTestStrategy;
   iterations: RepoTestIterationResult[];
+  best_iteration: number;
   clone_duration_ms: number;
+  install_duration_ms: number;
   total_duration_ms: number;
+  spans: RepoTestSpan[];
   final_tests_passed: number;
   final_tests_failed: number;
   final_tests_total: number;
+  final_test_scope: "full" | "failed";
   error?: string;
 }
 
 export interface RepoTestProgressEvent {
-  type: "status" | "clone" | "iteration_start" | "tool_output" | "test_result" | "complete" | "error";
+  type: "status" | "clone" | "install" | "iteration_start" | "tool_output" | "test_output" | "test_result" | "span" | "complete" | "error";
   message: string;
   data?: any;
 }
@@ -228,6 +297,7 @@ export interface RepoTestHistoryEntry {
   model: string;
   status: string;
   clone_duration_ms: number;
+  install_duration_ms: number | null;
   tool_duration_ms: number;
   test_duration_ms: number;
   total_duration_ms: number;
@@ -237,7 +307,12 @@ export interface RepoTestHistoryEntry {
   test_output: string;
   tool_output: string;
   error: string;
+  timeout_phase: "clone" | "install" | "tool" | "test" | null;
+  strategy: RepoTestStrategy | null;
+  best_iteration: number | null;
   created_at: string;
+  test_cases?: Array<RepoTestCase & { iteration: number }>; // only on single-run fetches
+  spans?: RepoTestSpan[]; // only on single-run fetches
 }
 
 class ApiService {
@@ -269,6 +344,85 @@ class ApiService {
     return await response.json();
   }
 
+  // Read SSE `data:` frames until `data: [DONE]`; false if the stream ended without it
+  private async readSse(response: Response, onFrame: (id: string | null, data: string) => void): Promise<boolean> {
+    const reader = response.body?.getReader();
+    if (!reader) {
+      throw new Error('No response body reader available');
+    }
+
+    const decoder = new TextDecoder();
+    let buffer = '';
+    let id: string | null = null;
+
+    try {
+      while (true) {
+        const { done, value } = await reader.read();
+        if (done) return false;
+
+        buffer += decoder.decode(value, { stream: true });
+        const lines = buffer.split('\n');
+        buffer = lines.pop() || '';
+
+        for (const line of lines) {
+          if (line.startsWith('id: ')) {
+            id = line.slice(4);
+          } else if (line.startsWith('data: ')) {
+            const data = line.slice(6);
+            if (data === '[DONE]') return true;
+            onFrame(id, data);
+            id = null;
+          }
+        }
+      }
+    } finally {
+      reader.releaseLock();
+    }
+  }
+
+  // Read a run's event stream. If the connection drops before the run finishes, reattach
+  // through /api/runs/:id/events with Last-Event-ID and carry on from the last event seen.
+  // Ids are opaque: job streams send "<attempt>-<seq>".
+  private async readRunStream<E>(response: Response, onEvent: (event: E) => void): Promise<void> {
+    const runId = response.headers.get('X-Run-Id');
+    const resumeUrl = response.headers.get('X-Resume-Url') ?? (runId ? `/api/runs/${runId}/events` : null);
+    let lastEventId: string | null = null;
+    let failures = 0;
+    let current: Response | null = response;
+
+    while (true) {
+      const seen = lastEventId;
+      if (current) {
+        try {
+          const finished = await this.readSse(current, (id, data) => {
+            if (id !== null) lastEventId = id;
+            try {
+              onEvent(JSON.parse(data));
+            } catch {
+              console.warn('Failed to parse streaming event:', data);
+            }
+          });
+          if (finished) return;
+        } catch (error) {
+          if (!resumeUrl || failures >= 5) throw error;
+        }
+      }
+      if (lastEventId !== seen) failures = 0;
+      if (!resumeUrl || failures >= 5) {
+        throw new Error('Lost the connection to the run');
+      }
+      failures++;
+      await new Promise((resolve) => setTimeout(resolve, 500 * failures));
+      current = await fetch(`${API_BASE_URL}${resumeUrl}`, {
+        headers: lastEventId !== null ? { 'Last-Event-ID': lastEventId } : {},
+      }).catch(() => null);
+      if (current?.status === 404) {
+        throw new Error('The run is no longer available');
+      }
+      if (current && !current.ok) current = null;
+    }
+  }
+
   // OpenRouter API endpoints
   async getModels() {
     return this.request('/api/openrouter/models');
@@ -356,40 +510,7 @@ class ApiService {
       throw new Error(`HTTP error! status: ${response.status}`);
     }
 
-    const reader = response.body?.getReader();
-    if (!reader) {
-      throw new Error('No response body reader available');
-    }
-
-    const decoder = new TextDecoder();
-    let buffer = '';
-
-    try {
-      while (true) {
-        const { done, value } = await reader.read();
-        if (done) break;
-
-        buffer += decoder.decode(value, { stream: true });
-        const lines = buffer.split('\n');
-        buffer = lines.pop() || '';
-
-        for (const line of lines) {
-          if (line.startsWith('data: ')) {
-            const data = line.slice(6);
-            if (data === '[DONE]') continue;
-
-            try {
-              const event: StreamingEvent = JSON.parse(data);
-              onEvent(event);
-            } catch (e) {
-              console.warn('Failed to parse streaming event:', data);
-            }
-          }
-        }
-      }
-    } finally {
-      reader.releaseLock();
-    }
+    await this.readRunStream(response, onEvent);
   }
 
   // Test results endpoint
@@ -413,6 +534,25 @@ class ApiService {
     );
   }
 
+  async runExercismStream(
+    request: { exerciseId: string; models: string[]; testCount?: number },
+    onEvent: (event: ExercismStreamEvent) => void
+  ): Promise<void> {
+    const url = `${API_BASE_URL}/api/exercism/run-stream`;
+    const response = await fetch(url, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify(request),
+    });
+
+    if (!response.ok) {
+      const errBody = await response.text();
+      throw new Error(`HTTP error ${response.status}: ${errBody}`);
+    }
+
+    await this.readRunStream(response, onEvent);
+  }
+
   async getExercismHistory(limit = 50) {
     return this.request<CodeEvalRun[]>(`/api/exercism/history?limit=${limit}`);
   }
@@ -452,8 +592,16 @@ class ApiService {
     return this.request<CodingTool[]>('/api/repo-test/tools');
   }
 
+  repoTestIterationDiffUrl(runId: number, iteration: number) {
+    return `${API_BASE_URL}/api/repo-test/runs/${runId}/iterations/${iteration}/diff`;
+  }
+
+  async refreshRepoTestTools() {
+    return this.request<CodingTool[]>('/api/repo-test/tools/refresh', { method: 'POST' });
+  }
+
   async runRepoTestStream(
-    request: { repo_url: string; ref: string; prompt: string; test_command: string; tool: string; model: string },
+    request: { repo_url: string; ref: string; prompt: string; test_command: string; tool: string; model: string; iterations?: number; strategy?: RepoTestStrategy; incremental_tests?: RepoTestIncrementalMode },
     onEvent: (event: RepoTestProgressEvent) => void
   ): Promise<void> {
     const url = `${API_BASE_URL}/api/repo-test/run`;
@@ -468,38 +616,10 @@ class ApiService {
       throw new Error(`HTTP error ${response.status}: ${errBody}`);
     }
 
-    const reader = response.body?.getReader();
-    if (!reader) throw new Error('No response body reader available');
-
-    const decoder = new TextDecoder();
-    let buffer = '';
-
-    try {
-      while (true) {
-        const { done, value } = await reader.read();
-        if (done) break;
-
-        buffer += decoder.decode(value, { stream: true });
-        const lines = buffer.split('\n');
-        buffer = lines.pop() || '';
-
-        for (const line of lines) {
-          if (line.startsWith('data: ')) {
-            const data = line.slice(6);
-            if (data === '[DONE]') continue;
-            try {
-              const event: RepoTestProgressEvent = JSON.parse(data);
-              onEvent(event);
-            } catch { /* ignore parse errors */ }
-          }
-        }
-      }
-    } finally {
-      reader.releaseLock();
-    }
+    await this.readRunStream(response, onEvent);
   }
 
-  async runRepoTestSync(request: { repo_url: string; ref: string; prompt: string; test_command: string; tool: string; model: string }) {
+  async runRepoTestSync(request: { repo_url: string; ref: string; prompt: string; test_command: string; tool: string; model: string; iterations?: number; strategy?: RepoTestStrategy; incremental_tests?: RepoTestIncrementalMode }) {
     return this.request<RepoTestResult>('/api/repo-test/run-sync', {
       method: 'POST',
       body: JSON.stringify(request),
@@ -520,7 +640,7 @@ class ApiService {
   }
 
   async runRepoTestBatch(
-    request: { repo_url: string; ref: string; prompt: string; test_command: string; tool: string; models: string[] },
+    request: { repo_url: string; ref: string; prompt: string; test_command: string; tool: string; models: string[]; iterations?: number; strategy?: RepoTestStrategy; incremental_tests?: RepoTestIncrementalMode },
     onEvent: (event: BatchProgressEvent) => void
   ): Promise<void> {
     const url = `${API_BASE_URL}/api/repo-test/batch`;
@@ -535,35 +655,7 @@ class ApiService {
       throw new Error(`HTTP error ${response.status}: ${errBody}`);
     }
 
-    const reader = response.body?.getReader();
-    if (!reader) throw new Error('No response body reader available');
-
-    const decoder = new TextDecoder();
-    let buffer = '';
-
-    try {
-      while (true) {
-        const { done, value } = await reader.read();
-        if (done) break;
-
-        buffer += decoder.decode(value, { stream: true });
-        const lines = buffer.split('\n');
-        buffer = lines.pop() || '';
-
-        for (const line of lines) {
-          if (line.startsWith('data: ')) {
-            const data = line.slice(6);
-            if (data === '[DONE]') continue;
-            try {
-              const event: BatchProgressEvent = JSON.parse(data);
-              onEvent(event);
-            } catch { /* ignore parse errors */ }
-          }
-        }
-      }
-    } finally {
-      reader.releaseLock();
-    }
+    await this.readRunStream(response, onEvent);
   }
 }
 